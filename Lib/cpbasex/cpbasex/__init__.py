@@ -2,4 +2,12 @@ from .pbasex import pbasex
 from .gData import loadG, get_gData
 from .rBFs import rBFs
 from .cpbasex import *
-from .image_mod import *
\ No newline at end of file
+from .rbasex import rbasex, rbasex_energy
+from .image_mod import *
+
+def __getattr__(name):
+	# the colormaps of image_mod are made on first use
+	if name in ('gist_heat', 'hot_cmap'):
+		from . import image_mod
+		return getattr(image_mod, name)
+	raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
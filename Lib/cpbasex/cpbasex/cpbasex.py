@@ -1,9 +1,127 @@
 import numpy as np
+from functools import lru_cache
 from quadrant import unfoldQuadrant
+from scipy.special import eval_legendre as leg
 from .gData import loadG
+from .rBFs import rBFs
 from .image_mod import unfoldHalf
 
-def cpbasex_energy(images, gData, make_images=False, weights=None, regularization=0, alpha=1.0, shape='half'):
+def polar_grid(r, x, y, l, step=1):
+	"""
+	Sample the (x, y) image grid in polar coordinates. Returns the Legendre
+	polynomials P_l(cos(theta)) of every pixel, together with the indices and
+	weights which interpolate a radial distribution sampled on r onto the pixel
+	radii (cubic for a uniform r, linear otherwise). Every step-th pixel is
+	kept along both axes. The results of the last few grids are cached.
+	"""
+
+	grid = lambda a: tuple(np.asarray(a, dtype=float).ravel())
+	return _polar_grid(grid(r), grid(x), grid(y), tuple(l), step)
+
+@lru_cache(maxsize=8)
+def _polar_grid(r, x, y, l, step):
+	r, x, y = np.array(r), np.array(x), np.array(y)
+
+	# same pixel ordering as findGinv()
+	Y, X = np.meshgrid(y[::step], x[::step])
+	R = np.sqrt(X**2+Y**2)
+	with np.errstate(invalid='ignore', divide='ignore'):
+		CosTh = np.nan_to_num(Y/R)
+	Pl = np.stack([leg(li, CosTh) for li in l], axis=-1)
+
+	# indices refer to the radial distribution padded with one mirrored value
+	# below r[0], and two zeros above r[-1] (see reconstruct_images)
+	dr = r[1]-r[0]
+	if np.allclose(np.diff(r), dr):
+		i0 = np.clip(np.floor((R-r[0])/dr).astype(int), -1, len(r)-1)
+		t = (R-r[0])/dr - i0
+		offsets = np.arange(-1, 3)
+		weights = np.stack((-t*(t-1)*(t-2)/6, (t+1)*(t-1)*(t-2)/2,
+							-(t+1)*t*(t-2)/2, (t+1)*t*(t-1)/6), axis=-1)
+	else:
+		i0 = np.clip(np.searchsorted(r, R)-1, 0, len(r)-2)
+		t = np.clip((R-r[i0])/(r[i0+1]-r[i0]), 0, 1)
+		offsets = np.arange(0, 2)
+		weights = np.stack((1-t, t), axis=-1)
+	indices = np.clip(i0[...,None] + offsets + 1, 0, len(r)+2)
+	weights[R > r[-1]] = 0
+
+	return Pl, indices, weights
+
+def polar_to_image(IRB, r, x, y, l, step=1):
+	"""
+	Evaluates sum_l I_l(R) P_l(cos(theta)) on the (x, y) image grid, where the
+	radial distributions IRB have axes (r, l, images).
+	"""
+
+	nl, nim = IRB.shape[1:]
+	IRB = np.concatenate((IRB[:1], IRB, np.zeros((2,nl,nim))), axis=0)
+	Pl, indices, weights = polar_grid(r, x, y, l, step=step)
+	image = np.zeros(Pl.shape[:2]+(nim,))
+	for i in range(indices.shape[-1]):
+		for j in range(nl):
+			image += (weights[...,i]*Pl[...,j])[...,None] * IRB[indices[...,i], j]
+	return image
+
+def radial_basis(gData):
+	"""
+	Gives the radial grid and the radial basis functions sampled on it. When
+	the basis can be re-evaluated (gData has 'rBF', 'k' and 'params', and the
+	basis is not custom), the grid x is extended to the corners of the image,
+	otherwise frk is used as it is (and taken as zero beyond max(x)).
+	"""
+
+	x = gData['x']
+	rBF = gData.get('rBF', 'custom')
+	if isinstance(rBF, bytes):
+		rBF = rBF.decode()
+	if rBF == 'custom' or not {'k', 'params'} <= set(gData.keys()):
+		return x, gData['frk']
+
+	dx = x[1]-x[0]
+	r_max = np.sqrt(np.max(np.abs(x))**2 + np.max(np.abs(gData['y']))**2)
+	r = x[0] + dx*np.arange(int(np.ceil((r_max-x[0])/dx))+2)
+	frk = rBFs(rBF)[0](r, gData['k'], gData['params'])
+	return r, frk
+
+def reconstruct_images(c, gData, regularization=0, shape='half', image_indices=None, image_step=1):
+	"""
+	Gives the least-squares fit and the inverted images from the coefficients c,
+	without building dense matrices. The SVD scaling is applied elementwise, and
+	the inverse is the product of the radial basis and the Legendre polynomials
+	on a cached polar grid (instead of Ginv).
+
+	image_indices selects the images to reconstruct, and image_step > 1 gives a
+	downsampled preview (every image_step-th pixel along both axes).
+	"""
+
+	ny, nx, nk, nl = len(gData['y']), len(gData['x']), gData['nk'], gData['nl']
+	c = c.reshape(nk*nl, -1)
+	if image_indices is not None:
+		c = c[:, np.atleast_1d(image_indices)]
+	nim = c.shape[1]
+
+	scaling = (gData['S']**2+regularization)/gData['S']
+	if shape=='half':
+		fit_shape = (nx, ny)
+	elif shape=='quadrant':
+		fit_shape = (ny, nx)
+	else:
+		raise NameError(f"'shape' ({shape}) must be either 'quadrant' or 'half'")
+	pixels = np.arange(nx*ny).reshape(fit_shape)[::image_step, ::image_step]
+	fit = gData['Up'][:, pixels.flatten()].T.dot(scaling[:,None]*gData['V'].T.dot(c))
+	fit = fit.reshape(pixels.shape+(nim,))
+
+	r, frk = radial_basis(gData)
+	IRB = frk.dot(c.reshape(nl,nk,nim).swapaxes(0,1).reshape(nk,nl*nim)).reshape(len(r),nl,nim)
+	inv = polar_to_image(IRB, r, gData['x'], gData['y'], gData['l'], step=image_step)
+
+	if shape=='half':
+		return unfoldHalf(fit), unfoldHalf(inv)
+	return unfoldQuadrant(fit), unfoldQuadrant(inv)
+
+def cpbasex_energy(images, gData, make_images=False, weights=None, regularization=0, alpha=1.0, shape='half',
+		image_indices=None, image_step=1):
 	
 	gData  = loadG(gData, make_images)
 	ny, nx, nk, nl = len(gData['y']), len(gData['x']), gData['nk'], gData['nl']
@@ -25,21 +143,15 @@ def cpbasex_energy(images, gData, make_images=False, weights=None, regularizatio
 		c = gData['V'].dot((gData['S']/(gData['S']**2+regularization))[:,None]*(np.linalg.solve((gData['Up']*weights[None,:]).dot(gData['Up'].T),gData['Up'].dot(weights[:,None]*images))))
 
 	E = alpha*gData['x']**2
-	IEB = 1/(2*alpha)*np.diag(gData['x']).dot(gData['frk'].dot(c.reshape(nl,nk,nim).swapaxes(0,1).reshape(nk,nl*nim)))
+	IEB = 1/(2*alpha)*gData['x'][:,None]*(gData['frk'].dot(c.reshape(nl,nk,nim).swapaxes(0,1).reshape(nk,nl*nim)))
 	IE = IEB[:,:nim]
 	# with np.errstate(divide='ignore'):
 	with np.errstate(invalid='ignore'):
 		betas = IEB[:,nim:].reshape(nx,nl-1,nim)/IE[:,None,:]
 
 	if make_images:
-		if shape=='half':
-			fit = unfoldHalf(gData['Up'].T.dot(np.diag((gData['S']**2+regularization)/gData['S']).dot(gData['V'].T.dot(c))).reshape(nx,ny,nim))
-			inv = unfoldHalf(gData['Ginv'].dot(c).reshape(nx,ny,nim))
-
-	if make_images:
-		if shape=='quadrant':
-			fit = unfoldQuadrant(gData['Up'].T.dot(np.diag((gData['S']**2+regularization)/gData['S']).dot(gData['V'].T.dot(c))).reshape(ny,nx,nim))
-			inv = unfoldQuadrant(gData['Ginv'].dot(c).reshape(nx,ny,nim))
+		fit, inv = reconstruct_images(c, gData, regularization=regularization, shape=shape,
+			image_indices=image_indices, image_step=image_step)
 
 	out = {'E': E, 'IE': np.squeeze(IE), 'betas': np.squeeze(betas), 'c': np.squeeze(c)}
 	if make_images:
@@ -47,7 +159,8 @@ def cpbasex_energy(images, gData, make_images=False, weights=None, regularizatio
 
 	return out
 
-def cpbasex(images, gData, make_images=False, weights=None, regularization=0, shape='half'):
+def cpbasex(images, gData, make_images=False, weights=None, regularization=0, shape='half',
+		image_indices=None, image_step=1):
 	"""
 	This gives the inversion in radial coordinates.
 	"""
@@ -77,14 +190,8 @@ def cpbasex(images, gData, make_images=False, weights=None, regularization=0, sh
 		betas = IRB[:,nim:].reshape(nx,nl-1,nim)/IR[:,None,:]
 
 	if make_images:
-		if shape=='half':
-			fit = unfoldHalf(gData['Up'].T.dot(np.diag((gData['S']**2+regularization)/gData['S']).dot(gData['V'].T.dot(c))).reshape(nx,ny,nim))
-			inv = unfoldHalf(gData['Ginv'].dot(c).reshape(nx,ny,nim))
-
-	if make_images:
-		if shape=='quadrant':
-			fit = unfoldQuadrant(gData['Up'].T.dot(np.diag((gData['S']**2+regularization)/gData['S']).dot(gData['V'].T.dot(c))).reshape(ny,nx,nim))
-			inv = unfoldQuadrant(gData['Ginv'].dot(c).reshape(nx,ny,nim))
+		fit, inv = reconstruct_images(c, gData, regularization=regularization, shape=shape,
+			image_indices=image_indices, image_step=image_step)
 
 	out = {'r': r, 'IR': np.squeeze(IR), 'betas': np.squeeze(betas), 'c': np.squeeze(c)}
 	if make_images:
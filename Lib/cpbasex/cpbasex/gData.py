@@ -25,14 +25,22 @@ else:
 		return packed_func,dumped_items
 
 def loadG(gData, make_images=False):
+	'''
+	Loads the inversion data. The dense 'Ginv' matrix is not loaded; images are
+	reconstructed with cpbasex.reconstruct_images() instead. make_images is kept
+	for compatibility.
+	'''
 
 	if isinstance(gData, str):
 		with File(gData, 'r') as gData:
 			return loadG(gData, make_images)
 	elif isinstance(gData, File):
 		gData_dict = {}
-		for key in ['y','x','nk','nl','Up','S','V','frk','l']+make_images*['Ginv']:
+		for key in ['y','x','nk','nl','Up','S','V','frk','l']:
 			gData_dict[key] = gData[key][()]
+		for key in ['k','params','rBF']:  # optional, for re-evaluating the basis
+			if key in gData:
+				gData_dict[key] = gData[key][()]
 		return loadG(gData_dict, make_images)
 	else:
 		return gData
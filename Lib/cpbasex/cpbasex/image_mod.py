@@ -1,13 +1,74 @@
-from warnings import warn
-from fermi_libraries.common_functions import rebinning
+from functools import lru_cache
+from fermi_libraries.common_functions import get_rebinner
 import numpy as np
-import matplotlib.pyplot as plt
-from scipy.ndimage import rotate as scipy_rot
-from scipy.ndimage import zoom, shift
-from matplotlib import colormaps as cm
-from matplotlib.colors import ListedColormap, LinearSegmentedColormap
-gist_heat = cm.get_cmap('gist_heat')
-hot_cmap = ListedColormap(np.flipud(gist_heat(range(100)))**0.3)
+
+# matplotlib and scipy.ndimage/sparse are imported where they are used, and the
+# colormaps are made on first use (see __getattr__), to keep this import fast.
+
+@lru_cache(maxsize=None)
+def _colormaps():
+    from matplotlib import colormaps as cm
+    from matplotlib.colors import ListedColormap
+    gist_heat = cm.get_cmap('gist_heat')
+    hot_cmap = ListedColormap(np.flipud(gist_heat(range(100)))**0.3)
+    return {'gist_heat': gist_heat, 'hot_cmap': hot_cmap}
+
+def __getattr__(name):
+    if name in ('gist_heat', 'hot_cmap'):
+        return _colormaps()[name]
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+def find_centers(images, center_guess=None, r_max=None, subpixel=True):
+    """
+    Finds the center of point-symmetric images, from the maximum of their
+    autoconvolution (the overlap of each image with its point-reflected copy
+    as a function of the reflection point). A stack of images, with shape
+    (N, M, k), is handled with one FFT pass.
+    - center_guess, r_max: when given, only the image within r_max of center_guess is used.
+    - subpixel: refine the maximum with a parabola along each axis.
+    Returns the centers with shape (2,) for a single image or (2, k) for a stack,
+    in the convention of find_center, i.e. image[:center_raw] is the upper half.
+    For integer centers, use np.round(center).astype(int).
+    """
+    
+    images = np.asarray(images, dtype=float)
+    single = images.ndim == 2
+    if single:
+        images = images[:,:,None]
+    nr, nc, nim = images.shape
+    
+    if center_guess is not None and r_max is not None:
+        raw_i = np.arange(nr) - center_guess[0] + 0.5
+        col_i = np.arange(nc) - center_guess[1] + 0.5
+        R = np.sqrt(raw_i[:,None]**2 + col_i[None,:]**2)
+        images = images * (R <= r_max)[:,:,None]
+    
+    # autoconvolution, zero-padded against wrap-around. Its maximum lies at
+    # twice the symmetry center, in pixel index coordinates.
+    shape = (2*nr, 2*nc)
+    spectra = np.fft.rfft2(images, s=shape, axes=(0,1))
+    autoconvolution = np.fft.irfft2(spectra*spectra, s=shape, axes=(0,1))
+    
+    flat_max = np.argmax(autoconvolution.reshape(-1, nim), axis=0)
+    peak_raw, peak_col = np.unravel_index(flat_max, shape)
+    peaks = np.stack((peak_raw, peak_col)).astype(float)
+    
+    if subpixel:
+        k = np.arange(nim)
+        for axis, peak in enumerate((peak_raw, peak_col)):
+            before, after = [peak_raw, peak_col], [peak_raw, peak_col]
+            before[axis] = np.clip(peak-1, 0, shape[axis]-1)
+            after[axis] = np.clip(peak+1, 0, shape[axis]-1)
+            c_0 = autoconvolution[peak_raw, peak_col, k]
+            c_m = autoconvolution[before[0], before[1], k]
+            c_p = autoconvolution[after[0], after[1], k]
+            curvature = c_m - 2*c_0 + c_p
+            with np.errstate(divide='ignore', invalid='ignore'):
+                delta = np.where(curvature < 0, 0.5*(c_m - c_p)/curvature, 0)
+            peaks[axis] += np.clip(delta, -0.5, 0.5)
+    
+    centers = peaks/2 + 0.5
+    return centers[:,0] if single else centers
 
 def find_center(image, center_guess, r_max, show_image = False): 
     """
@@ -23,52 +84,16 @@ def find_center(image, center_guess, r_max, show_image = False):
         - image[center_raw:, center_col:] is the lower right quadrant
     """
     
-    image_copy = image.copy()
-    nr, nc = np.shape(image)
-    raw_i = np.arange(nr) - center_guess[0] + 0.5
-    col_i = np.arange(nc) - center_guess[1] + 0.5
-    Raw_i, Col_i = np.meshgrid(raw_i, col_i)
-    R = np.sqrt(Raw_i**2 + Col_i**2)
-    mask_out = R > r_max
-    image_copy[mask_out] = 0
-
-    dim_raw, dim_col = np.shape(image_copy)
-    size = dim_raw
-    xcorr_raw = []
-    xcorr_col = []
-    image_abs = (image_copy.copy())
-    for jj in np.array((range(dim_raw))):
-        jj_shift = int(jj - dim_raw/2)
-        lapl_1 = image_abs
-        lapl_2 = image_abs
-        lapl_1 = np.roll(np.flipud(lapl_1), jj_shift, 0)
-        if jj_shift >= 0:
-            lapl_1[:jj_shift,:] = 0
-        else:
-            lapl_1[jj_shift:,:] = 0
-        prod = np.sum(lapl_1 * lapl_2)
-        xcorr_raw.append(prod)
-    
-        lapl_1 = image_abs
-        lapl_2 = image_abs
-        lapl_1 = np.roll(np.fliplr(lapl_1), jj_shift, 1)
-        if jj_shift >= 0:
-            lapl_1[:,:jj_shift] = 0
-        else:
-            lapl_1[:,jj_shift:] = 0
-        prod = np.sum(lapl_1 * lapl_2)
-        xcorr_col.append(prod)
-    
-    center_raw = +(np.argmax(xcorr_raw) - dim_raw/2 )/2 + dim_raw/2
-    center_col = +(np.argmax(xcorr_col) - dim_col/2 )/2 + dim_col/2 
-    center_raw_pix  = int(np.round(center_raw+0.5))
-    center_col_pix  = int(np.round(center_col+0.5))
+    center = find_centers(image, center_guess=center_guess, r_max=r_max, subpixel=False)
+    center_raw_pix, center_col_pix = [int(c) for c in np.round(center+0.5)]
     
     output = [center_raw_pix, center_col_pix]
     x = np.linspace(center_guess[1] - r_max, center_guess[1] + r_max,101)
     y_u = center_guess[0] + np.sqrt(-(x - center_guess[1])**2 + r_max**2)
     y_d = center_guess[0] - np.sqrt(-(x - center_guess[1])**2 + r_max**2)
     if show_image:
+        import matplotlib.pyplot as plt
+        hot_cmap = _colormaps()['hot_cmap']
         plt.figure(figsize = (8,3))
         plt.subplot(1,3,1)
         plt.imshow(image, cmap = hot_cmap)
@@ -104,9 +129,12 @@ def center_image(images, center, axes=(-2, -1)):
     return images_centered
 
 def center_image_interp(image, center, show_image=False):
+    from scipy.ndimage import shift
     dim = np.shape(image)
     image = shift(image, (-center[0]+dim[0]/2,-center[1] + dim[1]/2))
     if show_image:
+        import matplotlib.pyplot as plt
+        hot_cmap = _colormaps()['hot_cmap']
         plt.figure(figsize = (8,3))
         plt.imshow(image, cmap = hot_cmap)
         plt.plot( 450, 450,'.', markersize = '10', color = 'red')
@@ -114,14 +142,18 @@ def center_image_interp(image, center, show_image=False):
     return image
     
 def rotate(image, angle, show_image = False):
+    from scipy.ndimage import rotate as scipy_rot
     img_rot = scipy_rot(image, angle, reshape = False)
     if show_image:
+        import matplotlib.pyplot as plt
+        hot_cmap = _colormaps()['hot_cmap']
         plt.figure(figsize = (8,3))
         plt.imshow(img_rot, cmap = hot_cmap)
         plt.plot( 450, 450,'.', markersize = '10', color = 'red')
     return img_rot
 
 def zoom_horizontal(image, factor, show_image = False):
+    from scipy.ndimage import zoom
     if factor == 1:
         img_zoom = image
     else: 
@@ -137,6 +169,8 @@ def zoom_horizontal(image, factor, show_image = False):
             img_new[:,size_1_diff:size_1_diff+size_out[1]] = img_zoom
             img_zoom = img_new
     if show_image:
+        import matplotlib.pyplot as plt
+        hot_cmap = _colormaps()['hot_cmap']
         plt.figure(figsize = (8,3))
         plt.imshow(img_zoom, cmap = hot_cmap)
         plt.plot( 450, 450,'.', markersize = '10', color = 'red')
@@ -147,6 +181,7 @@ def stretch(image, stretch=(1,1), axis=(0,1)):
         raise ValueError(f'axis keyword {axis} must have length two')
     if len(stretch)!=2:
         raise ValueError(f'stretch keyword {stretch} must have length two')
+    from scipy.ndimage import zoom
     
     old_Nx, old_Ny, *_ = np.array(image.shape)[np.array(axis)]
     old_x, old_y = np.arange(old_Nx)-old_Nx//2, np.arange(old_Ny)-old_Ny//2
@@ -157,29 +192,145 @@ def stretch(image, stretch=(1,1), axis=(0,1)):
         stretched = zoom(stretched, zoom_factors)
     new_Nx, new_Ny = stretched.shape
     new_x, new_y = np.arange(new_Nx)-new_Nx//2, np.arange(new_Ny)-new_Ny//2
-    stretched = rebinning(old_x, new_x, stretched, axis=axis[0])
-    stretched = rebinning(old_y, new_y, stretched, axis=axis[1])
+    stretched = get_rebinner(new_x, old_x).apply(stretched, axis=axis[0])
+    stretched = get_rebinner(new_y, old_y).apply(stretched, axis=axis[1])
     return stretched
 
-def find_rotation(image, guess=None):
+def polar_transform(images, center=None, r_max=None, nr=None, ntheta=360, r_min=0):
+    """
+    Resamples an image, or a stack of images (N, M, k), onto a polar grid with
+    one (bilinear) map_coordinates call. The angle theta is measured from the
+    first image axis towards the second one.
+    - center: in the convention of find_center, for all images (2,) or per image (2, k). Found with find_centers if not given.
+    - r_max: largest radius, by default the largest circle inside the image.
+    - nr, ntheta: number of radial and angular points.
+    Returns r (nr,), theta (ntheta,), and the polar images (nr, ntheta) or (nr, ntheta, k).
+    """
+    
+    images = np.asarray(images, dtype=float)
+    single = images.ndim == 2
+    if single:
+        images = images[:,:,None]
+    nim = images.shape[2]
+    
+    if center is None:
+        center = find_centers(images)
+    center = np.broadcast_to(np.asarray(center, dtype=float).reshape(2, -1), (2, nim))
+    if r_max is None:
+        r_max = np.min(np.stack((center[0], center[1], images.shape[0]-center[0], images.shape[1]-center[1])))
+    if nr is None:
+        nr = int(np.ceil(r_max - r_min))
+    
+    r = np.linspace(r_min, r_max, nr, endpoint=False) + (r_max-r_min)/(2*nr)
+    theta = np.linspace(0, 2*np.pi, ntheta, endpoint=False)
+    # pixel i has its center at i+0.5 in the convention of find_center
+    raw = center[0][None,None,:] - 0.5 + r[:,None,None]*np.cos(theta)[None,:,None]
+    col = center[1][None,None,:] - 0.5 + r[:,None,None]*np.sin(theta)[None,:,None]
+    index = np.broadcast_to(np.arange(nim, dtype=float), raw.shape)
+    from scipy.ndimage import map_coordinates
+    polar = map_coordinates(images, (raw, col, index), order=1, mode='constant', cval=0.0)
+    
+    return r, theta, (polar[:,:,0] if single else polar)
+
+def _refine_maximum(values, axis):
+    """
+    Index of the maximum along axis, refined with a parabola through its
+    periodic neighbours. Also returns the maximum values.
+    """
+    values = np.moveaxis(values, axis, 0)
+    n = values.shape[0]
+    peak = np.argmax(values, axis=0)
+    c_0 = np.take_along_axis(values, peak[None], 0)[0]
+    c_m = np.take_along_axis(values, ((peak-1) % n)[None], 0)[0]
+    c_p = np.take_along_axis(values, ((peak+1) % n)[None], 0)[0]
+    curvature = c_m - 2*c_0 + c_p
+    with np.errstate(divide='ignore', invalid='ignore'):
+        delta = np.where(curvature < 0, 0.5*(c_m - c_p)/curvature, 0)
+    return peak + np.clip(delta, -0.5, 0.5), c_0
+
+def find_rotation(image, guess=None, center=None, r_max=None, r_min=0, ntheta=360, oversampling=16):
     '''
-    Find rotation in degrees.
+    Find rotation in degrees, i.e. the angle for rotate() which aligns the
+    symmetry axis of the image with an image axis. The mirror axis of the
+    angular distribution follows from the maximum of its (angular) cross-correlation
+    with its mirror image, summed over all radii. The result is ambiguous by
+    90 degrees, the angle closest to guess (default 0) is returned.
+    Accepts an image stack (N, M, k), and then returns k angles.
     '''
-    warn("rotation detection not implemented, returning trivial")
-    rotation = 0
+    r, theta, polar = polar_transform(image, center=center, r_max=r_max, r_min=r_min, ntheta=ntheta)
+    polar = polar - np.mean(polar, axis=1, keepdims=True)
+    
+    # the autoconvolution peaks at twice the mirror angle
+    spectra = np.fft.rfft(polar, axis=1)
+    spectrum = np.sum(r.reshape((-1,) + (1,)*(polar.ndim-1)) * spectra**2, axis=0)
+    n_fine = oversampling*ntheta
+    autoconvolution = np.fft.irfft(spectrum, n=n_fine, axis=0)
+    peak, _ = _refine_maximum(autoconvolution, axis=0)
+    mirror_angle = np.degrees(np.pi*peak/n_fine)
+    
+    if guess is None:
+        guess = 0
+    # mirror axes repeat every 90 degrees; rotate() turns them the opposite way
+    rotation = -mirror_angle
+    rotation = guess + (rotation - guess + 45) % 90 - 45
     return rotation
 
-def find_ellipticity(image, guess=None):
+def find_ellipticity(image, guess=None, center=None, r_max=None, r_min=None, ntheta=180, nr=None):
     '''
-    Find the ellipticity of the image.
+    Find the ellipticity of the image, as the (area-preserving) factors for
+    stretch() which make its rings circular. The radial profile at every
+    angle is compared with the angle-averaged profile on a logarithmic radius,
+    where a different ring radius is a shift. Then 1/r**2 = A cos**2 + B sin**2
+    (+ C sin cos) is fitted to the relative ring radii versus angle.
+    Accepts an image stack (N, M, k), and then returns factors of shape (2, k).
+    The guess is not used.
     '''
-    warn("ellipticity detection not implemented, returning trivial")
-    ellipticity = np.array([1, 1])
-    return ellipticity
+    images = np.asarray(image, dtype=float)
+    single = images.ndim == 2
+    if single:
+        images = images[:,:,None]
+    if center is None:
+        center = find_centers(images)
+    if r_max is None:
+        center = np.reshape(center, (2, -1))
+        r_max = np.min(np.concatenate((center, np.array(images.shape[:2])[:,None]-center)))
+    if r_min is None:
+        r_min = 0.05*r_max
+    if nr is None:
+        nr = int(np.ceil(r_max))
+    
+    # polar image on a logarithmic radial grid
+    log_r = np.linspace(np.log(r_min), np.log(r_max), nr)
+    r, theta, polar = polar_transform(images, center=center, r_max=r_max, nr=int(np.ceil(r_max))*2, ntheta=ntheta)
+    indices = np.interp(np.exp(log_r), r, np.arange(len(r)))
+    lower = np.floor(indices).astype(int)
+    upper = np.minimum(lower+1, len(r)-1)
+    t = (indices-lower)[:,None,None]
+    polar = (1-t)*polar[lower] + t*polar[upper]
+    polar = polar * np.exp(log_r)[:,None,None]
+    polar = polar - np.mean(polar, axis=0, keepdims=True)
+    
+    # shift of every angular profile relative to the average profile
+    reference = np.mean(polar, axis=1, keepdims=True)
+    n = 2*nr
+    correlation = np.fft.irfft(np.fft.rfft(polar, n=n, axis=0)*np.conj(np.fft.rfft(reference, n=n, axis=0)), n=n, axis=0)
+    peak, weight = _refine_maximum(correlation, axis=0)
+    shift = np.where(peak > n/2, peak-n, peak) * (log_r[1]-log_r[0])
+    weight = np.clip(weight, 0, None)
+    
+    # weighted least squares per image, for 1/rho**2 = A cos**2 + B sin**2 + C sin cos
+    design = np.stack((np.cos(theta)**2, np.sin(theta)**2, np.sin(theta)*np.cos(theta)), axis=-1)
+    ellipticity = np.zeros((2, images.shape[2]))
+    for i in range(images.shape[2]):
+        w = np.sqrt(weight[:,i])
+        A, B, _ = np.linalg.lstsq(design*w[:,None], np.exp(-2*shift[:,i])*w, rcond=None)[0]
+        # semi-axes are 1/sqrt(A) (first axis) and 1/sqrt(B) (second axis)
+        ellipticity[:,i] = (A/B)**0.25, (B/A)**0.25
+    return ellipticity[:,0] if single else ellipticity
 
 def resize(image, new_N, axis=(0,1)):
     '''
-    Resize the image using the rebinning() function.
+    Resize the image by (cached, conservative) rebinning along every axis.
     '''
     if len(new_N) != len(axis):
         raise ValueError(f'length of new_N ({len(new_N)})')
@@ -191,9 +342,87 @@ def resize(image, new_N, axis=(0,1)):
     for old_N_i, new_N_i, axis_i in zip(old_N, new_N, axis):
         old_x = np.arange(old_N_i)
         new_x = np.linspace(0, old_N_i-1, num=new_N_i)
-        reduced = rebinning(new_x, old_x, reduced, axis=axis_i)
+        reduced = get_rebinner(old_x, new_x).apply(reduced, axis=axis_i)
     return reduced
 
+@lru_cache(maxsize=8)
+def correction_operator(shape, nx, center, rotation=0, stretch=(1,1), r_max=None, half_filter=(1,1),
+        fold=True, supersampling=None):
+    """
+    Sparse matrix which maps a flattened image of the given shape onto the
+    corrected image, i.e. the equivalent of
+        foldHalf(resize(stretch(rotate(center_image(image, center), rotation), stretch)), half_filter)
+    in a single (bilinear) resampling. The circle r_max around the center
+    (default nx) is mapped onto the cpbasex grid x = arange(nx)+0.5, so the
+    output has the shape (nx, 2*nx), or (2*nx, 2*nx) for fold=False. Like
+    resize(), the output is an average over every output pixel, using
+    supersampling**2 points per pixel (by default enough to cover the input
+    pixels). Like foldHalf(), the halves in half_filter are summed.
+    Cached per geometry, so all arguments must be hashable.
+    """
+    
+    if r_max is None:
+        r_max = nx
+    scale = r_max/nx  # input pixels per output pixel
+    if supersampling is None:
+        supersampling = max(1, int(np.ceil(scale)))
+    
+    # output coordinates in input pixels, relative to the center
+    sub = ((np.arange(supersampling)+0.5)/supersampling - 0.5)
+    x = (np.arange(nx)+0.5)[:,None] + sub[None,:]
+    y = (np.arange(2*nx)-nx+0.5)[:,None] + sub[None,:]
+    if fold:
+        halves = [sign*x for sign, use in zip((-1, 1), half_filter) if use]
+    else:
+        halves = [(np.arange(2*nx)-nx+0.5)[:,None] + sub[None,:]]
+    
+    rows, cols, vals = [], [], []
+    n_out = halves[0].shape[0]*len(y)
+    out_index = np.arange(n_out).reshape(halves[0].shape[0], 1, len(y), 1)
+    for half in halves:
+        d0 = scale*half[:,:,None,None]/stretch[0]
+        d1 = scale*y[None,None,:,:]/stretch[1]
+        # rotate() turns the image by +rotation, so look up at -rotation
+        angle = np.radians(rotation)
+        raw = center[0] - 0.5 + np.cos(angle)*d0 + np.sin(angle)*d1
+        col = center[1] - 0.5 - np.sin(angle)*d0 + np.cos(angle)*d1
+        raw0, col0 = np.floor(raw).astype(int), np.floor(col).astype(int)
+        t_raw, t_col = raw-raw0, col-col0
+        for i, w_raw in ((0, 1-t_raw), (1, t_raw)):
+            for j, w_col in ((0, 1-t_col), (1, t_col)):
+                r_i, c_j = raw0+i, col0+j
+                inside = (r_i >= 0) & (r_i < shape[0]) & (c_j >= 0) & (c_j < shape[1])
+                out = np.broadcast_to(out_index, inside.shape)
+                rows.append(out[inside])
+                cols.append((r_i*shape[1]+c_j)[inside])
+                vals.append((w_raw*w_col)[inside]/supersampling**2)
+    
+    from scipy import sparse
+    operator = sparse.csr_matrix((np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))),
+        shape=(n_out, shape[0]*shape[1]))
+    operator.sum_duplicates()
+    return operator
+
+def correct_images(images, nx, center=None, rotation=0, stretch=(1,1), r_max=None, half_filter=(1,1),
+        fold=True, supersampling=None):
+    """
+    Applies correction_operator() to an image or a stack of images (N, M, k),
+    with one sparse matrix product. Returns (nx, 2*nx, ...) for fold=True,
+    ready for cpbasex with len(gData['x']) == nx, otherwise (2*nx, 2*nx, ...).
+    - center: in the convention of find_center, by default the image center.
+    """
+    
+    images = np.asarray(images)
+    shape = images.shape[:2]
+    if center is None:
+        center = (shape[0]//2, shape[1]//2)
+    operator = correction_operator(shape, int(nx), tuple(float(c) for c in center), float(rotation),
+        tuple(float(s) for s in stretch), None if r_max is None else float(r_max),
+        tuple(bool(h) for h in half_filter), fold, supersampling)
+    
+    corrected = operator.dot(images.reshape(shape[0]*shape[1], -1))
+    return corrected.reshape((-1, 2*nx) + images.shape[2:])
+
 def unfoldHalf(M):
 	"""
 	Unfold the image-half into a symmetric full image. Image completion along
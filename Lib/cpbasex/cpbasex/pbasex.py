@@ -1,6 +1,6 @@
 import numpy as np
 from .gData import loadG
-from quadrant import unfoldQuadrant
+from .cpbasex import reconstruct_images
 
 def pbasex(images, gData, make_images=False, weights=None, regularization=0, alpha=1.0):
 	
@@ -23,14 +23,13 @@ def pbasex(images, gData, make_images=False, weights=None, regularization=0, alp
 		c = gData['V'].dot((gData['S']/(gData['S']**2+regularization))[:,None]*(np.linalg.solve((gData['Up']*weights[None,:]).dot(gData['Up'].T),gData['Up'].dot(weights[:,None]*images))))
 
 	E = alpha*gData['x']**2
-	IEB = 1/(2*alpha)*np.diag(gData['x']).dot(gData['frk'].dot(c.reshape(nl,nk,nim).swapaxes(0,1).reshape(nk,nl*nim)))
+	IEB = 1/(2*alpha)*gData['x'][:,None]*(gData['frk'].dot(c.reshape(nl,nk,nim).swapaxes(0,1).reshape(nk,nl*nim)))
 	IE = IEB[:,:nim]
 	with np.errstate(divide='ignore'):
 		betas = IEB[:,nim:].reshape(nx,nl-1,nim)/IE[:,None,:]
 
 	if make_images:
-		fit = unfoldQuadrant(gData['Up'].T.dot(np.diag((gData['S']**2+regularization)/gData['S']).dot(gData['V'].T.dot(c))).reshape(nx,nx,nim))
-		inv = unfoldQuadrant(gData['Ginv'].dot(c).reshape(nx,nx,nim))
+		fit, inv = reconstruct_images(c, gData, regularization=regularization, shape='quadrant')
 
 	out = {'E': E, 'IE': np.squeeze(IE), 'betas': np.squeeze(betas), 'c': np.squeeze(c)}
 	if make_images:
@@ -0,0 +1,205 @@
+import numpy as np
+from functools import lru_cache
+from numpy.polynomial import legendre as npleg
+from scipy import sparse
+from quadrant import unfoldQuadrant
+from scipy.special import eval_legendre as leg
+from .cpbasex import polar_to_image
+from .image_mod import unfoldHalf
+
+def image_grid(nx, shape='half'):
+	"""
+	The (x, y) pixel coordinates of a half or quadrant image with nx columns,
+	in the same convention as get_gData().
+	"""
+	x = np.arange(nx, dtype='double')+0.5
+	if shape=='half':
+		y = np.concatenate((-x[::-1], x))
+	elif shape=='quadrant':
+		y = x
+	return x, y
+
+def projected_orders(l):
+	"""
+	All Legendre orders m which appear in the projection of the orders l.
+	"""
+	return np.array(sorted({m for li in l for m in range(li%2, li+1, 2)}))
+
+def legendre_scaling(l, m):
+	"""
+	Polynomial coefficients (in u) of c_lm(u), defined by
+	P_l(u*v) = sum_m c_lm(u) P_m(v). Returns an array of shape (nl, nm, lmax+1).
+	"""
+	lmax = max(l)
+	# Legendre coefficients of the monomials v^k
+	monomials = np.zeros((lmax+1, lmax+1))
+	for k in range(lmax+1):
+		monomials[k,:k+1] = npleg.poly2leg(np.eye(k+1)[k])
+	coefficients = np.zeros((len(l), len(m), lmax+1))
+	for i, li in enumerate(l):
+		a = npleg.leg2poly(np.eye(li+1)[li])
+		for j, mj in enumerate(m):
+			coefficients[i,j,:li+1] = a*monomials[:li+1,mj]
+	return coefficients
+
+def radial_split(R, nr):
+	"""
+	Linear (hat-function) split of the radii R onto the grid arange(nr)+0.5.
+	Returns two (indices, weights) pairs; weights beyond the grid are zero.
+	"""
+	s = np.clip(R-0.5, 0, None)
+	i0 = np.floor(s).astype(int)
+	t = s-i0
+	w0 = np.where(i0<nr, 1-t, 0)
+	w1 = np.where(i0+1<nr, t, 0)
+	return (np.clip(i0, 0, nr-1), w0), (np.clip(i0+1, 0, nr-1), w1)
+
+def polar_projector(nx, m, shape='half'):
+	"""
+	Sparse matrix of shape (pixels, nr*nm) which gives, for every image radius
+	r = arange(nx)+0.5, the least-squares coefficients of sum_m p_m P_m(cos(theta))
+	over the pixels of that ring (pixels are split linearly between rings).
+	Also returns which rings resolve all orders m.
+	"""
+	x, y = image_grid(nx, shape)
+	Y, X = np.meshgrid(y, x)
+	R = np.sqrt(X**2+Y**2).flatten()
+	CosTh = (Y.flatten()/R)
+	Pm = np.stack([leg(mi, CosTh) for mi in m], axis=-1)
+	nr, nm, npix = nx, len(m), len(R)
+
+	rows, cols, vals = [], [], []
+	gram = np.zeros((nr, nm, nm))
+	for indices, weights in radial_split(R, nr):
+		for j in range(nm):
+			rows.append(np.arange(npix))
+			cols.append(indices*nm+j)
+			vals.append(weights*Pm[:,j])
+		np.add.at(gram, indices, weights[:,None,None]*Pm[:,:,None]*Pm[:,None,:])
+	T = sparse.csr_matrix((np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))), shape=(npix, nr*nm))
+
+	# rings close to the center contain too few pixels to resolve every order;
+	# only their isotropic part is kept
+	eigenvalues = np.linalg.eigvalsh(gram)
+	resolved = eigenvalues[:,0] > 1e-3*eigenvalues[:,-1]
+	gram_inv = np.zeros_like(gram)
+	gram_inv[resolved] = np.linalg.inv(gram[resolved])
+	gram_inv[~resolved,0,0] = 1/gram[~resolved,0,0]
+	projector = (T @ sparse.block_diag(list(gram_inv), format='csr')).tocsr()
+	return projector, resolved
+
+def projection_matrix(nx, l, m, dz=0.05):
+	"""
+	Matrix of shape (nr*nm, nr*nl) which projects the distributions
+	I_l(r) P_l(cos(theta)), with I_l(r) linear between the radii arange(nx)+0.5,
+	onto the image coefficients of polar_projector(). Same normalisation as
+	get_gData(), i.e. 1/(2 pi) int_0^inf dz.
+	"""
+	r = np.arange(nx, dtype='double')+0.5
+	nr, nl, nm = nx, len(l), len(m)
+	coefficients = legendre_scaling(l, m).reshape(nl*nm, -1)
+	A = np.zeros((nr, nm, nr, nl))
+	for i, Ri in enumerate(r):
+		z = np.arange(0, np.sqrt((r[-1]+1)**2-Ri**2)+dz, dz)
+		rz = np.sqrt(Ri**2+z**2)
+		wz = np.full(len(z), dz)
+		wz[0] = dz/2
+		c = (Ri/rz)[:,None]**np.arange(coefficients.shape[1]) @ coefficients.T
+		for indices, weights in radial_split(rz, nr):
+			# tri_j(r(z)) * c_lm(R/r(z)), summed over z
+			contribution = np.zeros((nr, nl*nm))
+			np.add.at(contribution, indices, (wz*weights)[:,None]*c)
+			A[i] += contribution.reshape(nr, nl, nm).transpose(2,0,1)
+	return A.reshape(nr*nm, nr*nl)/(2*np.pi)
+
+def rbasex_tables(nx, l=(0,2,4), shape='half', regularization=0):
+	"""
+	Lookup tables for rbasex(); the tables of the last few image sizes and
+	regularizations are kept in memory.
+	"""
+	return _rbasex_tables(int(nx), tuple(int(li) for li in l), shape, float(regularization))
+
+@lru_cache(maxsize=4)
+def _rbasex_tables(nx, l, shape, regularization):
+	m = projected_orders(l)
+	projector, resolved = polar_projector(nx, m, shape)
+	A = projection_matrix(nx, l, m)
+	A.reshape(nx, len(m), -1)[~resolved,1:] = 0
+	if regularization:
+		solver = np.linalg.solve(A.T.dot(A)+regularization*np.eye(A.shape[1]), A.T)
+	else:
+		solver = np.linalg.pinv(A)
+
+	return {'l': np.array(l), 'm': m, 'projector': projector, 'A': A, 'solver': solver}
+
+def rbasex_coefficients(images, l, regularization, shape):
+	nx = images.shape[0]
+	try:
+		nim = images.shape[2]
+	except IndexError:
+		nim = 1
+	tables = rbasex_tables(nx, l, shape, regularization)
+	images = images.reshape(-1, nim)
+
+	p = tables['projector'].T.dot(images)
+	c = tables['solver'].dot(p).reshape(nx, len(l), nim)
+	return tables, p, c
+
+def rbasex_images(tables, c, shape, image_step=1):
+	nx, nl, nim = c.shape
+	x, y = image_grid(nx, shape)
+	r = x
+	m = tables['m']
+	p = tables['A'].dot(c.reshape(nx*nl, nim)).reshape(nx, len(m), nim)
+	fit = polar_to_image(p, r, x, y, m, step=image_step)
+	inv = polar_to_image(c, r, x, y, tables['l'], step=image_step)
+	if shape=='half':
+		return unfoldHalf(fit), unfoldHalf(inv)
+	return unfoldQuadrant(fit), unfoldQuadrant(inv)
+
+def rbasex_energy(images, make_images=False, l=(0,2,4), regularization=0, alpha=1.0, shape='half', image_step=1):
+	"""
+	Fast approximate inversion, with the same output as cpbasex_energy(), but
+	without a gData file, and so without 'c' (the coefficients of the gData
+	basis functions). Images have the shape of the cpbasex images,
+	i.e. (nx, 2*nx, images) for shape='half'.
+	"""
+
+	tables, p, c = rbasex_coefficients(images, l, regularization, shape)
+	nx, nl, nim = c.shape
+	x = np.arange(nx, dtype='double')+0.5
+
+	E = alpha*x**2
+	IEB = 1/(2*alpha)*x[:,None,None]*c
+	IE = IEB[:,0]
+	with np.errstate(invalid='ignore'):
+		betas = IEB[:,1:]/IE[:,None,:]
+
+	out = {'E': E, 'IE': np.squeeze(IE), 'betas': np.squeeze(betas)}
+	if make_images:
+		fit, inv = rbasex_images(tables, c, shape, image_step=image_step)
+		out['fit'], out['inv'] = np.squeeze(fit), np.squeeze(inv)
+
+	return out
+
+def rbasex(images, make_images=False, l=(0,2,4), regularization=0, shape='half', image_step=1):
+	"""
+	This gives the fast approximate inversion in radial coordinates, with the
+	same output as cpbasex(), except 'c' (the coefficients of the gData basis
+	functions, which are not used here).
+	"""
+
+	tables, p, c = rbasex_coefficients(images, l, regularization, shape)
+	nx, nl, nim = c.shape
+
+	r = np.arange(nx, dtype='double')+0.5
+	IR = c[:,0]
+	with np.errstate(divide='ignore'):
+		betas = c[:,1:]/IR[:,None,:]
+
+	out = {'r': r, 'IR': np.squeeze(IR), 'betas': np.squeeze(betas)}
+	if make_images:
+		fit, inv = rbasex_images(tables, c, shape, image_step=image_step)
+		out['fit'], out['inv'] = np.squeeze(fit), np.squeeze(inv)
+
+	return out
@@ -1,4 +1,15 @@
 from . import common_functions
 from . import dictionary_search
 from . import run_module
-from . import calibration_tools
\ No newline at end of file
+from . import calibration_tools
+from . import reducers
+from . import events
+from . import profiling
+from . import planner
+from . import catalog
+from . import backends
+from . import accumulators
+from . import sketches
+from . import asynchronous
+from . import live_plotting
+from . import peak_fitting
@@ -0,0 +1,239 @@
+'''
+Mergeable sums over shots.
+
+An Accumulator holds the sums of the shots of one or more files, with the fixed axes
+(conditions, rules, ...) of Run.yield_file_data(): the sum and the number of shots,
+optionally the sum of squared deviations from the mean (M2), and optionally the sums of
+a second variable and the co-moment of both. Accumulators of different files, cache
+blocks or Runs are combined with merge(), which is associative and works in place:
+
+    accumulator = merge_all(run.yield_accumulators_filedata('vmi', back_sep=True))
+    accumulator.merge(other_accumulator)
+    averages, weights = accumulator.mean(), accumulator.count
+
+M2 and the co-moment are merged with the pairwise update of Chan et al., so they stay
+accurate when many files with different means are combined. With M2, variance(), std()
+and standard_error() give the spread of the shots and the error of the mean.
+'''
+
+import io
+import numpy as np
+
+FIELDS = ('sum', 'count', 'm2', 'sum2', 'comoment')
+
+
+def _expand(array, ndim):
+    ''' array with axes appended up to ndim. '''
+    return np.expand_dims(array, axis=tuple(range(np.ndim(array), ndim)))
+
+
+def _mean(sums, count):
+    divisor = _expand(count, np.ndim(sums)).astype(float)
+    divisor[divisor==0] = 1
+    return sums/divisor
+
+
+class Accumulator():
+    '''
+    Sums over shots with the axes (conditions, rules, ...), see the module docstring.
+
+    Attributes
+    ----------
+    sum : np.ndarray
+        Sum of the shots, float64 with shape (conditions, rules, *data).
+    count : np.ndarray
+        Number of shots, int64 with shape (conditions, rules).
+    m2 : np.ndarray or None
+        Sum of the squared deviations from the mean, with the shape of sum.
+    sum2 : np.ndarray or None
+        Sum of a second variable of the same shots, float64 with shape
+        (conditions, rules, *data2).
+    comoment : np.ndarray or None
+        Sum of (x - mean x)(y - mean y) of the flattened variables, with shape
+        (conditions, rules, size of data, size of data2).
+    '''
+
+    __slots__ = FIELDS
+
+    def __init__(self, sum, count, m2=None, sum2=None, comoment=None):
+        self.sum = np.array(sum, dtype=float)
+        self.count = np.array(count, dtype=np.int64)
+        self.m2 = None if m2 is None else np.array(m2, dtype=float)
+        self.sum2 = None if sum2 is None else np.array(sum2, dtype=float)
+        self.comoment = None if comoment is None else np.array(comoment, dtype=float)
+        if self.count.ndim != 2 or self.sum.shape[:2] != self.count.shape:
+            raise ValueError(f'sum {self.sum.shape} and count {self.count.shape} do not have the axes (conditions, rules)')
+        if (self.sum2 is None) != (self.comoment is None):
+            raise ValueError('sum2 and comoment must be given together')
+
+    @classmethod
+    def zeros(cls, num_conditions, num_rules, shape=(), m2=False, shape2=None):
+        '''
+        Empty Accumulator, with M2 if m2, and with sum2 and the co-moment if shape2 is
+        given.
+        '''
+        axes = (num_conditions, num_rules)
+        size, size2 = int(np.prod(shape)), int(np.prod(shape2 or ()))
+        return cls(np.zeros(axes + tuple(shape)), np.zeros(axes, dtype=np.int64),
+                   m2=np.zeros(axes + tuple(shape)) if m2 else None,
+                   sum2=None if shape2 is None else np.zeros(axes + tuple(shape2)),
+                   comoment=None if shape2 is None else np.zeros(axes + (size, size2)))
+
+    @classmethod
+    def from_shots(cls, file_level_data, m2=False):
+        '''
+        Accumulator of the shots of one file, given as [conditions][rules] arrays of
+        shape (shots, ...), e.g. the output of Run.yield_file_data(). With m2, the
+        squared deviations are summed as well (one float copy of the shots of a rule at
+        a time).
+        '''
+        sums, counts, m2s = [], [], []
+        for split_data in file_level_data:
+            split_sums, split_counts, split_m2s = [], [], []
+            for rule_data in split_data:
+                rule_data = np.asarray(rule_data)
+                rule_sum = np.sum(rule_data, axis=0, dtype=float)
+                split_sums.append(rule_sum)
+                split_counts.append(len(rule_data))
+                if m2:
+                    deviations = rule_data - rule_sum/max(len(rule_data), 1)
+                    split_m2s.append(np.einsum('i...,i...->...', deviations, deviations))
+            sums.append(split_sums)
+            counts.append(split_counts)
+            m2s.append(split_m2s)
+        return cls(sums, counts, m2=m2s if m2 else None)
+
+    @classmethod
+    def from_average(cls, average, weights, m2=None):
+        '''
+        Accumulator from averages and weights (conditions, rules), e.g. of a cache of
+        Run.average_run_data_weights().
+        '''
+        average = np.asarray(average, dtype=float)
+        return cls(average*_expand(weights, average.ndim), weights, m2=m2)
+
+    @property
+    def shape(self):
+        ''' (conditions, rules, *data) '''
+        return self.sum.shape
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in FIELDS if getattr(self, name) is not None)
+
+    def copy(self):
+        return Accumulator(**self.as_arrays())
+
+    def _check_mergeable(self, other):
+        for name in FIELDS:
+            mine, theirs = getattr(self, name), getattr(other, name)
+            if (mine is None) != (theirs is None):
+                raise ValueError(f'cannot merge an Accumulator with and one without {name}')
+            if mine is not None and mine.shape != theirs.shape:
+                raise ValueError(f'cannot merge {name} of shape {theirs.shape} into {mine.shape}')
+
+    def merge(self, other):
+        '''
+        Adds the shots of other to this Accumulator (in place) and returns it.
+        '''
+        self._check_mergeable(other)
+        if self.m2 is not None or self.comoment is not None:
+            count = self.count + other.count
+            factor = self.count*other.count/np.where(count > 0, count, 1)
+            delta = _mean(other.sum, other.count) - _mean(self.sum, self.count)
+        if self.m2 is not None:
+            self.m2 += other.m2 + _expand(factor, delta.ndim)*delta**2
+        if self.comoment is not None:
+            delta = delta.reshape(self.count.shape + (-1,))
+            delta2 = (_mean(other.sum2, other.count) - _mean(self.sum2, self.count)).reshape(self.count.shape + (-1,))
+            self.comoment += other.comoment + factor[..., None, None]*delta[..., :, None]*delta2[..., None, :]
+            self.sum2 += other.sum2
+        self.sum += other.sum
+        self.count += other.count
+        return self
+
+    def __iadd__(self, other):
+        return self.merge(other)
+
+    def __add__(self, other):
+        return self.copy().merge(other)
+
+    def mean(self):
+        ''' Average of the shots (zero without shots), shape (conditions, rules, *data). '''
+        return _mean(self.sum, self.count)
+
+    def mean2(self):
+        ''' Average of the second variable. '''
+        return _mean(self.sum2, self.count)
+
+    def _check_m2(self):
+        if self.m2 is None:
+            raise ValueError('the Accumulator has no M2; accumulate with m2=True')
+
+    def variance(self, ddof=1):
+        '''
+        Variance of the shots, shape (conditions, rules, *data); NaN with ddof or fewer
+        shots.
+        '''
+        self._check_m2()
+        divisor = _expand(self.count - ddof, self.m2.ndim).astype(float)
+        divisor[divisor<=0] = np.nan
+        return self.m2/divisor
+
+    def std(self, ddof=1):
+        ''' Standard deviation of the shots, see variance(). '''
+        return np.sqrt(self.variance(ddof))
+
+    def standard_error(self, ddof=1):
+        ''' Standard error of the mean, std()/sqrt(count). '''
+        return self.std(ddof)/np.sqrt(_expand(self.count, self.m2.ndim))
+
+    def covariance(self, ddof=1):
+        '''
+        Covariance of the flattened variables, shape (conditions, rules, size, size2);
+        NaN with ddof or fewer shots.
+        '''
+        divisor = (self.count - ddof).astype(float)
+        divisor[divisor<=0] = np.nan
+        return self.comoment/divisor[..., None, None]
+
+    def as_arrays(self):
+        ''' {field: array} of the fields which are not None, e.g. for np.savez(). '''
+        return {name: getattr(self, name) for name in FIELDS if getattr(self, name) is not None}
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        ''' Inverse of as_arrays(), also for the NpzFile of np.load(). '''
+        return cls(**{name: arrays[name] for name in FIELDS if name in arrays})
+
+    def to_bytes(self):
+        ''' Compressed serialization of the fields (npz). '''
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, **self.as_arrays())
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data):
+        with np.load(io.BytesIO(data)) as arrays:
+            return cls.from_arrays(arrays)
+
+    def __repr__(self):
+        fields = ', '.join(name for name in FIELDS[2:] if getattr(self, name) is not None)
+        return f'Accumulator(shape={self.shape}, shots={int(self.count.sum())}' + (f', {fields})' if fields else ')')
+
+
+def merge_all(accumulators, copy=True):
+    '''
+    Merge of all accumulators (None are skipped) into (a copy of, if copy) the first
+    one; None if there are none. Works for anything with copy() and merge(), e.g. the
+    Histograms and QuantileSketches of the sketches module.
+    '''
+    output = None
+    for accumulator in accumulators:
+        if accumulator is None:
+            continue
+        if output is None:
+            output = accumulator.copy() if copy else accumulator
+        else:
+            output.merge(accumulator)
+    return output
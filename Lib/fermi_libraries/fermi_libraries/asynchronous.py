@@ -0,0 +1,179 @@
+'''
+asyncio interface of the reductions.
+
+The *_async methods of Run and RunSets (e.g. Run.average_run_data_async()) are
+coroutines. They submit the uncached files one by one to a backend (see the backends
+module; Backend.submit()), so the event loop stays free while the files are processed.
+Cancelling such a call drops its files which have not started yet; running files finish
+in the background and their results are discarded. No cache is written by a cancelled
+call.
+
+    average = await run.average_run_data_async('vmi', back_sep=True, backend=backend)
+
+    # VMI and TOF at the same time
+    vmi, tof = await asyncio.gather(run.average_run_data_async('vmi', back_sep=True),
+                                    run.average_run_data_async('ion_tof', back_sep=True))
+
+Without a backend, the files of all calls are processed one at a time in a thread of this
+process (default_backend()), and a MultithreadRun uses its backend or num_cores
+processes.
+
+Latest keeps one task per key: a new request cancels the unfinished one, e.g. if new
+files arrive during a reduction, the stale reduction is not finished first:
+
+    latest = Latest()
+    task = latest.submit('vmi', run.average_run_data_async('vmi', back_sep=True))
+    average = await task  # CancelledError if superseded
+
+Code without a running event loop (e.g. a Qt GUI) can use a BackgroundLoop, whose
+submit() returns a concurrent.futures.Future:
+
+    background = BackgroundLoop()
+    future = background.submit(run.average_run_data_async('vmi', back_sep=True), key='vmi')
+    future.add_done_callback(...)  # called in the thread of the loop
+'''
+
+import asyncio
+import threading
+from functools import partial
+from contextlib import asynccontextmanager
+from .backends import SerialBackend, ProcessPoolBackend
+
+_default_backend = None
+
+
+def default_backend():
+    ''' The SerialBackend of the calls without a backend (one task at a time, in a thread). '''
+    global _default_backend
+    if _default_backend is None:
+        _default_backend = SerialBackend()
+    return _default_backend
+
+
+@asynccontextmanager
+async def backend_scope(backend=None, num_processes=1):
+    '''
+    Like backends.backend_context(): yields backend, or else default_backend()
+    (num_processes <= 1) or a new ProcessPoolBackend, which is closed (in a thread) at the
+    end.
+    '''
+    if backend is not None:
+        yield backend
+    elif num_processes <= 1:
+        yield default_backend()
+    else:
+        new_backend = ProcessPoolBackend(num_processes)
+        try:
+            yield new_backend
+        finally:
+            await asyncio.to_thread(new_backend.close)
+
+
+async def starmap(backend, fn, args_iter, kwargs={}):
+    '''
+    [fn(*args, **kwargs) for args in args_iter], with every call submitted to backend.
+    Cancelling cancels the calls which have not started.
+    '''
+    task_fn = partial(fn, **kwargs) if kwargs else fn
+    futures = [backend.submit(task_fn, *args) for args in args_iter]
+    try:
+        return await asyncio.gather(*(asyncio.wrap_future(future) for future in futures))
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+class Latest():
+    '''
+    At most one unfinished task per key, see the module docstring. Must be used from the
+    thread of the event loop.
+    '''
+
+    def __init__(self):
+        self.tasks = {}
+
+    def submit(self, key, coroutine):
+        '''
+        Cancels the unfinished task of key, and returns the asyncio.Task of coroutine.
+        '''
+        self.cancel(key)
+        task = asyncio.ensure_future(coroutine)
+        self.tasks[key] = task
+
+        def forget(task):
+            if self.tasks.get(key) is task:
+                del self.tasks[key]
+        task.add_done_callback(forget)
+        return task
+
+    def cancel(self, key=None):
+        '''
+        Cancels the task of key (all tasks if key is None). Returns whether a task was
+        cancelled.
+        '''
+        keys = list(self.tasks) if key is None else [key]
+        cancelled = False
+        for k in keys:
+            task = self.tasks.pop(k, None)
+            if task is not None and not task.done():
+                task.cancel()
+                cancelled = True
+        return cancelled
+
+    def running(self, key):
+        ''' Whether key has an unfinished task. '''
+        return key in self.tasks and not self.tasks[key].done()
+
+    def __repr__(self):
+        return f'Latest({sorted(map(str, self.tasks))})'
+
+
+class BackgroundLoop():
+    '''
+    An asyncio event loop in a daemon thread, see the module docstring. Close it with
+    close() (or use it as a context manager).
+    '''
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._latest = Latest()  # only used in the thread of the loop
+        self._thread = threading.Thread(target=self.loop.run_forever, name='BackgroundLoop', daemon=True)
+        self._thread.start()
+
+    def submit(self, coroutine, key=None):
+        '''
+        Runs coroutine in the loop and returns a concurrent.futures.Future of its result.
+        With a key, the unfinished coroutine of the same key is cancelled (see Latest); its
+        future is then cancelled as well.
+        '''
+        async def run():
+            if key is None:
+                return await coroutine
+            return await self._latest.submit(key, coroutine)
+        return asyncio.run_coroutine_threadsafe(run(), self.loop)
+
+    def cancel(self, key=None):
+        ''' Cancels the coroutine of key (all keyed coroutines if key is None). '''
+        self.loop.call_soon_threadsafe(self._latest.cancel, key)
+
+    def close(self):
+        ''' Cancels all coroutines and stops the loop. '''
+        if self.loop.is_closed():
+            return
+
+        async def cancel_all():
+            tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        asyncio.run_coroutine_threadsafe(cancel_all(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
@@ -0,0 +1,338 @@
+'''
+Execution backends for the file-level tasks of MultithreadRun and RunSets.
+
+A backend runs a function on a list of argument tuples and returns the results in
+order, like multiprocessing.Pool.starmap(), so it can be used wherever the pool was
+(see run_module.starmap_profiled()). Single tasks can be submitted as well; submit()
+returns a concurrent.futures.Future, which the asynchronous module awaits:
+
+    SerialBackend()            in this process
+    ProcessPoolBackend(n)      n local worker processes
+    SocketBackend(...)         worker processes on any machine which can reach this
+                               one over TCP, and which see the files at the same paths
+                               (shared filesystem)
+
+The tasks of run_module are single files, whose partial sums and counts are added by
+the caller, so the result does not depend on the backend. With a SocketBackend, the
+coordinator serves a task and a result queue; the workers take tasks one at a time,
+so faster nodes take more files:
+
+    # coordinator, listening on all interfaces (the default is this machine only)
+    backend = SocketBackend(address=('', 50000), authkey=b'secret')
+    runsets.average_run_data_weights('vmi', back_sep=True, backend=backend)
+
+    # on every node (FERMI_BACKEND_AUTHKEY=secret)
+    python -c 'from fermi_libraries.backends import main; main()' <coordinator host>:50000
+
+For tests, or to use one machine only, SocketBackend(local_workers=4) starts the
+workers itself.
+'''
+
+import os
+import sys
+import queue
+import argparse
+import threading
+import traceback
+import subprocess
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from multiprocessing.managers import BaseManager
+
+AUTHKEY_VARIABLE = 'FERMI_BACKEND_AUTHKEY'
+
+
+class Backend():
+    '''
+    Base class of the backends. Backends are context managers; close() releases their
+    workers.
+    '''
+
+    num_workers = 1
+    _submit_executor = None
+
+    def starmap(self, fn, iterable):
+        '''
+        [fn(*args) for args in iterable], in order.
+        '''
+        raise NotImplementedError
+
+    def submit(self, fn, *args):
+        '''
+        Starts fn(*args) and returns a concurrent.futures.Future of its result. A task
+        which has not started yet is dropped by Future.cancel(). Here, the tasks run one
+        at a time (with starmap()) in a thread of this process.
+        '''
+        if self._submit_executor is None:
+            self._submit_executor = ThreadPoolExecutor(1, thread_name_prefix=type(self).__name__)
+        return self._submit_executor.submit(lambda: self.starmap(fn, [args])[0])
+
+    def close(self):
+        if self._submit_executor is not None:
+            self._submit_executor.shutdown(wait=True, cancel_futures=True)
+            self._submit_executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+
+class SerialBackend(Backend):
+    ''' Runs the tasks in this process. '''
+
+    def starmap(self, fn, iterable):
+        return [fn(*args) for args in iterable]
+
+    def __repr__(self):
+        return 'SerialBackend()'
+
+
+class ProcessPoolBackend(Backend):
+    '''
+    Runs the tasks in num_processes local processes. The pool is started on first use
+    and kept until close().
+    '''
+
+    def __init__(self, num_processes):
+        self.num_workers = num_processes
+        self._pool = None
+
+    def submit(self, fn, *args):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.num_workers)
+        return self._pool.submit(fn, *args)
+
+    def starmap(self, fn, iterable):
+        futures = [self.submit(fn, *args) for args in iterable]
+        return [future.result() for future in futures]
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    def __repr__(self):
+        return f'ProcessPoolBackend({self.num_workers})'
+
+
+# the queues live in the server process of the coordinator
+_task_queue = None
+_result_queue = None
+
+def _get_task_queue():
+    global _task_queue
+    if _task_queue is None:
+        _task_queue = queue.Queue()
+    return _task_queue
+
+def _get_result_queue():
+    global _result_queue
+    if _result_queue is None:
+        _result_queue = queue.Queue()
+    return _result_queue
+
+
+class TaskManager(BaseManager):
+    ''' Serves the task and the result queue of a SocketBackend. '''
+
+TaskManager.register('get_task_queue', callable=_get_task_queue)
+TaskManager.register('get_result_queue', callable=_get_result_queue)
+
+
+def _authkey(authkey):
+    if authkey is None:
+        authkey = os.environ.get(AUTHKEY_VARIABLE)
+    if authkey is None:
+        raise ValueError(f'no authkey given, and {AUTHKEY_VARIABLE} is not set')
+    return authkey.encode() if isinstance(authkey, str) else authkey
+
+
+class SocketBackend(Backend):
+    '''
+    Runs the tasks on worker processes which connect over TCP, see run_worker().
+
+    Parameters
+    ----------
+    address : tuple, optional
+        (host, port) the task server listens on. The default is ('127.0.0.1', 0):
+        this machine only (enough for local_workers), and a free port (see the address
+        attribute). The server runs the callables it receives, so serving remote
+        workers takes an explicit host, e.g. '' for all interfaces.
+    authkey : bytes or str, optional
+        Shared secret of the coordinator and the workers. The default is None, i.e. the
+        FERMI_BACKEND_AUTHKEY environment variable, or a random key if local_workers
+        are started.
+    local_workers : int, optional
+        Number of workers started on this machine. The default is 0.
+    num_workers : int, optional
+        Expected number of workers, only used for the 'ipc' stage of profiles. The
+        default is None (local_workers, at least 1).
+    timeout : float, optional
+        Seconds to wait for the next result before a TimeoutError, e.g. if a worker
+        died during a task. The default is None (no limit).
+    '''
+
+    def __init__(self, address=('127.0.0.1', 0), authkey=None, local_workers=0, num_workers=None, timeout=None):
+        if authkey is None and local_workers and AUTHKEY_VARIABLE not in os.environ:
+            authkey = os.urandom(16).hex()
+        self.authkey = _authkey(authkey)
+        self.timeout = timeout
+        self.num_workers = num_workers or max(local_workers, 1)
+        self._manager = TaskManager(address=tuple(address), authkey=self.authkey)
+        self._manager.start()
+        self.address = self._manager.address
+        self._tasks = self._manager.get_task_queue()
+        self._results = self._manager.get_result_queue()
+        self._futures = {}
+        self._next_task = 0
+        self._lock = threading.Lock()
+        self._collector = None
+        self.workers = [start_worker(self.local_address, self.authkey) for _ in range(local_workers)]
+
+    @property
+    def local_address(self):
+        ''' The address for workers on this machine. '''
+        host, port = self.address
+        return ('127.0.0.1' if host in ('', '0.0.0.0') else host, port)
+
+    def submit(self, fn, *args):
+        '''
+        Queues fn(*args) for the workers. A cancelled task may still run on a worker, but
+        its result is dropped.
+        '''
+        future = Future()
+        with self._lock:
+            task_id = self._next_task
+            self._next_task += 1
+            self._futures[task_id] = future
+            if self._collector is None:
+                self._collector = threading.Thread(target=self._collect, name='SocketBackend results', daemon=True)
+                self._collector.start()
+        self._tasks.put((task_id, fn, tuple(args)))
+        return future
+
+    def _collect(self, poll=0.2):
+        ''' Sets the futures of the results, until close(). '''
+        while self._collector is not None:
+            try:
+                task_id, ok, result = self._results.get(timeout=poll)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break
+            with self._lock:
+                future = self._futures.pop(task_id, None)
+            if future is None or not future.set_running_or_notify_cancel():
+                continue
+            if ok:
+                future.set_result(result)
+            else:
+                future.set_exception(RuntimeError(f'task {task_id} failed on a worker:\n{result}'))
+
+    def starmap(self, fn, iterable):
+        futures = [self.submit(fn, *args) for args in iterable]
+        try:
+            results = []
+            for future in futures:
+                try:
+                    results.append(future.result(timeout=self.timeout))
+                except FutureTimeoutError:
+                    raise TimeoutError(f'no result within {self.timeout} s ({len(results)} of {len(futures)} received)')
+            return results
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def close(self):
+        if self._manager is None:
+            return
+        with self._lock:
+            collector, self._collector = self._collector, None
+            futures, self._futures = self._futures, {}
+        if collector is not None:
+            collector.join()
+        for future in futures.values():
+            future.cancel()
+        for _ in self.workers:
+            self._tasks.put(None)
+        for worker in self.workers:
+            try:
+                worker.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                worker.kill()
+        self.workers = []
+        self._manager.shutdown()
+        self._manager = None
+
+    def __repr__(self):
+        return f'SocketBackend(address={self.address}, local workers={len(self.workers)})'
+
+
+def run_worker(address, authkey=None, poll=1.0):
+    '''
+    Takes tasks from the SocketBackend at address until it stops the worker or shuts
+    down. Exceptions of a task are sent back with their traceback. Returns the number
+    of tasks done.
+    '''
+    manager = TaskManager(address=tuple(address), authkey=_authkey(authkey))
+    manager.connect()
+    tasks = manager.get_task_queue()
+    results = manager.get_result_queue()
+    done = 0
+    while True:
+        try:
+            task = tasks.get(timeout=poll)
+        except queue.Empty:
+            continue
+        except (EOFError, OSError):  # the coordinator shut down
+            break
+        if task is None:
+            break
+        task_id, fn, args = task
+        try:
+            output = (task_id, True, fn(*args))
+        except Exception:
+            output = (task_id, False, traceback.format_exc())
+        try:
+            results.put(output)
+        except (EOFError, OSError):
+            break
+        done += 1
+    return done
+
+
+def start_worker(address, authkey):
+    '''
+    Starts run_worker() in a new local process, see main().
+    '''
+    env = dict(os.environ, **{AUTHKEY_VARIABLE: _authkey(authkey).decode()})
+    host, port = address
+    return subprocess.Popen([sys.executable, '-c', 'from fermi_libraries.backends import main; main()',
+                             f'{host}:{port}'], env=env)
+
+
+@contextmanager
+def backend_context(backend=None, num_processes=1):
+    '''
+    Yields backend, or if it is None, a SerialBackend (num_processes <= 1) or a
+    ProcessPoolBackend which is closed at the end.
+    '''
+    if backend is not None:
+        yield backend
+        return
+    with (ProcessPoolBackend(num_processes) if num_processes > 1 else SerialBackend()) as new_backend:
+        yield new_backend
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Worker of a SocketBackend. The authkey is read from the '
+                                                 f'{AUTHKEY_VARIABLE} environment variable.')
+    parser.add_argument('address', help='host:port of the coordinator')
+    parser.add_argument('--poll', type=float, default=1.0)
+    args = parser.parse_args(argv)
+    host, port = args.address.rsplit(':', 1)
+    run_worker((host, int(port)), poll=args.poll)
+
@@ -1,8 +1,8 @@
+import functools
 import numpy as np
-import lmfit
 from .common_functions import (
     residuals, transpose_axis_to_zero, weighted_linear_regression, 
-    first_arg_scalar_into_array)
+    first_arg_scalar_into_array, Rebinner)
 
 def get_tof_mq_constants(peaks=None, constants=None):
     """
@@ -159,6 +159,38 @@ def mq_to_tof_conversion(mq, spectrum, t0, propconst, axis=None):
     tof_spec = transpose_axis_to_zero(tof_spec, axis=axis)  # revert transposition
     return tof_coor, tof_spec
 
+@functools.lru_cache(maxsize=16)
+def _cached_tof_to_mq_operator(tof_bytes, mq_bytes, t0, propconst):
+    transform = lambda tof_in: tof_mq_coordinate_func(tof_in, t0, propconst)
+    return Rebinner(np.frombuffer(tof_bytes), np.frombuffer(mq_bytes), transform=transform)
+
+def tof_to_mq_operator(tof, mq, t0, propconst):
+    """
+    Linear operator from spectra on the TOF grid directly to spectra on the
+    m/q grid, i.e. tof_to_mq_conversion() followed by rebinning() in a single
+    sparse product. The TOF bins are mapped onto m/q exactly, so the
+    Jacobian is included and the counts are conserved. Cached per grids and
+    calibration constants.
+
+    Parameters
+    ----------
+    tof : np.ndarray
+        Raw TOF bin centers.
+    mq : np.ndarray
+        Target m/q bin centers.
+    t0, propconst : float
+        See get_tof_mq_constants().
+
+    Returns
+    -------
+    operator : Rebinner
+        Use operator.apply(spectra, axis=-1) on stacks of spectra, e.g.
+        (conditions, rules, tof) -> (conditions, rules, mq).
+    """
+    tof = np.ascontiguousarray(tof, dtype=float)
+    mq = np.ascontiguousarray(mq, dtype=float)
+    return _cached_tof_to_mq_operator(tof.tobytes(), mq.tobytes(), float(t0), float(propconst))
+
 def get_tof_ke_constants(peaks=None, constants=None):
     """
     Formulas are: ke = 1 / (C*(t-T0)^2) + ke0, d(ke) = -2 / (C*(t-T0)^3) dt
@@ -289,6 +321,7 @@ def get_tof_ke_constants(peaks=None, constants=None):
 
             propconst_guess = 1/(ke1*ke2/(np.sqrt(ke2)-np.sqrt(ke1))**2 * (tof1-tof2)**2)
 
+            import lmfit
             initial_params = lmfit.Parameters()
             initial_params.add_many(
                     ('C', propconst_guess, True, 0, None),
@@ -394,3 +427,35 @@ def ke_to_tof_conversion(ke, spectrum, t0, propconst, ke0, axis=None):
     tof_spec = (spectrum * jacobian)[mask]
     tof_spec = transpose_axis_to_zero(tof_spec, axis=axis)  # revert transposition
     return tof_coor, tof_spec
+
+@functools.lru_cache(maxsize=16)
+def _cached_tof_to_ke_operator(tof_bytes, ke_bytes, t0, propconst, ke0):
+    transform = lambda tof_in: tof_ke_coordinate_func(tof_in, t0, propconst, ke0)
+    return Rebinner(np.frombuffer(tof_bytes), np.frombuffer(ke_bytes), transform=transform)
+
+def tof_to_ke_operator(tof, ke, t0, propconst, ke0):
+    """
+    Linear operator from spectra on the TOF grid directly to spectra on the
+    KE grid, i.e. tof_to_ke_conversion() followed by rebinning() in a single
+    sparse product. The TOF bins are mapped onto KE exactly, so the
+    (absolute) Jacobian is included and the counts are conserved; unlike
+    tof_to_ke_conversion(), the result is not negated. Cached per grids and
+    calibration constants.
+
+    Parameters
+    ----------
+    tof : np.ndarray
+        Raw TOF bin centers.
+    ke : np.ndarray
+        Target KE bin centers.
+    t0, propconst, ke0 : float
+        See get_tof_ke_constants().
+
+    Returns
+    -------
+    operator : Rebinner
+        Use operator.apply(spectra, axis=-1) on stacks of spectra.
+    """
+    tof = np.ascontiguousarray(tof, dtype=float)
+    ke = np.ascontiguousarray(ke, dtype=float)
+    return _cached_tof_to_ke_operator(tof.tobytes(), ke.tobytes(), float(t0), float(propconst), float(ke0))
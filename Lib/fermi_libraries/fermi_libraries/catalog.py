@@ -0,0 +1,244 @@
+'''
+Catalog of the per-file metadata of a Run.
+
+Every HDF5 file is opened once to record whether it is readable, its number of shots
+(the length of 'bunches'), its 'Background_Period', and the tree of its datasets with
+their shapes, dtypes, chunking and compression. The entries are kept in memory and, if
+the Run has a work directory, in <run>/work/catalog_cache/, keyed by the file identity
+(path, size and modification time), so a modified file is catalogued again.
+
+Run methods consult the catalog (Run.get_catalog()) to skip unreadable files and files
+without a dataset, and to get shot counts and dataset shapes without opening the files
+again.
+'''
+
+import os
+import json
+import hashlib
+import numpy as np
+import h5py
+
+# entries of this process, by file path
+_entries = {}
+
+
+def file_identity(filepath):
+    '''
+    (real path, size, modification time in ns) of filepath, or None if it does not exist.
+    '''
+    try:
+        stat = os.stat(filepath)
+    except OSError:
+        return None
+    return (os.path.realpath(filepath), stat.st_size, stat.st_mtime_ns)
+
+
+class DatasetEntry():
+    '''
+    Metadata of one dataset: shape, dtype (str), chunks, compression and compression_opts.
+    '''
+
+    __slots__ = ('shape', 'dtype', 'chunks', 'compression', 'compression_opts')
+
+    def __init__(self, shape, dtype, chunks=None, compression=None, compression_opts=None):
+        self.shape = tuple(shape)
+        self.dtype = str(dtype)
+        self.chunks = None if chunks is None else tuple(chunks)
+        self.compression = compression
+        self.compression_opts = compression_opts
+
+    @classmethod
+    def from_dataset(cls, dataset):
+        return cls(dataset.shape, dataset.dtype, dataset.chunks, dataset.compression, dataset.compression_opts)
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return f'DatasetEntry(shape={self.shape}, dtype={self.dtype}, chunks={self.chunks}, compression={self.compression})'
+
+
+class FileEntry():
+    '''
+    Metadata of one file.
+
+    Attributes
+    ----------
+    filepath : str
+    identity : tuple
+        See file_identity(); None if the file does not exist.
+    readable : bool
+        Whether the file exists and can be opened by h5py.
+    error : str
+        The error if not readable.
+    shots : int
+        Length of 'bunches' (None without 'bunches').
+    background_period : float
+        Value of 'Background_Period' (None without it).
+    datasets : dict
+        {path: DatasetEntry} of all datasets in the file (paths without leading '/').
+    '''
+
+    def __init__(self, filepath, identity, readable, error=None, shots=None, background_period=None, datasets=None):
+        self.filepath = filepath
+        self.identity = None if identity is None else tuple(identity)
+        self.readable = readable
+        self.error = error
+        self.shots = shots
+        self.background_period = background_period
+        self.datasets = {} if datasets is None else datasets
+
+    @classmethod
+    def from_file(cls, filepath):
+        '''
+        Opens filepath once and records its metadata.
+        '''
+        identity = file_identity(filepath)
+        if identity is None:
+            return cls(filepath, None, False, error='file not found')
+        datasets = {}
+        try:
+            with h5py.File(filepath, 'r') as file:
+                def visit(name, item):
+                    if isinstance(item, h5py.Dataset):
+                        datasets[name] = DatasetEntry.from_dataset(item)
+                file.visititems(visit)
+                shots = file['bunches'].shape[0] if 'bunches' in datasets else None
+                background_period = None
+                if 'Background_Period' in datasets and datasets['Background_Period'].shape in [(), (1,)]:
+                    background_period = float(np.ravel(file['Background_Period'][()])[0])
+        except (OSError, KeyError, ValueError, TypeError) as e:
+            return cls(filepath, identity, False, error=str(e))
+        return cls(filepath, identity, True, shots=shots, background_period=background_period, datasets=datasets)
+
+    def has(self, name):
+        ''' Whether the file is readable and has the dataset name. '''
+        return self.readable and name.strip('/') in self.datasets
+
+    def dataset(self, name):
+        ''' The DatasetEntry of name (KeyError if missing). '''
+        return self.datasets[name.strip('/')]
+
+    def is_shot_data(self, name):
+        ''' Whether dataset name has one entry per shot. '''
+        entry = self.dataset(name)
+        return entry.ndim > 0 and entry.shape[0] == self.shots
+
+    def as_dict(self):
+        return dict(filepath=self.filepath, identity=self.identity, readable=self.readable, error=self.error,
+                    shots=self.shots, background_period=self.background_period,
+                    datasets={name: entry.as_dict() for name, entry in self.datasets.items()})
+
+    @classmethod
+    def from_dict(cls, d):
+        datasets = {name: DatasetEntry(**entry) for name, entry in d['datasets'].items()}
+        return cls(d['filepath'], d['identity'], d['readable'], error=d['error'], shots=d['shots'],
+                   background_period=d['background_period'], datasets=datasets)
+
+    def __repr__(self):
+        state = f'{self.shots} shots, {len(self.datasets)} datasets' if self.readable else f'unreadable: {self.error}'
+        return f'FileEntry({os.path.basename(self.filepath)}, {state})'
+
+
+def _cache_path(filepath):
+    work_dir = filepath.split('/rawdata/')[0] + '/work'
+    if '/rawdata/' not in filepath or not os.path.isdir(work_dir):
+        return None
+    idf = hashlib.md5(os.path.realpath(filepath).encode()).hexdigest()
+    return f'{work_dir}/catalog_cache/{idf}.json'
+
+
+def get_entry(filepath, use_cache=True, make_cache=True):
+    '''
+    The FileEntry of filepath: from memory or the catalog cache if the file identity is
+    unchanged, else from the file (and then cached).
+    '''
+    identity = file_identity(filepath)
+    entry = _entries.get(filepath)
+    if use_cache and entry is not None and entry.identity == identity:
+        return entry
+
+    cache_path = _cache_path(filepath)
+    if use_cache and identity is not None and cache_path is not None and os.path.exists(cache_path):
+        try:
+            with open(cache_path) as f:
+                entry = FileEntry.from_dict(json.load(f))
+            if entry.identity == identity:
+                _entries[filepath] = entry
+                return entry
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    entry = FileEntry.from_file(filepath)
+    _entries[filepath] = entry
+    if make_cache and entry.identity is not None and cache_path is not None:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        temp_path = f'{cache_path}.{os.getpid()}'
+        with open(temp_path, 'w') as f:
+            json.dump(entry.as_dict(), f)
+        os.replace(temp_path, cache_path)  # atomic, if several processes catalog the same file
+    return entry
+
+
+class RunCatalog():
+    '''
+    The FileEntry of every file of a Run, see get_entry().
+    '''
+
+    def __init__(self, filepaths, use_cache=True, make_cache=True):
+        self.filepaths = list(filepaths)
+        self.entries = {filepath: get_entry(filepath, use_cache=use_cache, make_cache=make_cache)
+                        for filepath in self.filepaths}
+
+    def is_current(self, filepaths, check_files=True):
+        '''
+        Whether this catalog is of filepaths, and (if check_files, which stats every file)
+        none of the files changed.
+        '''
+        return (list(filepaths) == self.filepaths
+                and (not check_files
+                     or all(entry.identity == file_identity(filepath) for filepath, entry in self.entries.items())))
+
+    def current(self, filepath):
+        '''
+        The FileEntry of filepath, remade if the file changed; only this file is checked,
+        e.g. just before it is opened.
+        '''
+        entry = self[filepath]
+        if entry.identity != file_identity(filepath):
+            entry = self.entries[filepath] = get_entry(filepath)
+        return entry
+
+    def __getitem__(self, filepath):
+        if filepath not in self.entries:
+            self.entries[filepath] = get_entry(filepath)
+        return self.entries[filepath]
+
+    def readable(self):
+        ''' The readable files. '''
+        return [filepath for filepath in self.filepaths if self.entries[filepath].readable]
+
+    def unreadable(self):
+        ''' The files which do not exist or cannot be opened. '''
+        return [filepath for filepath in self.filepaths if not self.entries[filepath].readable]
+
+    def with_dataset(self, name):
+        ''' The readable files which have the dataset name. '''
+        return [filepath for filepath in self.filepaths if self.entries[filepath].has(name)]
+
+    def shots(self, filepaths=None):
+        ''' Shots per file. '''
+        return [self.entries[filepath].shots for filepath in (self.filepaths if filepaths is None else filepaths)]
+
+    def background_periods(self, filepaths=None):
+        ''' Background_Period per file (None where missing). '''
+        return [self.entries[filepath].background_period
+                for filepath in (self.filepaths if filepaths is None else filepaths)]
+
+    def __repr__(self):
+        return (f'RunCatalog({len(self.filepaths)} files, {len(self.unreadable())} unreadable, '
+                f'{sum(shots or 0 for shots in self.shots())} shots)')
@@ -1,15 +1,12 @@
 import os
 import re
-import lmfit
+import functools
 import numpy as np
-import matplotlib as pl
-from matplotlib import ticker
-from scipy.integrate import cumulative_simpson
-from scipy.interpolate import interp1d
-import scipy.constants as spc
-from scipy.special import erf
 import warnings
 
+# SciPy and matplotlib are imported where they are used, so that the reduction core
+# (run_module, dictionary_search, the statistics helpers) imports with numpy only.
+
 def first_arg_scalar_into_array(func):
     def wrap_and_call(*args, **kwargs):
         try:
@@ -79,62 +76,168 @@ def combination(list_of_lists):
 
     return output
 
-def rebinning(xnew: np.ndarray, x: np.ndarray, y: np.ndarray, axis: int=-1):
-    '''
-    Rebin the data of (x, y) into (xnew, ynew).
-    '''
-    
-    transpose_order = np.arange(np.ndim(y))
-    if axis!=0:
-        transpose_order[0]=axis
-        transpose_order[axis]=0
-
-    y_transpose = np.transpose(y, axes=transpose_order)
-    y_shape = np.array(np.shape(y))
-    new_y_shape = y_shape[transpose_order]
-    new_y_shape[0]=len(xnew)
-    
-    nan_bool_array = np.isnan(y_transpose)
-    y_remove_nans = np.copy(y_transpose)
-    y_remove_nans[np.isnan(y_transpose)]=0
-    ynew_integral = np.zeros(shape=new_y_shape)
-    ynew = 0*ynew_integral  # default setup
-    y_integral = 0*y_remove_nans  # default setup
+def edges_from_centers(x):
+    """
+    Cell edges around the (sorted) bin centers x: midpoints between the
+    centers, and half a spacing beyond the first and last center.
+    """
+    x = np.asarray(x, dtype=float)
+    if len(x) < 2:
+        return np.array([])
+    midpoints = (x[1:]+x[:-1])/2
+    return np.concatenate(([x[0]-(midpoints[0]-x[0])], midpoints, [x[-1]+(x[-1]-midpoints[-1])]))
 
-    if len(x) != 0:
-        y_integral = cumulative_simpson(y_remove_nans, x=x, initial=0, axis=0)
-        y_interpolate = interp1d(x, y_integral, kind='linear',axis=0)
 
-        xnew_in = (np.min(x)<=xnew) * (xnew<=np.max(x))
-        xnew_out_right = np.max(x) < xnew
+def overlap_matrix(lo, hi, new_edges):
+    """
+    Sparse matrix with the overlap lengths of the intervals [lo[j], hi[j]]
+    (columns) and the cells [new_edges[i], new_edges[i+1]] (rows). The
+    intervals may overlap each other; new_edges must be increasing.
+    """
+    from scipy import sparse
+    n, m = len(lo), len(new_edges)-1
+    if n < 1 or m < 1:
+        return sparse.csr_matrix((max(m, 0), n))
+    i_lo = np.clip(np.searchsorted(new_edges, lo, side='right')-1, 0, m-1)
+    i_hi = np.clip(np.searchsorted(new_edges, hi, side='left')-1, 0, m-1)
+    counts = np.clip(i_hi-i_lo+1, 0, None)
+    cols = np.repeat(np.arange(n), counts)
+    rows = i_lo[cols] + np.arange(len(cols)) - np.repeat(np.cumsum(counts)-counts, counts)
+    overlap = (np.minimum(new_edges[rows+1], hi[cols])
+               - np.maximum(new_edges[rows], lo[cols]))
+    keep = overlap > 0
+    return sparse.csr_matrix((overlap[keep], (rows[keep], cols[keep])), shape=(m, n))
+
+
+class Rebinner():
+    """
+    Conservative rebinning from the bin centers x onto the bin centers xnew,
+    as a sparse matrix that is built once and applied to any number of arrays.
 
-        if len(xnew) == 1:
-            warnings.warn('xnew only has length one')
+    Every bin is the cell between the midpoints of its neighbouring centers.
+    A new bin gets the overlap-weighted average of the old bins, i.e. the
+    data is treated as a density (as in ``rebinning``) and the integral is
+    conserved where the grids overlap. New bins at the edge of x average over
+    their covered part only, and outside of x the result is zero.
 
-        elif len(xnew) == 0:
-            warnings.warn('xnew has zero length')
+    With a coordinate transform, the cells of x are mapped onto the xnew
+    coordinate before the overlaps are taken, which includes the Jacobian:
+    the result is the density per unit of the new coordinate.
 
-        elif len(xnew[xnew_in]) == 0:  # xnew is completely outside of x
-            warnings.warn('xnew is completely outside of x')
-        
-        elif len(x) != 0:
-            ynew_integral[xnew<np.min(x)] = y_interpolate(xnew[xnew_in][0])
-            ynew_integral[xnew_in] = y_interpolate(xnew[xnew_in])
-            ynew_integral[xnew_out_right] = ynew_integral[xnew_in][-1]
+    Parameters
+    ----------
+    x : np.ndarray
+        Bin centers of the data, in any order. NaN centers are ignored.
+    xnew : np.ndarray
+        New bin centers, in any order.
+    transform : callable, optional
+        Monotonic (within every cell) map from the x to the xnew coordinate.
+        Cells with a non-finite image are ignored. The default is None.
 
-            ynew = np.gradient(ynew_integral, xnew, axis=0)
+    Examples
+    --------
+    >>> rebinner = get_rebinner(tof, tof_coarse)
+    >>> coarse = rebinner.apply(spectra, axis=-1)  # e.g. (runs, rules, tof)
+    """
+
+    def __init__(self, x: np.ndarray, xnew: np.ndarray, transform=None):
+        self.x, self.xnew = np.array(x, dtype=float), np.array(xnew, dtype=float)
+        valid = np.flatnonzero(~np.isnan(self.x))
+        order = valid[np.argsort(self.x[valid], kind='stable')]
+        new_order = np.argsort(self.xnew, kind='stable')
+
+        edges = edges_from_centers(self.x[order])
+        lo, hi = edges[:-1], edges[1:]
+        density = np.ones(len(lo))
+        if transform is not None and len(edges):
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mapped = np.asarray(transform(edges), dtype=float)
+                mapped_lo, mapped_hi = mapped[:-1], mapped[1:]
+                lo, hi = np.fmin(mapped_lo, mapped_hi), np.fmax(mapped_lo, mapped_hi)
+                usable = np.isfinite(mapped_lo) & np.isfinite(mapped_hi) & (hi > lo)
+                density = np.where(usable, (edges[1:]-edges[:-1])/(hi-lo), 0)
+            lo, hi = np.where(usable, lo, 0), np.where(usable, hi, 0)
+
+        from scipy import sparse
+        overlap = overlap_matrix(lo, hi, edges_from_centers(self.xnew[new_order]))
+        covered = np.asarray(overlap.sum(axis=1)).ravel()
+        with np.errstate(divide='ignore'):
+            overlap = sparse.diags(np.where(covered > 0, 1/covered, 0)) @ overlap @ sparse.diags(density)
+
+        # back to the original order of x and xnew
+        overlap = overlap.tocoo()
+        self.matrix = sparse.csr_matrix(
+            (overlap.data, (new_order[overlap.row], order[overlap.col])),
+            shape=(len(self.xnew), len(self.x)))
+        self._support = None
+
+    def apply(self, y: np.ndarray, axis: int=-1) -> np.ndarray:
+        """
+        Rebin y along axis. A new bin becomes NaN when any old bin
+        contributing to it is NaN.
+        """
+        y = np.asarray(y)
+        moved = np.moveaxis(y, axis, 0)
+        shape = moved.shape
+        flat = moved.reshape(shape[0], -1)
+
+        nan_mask = np.isnan(flat) if np.issubdtype(flat.dtype, np.floating) else None
+        if nan_mask is not None and nan_mask.any():
+            flat = np.where(nan_mask, 0, flat)
+            if self._support is None:
+                self._support = (self.matrix != 0).astype(float)
+            nan_new = self._support.dot(nan_mask.astype(float)) > 0
+        else:
+            nan_new = None
 
-            for i, is_nan in zip(range(len(xnew)-1), nan_bool_array):
-                if np.sum(is_nan)==0:
-                    continue
-                x_loc = x[i]
-                x_lo, x_hi = xnew[i], xnew[i+1]
-                crit_nan =  (x_lo<=xnew)*(xnew<x_hi)
-                ynew[:,is_nan][crit_nan] = np.nan
+        ynew = self.matrix.dot(flat)
+        if nan_new is not None:
+            ynew[nan_new] = np.nan
+        ynew = ynew.reshape((len(self.xnew),) + shape[1:])
+        return np.moveaxis(ynew, 0, axis)
 
-    ynew = np.transpose(ynew, axes=transpose_order)  # revert transposition
+    __call__ = apply
 
-    return ynew
+    def __repr__(self):
+        return f'Rebinner({len(self.x)} -> {len(self.xnew)} bins)'
+
+
+@functools.lru_cache(maxsize=32)
+def _cached_rebinner(x_bytes, xnew_bytes):
+    return Rebinner(np.frombuffer(x_bytes), np.frombuffer(xnew_bytes))
+
+
+def get_rebinner(x: np.ndarray, xnew: np.ndarray) -> Rebinner:
+    """
+    Returns the (least-recently-used cached) ``Rebinner`` for the grids x and
+    xnew, so repeated rebinning between the same grids only costs a sparse
+    matrix product.
+    """
+    x = np.ascontiguousarray(x, dtype=float)
+    xnew = np.ascontiguousarray(xnew, dtype=float)
+    return _cached_rebinner(x.tobytes(), xnew.tobytes())
+
+
+def rebinning(xnew: np.ndarray, x: np.ndarray, y: np.ndarray, axis: int=-1):
+    '''
+    Rebin the data of (x, y) into (xnew, ynew). See ``Rebinner``; the rebinning
+    matrix is cached per pair of grids.
+    '''
+    xnew, x = np.atleast_1d(xnew), np.atleast_1d(x)
+
+    if len(xnew) == 1:
+        warnings.warn('xnew only has length one')
+    elif len(xnew) == 0:
+        warnings.warn('xnew has zero length')
+    elif len(x) and ((np.nanmax(xnew) < np.nanmin(x)) or (np.nanmin(xnew) > np.nanmax(x))):
+        warnings.warn('xnew is completely outside of x')
+
+    if len(xnew) < 2 or len(x) < 2:
+        shape = list(np.shape(y))
+        shape[axis] = len(xnew)
+        return np.zeros(shape)
+
+    return get_rebinner(x, xnew).apply(y, axis=axis)
 
 
 def convolve_with_gaussian(convolution_width, x, y):
@@ -220,6 +323,7 @@ def adjust_ylim(xlim, xdata, ydata):
 
 def get_colour(i):
     ''' Cycles through the default matplotlib colours '''
+    import matplotlib as pl
     colours = pl.rcParams['axes.prop_cycle'].by_key()['color']
     Ncolours = len(colours)
     return colours[i%Ncolours]
@@ -318,6 +422,144 @@ def single_pass_moment_sums(generator1, generator2=None, filter1=None, filter2=N
             }
     return AnalysisDict
 
+def batch_moment_sums(data1, data2=None, _weight=1):
+    """
+    Same output as single_pass_moment_sums(), but for the samples given at
+    once as arrays of shape (samples, ...) instead of generators, e.g. the
+    output of a filter with the batch attribute (see reducers.py).
+
+    Parameters
+    ----------
+    data1 : np.ndarray
+        Samples along axis 0.
+    data2 : np.ndarray, optional
+        Analogous to data1, with the same number of samples. If None, the
+        "self"-covariance of data1 is computed. The default is None.
+
+    Returns
+    -------
+    AnalysisDict : dict
+        Same as single_pass_moment_sums().
+    """
+
+    data1 = np.asarray(data1)
+    data2 = data1 if data2 is None else np.asarray(data2)
+    n = len(data1)
+
+    x_sum = np.sum(data1, axis=0)
+    y_sum = np.sum(data2, axis=0)
+    x = data1.reshape(n, int(np.prod(data1.shape[1:])))
+    y = data2.reshape(n, int(np.prod(data2.shape[1:])))
+    covar_sum = (x - x.sum(axis=0)/max(n, 1)).T @ (y - y.sum(axis=0)/max(n, 1))
+
+    AnalysisDict = {
+            'covar_sum' : covar_sum * _weight,
+            'x_sum' : x_sum * _weight,
+            'y_sum' : y_sum * _weight,
+            'count' : n * _weight,
+            }
+    return AnalysisDict
+
+def binned_sums(values, edges, data):
+    """
+    Sums the samples of data into the bins of their values, e.g. shots into
+    delay bins.
+
+    Parameters
+    ----------
+    values : np.ndarray
+        One value per sample, shape (samples,). NaN values and values outside
+        of the edges are ignored.
+    edges : np.ndarray
+        Increasing bin edges, shape (bins+1,).
+    data : np.ndarray
+        Samples along axis 0, shape (samples, ...).
+
+    Returns
+    -------
+    sums : np.ndarray
+        Shape (bins, ...).
+    counts : np.ndarray
+        Number of samples per bin, shape (bins,).
+    """
+
+    values = np.asarray(values, dtype=float)
+    data = np.asarray(data)
+    nbins = len(edges)-1
+    n = len(values)
+
+    index = np.searchsorted(edges, values, side='right')-1
+    index[values == edges[-1]] = nbins-1  # the last bin includes its upper edge
+    valid = np.flatnonzero((index >= 0) & (index < nbins) & np.isfinite(values))
+
+    from scipy import sparse
+    selection = sparse.csr_matrix(
+        (np.ones(len(valid)), (index[valid], valid)), shape=(nbins, n))
+    flat_data = data.reshape(n, int(np.prod(data.shape[1:])))
+    sums = np.asarray(selection @ flat_data).reshape((nbins,) + data.shape[1:])
+    counts = np.bincount(index[valid], minlength=nbins)
+    return sums, counts
+
+def robust_inliers(values, nsigma=5.0, method='mad', groups=None, max_iterations=10):
+    """
+    Boolean mask of the values which lie within nsigma robust standard
+    deviations of their center, e.g. to reject bad shots. Non-finite values are
+    always rejected.
+
+    Parameters
+    ----------
+    values : np.ndarray
+        One value per sample, shape (samples,).
+    nsigma : float, optional
+        Accepted distance from the center, in standard deviations. The default
+        is 5.0.
+    method : str, optional
+        'mad': the center is the median and the standard deviation is
+        1.4826 times the median absolute deviation, or if that is zero (more
+        than half of the values are equal, e.g. shots without counts), 1.2533
+        times the mean absolute deviation from the median.
+        'clip': iterative sigma clipping; mean and standard deviation of the
+        accepted values, until no value changes side (at most max_iterations).
+        The default is 'mad'.
+    groups : np.ndarray, optional
+        Label per sample (e.g. foreground/background); the statistics are taken
+        within every group. The default is None (one group).
+
+    Returns
+    -------
+    inliers : np.ndarray
+        Shape (samples,), dtype bool.
+    """
+
+    values = np.asarray(values, dtype=float)
+    inliers = np.isfinite(values)
+    if groups is None:
+        groups = np.zeros(len(values), dtype=int)
+    for group in np.unique(groups):
+        members = (groups == group) & inliers
+        group_values = values[members]
+        if len(group_values) == 0:
+            continue
+        if method == 'mad':
+            center = np.median(group_values)
+            deviations = np.abs(group_values - center)
+            scale = 1.4826*np.median(deviations)
+            if scale == 0:
+                scale = 1.2533*deviations.mean()
+            accepted = deviations <= nsigma*scale
+        elif method == 'clip':
+            accepted = np.ones(len(group_values), dtype=bool)
+            for _ in range(max_iterations):
+                center, scale = group_values[accepted].mean(), group_values[accepted].std()
+                new_accepted = np.abs(group_values - center) <= nsigma*scale
+                if np.array_equal(new_accepted, accepted) or not new_accepted.any():
+                    break
+                accepted = new_accepted
+        else:
+            raise ValueError(f"method ({method}) must be 'mad' or 'clip'")
+        inliers[members] = accepted
+    return inliers
+
 def single_pass_covariance(generator1, generator2=None, filter1=None, filter2=None):
     SumDict = single_pass_moment_sums(generator1, generator2=generator2, filter1=filter1, filter2=filter2)
     n = SumDict['count']
@@ -511,6 +753,8 @@ def add_mq_label(ax1, tof_to_mq_func, minor=1, major=1):
         coordinate.
 
     '''
+    from matplotlib import ticker
+    from scipy.interpolate import interp1d
 
     ax2_tof_lims = ax1.get_xlim()
 
@@ -571,6 +815,8 @@ def add_ke_label(ax1, tof_to_ke_func, minor=0.1, major=1, ke_max=None):
         coordinate.
 
     '''
+    from matplotlib import ticker
+    from scipy.interpolate import interp1d
     ax2_tof_lims = ax1.get_xlim()
 
     samples = 1000
@@ -703,10 +949,12 @@ def non_normalized_gaussians(params, x):
 
 def nm_to_ev(nm):
     '''Convert from nm to eV.'''
+    import scipy.constants as spc
     return spc.h*spc.c/spc.nano/spc.e/nm
 
 def ev_to_nm(eV):
     '''Convert from eV to nm.'''
+    import scipy.constants as spc
     return spc.h*spc.c/spc.nano/spc.e/eV
 
 def swap_rules_runs(data, single_rule=False, single_run=False, single_shot = False, file_level=False):
@@ -806,6 +1054,7 @@ def avg_from_moments(x, y, L=0.5):
     return mu
 
 def stdev_from_moments(x, y, L=0.5):
+    from scipy.special import erf
     L = 0.5  # include all data points from 0 < L*max < max
     above_half_max = y > np.max(y) * L
     moment_0 = np.sum(x**0 * y * above_half_max, axis=1)
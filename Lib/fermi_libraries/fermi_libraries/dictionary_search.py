@@ -10,6 +10,12 @@ i.e. change
     'keyword1 : option1 | keyword2 : option2'
     -> '(keyword1:option1)|(keyword2:option2)'
 to be on the safe side.
+
+Robust shot rejection: '(i0m@5)' keeps the shots whose i0m lies within 5 robust
+standard deviations (1.4826*MAD) of the median of their file, '(i0m#3)' uses 3-sigma
+clipping instead. For data with more than one value per shot, e.g. '(vmi@6,max)', the
+shots are compared by their maximum (or 'sum', 'mean', 'min'). Run.yield_file_data()
+takes these statistics separately for the foreground/background/SLU shots.
 '''
 
 
@@ -17,6 +23,7 @@ to be on the safe side.
 import re
 from itertools import chain
 import numpy as np
+from .common_functions import robust_inliers
 
 def infix_to_postfix_functions(infix_list,
                             operator_dict=None,
@@ -805,6 +812,29 @@ def keyword_float_equal(keyword, option, input_func):
 def keyword_any(keyword, option, input_func):
     return np.array([True,])#slice(0,None,1)
 
+_shot_reductions = {'sum': np.sum, 'mean': np.mean, 'max': np.max, 'min': np.min}
+
+def _robust_inliers_context(keyword, option, input_func, method):
+    '''
+    option is 'nsigma' or 'nsigma,reduction'; data with more than one value per shot
+    (e.g. camera frames) is reduced per shot with reduction ('sum', 'mean', 'max' or
+    'min'; default 'sum'). The statistics are taken within the shot groups of
+    input_func.shot_groups, if it has this attribute (see Run.yield_file_data()).
+    '''
+    nsigma, _, reduction = str(option).partition(',')
+    data = np.asarray(input_func(keyword), dtype=float)
+    if data.ndim > 1:
+        data = _shot_reductions[reduction or 'sum'](data.reshape(len(data), -1), axis=1)
+    return robust_inliers(data, float(nsigma), method=method, groups=getattr(input_func, 'shot_groups', None))
+
+def keyword_mad_inlier(keyword, option, input_func):
+    ''' (keyword@nsigma): within nsigma*1.4826*MAD of the median of the file. '''
+    return _robust_inliers_context(keyword, option, input_func, 'mad')
+
+def keyword_sigma_clip_inlier(keyword, option, input_func):
+    ''' (keyword#nsigma): within nsigma standard deviations after sigma clipping. '''
+    return _robust_inliers_context(keyword, option, input_func, 'clip')
+
 array_operator_dict = {
     '&' : OperatorInfo(num_args=2,
                     precedence=2,
@@ -830,6 +860,8 @@ array_context_dict = {
     '<' : keyword_float_lesser,
     '=' : keyword_float_equal,
     '†' : keyword_any,
+    '@' : keyword_mad_inlier,
+    '#' : keyword_sigma_clip_inlier,
     # ';' : lambda keyword, option, input_func: ExtendedFunctions[keyword](input_func, option),
     }
 
@@ -0,0 +1,155 @@
+'''
+Sparse event-mode representation of low-count camera frames (e.g. 'vmi/andor').
+
+Every frame is thresholded once, and only the hits (pixel coordinates and amplitudes)
+are kept in a compact CSR-like store: the hits of shot i are
+``y[indptr[i]:indptr[i+1]]``, ``x[...]`` and ``amplitude[...]``. Sums, histograms at
+any resolution, recentred images and re-thresholded subsets are then made from the
+events, without reading and decompressing the raw frames again.
+
+See Run.give_events() for extracting the events of a Run (with caching per file).
+'''
+
+import numpy as np
+
+
+class EventStore():
+    '''
+    Hits of a stack of frames, in CSR-like form.
+
+    Parameters
+    ----------
+    shape : tuple
+        Shape (ny, nx) of the original frames.
+    indptr : np.ndarray
+        Shape (shots+1,); the hits of shot i are at indptr[i]:indptr[i+1].
+    y, x : np.ndarray
+        Pixel row and column of every hit.
+    amplitude : np.ndarray
+        Frame value of every hit.
+    '''
+
+    def __init__(self, shape, indptr, y, x, amplitude):
+        self.shape = tuple(int(n) for n in shape)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.y = np.asarray(y, dtype=np.uint16)
+        self.x = np.asarray(x, dtype=np.uint16)
+        self.amplitude = np.asarray(amplitude, dtype=np.float32)
+
+    @classmethod
+    def from_frames(cls, frames, threshold):
+        '''
+        Extracts the pixels above threshold of every frame in frames (shots, ny, nx).
+        '''
+        frames = np.asarray(frames)
+        shots, y, x = np.nonzero(frames > threshold)
+        indptr = np.zeros(len(frames)+1, dtype=np.int64)
+        indptr[1:] = np.cumsum(np.bincount(shots, minlength=len(frames)))
+        return cls(frames.shape[1:], indptr, y, x, frames[shots, y, x])
+
+    @classmethod
+    def concatenate(cls, stores):
+        '''
+        Joins the shots of several stores of the same frame shape, e.g. of all files.
+        '''
+        stores = list(stores)
+        if len(stores) == 0:
+            raise ValueError('no EventStore to concatenate')
+        offsets = np.cumsum([0] + [store.indptr[-1] for store in stores[:-1]])
+        indptr = np.concatenate([[0]] + [store.indptr[1:]+offset for store, offset in zip(stores, offsets)])
+        return cls(stores[0].shape, indptr,
+                   np.concatenate([store.y for store in stores]),
+                   np.concatenate([store.x for store in stores]),
+                   np.concatenate([store.amplitude for store in stores]))
+
+    def __len__(self):
+        return len(self.indptr)-1
+
+    @property
+    def num_events(self):
+        return int(self.indptr[-1])
+
+    def __repr__(self):
+        return f'EventStore({len(self)} shots, {self.num_events} events, shape={self.shape})'
+
+    def shot_index(self):
+        ''' The shot of every event. '''
+        return np.repeat(np.arange(len(self)), np.diff(self.indptr))
+
+    def select(self, shots):
+        '''
+        A new store with only the given shots (boolean mask or indices), in that order.
+        '''
+        shots = np.arange(len(self))[shots]
+        starts, stops = self.indptr[shots], self.indptr[shots+1]
+        counts = stops-starts
+        indptr = np.zeros(len(shots)+1, dtype=np.int64)
+        indptr[1:] = np.cumsum(counts)
+        events = np.repeat(starts-indptr[:-1], counts) + np.arange(indptr[-1])
+        return EventStore(self.shape, indptr, self.y[events], self.x[events], self.amplitude[events])
+
+    def threshold(self, threshold):
+        '''
+        A new store with only the events above threshold; a higher threshold than the
+        extraction threshold re-filters without the raw frames.
+        '''
+        keep = self.amplitude > threshold
+        indptr = np.zeros(len(self)+1, dtype=np.int64)
+        indptr[1:] = np.cumsum(np.bincount(self.shot_index()[keep], minlength=len(self)))
+        return EventStore(self.shape, indptr, self.y[keep], self.x[keep], self.amplitude[keep])
+
+    def sum_image(self, counting=False):
+        '''
+        Sum of all (thresholded) frames at the original resolution. With counting=True,
+        every event counts as one instead of its amplitude.
+        '''
+        weights = None if counting else self.amplitude
+        flat_index = self.y.astype(np.int64)*self.shape[1] + self.x
+        image = np.bincount(flat_index, weights=weights, minlength=self.shape[0]*self.shape[1])
+        return image.reshape(self.shape).astype(float)
+
+    def histogram(self, y_edges, x_edges, center=None, counting=False, shots=None):
+        '''
+        Histogram of the events at any resolution. Pixel i is taken at its center i+0.5
+        (the convention of image_mod.find_center()), relative to center (y0, x0) if given.
+
+        Parameters
+        ----------
+        y_edges, x_edges : np.ndarray
+            Bin edges along the rows and the columns.
+        center : tuple, optional
+            Subtracted from the event coordinates, for recentring. The default is None.
+        counting : bool, optional
+            Count events instead of summing their amplitudes. The default is False.
+        shots : np.ndarray, optional
+            Boolean mask or indices of the shots to use. The default is None (all).
+
+        Returns
+        -------
+        image : np.ndarray
+            Shape (len(y_edges)-1, len(x_edges)-1).
+        '''
+        store = self if shots is None else self.select(shots)
+        y, x = store.y+0.5, store.x+0.5
+        if center is not None:
+            y, x = y-center[0], x-center[1]
+        weights = None if counting else store.amplitude
+        image, _, _ = np.histogram2d(y, x, bins=(y_edges, x_edges), weights=weights)
+        return image
+
+    def frames(self):
+        '''
+        The dense (thresholded) frames again, shape (shots, ny, nx).
+        '''
+        frames = np.zeros((len(self),) + self.shape, dtype=np.float32)
+        frames[self.shot_index(), self.y, self.x] = self.amplitude
+        return frames
+
+    def save(self, filepath):
+        np.savez_compressed(filepath, shape=np.array(self.shape), indptr=self.indptr,
+                            y=self.y, x=self.x, amplitude=self.amplitude)
+
+    @classmethod
+    def load(cls, filepath):
+        loaded = np.load(filepath)
+        return cls(loaded['shape'], loaded['indptr'], loaded['y'], loaded['x'], loaded['amplitude'])
@@ -0,0 +1,293 @@
+'''
+Incremental redraws of live matplotlib plots, e.g. of the GUI.
+
+The artists of a live plot are made once and updated in place (set_data()); a
+BlitManager then redraws only them on top of a saved background of the figure (axes,
+ticks, labels, colorbars), so an update does not render the whole figure again:
+
+    line, = ax.plot([], [])
+    blit_manager = BlitManager(ax.figure.canvas, [line])
+    ...
+    line.set_data(x, y)
+    blit_manager.update()  # full redraw only if the limits, scales or size changed
+
+Images are not drawn at the resolution of the data but at about that of their axes on
+screen: a LiveImage shows the level of an ImagePyramid (block averages of 2x2, 4x4, ...
+pixels) which is just larger than the axes, so the cost of a redraw depends on the size
+of the widget rather than on that of the detector:
+
+    live_image = LiveImage(ax.imshow(frame))
+    live_image.set_data(new_frame, autoscale=True)  # the extent is left as it is
+
+Likewise, a LiveLine shows a long trace (e.g. of the digitizer) with about two points per
+horizontal pixel of the visible x-range: the minimum and the maximum of the samples in
+every pixel, taken from a TracePyramid of minima and maxima of 2, 4, 8, ... samples, so
+narrow peaks stay visible. It is recomputed whenever the x-limits change (e.g. zooming
+or panning with the toolbar):
+
+    live_line = LiveLine(ax.plot([], [])[0])
+    live_line.set_data(tof_coordinates, tof_trace)
+
+No module of matplotlib is imported here; the artists and canvases are passed in.
+'''
+
+import numpy as np
+
+
+def downsample(image, factor=2):
+    '''
+    Means of factor x factor blocks of pixels of image (along its first two axes);
+    the rows and columns which do not fill a block are dropped.
+    '''
+    image = np.asarray(image)
+    rows, columns = image.shape[0]//factor, image.shape[1]//factor
+    blocks = image[:rows*factor, :columns*factor].reshape(rows, factor, columns, factor, *image.shape[2:])
+    return blocks.mean(axis=(1, 3))
+
+
+def axes_pixel_shape(ax):
+    ''' (rows, columns) of screen pixels of the axes ax, at least (1, 1). '''
+    bbox = ax.get_window_extent()
+    return max(int(np.ceil(bbox.height)), 1), max(int(np.ceil(bbox.width)), 1)
+
+
+class ImagePyramid():
+    '''
+    An image and its downsampled copies at 1/2, 1/4, ... of its resolution, made when
+    they are first needed.
+    '''
+
+    def __init__(self, image):
+        self.levels = [np.asarray(image)]
+
+    @property
+    def shape(self):
+        ''' Shape of the full image. '''
+        return self.levels[0].shape
+
+    def level(self, shape):
+        '''
+        The smallest level with at least shape (rows, columns) pixels; the full image
+        if it is smaller than that.
+        '''
+        rows, columns = shape
+        while self.levels[-1].shape[0] >= 2*rows and self.levels[-1].shape[1] >= 2*columns:
+            self.levels.append(downsample(self.levels[-1]))
+        for image in reversed(self.levels):
+            if image.shape[0] >= rows and image.shape[1] >= columns:
+                return image
+        return self.levels[0]
+
+    def __repr__(self):
+        return f'ImagePyramid({self.shape}, levels={len(self.levels)})'
+
+
+class LiveImage():
+    '''
+    An AxesImage (e.g. of imshow()) which shows the level of an ImagePyramid of its data
+    matching the size of its axes on screen, see the module docstring. The extent of the
+    image (in pixels of the full data) is set by the caller.
+    '''
+
+    def __init__(self, artist):
+        self.artist = artist
+        self.pyramid = None
+
+    def set_data(self, data, autoscale=False):
+        '''
+        Shows data (at the resolution of the axes); autoscale sets the colour limits to
+        the shown values.
+        '''
+        self.pyramid = ImagePyramid(data)
+        self.refresh()
+        if autoscale:
+            self.artist.autoscale()
+
+    def refresh(self):
+        ''' Shows the level of the current size of the axes, e.g. after a resize. '''
+        if self.pyramid is not None:
+            self.artist.set_data(self.pyramid.level(axes_pixel_shape(self.artist.axes)))
+
+
+def _combine_extrema(values, positions, smaller):
+    '''
+    Pairwise extrema (minima if smaller, else maxima) of consecutive values and their
+    positions; NaN only if both values are NaN.
+    '''
+    if len(values) % 2:
+        values, positions = np.append(values, values[-1]), np.append(positions, positions[-1])
+    first, second = values[0::2], values[1::2]
+    take_second = np.isnan(first) | ((second < first) if smaller else (second > first))
+    return (np.where(take_second, second, first),
+            np.where(take_second, positions[1::2], positions[0::2]))
+
+
+class TracePyramid():
+    '''
+    Minima and maxima (and their x-positions) of blocks of 1, 2, 4, ... samples of a
+    trace y(x), made when they are first needed; see the module docstring.
+
+    Attributes
+    ----------
+    x, y : np.ndarray
+        The full trace. Only an x which does not decrease is cut to the visible range,
+        else the whole trace is decimated.
+    '''
+
+    def __init__(self, x, y):
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        if self.x.shape != self.y.shape or self.x.ndim != 1:
+            raise ValueError(f'x {self.x.shape} and y {self.y.shape} are not one trace')
+        self.sorted = bool(np.all(np.diff(self.x) >= 0))
+        self.levels = [(self.y, self.x, self.y, self.x)]  # (minima, positions, maxima, positions)
+
+    def __len__(self):
+        return len(self.x)
+
+    def level(self, number):
+        ''' (minima, their positions, maxima, their positions) of blocks of 2**number samples. '''
+        while len(self.levels) <= number:
+            minima, minima_x, maxima, maxima_x = self.levels[-1]
+            self.levels.append(_combine_extrema(minima, minima_x, True) + _combine_extrema(maxima, maxima_x, False))
+        return self.levels[number]
+
+    def view(self, xlim=None, num_pixels=1000):
+        '''
+        (x, y) to draw the part of the trace in xlim (plus a sample on either side) with
+        about two points per pixel, for num_pixels pixels: the samples themselves if there
+        are not more than 2*num_pixels, else the minimum and the maximum of every block in
+        the order of their positions.
+        '''
+        start, stop = 0, len(self)
+        if xlim is not None and self.sorted:
+            low, high = min(xlim), max(xlim)
+            start = max(np.searchsorted(self.x, low, side='left') - 1, 0)
+            stop = min(np.searchsorted(self.x, high, side='right') + 1, len(self))
+        num_samples = stop - start
+        if num_samples <= 2*max(num_pixels, 1):
+            return self.x[start:stop], self.y[start:stop]
+        number = int(np.log2(num_samples/max(num_pixels, 1)))
+        minima, minima_x, maxima, maxima_x = self.level(number)
+        blocks = slice(start >> number, ((stop - 1) >> number) + 1)
+        minima, minima_x, maxima, maxima_x = minima[blocks], minima_x[blocks], maxima[blocks], maxima_x[blocks]
+        minimum_first = ~(maxima_x < minima_x)
+        x = np.where(minimum_first, [minima_x, maxima_x], [maxima_x, minima_x]).T.ravel()
+        y = np.where(minimum_first, [minima, maxima], [maxima, minima]).T.ravel()
+        return x, y
+
+    def __repr__(self):
+        return f'TracePyramid({len(self)} samples, levels={len(self.levels)})'
+
+
+class LiveLine():
+    '''
+    A Line2D (e.g. of plot()) which shows its trace decimated to the visible x-range and
+    the width of its axes on screen, see the module docstring and TracePyramid.view().
+    '''
+
+    def __init__(self, line):
+        self.line = line
+        self.pyramid = None
+        self._xlim_id = line.axes.callbacks.connect('xlim_changed', lambda ax: self.refresh())
+
+    def set_data(self, x, y):
+        ''' Shows the trace y(x) (at the resolution of the axes). '''
+        self.pyramid = TracePyramid(x, y)
+        self.refresh()
+
+    def get_data(self):
+        ''' The full trace (x, y). '''
+        if self.pyramid is None:
+            return self.line.get_data()
+        return self.pyramid.x, self.pyramid.y
+
+    def refresh(self):
+        ''' Shows the current x-range, e.g. after a resize. '''
+        if self.pyramid is not None:
+            ax = self.line.axes
+            self.line.set_data(*self.pyramid.view(ax.get_xlim(), axes_pixel_shape(ax)[1]))
+
+    def disconnect(self):
+        self.line.axes.callbacks.disconnect(self._xlim_id)
+
+
+class BlitManager():
+    '''
+    Redraws the artists of a canvas on top of a saved background, see the module
+    docstring.
+
+    The background is the figure without the artists (and the frames of their axes,
+    which are drawn on top of them), saved at the last full redraw.
+    update() draws the whole figure again if there is no background yet, if a draw of
+    the canvas from elsewhere (e.g. a resize, or zooming with the toolbar) made it
+    stale, or if the limits, scales or positions of the axes or the colour limits of the
+    artists changed since. The artists stay ordinary artists, so e.g. saving the figure
+    includes them.
+    '''
+
+    def __init__(self, canvas, artists=()):
+        self.canvas = canvas
+        self.artists = list(artists)
+        self._background = None
+        self._view = None
+        self._drawing = False
+        self._draw_id = canvas.mpl_connect('draw_event', self._on_draw)
+
+    def add_artist(self, artist):
+        self.artists.append(artist)
+        self._background = None
+
+    def _on_draw(self, event):
+        if not self._drawing:
+            self._background = None
+
+    def _view_state(self):
+        figure = self.canvas.figure
+        axes_state = tuple((tuple(ax.get_xlim()), tuple(ax.get_ylim()), ax.get_xscale(), ax.get_yscale(),
+                            tuple(ax.bbox.bounds)) for ax in figure.axes)
+        colour_limits = tuple(tuple(artist.get_clim()) for artist in self.artists if hasattr(artist, 'get_clim'))
+        return tuple(figure.bbox.bounds), axes_state, colour_limits
+
+    def needs_full_redraw(self):
+        return self._background is None or self._view_state() != self._view
+
+    def _frames(self):
+        ''' Spines of the axes of the artists, which are drawn on top of them. '''
+        axes = {id(artist.axes): artist.axes for artist in self.artists if artist.axes is not None}
+        return [spine for ax in axes.values() for spine in ax.spines.values()]
+
+    def update(self, full=False):
+        '''
+        Shows the current state of the artists, with a full redraw of the figure only if
+        needed (or full). Returns whether the figure was fully redrawn.
+        '''
+        canvas = self.canvas
+        artists = self.artists + self._frames()
+        full = full or self.needs_full_redraw()
+        if full:
+            visible = [artist.get_visible() for artist in artists]
+            self._drawing = True
+            try:
+                for artist in artists:
+                    artist.set_visible(False)
+                canvas.draw()
+                self._background = canvas.copy_from_bbox(canvas.figure.bbox)
+                self._view = self._view_state()
+            finally:
+                for artist, artist_visible in zip(artists, visible):
+                    artist.set_visible(artist_visible)
+                self._drawing = False
+        else:
+            canvas.restore_region(self._background)
+        for artist in artists:
+            if artist.get_visible():
+                canvas.figure.draw_artist(artist)
+        canvas.blit(canvas.figure.bbox)
+        return full
+
+    def disconnect(self):
+        self.canvas.mpl_disconnect(self._draw_id)
+
+    def __repr__(self):
+        return f'BlitManager({len(self.artists)} artists)'
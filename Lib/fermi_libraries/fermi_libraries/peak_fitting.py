@@ -0,0 +1,353 @@
+'''
+Batched least-squares fits of peak models to stacks of spectra.
+
+fit_spectra() fits the same model to every spectrum of an array (..., points) at once,
+e.g. to the averages of Run.average_run_data() or RunSets.average_run_data() with the
+axes (conditions, runs, rules, points). All spectra take the same Levenberg-Marquardt
+steps together, with vectorized residuals and the analytic Jacobians of the models, so
+thousands of small fits cost about as much as a few large array operations:
+
+    fits = fit_spectra(tof, averages, initial=[amp, center, width], scan_axis=1)
+    centers, center_errors = fits['center0'], fits.error('center0')  # (conditions, runs, rules)
+
+Along scan_axis (e.g. the runs of a delay scan), the spectra at index i start from the
+fits of their neighbours at i-1, and only the first ones (and those whose neighbour
+failed) start from initial. The other axes can be spread over processes (num_processes
+or a backend of the backends module).
+
+The parameters are ordered as for common_functions.gaussians():
+(amp0, center0, width0, amp1, center1, width1, ...), so initial can also be such a
+dict (or lmfit.Parameters). The models are given by name (see MODELS) or as a function
+model(x, params) -> (values, jacobian) of params with shape (spectra, parameters),
+returning values (spectra, points) and jacobian (spectra, points, parameters).
+
+Like lmfit, the errors are the square roots of the diagonal of the covariance matrix,
+scaled by the reduced chi-square (scale_covar). Non-finite points are ignored.
+'''
+
+import numpy as np
+from collections.abc import Mapping
+from .backends import backend_context
+
+PEAK_PARAMETERS = ('amp', 'center', 'width')
+_SQRT_2PI = np.sqrt(2*np.pi)
+
+
+def _peak_arguments(x, params):
+    x = np.asarray(x, dtype=float)
+    params = np.asarray(params, dtype=float)
+    amp, center, width = (params[:, i::3, None] for i in range(3))  # (spectra, peaks, 1)
+    u = (x - center)/width
+    return amp, width, u, np.exp(-u**2/2)
+
+
+def _stack_peaks(values, derivatives):
+    ''' Sum over the peaks, and the jacobian (spectra, points, 3*peaks). '''
+    jacobian = np.stack(derivatives, axis=2)  # (spectra, peaks, 3, points)
+    return values.sum(axis=1), jacobian.reshape(jacobian.shape[0], -1, jacobian.shape[-1]).transpose(0, 2, 1)
+
+
+def gaussians_model(x, params):
+    '''
+    Sum of normalized Gaussians amp/(width*sqrt(2pi))*exp(-(x-center)^2/(2*width^2)),
+    as common_functions.gaussians(), and its jacobian.
+    '''
+    amp, width, u, exponential = _peak_arguments(x, params)
+    unit_area = exponential/(width*_SQRT_2PI)
+    values = amp*unit_area
+    return _stack_peaks(values, [unit_area, values*u/width, values*(u**2 - 1)/width])
+
+
+def non_normalized_gaussians_model(x, params):
+    '''
+    Sum of Gaussians amp*exp(-(x-center)^2/(2*width^2)), as
+    common_functions.non_normalized_gaussians(), and its jacobian.
+    '''
+    amp, width, u, exponential = _peak_arguments(x, params)
+    values = amp*exponential
+    return _stack_peaks(values, [exponential, values*u/width, values*u**2/width])
+
+
+MODELS = {
+    'gaussians': gaussians_model,
+    'non_normalized_gaussians': non_normalized_gaussians_model,
+}
+
+
+def parameter_names(num_params):
+    ''' amp0, center0, width0, amp1, ... for num_params parameters. '''
+    return [f'{PEAK_PARAMETERS[i % 3]}{i//3}' for i in range(num_params)]
+
+
+def _parameter_array(params):
+    ''' params as an array (..., parameters); a dict is read in the order of parameter_names(). '''
+    if isinstance(params, Mapping):
+        names = [name for name in parameter_names(len(params)) if name in params]
+        return np.array([getattr(params[name], 'value', params[name]) for name in names], dtype=float)
+    return np.asarray(params, dtype=float)
+
+
+def guess_gaussian(x, spectra):
+    '''
+    Initial (amp, center, width) of one Gaussian per spectrum (..., points), from the
+    area, mean and standard deviation of the positive part of the spectra.
+    '''
+    x = np.asarray(x, dtype=float)
+    weights = np.clip(np.nan_to_num(np.asarray(spectra, dtype=float)), 0, None)
+    dx = np.gradient(x)
+    total = weights.sum(axis=-1)
+    total = np.where(total > 0, total, 1)
+    center = (weights*x).sum(axis=-1)/total
+    width = np.sqrt((weights*(x - center[..., None])**2).sum(axis=-1)/total)
+    width = np.where(width > 0, width, np.abs(dx).mean())
+    amp = (weights*np.abs(dx)).sum(axis=-1)
+    return np.stack([amp, center, width], axis=-1)
+
+
+def _chisqr(y, values, weights):
+    return np.sum(((y - values)*weights)**2, axis=-1)
+
+
+def levenberg_marquardt(model, x, y, initial, weights=None, lower=None, upper=None, vary=None,
+                        max_iterations=200, tolerance=1e-10):
+    '''
+    Fits model to the spectra y (spectra, points) from initial (spectra, parameters),
+    every spectrum with its own damping. lower and upper (parameters,) bound the
+    parameters, vary (parameters,) marks the fitted ones. A fit has converged when a step
+    changes the chi-square or the parameters by less than tolerance (relatively), or
+    when no smaller chi-square is found.
+
+    Returns
+    -------
+    params, chisqr, success, iterations, curvature
+        curvature is J^T J (spectra, parameters, parameters) of the weighted residuals.
+        Trial steps to overflowing parameters are rejected without warnings.
+    '''
+    y = np.asarray(y, dtype=float)
+    params = np.array(initial, dtype=float)
+    num_spectra, num_params = params.shape
+    weights = np.ones_like(y) if weights is None else np.asarray(weights, dtype=float)*np.ones_like(y)
+    finite = np.isfinite(y) & np.isfinite(weights)
+    weights = np.where(finite, weights, 0)
+    y = np.where(finite, y, 0)
+    vary = np.ones(num_params, dtype=bool) if vary is None else np.asarray(vary, dtype=bool)
+    lower = np.full(num_params, -np.inf) if lower is None else np.asarray(lower, dtype=float)
+    upper = np.full(num_params, np.inf) if upper is None else np.asarray(upper, dtype=float)
+    params = np.clip(params, lower, upper)
+
+    with np.errstate(over='ignore', invalid='ignore', divide='ignore'):
+        return _levenberg_marquardt(model, x, y, params, weights, lower, upper, vary, max_iterations, tolerance)
+
+
+def _levenberg_marquardt(model, x, y, params, weights, lower, upper, vary, max_iterations, tolerance):
+    num_spectra, num_params = params.shape
+    values, jacobian = model(x, params)
+    chisqr = _chisqr(y, values, weights)
+    damping = np.full(num_spectra, 1e-3)
+    iterations = np.zeros(num_spectra, dtype=int)
+    success = np.zeros(num_spectra, dtype=bool)
+    done = ~np.isfinite(chisqr)
+
+    def curvature_and_gradient(indices):
+        weighted_jacobian = jacobian[indices]*weights[indices, :, None]
+        weighted_jacobian[..., ~vary] = 0
+        residuals = (y[indices] - values[indices])*weights[indices]
+        return (np.einsum('snp,snq->spq', weighted_jacobian, weighted_jacobian),
+                np.einsum('snp,sn->sp', weighted_jacobian, residuals))
+
+    for _ in range(max_iterations):
+        active = np.flatnonzero(~done)
+        if not len(active):
+            break
+        curvature, gradient = curvature_and_gradient(active)
+        diagonal = curvature.diagonal(axis1=1, axis2=2).copy()
+        diagonal = np.maximum(diagonal, 1e-12*diagonal.max(axis=1, keepdims=True) + 1e-300)
+        diagonal[:, ~vary] = 1
+        step = np.linalg.solve(curvature + (damping[active, None]*diagonal)[..., None]*np.eye(num_params),
+                               gradient[..., None])[..., 0]
+        new_params = np.clip(params[active] + step, lower, upper)
+        new_values, new_jacobian = model(x, new_params)
+        new_chisqr = _chisqr(y[active], new_values, weights[active])
+
+        better = new_chisqr < chisqr[active]
+        small_change = (chisqr[active] - new_chisqr <= tolerance*chisqr[active])
+        small_step = np.all(np.abs(new_params - params[active]) <= tolerance*(np.abs(params[active]) + tolerance), axis=1)
+        improved = active[better]
+        params[improved], values[improved], jacobian[improved] = new_params[better], new_values[better], new_jacobian[better]
+        chisqr[improved] = new_chisqr[better]
+        damping[active] = np.where(better, np.maximum(damping[active]/10, 1e-15), damping[active]*10)
+        iterations[active] += 1
+
+        converged = (better & small_change) | small_step | (damping[active] > 1e15)
+        done[active[converged]] = True
+        success[active[converged]] = True
+
+    curvature = curvature_and_gradient(np.arange(num_spectra))[0]
+    return params, chisqr, success, iterations, curvature
+
+
+def _errors(curvature, chisqr, num_points, vary, scale_covar):
+    ''' Square roots of the diagonal of the covariance matrix; zero for fixed parameters. '''
+    num_free = num_points - np.count_nonzero(vary)
+    redchi = np.where(num_free > 0, chisqr/np.maximum(num_free, 1), np.nan)
+    varied = np.ix_(vary, vary)
+    covariance = np.zeros_like(curvature)
+    covariance[(slice(None),) + varied] = np.linalg.pinv(curvature[(slice(None),) + varied])
+    variances = covariance.diagonal(axis1=1, axis2=2)
+    if scale_covar:
+        variances = variances*redchi[:, None]
+    return np.sqrt(np.clip(variances, 0, None)), redchi
+
+
+def _fit_scan(model, x, y, weights, initial, lower, upper, vary, warm_start, max_iterations, tolerance, scale_covar):
+    '''
+    Fits of the spectra y (scan, spectra, points), one index of the scan after the other,
+    see fit_spectra().
+    '''
+    model = MODELS[model] if isinstance(model, str) else model
+    vary = np.ones(initial.shape[-1], dtype=bool) if vary is None else np.asarray(vary, dtype=bool)
+    num_points = np.count_nonzero(np.isfinite(y) & np.isfinite(weights), axis=-1)
+    outputs = {name: [] for name in PeakFits.__slots__ if name != 'names'}
+    for index in range(len(y)):
+        start = initial[index]
+        if warm_start and index:
+            start = np.where(outputs['success'][-1][:, None], outputs['params'][-1], start)
+        params, chisqr, success, iterations, curvature = levenberg_marquardt(
+            model, x, y[index], start, weights[index], lower, upper, vary, max_iterations, tolerance)
+        errors, redchi = _errors(curvature, chisqr, num_points[index], vary, scale_covar)
+        for name, output in zip(['params', 'errors', 'chisqr', 'redchi', 'success', 'iterations'],
+                                [params, errors, chisqr, redchi, success, iterations]):
+            outputs[name].append(output)
+    return {name: np.array(output) for name, output in outputs.items()}
+
+
+class PeakFits():
+    '''
+    Fitted parameters of a stack of spectra, see fit_spectra(). fits['center0'] gives the
+    values of one parameter, fits.error('center0') their errors.
+
+    Attributes
+    ----------
+    params : np.ndarray
+        Fitted parameters, shape (..., parameters).
+    errors : np.ndarray
+        Their errors, shape of params (zero for fixed parameters).
+    chisqr, redchi : np.ndarray
+        Chi-square and reduced chi-square, shape (...).
+    success : np.ndarray
+        Whether the fit converged, shape (...).
+    iterations : np.ndarray
+        Number of Levenberg-Marquardt steps, shape (...).
+    names : list
+        Names of the parameters (amp0, center0, width0, ...).
+    '''
+
+    __slots__ = ('params', 'errors', 'chisqr', 'redchi', 'success', 'iterations', 'names')
+
+    def __init__(self, params, errors, chisqr, redchi, success, iterations, names=None):
+        self.params = np.asarray(params, dtype=float)
+        self.errors = np.asarray(errors, dtype=float)
+        self.chisqr = np.asarray(chisqr, dtype=float)
+        self.redchi = np.asarray(redchi, dtype=float)
+        self.success = np.asarray(success, dtype=bool)
+        self.iterations = np.asarray(iterations, dtype=int)
+        self.names = parameter_names(self.params.shape[-1]) if names is None else list(names)
+
+    @property
+    def shape(self):
+        ''' Shape of the stack of spectra. '''
+        return self.chisqr.shape
+
+    def __getitem__(self, name):
+        return self.params[..., self.names.index(name)]
+
+    def error(self, name):
+        return self.errors[..., self.names.index(name)]
+
+    def __repr__(self):
+        return f'PeakFits(shape={self.shape}, parameters={len(self.names)}, success={int(self.success.sum())}/{self.success.size})'
+
+
+def fit_spectra(x, spectra, initial, model='gaussians', yerr=None, lower=None, upper=None, vary=None,
+                scan_axis=None, warm_start=True, max_iterations=200, tolerance=1e-10, scale_covar=True,
+                num_processes=1, backend=None):
+    '''
+    Fits model to every spectrum of spectra, see the module docstring.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        Coordinates of the points, shape (points,).
+    spectra : np.ndarray
+        Spectra with shape (..., points).
+    initial : np.ndarray or dict
+        Initial parameters, (parameters,) or broadcastable to (..., parameters); or a
+        dict {'amp0': ..., 'center0': ..., ...}. See also guess_gaussian().
+    model : str or function
+        A name of MODELS, or model(x, params) -> (values, jacobian).
+    yerr : np.ndarray, optional
+        Errors of the spectra (broadcastable to spectra); the residuals are divided by
+        them.
+    lower, upper : np.ndarray, optional
+        Bounds of the parameters, shape (parameters,). The default lower bound of the
+        widths of the Gaussian models is zero (exclusive).
+    vary : np.ndarray, optional
+        Booleans (parameters,); the parameters which are False stay at their initial
+        values.
+    scan_axis : int, optional
+        Axis of the stack (not of the points) along which the fits are warm-started from
+        their neighbours, see the module docstring. None fits all spectra at once.
+    warm_start : bool
+        False starts every spectrum from initial, also along scan_axis.
+    max_iterations, tolerance :
+        See levenberg_marquardt().
+    scale_covar : bool
+        Scale the errors by the reduced chi-square, as lmfit does by default.
+    num_processes : int
+        Processes for the spectra (not along scan_axis) if backend is None.
+    backend : backends.Backend, optional
+
+    Returns
+    -------
+    PeakFits
+    '''
+    x = np.asarray(x, dtype=float)
+    spectra = np.asarray(spectra, dtype=float)
+    initial = _parameter_array(initial)
+    num_params = initial.shape[-1]
+    stack_shape = spectra.shape[:-1]
+    initial = np.broadcast_to(initial, stack_shape + (num_params,))
+    weights = np.broadcast_to(1. if yerr is None else 1/np.asarray(yerr, dtype=float), spectra.shape)
+    if lower is None and model in MODELS:
+        lower = np.tile([-np.inf, -np.inf, 1e-300], num_params//3)
+
+    # (scan, spectra, ...)
+    if scan_axis is not None:
+        if not -len(stack_shape) <= scan_axis < len(stack_shape):
+            raise ValueError(f'scan_axis {scan_axis} is not an axis of the stack of spectra {stack_shape}')
+        scan_axis = scan_axis % len(stack_shape)
+    if scan_axis is None:
+        arrays = [array.reshape(1, -1, array.shape[-1]) for array in (spectra, weights, initial)]
+        moved_shape = (1,) + stack_shape
+    else:
+        arrays = [np.moveaxis(array, scan_axis, 0) for array in (spectra, weights, initial)]
+        moved_shape = arrays[0].shape[:-1]
+        arrays = [array.reshape(array.shape[0], -1, array.shape[-1]) for array in arrays]
+    y, weights, initial = arrays
+
+    with backend_context(backend, num_processes) as task_backend:
+        chunks = np.array_split(np.arange(y.shape[1]), max(min(task_backend.num_workers, y.shape[1]), 1))
+        outputs = task_backend.starmap(_fit_scan, [
+            (model, x, y[:, chunk], weights[:, chunk], initial[:, chunk], lower, upper, vary,
+             warm_start, max_iterations, tolerance, scale_covar) for chunk in chunks])
+
+    fields = {}
+    for name in outputs[0]:
+        output = np.concatenate([chunk_output[name] for chunk_output in outputs], axis=1)
+        output = output.reshape(moved_shape + output.shape[2:])
+        if scan_axis is None:
+            output = output[0]
+        else:
+            output = np.moveaxis(output, 0, scan_axis)
+        fields[name] = output
+    return PeakFits(**fields)
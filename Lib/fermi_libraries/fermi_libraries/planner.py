@@ -0,0 +1,331 @@
+'''
+Memory-budget planner for the averaging and data-loading calls of run_module.
+
+The planner reads the dataset shapes, dtypes and shot counts from the file metadata
+only (no data is read), estimates the peak memory of a call, and chooses the number of
+worker processes and the number of files per cache block so that the call stays within
+a memory budget:
+
+    plan = run.plan('vmi', call='average_run_data', memory_budget=8e9,
+                    back_sep=True, slu_sep=True, rules=[None, '(i0m>30)'])
+    print(plan)       # the estimate and the chosen num_cores/num_files_per_cache
+    averages = plan() # runs the call with these settings
+
+The memory model follows run_module.Run.yield_file_data(): a file's dataset is read as
+a whole, and every rule makes a copy of the selected shots (split into the conditions).
+In a single process the sums (in float64) of every file are merged into the running sum
+as soon as the file is read, so the peak does not grow with the number of files, and
+cache blocks only add their averages; with worker processes (MultithreadRun) the sums of
+all files are kept until the blocks are averaged.
+Reducers are not modelled, so the estimate of a call with a reducer is an upper bound.
+'''
+
+import os
+import warnings
+import numpy as np
+import h5py
+from multiprocessing import cpu_count
+from .profiling import format_bytes
+
+# bytes of an idle worker process (interpreter, numpy, h5py)
+worker_overhead = 100e6
+
+# fraction of the available memory used when no memory budget is given
+default_budget_fraction = 0.5
+
+SUPPORTED_CALLS = ('average_run_data_weights', 'average_run_data', 'give_rundata')
+
+
+def available_memory():
+    '''
+    The available physical memory in bytes, or None if it cannot be read.
+    '''
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1])*1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES')*os.sysconf('SC_PAGE_SIZE')
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def _sliced_shape(shape, slice_range):
+    if slice_range is None:
+        return tuple(shape)
+    shape = list(shape)
+    for axis, (i, j, k) in enumerate(slice_range, start=1):
+        shape[axis] = len(range(*slice(i, j, k).indices(shape[axis])))
+    return tuple(shape)
+
+
+class DatasetInfo():
+    '''
+    Metadata of one dataset over the files of a Run.
+
+    Attributes
+    ----------
+    filepaths : list
+        Files which have the dataset.
+    shapes : list
+        Shape of the dataset in every file.
+    dtype : np.dtype
+        Data type of the dataset (of the first file).
+    shots : list
+        Number of bunches of every file.
+    '''
+
+    def __init__(self, filepaths, shapes, dtype, shots):
+        self.filepaths = filepaths
+        self.shapes = shapes
+        self.dtype = np.dtype(dtype)
+        self.shots = shots
+
+    @classmethod
+    def from_run(cls, run, dataname):
+        '''
+        Reads the metadata of dataname (or its alias) from the catalog of run (see
+        Run.get_catalog()).
+        '''
+        name = run.keyword_alias(dataname)
+        catalog = run.get_catalog()
+        filepaths, shapes, dtype, shots = [], [], None, []
+        for filepath in catalog.readable():
+            entry = catalog[filepath]
+            if entry.has(name):
+                dataset = entry.dataset(name)
+            else:  # e.g. a keyword of custom keyword_functions
+                with h5py.File(filepath, 'r') as file:
+                    try:
+                        dataset = run.keyword_functions(name, lambda x:x, file)
+                    except KeyError:
+                        continue
+            filepaths.append(filepath)
+            shapes.append(tuple(dataset.shape))
+            shots.append(entry.shots or 1)
+            if dtype is None:
+                dtype = dataset.dtype
+        if not filepaths:
+            raise Exception(f'No data found with keyword ({dataname}).')
+        return cls(filepaths, shapes, dtype, shots)
+
+    def is_shot_data(self, i=0):
+        ''' Whether the dataset of file i has one entry per shot. '''
+        return len(self.shapes[i]) > 0 and self.shapes[i][0] == self.shots[i]
+
+    def file_bytes(self, i=0, slice_range=None):
+        ''' Bytes of the dataset of file i (after slice_range). '''
+        return int(np.prod(_sliced_shape(self.shapes[i], slice_range)))*self.dtype.itemsize
+
+    def shot_size(self, i=0, slice_range=None):
+        ''' Number of values per shot of file i (after slice_range). '''
+        shape = _sliced_shape(self.shapes[i], slice_range)
+        return int(np.prod(shape[1:])) if self.is_shot_data(i) else int(np.prod(shape))
+
+    def __repr__(self):
+        return (f'DatasetInfo({len(self.filepaths)} files, {sum(self.shots)} shots, '
+                f'shape={self.shapes[0]}, dtype={self.dtype})')
+
+
+class MemoryEstimate():
+    '''
+    Estimated peak memory (bytes) of a call.
+
+    Attributes
+    ----------
+    per_file : int
+        Peak of processing one file: the dataset, the copies per rule and the sums.
+    parent : int
+        Memory of the main process which is not released between files, e.g. the
+        running sum, or the kept sums of all files with worker processes.
+    workers : int
+        Memory of the worker processes, including their overhead.
+    total : int
+        Estimated peak of the whole call.
+    '''
+
+    def __init__(self, per_file, parent, workers=0):
+        self.per_file = int(per_file)
+        self.parent = int(parent)
+        self.workers = int(workers)
+        self.total = int(parent + (workers if workers else per_file))
+
+    def __repr__(self):
+        return (f'MemoryEstimate(total={format_bytes(self.total)}, per_file={format_bytes(self.per_file)}, '
+                f'parent={format_bytes(self.parent)}, workers={format_bytes(self.workers)})')
+
+
+def estimate_memory(info, call='average_run_data', rules=[None,], slice_range=None, num_cores=1,
+                    num_files_per_cache=None):
+    '''
+    Estimates the peak memory of a call on a Run, see the module docstring.
+
+    Parameters
+    ----------
+    info : DatasetInfo
+        Metadata of the dataset, see DatasetInfo.from_run().
+    call : str, optional
+        One of SUPPORTED_CALLS. The default is 'average_run_data'.
+    rules : list, optional
+        The rules of the call. The default is [None,].
+    slice_range : list, optional
+        The slice_range of the call. The default is None.
+    num_cores : int, optional
+        Worker processes (MultithreadRun). The default is 1.
+    num_files_per_cache : int, optional
+        Files per cache block. The default is None (all files).
+
+    Returns
+    -------
+    MemoryEstimate
+    '''
+    if call not in SUPPORTED_CALLS:
+        raise ValueError(f'call ({call}) is not one of {SUPPORTED_CALLS}')
+    num_rules = len(rules)
+    num_files = len(info.filepaths)
+    largest = int(np.argmax([np.prod(shape) for shape in info.shapes]))
+    raw_bytes = info.file_bytes(largest)  # the whole dataset is read before slicing
+    sliced_bytes = info.file_bytes(largest, slice_range)
+    mask_bytes = 8*max(info.shots)*(4 + num_rules)
+
+    if call == 'give_rundata':
+        run_bytes = sum(info.file_bytes(i, slice_range) for i in range(num_files))
+        # the selected shots of every file and rule, and their concatenation
+        per_file = raw_bytes + num_rules*sliced_bytes + mask_bytes
+        return MemoryEstimate(per_file, 2*num_rules*run_bytes)
+
+    sums_bytes = 4*num_rules*8*max(info.shot_size(i, slice_range) for i in range(num_files))
+    per_file = raw_bytes + num_rules*sliced_bytes + sums_bytes + mask_bytes
+    if num_cores > 1:
+        # MultithreadRun keeps the sums of all files (and their pickled copies) before the blocks
+        parent = 3*num_files*sums_bytes
+        workers = min(num_cores, num_files)*(per_file + worker_overhead)
+        return MemoryEstimate(per_file, parent, workers)
+    # the files are merged into the running sum as they are read (and the output average
+    # is made from it); cache blocks keep the averages of all blocks besides
+    num_blocks = 0 if num_files_per_cache is None else int(np.ceil(num_files/min(num_files_per_cache, num_files)))
+    parent = (2 + num_blocks)*sums_bytes
+    return MemoryEstimate(per_file, parent)
+
+
+class Plan():
+    '''
+    Settings of a call which fit into a memory budget, see plan().
+
+    Calling the plan runs the call with these settings (with a MultithreadRun if
+    num_cores > 1) and returns its output.
+
+    Attributes
+    ----------
+    call : str
+        Name of the Run method.
+    num_cores : int
+        Worker processes.
+    num_files_per_cache : int or None
+        Files per cache block (None: one block of all files).
+    estimate : MemoryEstimate
+        Estimate with these settings.
+    memory_budget : int
+        The budget in bytes.
+    fits : bool
+        Whether the estimate is within the budget.
+    '''
+
+    def __init__(self, run, dataname, call, kwargs, num_cores, num_files_per_cache, estimate, memory_budget):
+        self.run = run
+        self.dataname = dataname
+        self.call = call
+        self.kwargs = kwargs
+        self.num_cores = num_cores
+        self.num_files_per_cache = num_files_per_cache
+        self.estimate = estimate
+        self.memory_budget = int(memory_budget)
+        self.fits = estimate.total <= memory_budget
+
+    def call_kwargs(self):
+        ''' The keyword arguments which are passed to the call. '''
+        kwargs = dict(self.kwargs)
+        if self.call != 'give_rundata':
+            kwargs['num_files_per_cache'] = self.num_files_per_cache
+        return kwargs
+
+    def __call__(self):
+        run = self.run
+        if self.num_cores > 1:
+            from .run_module import MultithreadRun
+            run = MultithreadRun([])
+            for name, value in self.run.object_attributes():
+                setattr(run, name, value)
+            run.num_cores = self.num_cores
+        return getattr(run, self.call)(self.dataname, **self.call_kwargs())
+
+    def __repr__(self):
+        return (f'Plan({self.call}({self.dataname!r}), num_cores={self.num_cores}, '
+                f'num_files_per_cache={self.num_files_per_cache}, {self.estimate}, '
+                f'budget={format_bytes(self.memory_budget)}, fits={self.fits})')
+
+
+def plan(run, dataname, call='average_run_data', memory_budget=None, max_cores=None, **kwargs):
+    '''
+    Chooses the number of worker processes and the number of files per cache block of a
+    call on run, so that its estimated peak memory stays within memory_budget. More
+    workers are preferred. Cache blocks are not chosen (num_files_per_cache is None), as
+    in a single process they do not lower the peak (see estimate_memory()). If nothing
+    fits, the settings with the lowest estimate are returned with a warning, and
+    Plan.fits is False; reducing the data with slice_range or a reducer is then up to
+    the user.
+
+    Parameters
+    ----------
+    run : Run
+        The Run instance.
+    dataname : str
+        Dataset (or alias).
+    call : str, optional
+        One of SUPPORTED_CALLS. The default is 'average_run_data'.
+    memory_budget : float, optional
+        Budget in bytes. The default is None, i.e. default_budget_fraction of the
+        available memory.
+    max_cores : int, optional
+        Upper limit of worker processes. The default is None (cpu_count()).
+    **kwargs :
+        Keyword arguments of the call (back_sep, slu_sep, slice_range, rules, ...).
+
+    Returns
+    -------
+    Plan
+    '''
+    if memory_budget is None:
+        available = available_memory()
+        if available is None:
+            raise Exception('available memory unknown; give memory_budget')
+        memory_budget = default_budget_fraction*available
+    if max_cores is None:
+        max_cores = cpu_count()
+
+    info = DatasetInfo.from_run(run, dataname)
+    rules = kwargs.get('rules', [None,])
+    slice_range = kwargs.get('slice_range', None)
+    num_files = len(info.filepaths)
+
+    if call == 'give_rundata':
+        candidates = [(1, None)]
+    else:
+        candidates = [(num_cores, None) for num_cores in range(min(max_cores, num_files), 0, -1)]
+
+    estimates = [estimate_memory(info, call=call, rules=rules, slice_range=slice_range, num_cores=num_cores,
+                                 num_files_per_cache=num_files_per_cache)
+                 for num_cores, num_files_per_cache in candidates]
+    for (num_cores, num_files_per_cache), estimate in zip(candidates, estimates):
+        if estimate.total <= memory_budget:
+            break
+    else:
+        i = int(np.argmin([estimate.total for estimate in estimates]))
+        (num_cores, num_files_per_cache), estimate = candidates[i], estimates[i]
+        warnings.warn(f'{call}({dataname}) needs about {format_bytes(estimate.total)}, more than the memory '
+                      f'budget ({format_bytes(memory_budget)}); consider slice_range, a reducer or fewer rules')
+
+    return Plan(run, dataname, call, kwargs, num_cores, num_files_per_cache, estimate, memory_budget)
@@ -0,0 +1,276 @@
+'''
+Stage profiler of the reduction engine.
+
+While a profile is active (see Run.profile() and RunSets.profile()), the methods of
+run_module record the wall time, the bytes and (optionally) the peak memory of their
+stages, per file:
+
+    'open'         opening the HDF5 file
+    'read'         reading (and decompressing) the dataset; bytes are the stored
+                   (compressed) bytes, 'decompressed_bytes' the bytes in memory
+    'mask'         loading the bunches, and the background/SLU masks
+    'rules'        evaluating the filtering rules
+    'select'       splitting the shots into the conditions
+    'reduce'       reducers, filters and the sums over the shots
+    'cache_lookup' looking for and loading cache files
+    'cache_write'  writing cache files
+    'ipc'          sending the file results of worker processes back
+
+With the Profile.aggregate() totals one can tell whether a run is I/O-bound ('read' with
+little compression), decompression-bound ('read' with a large compression ratio) or
+Python-bound ('mask', 'rules', 'select', 'reduce').
+
+    with run.profile() as profile:
+        run.average_run_data('vmi', back_sep=True)
+    print(profile.log_line())
+
+When no profile is active, stage() returns a shared do-nothing context, so the
+instrumentation costs close to nothing.
+'''
+
+import os
+import time
+import logging
+import tracemalloc
+import numpy as np
+from contextlib import contextmanager
+
+STAGES = ('open', 'read', 'mask', 'rules', 'select', 'reduce', 'cache_lookup', 'cache_write', 'ipc')
+
+_active_profile = None
+
+
+class StageRecord():
+    '''
+    One execution of a stage, for one file (filepath is None for stages of the whole run).
+    '''
+
+    __slots__ = ('stage', 'filepath', 'seconds', 'nbytes', 'decompressed_bytes', 'peak_memory', 'count')
+
+    def __init__(self, stage, filepath=None, seconds=0.0, nbytes=0, decompressed_bytes=0, peak_memory=0, count=1):
+        self.stage = stage
+        self.filepath = filepath
+        self.seconds = seconds
+        self.nbytes = nbytes
+        self.decompressed_bytes = decompressed_bytes
+        self.peak_memory = peak_memory
+        self.count = count
+
+    def add_bytes(self, nbytes, decompressed_bytes=None):
+        self.nbytes += int(nbytes)
+        self.decompressed_bytes += int(nbytes if decompressed_bytes is None else decompressed_bytes)
+
+    def merge(self, other):
+        self.seconds += other.seconds
+        self.nbytes += other.nbytes
+        self.decompressed_bytes += other.decompressed_bytes
+        self.peak_memory = max(self.peak_memory, other.peak_memory)
+        self.count += other.count
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return (f'StageRecord({self.stage!r}, {os.path.basename(self.filepath or "") or "run"}, '
+                f'{self.seconds*1e3:.1f} ms, {self.nbytes} B, peak {self.peak_memory} B)')
+
+
+class _NullStage():
+    ''' Stand-in for a StageRecord while no profile is active. '''
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def add_bytes(self, nbytes, decompressed_bytes=None):
+        pass
+
+_null_stage = _NullStage()
+
+
+class Profile():
+    '''
+    Stage records of a profiled call, see the module docstring.
+
+    Parameters
+    ----------
+    memory : bool, optional
+        Also record the peak (Python and numpy) memory of every stage, with tracemalloc.
+        This slows the allocations down. The default is False.
+    '''
+
+    def __init__(self, memory=False):
+        self.memory = memory
+        self.records = []
+        self.seconds = 0.0
+        self.current_filepath = None
+        self._stack = []
+
+    @contextmanager
+    def stage(self, name, filepath=None):
+        record = StageRecord(name, filepath)
+        if name == 'open':
+            self.current_filepath = filepath
+        if self.memory and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                self._stack[-1][1] = max(self._stack[-1][1], peak)
+            tracemalloc.reset_peak()
+            entry = [current, current]
+        else:
+            entry = [0, 0]
+        self._stack.append(entry)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record.seconds = time.perf_counter() - start
+            self._stack.pop()
+            if self.memory and tracemalloc.is_tracing():
+                peak = max(entry[1], tracemalloc.get_traced_memory()[1])
+                record.peak_memory = peak - entry[0]
+                if self._stack:
+                    self._stack[-1][1] = max(self._stack[-1][1], peak)
+            self.records.append(record)
+
+    def extend(self, records):
+        ''' Adds the records of e.g. a worker process. '''
+        self.records.extend(records)
+
+    def _totals(self, key):
+        totals = {}
+        for record in self.records:
+            k = key(record)
+            if k in totals:
+                totals[k].merge(record)
+            else:
+                totals[k] = StageRecord(record.stage, record.filepath, record.seconds, record.nbytes,
+                                        record.decompressed_bytes, record.peak_memory, record.count)
+        return totals
+
+    def aggregate(self):
+        '''
+        Totals of every stage over all files: {stage: StageRecord}, in the order of STAGES.
+        '''
+        totals = self._totals(lambda record: record.stage)
+        for record in totals.values():
+            record.filepath = None
+        order = {stage: i for i, stage in enumerate(STAGES)}
+        return {stage: totals[stage] for stage in sorted(totals, key=lambda stage: order.get(stage, len(order)))}
+
+    def per_file(self):
+        '''
+        Totals of every stage per file: {filepath: {stage: StageRecord}}. Stages of the
+        whole run are under the filepath None.
+        '''
+        output = {}
+        for (filepath, stage), record in self._totals(lambda record: (record.filepath, record.stage)).items():
+            output.setdefault(filepath, {})[stage] = record
+        return output
+
+    def bound(self):
+        '''
+        The dominant cost: 'io', 'decompression', 'python' or 'cache' (None without records).
+        'read' time counts as decompression when the data is compressed more than 2x.
+        '''
+        totals = self.aggregate()
+        if not totals:
+            return None
+        read = totals.get('read')
+        compressed = read is not None and read.decompressed_bytes > 2*max(read.nbytes, 1)
+        groups = {'io': 0.0, 'decompression': 0.0, 'python': 0.0, 'cache': 0.0}
+        for stage, record in totals.items():
+            if stage in ('open', 'ipc'):
+                groups['io'] += record.seconds
+            elif stage == 'read':
+                groups['decompression' if compressed else 'io'] += record.seconds
+            elif stage.startswith('cache'):
+                groups['cache'] += record.seconds
+            else:
+                groups['python'] += record.seconds
+        return max(groups, key=groups.get)
+
+    def as_dict(self):
+        return dict(seconds=self.seconds, bound=self.bound(),
+                    aggregate={stage: record.as_dict() for stage, record in self.aggregate().items()},
+                    records=[record.as_dict() for record in self.records])
+
+    def log_line(self):
+        '''
+        One line summary, e.g. "12.31 s (decompression-bound): read 9.80 s 1.2 GB, ..."
+        '''
+        parts = []
+        for stage, record in self.aggregate().items():
+            part = f'{stage} {record.seconds:.2f} s'
+            if record.nbytes:
+                part += f' {format_bytes(record.nbytes)}'
+            if record.peak_memory:
+                part += f' (peak {format_bytes(record.peak_memory)})'
+            parts.append(part)
+        return f'{self.seconds:.2f} s ({self.bound()}-bound): ' + ', '.join(parts)
+
+    def __repr__(self):
+        return f'Profile({self.log_line()})'
+
+
+def format_bytes(nbytes):
+    for unit in ['B', 'kB', 'MB', 'GB']:
+        if abs(nbytes) < 1000 or unit == 'GB':
+            return f'{nbytes:.0f} {unit}' if unit == 'B' else f'{nbytes:.1f} {unit}'
+        nbytes /= 1000
+
+
+def active():
+    ''' The active Profile, or None. '''
+    return _active_profile
+
+
+def current_file():
+    ''' The file opened last within the active profile (None without profile). '''
+    return None if _active_profile is None else _active_profile.current_filepath
+
+
+def nbytes_of(data):
+    ''' Bytes of the arrays (or objects with nbytes, e.g. Accumulators) in (nested lists/tuples of) data. '''
+    if isinstance(data, (list, tuple)):
+        return sum(nbytes_of(item) for item in data)
+    if hasattr(data, 'nbytes'):
+        return data.nbytes
+    return np.asarray(data).nbytes
+
+
+def stage(name, filepath=None):
+    '''
+    Context for one stage of the active profile; yields a StageRecord (or a do-nothing
+    stand-in without an active profile) whose add_bytes() records the bytes.
+    '''
+    if _active_profile is None:
+        return _null_stage
+    return _active_profile.stage(name, filepath)
+
+
+@contextmanager
+def profile(memory=False, log=False):
+    '''
+    Activates a new Profile for the calls within the context, see Run.profile().
+    With log=True, its log_line() is logged (logging.info) at the end.
+    '''
+    global _active_profile
+    previous = _active_profile
+    new_profile = Profile(memory=memory)
+    started_tracing = memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    _active_profile = new_profile
+    start = time.perf_counter()
+    try:
+        yield new_profile
+    finally:
+        new_profile.seconds = time.perf_counter() - start
+        _active_profile = previous
+        if started_tracing:
+            tracemalloc.stop()
+        if log:
+            logging.info(new_profile.log_line())
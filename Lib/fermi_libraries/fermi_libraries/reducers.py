@@ -0,0 +1,272 @@
+'''
+Per-shot reducers for the accumulation methods of Run, MultithreadRun and RunSets
+(keyword ``reducer``). A reducer is applied to the shots of every file and rule
+before they are summed, so that memory, inter-process traffic and cache size scale
+with the reduced data instead of the raw traces/images.
+
+A reducer is any picklable callable. If it has the attribute ``batch = True`` (see
+batch_filter()), it is called once with the array of shots (shots, ...) and must return
+(shots, ...reduced). Otherwise it is called shot by shot. The same protocol applies to
+``filter1``/``filter2`` of Run.give_rundata() and the moment sums.
+
+The reducer is part of the cache key through its ``cache_key`` (see cache_key()): the
+reducers below give a deterministic ``repr()`` which depends on all of their parameters.
+Any other callable (e.g. a lambda) has no such key, so its results are not cached.
+'''
+
+import hashlib
+import numpy as np
+from .common_functions import get_rebinner
+from .calibration_tools import tof_to_mq_operator, tof_to_ke_operator
+
+
+def _array_tag(array):
+    array = np.ascontiguousarray(array)
+    digest = hashlib.md5(array.tobytes()).hexdigest()[:12]
+    return f'{array.dtype}{list(array.shape)}:{digest}'
+
+
+def _shot_axis(axis):
+    ''' Axis of a single shot -> axis of the (shots, ...) array. '''
+    return axis if axis < 0 else axis+1
+
+
+def batch_filter(function):
+    '''
+    Decorator which declares that a filter/reducer function takes the array of all
+    shots (shots, ...) and returns (shots, ...filtered), instead of a single shot.
+
+    Examples
+    --------
+    >>> @batch_filter
+    ... def roi_sum(shots):
+    ...     return shots[:, 1000:2000].sum(axis=-1)
+    '''
+    function.batch = True
+    return function
+
+
+def is_batch(function):
+    ''' True if function is None (no filter) or declares to take batches of shots. '''
+    return function is None or getattr(function, 'batch', False)
+
+
+def cache_key(reducer):
+    '''
+    Deterministic key of reducer for the cache names (Reducer.cache_key), or None if
+    it has none.
+    '''
+    return getattr(reducer, 'cache_key', None)
+
+
+def apply_reducer(reducer, data):
+    '''
+    Applies the reducer to the shots in data (shots, ...). Also works for files
+    without any shot for the rule, where the reduced shape is taken from a
+    zero-valued shot.
+    '''
+    if reducer is None:
+        return data
+    data = np.asarray(data)
+    if is_batch(reducer):
+        return np.asarray(reducer(data))
+    if len(data) == 0:
+        reduced_shot = np.asarray(reducer(np.zeros(np.shape(data)[1:])))
+        return np.zeros((0,) + np.shape(reduced_shot))
+    return np.array([reducer(line) for line in data])
+
+
+class Reducer():
+    '''
+    Base class of the batch reducers. Subclasses implement reduce(data), with
+    data of shape (shots, ...), and _parameters() for the repr(), which is also
+    the cache_key.
+    '''
+
+    batch = True
+
+    def reduce(self, data):
+        raise NotImplementedError
+
+    def __call__(self, data):
+        return self.reduce(np.asarray(data))
+
+    def _parameters(self):
+        return []
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(self._parameters())})"
+
+    @property
+    def cache_key(self):
+        return repr(self)
+
+
+class Rebin(Reducer):
+    '''
+    Conservative rebinning of every shot from the bin centers x onto xnew (see
+    common_functions.Rebinner), e.g. to accumulate a coarser TOF trace.
+
+    Parameters
+    ----------
+    x, xnew : np.ndarray
+        Old and new bin centers.
+    axis : int, optional
+        Axis of a single shot to be rebinned. The default is -1.
+    '''
+
+    def __init__(self, x, xnew, axis=-1):
+        self.x = np.asarray(x, dtype=float)
+        self.xnew = np.asarray(xnew, dtype=float)
+        self.axis = axis
+
+    def operator(self):
+        return get_rebinner(self.x, self.xnew)
+
+    def reduce(self, data):
+        return self.operator().apply(data, axis=_shot_axis(self.axis))
+
+    def _parameters(self):
+        return [_array_tag(self.x), _array_tag(self.xnew), f'axis={self.axis}']
+
+
+class CalibratedRebin(Rebin):
+    '''
+    Rebinning of TOF traces straight onto a calibrated m/q or, when ke0 is given,
+    kinetic energy axis (see calibration_tools.tof_to_mq_operator() and
+    tof_to_ke_operator()). The Jacobian is included.
+
+    Parameters
+    ----------
+    tof : np.ndarray
+        TOF bin centers of the traces.
+    xnew : np.ndarray
+        New m/q or kinetic energy bin centers.
+    t0, propconst : float
+        Calibration constants.
+    ke0 : float, optional
+        Retardation energy of the kinetic energy calibration. The default is None,
+        i.e. m/q calibration.
+    axis : int, optional
+        Axis of a single shot to be rebinned. The default is -1.
+    '''
+
+    def __init__(self, tof, xnew, t0, propconst, ke0=None, axis=-1):
+        super().__init__(tof, xnew, axis=axis)
+        self.t0, self.propconst, self.ke0 = float(t0), float(propconst), ke0
+
+    def operator(self):
+        if self.ke0 is None:
+            return tof_to_mq_operator(self.x, self.xnew, self.t0, self.propconst)
+        return tof_to_ke_operator(self.x, self.xnew, self.t0, self.propconst, self.ke0)
+
+    def _parameters(self):
+        return super()._parameters() + [f't0={self.t0!r}', f'propconst={self.propconst!r}',
+                                        f'ke0={self.ke0!r}']
+
+
+class ROIIntegral(Reducer):
+    '''
+    Weighted sums of every shot over regions of interest. The output of a shot
+    has one value per ROI.
+
+    Parameters
+    ----------
+    masks : np.ndarray
+        Boolean or weight masks of shape (rois, *shot_shape), or shot_shape for a
+        single ROI.
+    '''
+
+    def __init__(self, masks):
+        self.masks = np.asarray(masks)
+
+    @classmethod
+    def from_ranges(cls, x, ranges):
+        '''
+        ROIs of 1-dimensional traces, given as (low, high) ranges of the axis x.
+        '''
+        x = np.asarray(x)
+        return cls(np.array([(x >= low) & (x < high) for low, high in ranges]))
+
+    def reduce(self, data):
+        shot_ndim = np.ndim(data)-1
+        masks = self.masks.reshape((-1,) + self.masks.shape[self.masks.ndim-shot_ndim:])
+        flat_data = data.reshape(len(data), int(np.prod(data.shape[1:])))
+        flat_masks = masks.reshape(len(masks), -1).astype(float)
+        return flat_data @ flat_masks.T
+
+    def _parameters(self):
+        return [_array_tag(self.masks)]
+
+
+class PixelBinning(Reducer):
+    '''
+    Sums blocks of pixels of every shot, e.g. factor=(2, 2) for 2x2 binning of
+    images. The last axes of a shot are binned; rows/columns which do not fill a
+    block are dropped.
+
+    Parameters
+    ----------
+    factor : tuple of int
+        Block size along each of the last len(factor) axes.
+    '''
+
+    def __init__(self, factor=(2, 2)):
+        self.factor = tuple(int(f) for f in np.atleast_1d(factor))
+
+    def reduce(self, data):
+        n = len(self.factor)
+        outer, inner = data.shape[:-n], data.shape[-n:]
+        binned = [size//f for size, f in zip(inner, self.factor)]
+        data = data[(Ellipsis,) + tuple(slice(0, b*f) for b, f in zip(binned, self.factor))]
+        blocks = [d for b, f in zip(binned, self.factor) for d in (b, f)]
+        data = data.reshape(outer + tuple(blocks))
+        return data.sum(axis=tuple(len(outer)+2*i+1 for i in range(n)))
+
+    def _parameters(self):
+        return [f'factor={self.factor}']
+
+
+class Projection(Reducer):
+    '''
+    Sums every shot along the given axes, e.g. axis=0 projects an image onto
+    its columns.
+
+    Parameters
+    ----------
+    axis : int or tuple of int
+        Axes of a single shot.
+    '''
+
+    def __init__(self, axis=0):
+        self.axis = tuple(int(a) for a in np.atleast_1d(axis))
+
+    def reduce(self, data):
+        return data.sum(axis=tuple(_shot_axis(a) for a in self.axis))
+
+    def _parameters(self):
+        return [f'axis={self.axis}']
+
+
+class Chain(Reducer):
+    '''
+    Applies the reducers one after the other, e.g. Chain(PixelBinning(), Projection(1)).
+    '''
+
+    def __init__(self, *reducers):
+        self.reducers = reducers
+
+    def reduce(self, data):
+        for reducer in self.reducers:
+            data = apply_reducer(reducer, data)
+        return data
+
+    def _parameters(self):
+        return [repr(reducer) for reducer in self.reducers]
+
+    @property
+    def cache_key(self):
+        # only as deterministic as every reducer of the chain
+        if any(cache_key(reducer) is None for reducer in self.reducers):
+            return None
+        return repr(self)
@@ -1,30 +1,29 @@
 import os
+import asyncio
 import warnings
 import time
 import logging
 import re
 import hashlib
+import uuid
 import numpy as np
 import h5py
 from functools import wraps
 from multiprocessing import cpu_count, pool
-from scipy.interpolate import interp1d
 from .dictionary_search import SearchClass, search_symbols as default_search_symbols
-from .common_functions import single_pass_moment_sums
+from .common_functions import single_pass_moment_sums, batch_moment_sums, binned_sums
+from .reducers import apply_reducer, is_batch, cache_key
+from .events import EventStore
+from . import profiling
+from . import planner
+from .catalog import RunCatalog
+from .backends import backend_context
+from .accumulators import Accumulator, merge_all
+from . import sketches
+from . import asynchronous
 
 # warnings.simplefilter('always', DeprecationWarning)
 
-def _make_zero_inner(array):
-    old_shape = np.array(np.shape(array))
-    temp_shape = old_shape[1:]
-    return np.zeros(temp_shape)
-
-def _make_zero_shape(array):
-    old_shape = np.array(np.shape(array))
-    temp_shape = old_shape[:]
-    temp_shape[0] = 0
-    return np.zeros(temp_shape)
-
 class KeywordWarning(UserWarning):
     pass
 
@@ -49,6 +48,26 @@ def default_keyword_functions(keyword, alias_func, DictionaryObject):
     '''
     return DictionaryObject[alias_func(keyword)]
 
+def cacheable(reducer):
+    '''
+    True if results with reducer can be cached: without a reducer, or with one which
+    has a deterministic cache key (see reducers.cache_key()). The repr() of other
+    callables (e.g. a lambda) changes between sessions, so they are never cached.
+    '''
+    return reducer is None or cache_key(reducer) is not None
+
+def cache_args(filepaths, dataname, back_sep, slu_sep, slice_range, rules, reducer=None):
+    '''
+    Arguments which identify a cache file. The cache key of the reducer is only added
+    when given, so that caches made without a reducer keep their names. A reducer
+    which is not cacheable() gets a new key every time, which matches no cache (the
+    callers do not use caches with it anyway).
+    '''
+    args = (filepaths, dataname, back_sep, slu_sep, slice_range, rules)
+    if reducer is not None:
+        args = args + (cache_key(reducer) if cacheable(reducer) else f'uncached-{uuid.uuid4().hex}',)
+    return args
+
 def get_cache_filepath(outdir, filepaths, args, datanames, use_cache=True):
     idf = hashlib.md5(str(args).encode()).hexdigest()
     filepath = f'{outdir}/{idf}.npz' # cache file unique to all arguments
@@ -73,35 +92,92 @@ def cache_function(outdir, filepaths, args, datanames, use_cache=True):
         os.mkdir(outdir)
     idf = hashlib.md5(str(args).encode()).hexdigest()
     cachefile = get_cache_filepath(outdir, filepaths, args, datanames, use_cache=use_cache)
-    if os.path.exists(cachefile):
+    with profiling.stage('cache_lookup') as record:
+        if os.path.exists(cachefile):
 
-        # latest = sorted(filepaths)[0]
-        # rawtime = os.path.getmtime(latest)
-        # cachetime = os.path.getmtime(cachefile)
-        # # load cached data if it is up-to-date
-        # if (cachetime > rawtime) and use_cache:
+            # latest = sorted(filepaths)[0]
+            # rawtime = os.path.getmtime(latest)
+            # cachetime = os.path.getmtime(cachefile)
+            # # load cached data if it is up-to-date
+            # if (cachetime > rawtime) and use_cache:
 
-        if use_cache:
+            if use_cache:
 
-            try:
-                loaded_dict = np.load(cachefile, allow_pickle=True)
-                output = [loaded_dict[name] for name in datanames]
-                return output
-            except KeyError as e:
-                print(f'{e}, remaking the cache file')
+                try:
+                    loaded_dict = np.load(cachefile, allow_pickle=True)
+                    output = [loaded_dict[name] for name in datanames]
+                    record.add_bytes(os.path.getsize(cachefile))
+                    return output
+                except KeyError as e:
+                    print(f'{e}, remaking the cache file')
 
     return cachefile
 
+def save_cache(cachefile, **arrays):
+    '''
+    Writes the arrays into the (compressed) cache file given by cache_function().
+    '''
+    with profiling.stage('cache_write') as record:
+        np.savez_compressed(cachefile, **arrays)
+        record.add_bytes(os.path.getsize(cachefile))
+
+
 
+def function_for_imap(filepath, run_object_attributes, dataname, back_sep=True, slu_sep=True, slice_range=None, rules=[None,],
+                      reducer=None, m2=False, _profile=None):
+    '''
+    The Accumulator of filepath (see Run.yield_accumulators_filedata()); None if the
+    file is skipped (unreadable, or without dataname).
 
-def function_for_imap(filepath, run_object_attributes, dataname, back_sep=True, slu_sep=True, slice_range=None, rules=[None,]):
+    With _profile (the memory flag of the profile of the parent process, see
+    starmap_profiled()), the stage records of this file are returned as well.
+    '''
+    if _profile is not None:
+        with profiling.profile(memory=_profile) as worker_profile:
+            output = function_for_imap(filepath, run_object_attributes, dataname, back_sep=back_sep,
+                                       slu_sep=slu_sep, slice_range=slice_range, rules=rules, reducer=reducer,
+                                       m2=m2)
+        return output, worker_profile.records
     run_object = Run([])
     for name, value in run_object_attributes:
         setattr(run_object, name, value)
-    data_sum, data_count = list(run_object.yield_sums_counts_filedata(
+    return next(run_object.yield_accumulators_filedata(
         dataname, back_sep=back_sep, slu_sep=slu_sep,
-        slice_range=slice_range, rules=rules, filepaths=[filepath,]))[0]
-    return data_sum, data_count
+        slice_range=slice_range, rules=rules, filepaths=[filepath,], reducer=reducer, m2=m2), None)
+
+def function_for_scan(filepath, run_object_attributes, dataname, scan_name, scan_edges, back_sep=False, slu_sep=False,
+                      slice_range=None, rules=[None,], reducer=None, _profile=None):
+    if _profile is not None:
+        with profiling.profile(memory=_profile) as worker_profile:
+            output = function_for_scan(filepath, run_object_attributes, dataname, scan_name, scan_edges,
+                                       back_sep=back_sep, slu_sep=slu_sep, slice_range=slice_range,
+                                       rules=rules, reducer=reducer)
+        return output, worker_profile.records
+    run_object = Run([])
+    for name, value in run_object_attributes:
+        setattr(run_object, name, value)
+    return run_object._scan_sums_counts(
+        dataname, scan_name, scan_edges, back_sep=back_sep, slu_sep=slu_sep,
+        slice_range=slice_range, rules=rules, filepaths=[filepath,], reducer=reducer)
+
+def function_for_sketch(filepath, run_object_attributes, dataname, back_sep=False, slu_sep=False, slice_range=None,
+                        rules=[None,], reducer=None, edges=None, size=sketches.DEFAULT_SIZE, _profile=None):
+    '''
+    The Histogram and QuantileSketch of filepath (see Run.yield_sketches_filedata()).
+    '''
+    if _profile is not None:
+        with profiling.profile(memory=_profile) as worker_profile:
+            output = function_for_sketch(filepath, run_object_attributes, dataname, back_sep=back_sep,
+                                         slu_sep=slu_sep, slice_range=slice_range, rules=rules, reducer=reducer,
+                                         edges=edges, size=size)
+        return output, worker_profile.records
+    run_object = Run([])
+    for name, value in run_object_attributes:
+        setattr(run_object, name, value)
+    file_sketches = list(run_object.yield_sketches_filedata(
+        dataname, back_sep=back_sep, slu_sep=slu_sep, slice_range=slice_range, rules=rules,
+        filepaths=[filepath,], reducer=reducer, edges=edges, size=size))
+    return file_sketches[0] if file_sketches else (None, None)
 
 from itertools import repeat
 
@@ -112,6 +188,31 @@ def starmap_with_kwargs(pool, fn, args_iter, kwargs_iter):
     args_for_starmap = zip(repeat(fn), args_iter, kwargs_iter)
     return pool.starmap(apply_args_and_kwargs, args_for_starmap)
 
+def starmap_profiled(pool, fn, args_iter, kwargs, num_processes):
+    '''
+    starmap_with_kwargs() with the same kwargs for every call. pool is a
+    multiprocessing.Pool or a backend (see the backends module). If a profile is active,
+    the workers (function_for_imap() or function_for_scan()) profile their files, their
+    records are added to the active profile, and the pool time not spent in the workers
+    is recorded as 'ipc', with the bytes of the returned results.
+    '''
+    active_profile = profiling.active()
+    if active_profile is None:
+        return starmap_with_kwargs(pool, fn, args_iter, repeat(kwargs))
+
+    start = time.perf_counter()
+    outputs = starmap_with_kwargs(pool, fn, args_iter, repeat(dict(kwargs, _profile=active_profile.memory)))
+    seconds = time.perf_counter() - start
+    results = []
+    worker_seconds = 0.0
+    for result, records in outputs:
+        active_profile.extend(records)
+        worker_seconds += sum(record.seconds for record in records)
+        results.append(result)
+    active_profile.extend([profiling.StageRecord(
+        'ipc', None, max(seconds - worker_seconds/max(num_processes, 1), 0.0), profiling.nbytes_of(results))])
+    return results
+
 
 class Run:
     '''
@@ -135,6 +236,7 @@ class Run:
         self.background_periods = None
         self.slu_offset = None
         self.slu_period = np.array([[2.,]])
+        self.catalog = None
 
     def keyword_alias(self, keyword):
         try:
@@ -158,6 +260,61 @@ class Run:
     def alias(self, name):
         return name
 
+    def profile(self, memory=False, log=False):
+        '''
+        Context which profiles the stages (file open, read/decompress, masks, rules,
+        reduction, cache, IPC) of the calls within it, per file and in aggregate. See the
+        profiling module.
+
+            with run.profile() as profile:
+                run.average_run_data('vmi', back_sep=True)
+            profile.aggregate(), profile.per_file(), profile.log_line()
+
+        Parameters
+        ----------
+        memory : bool, optional
+            Also record the peak memory of every stage (tracemalloc, slower). The default is False.
+        log : bool, optional
+            Log the summary line (logging.info) at the end. The default is False.
+        '''
+        return profiling.profile(memory=memory, log=log)
+
+    def estimate_memory(self, dataname, call='average_run_data', rules=[None,], slice_range=None,
+                        num_cores=1, num_files_per_cache=None):
+        '''
+        Estimated peak memory of a call, from the file metadata only, see
+        planner.estimate_memory(). Returns a planner.MemoryEstimate.
+        '''
+        return planner.estimate_memory(
+            planner.DatasetInfo.from_run(self, dataname), call=call, rules=rules,
+            slice_range=slice_range, num_cores=num_cores, num_files_per_cache=num_files_per_cache)
+
+    def plan(self, dataname, call='average_run_data', memory_budget=None, max_cores=None, **kwargs):
+        '''
+        Chooses num_cores and num_files_per_cache of a call (e.g. 'average_run_data')
+        which keep it within memory_budget (bytes; default: half the available memory),
+        see planner.plan(). The returned Plan shows the estimate, and runs the call when
+        called:
+
+            plan = run.plan('vmi', memory_budget=4e9, back_sep=True)
+            averages = plan()
+        '''
+        return planner.plan(self, dataname, call=call, memory_budget=memory_budget,
+                            max_cores=max_cores, **kwargs)
+
+    def get_catalog(self, check_files=True):
+        '''
+        The catalog of the per-file metadata (shots, datasets with shapes, dtypes,
+        chunking and compression, Background_Period, readability), see the catalog
+        module. It is made once, and only remade for changed files or filepaths. Without
+        check_files, the files are not checked for changes (no stat of every file), e.g.
+        where the entry of every file is checked when it is opened (see
+        RunCatalog.current()).
+        '''
+        if self.catalog is None or not self.catalog.is_current(self.filepaths, check_files=check_files):
+            self.catalog = RunCatalog(self.filepaths)
+        return self.catalog
+
     @_alias
     def _check_background_split(self, check_name, data=None):
         '''
@@ -175,13 +332,13 @@ class Run:
         True if splitting possible, else False.
         '''
 
-        for filepath in self.filepaths[:1]:
-            with h5py.File(filepath,'r') as file:
-                bunch_length = (file['bunches'].shape)[0]
-                if data is not None:
-                    data_length = data.shape[0]
-                else:
-                    data_length = (file[check_name].shape)[0]
+        catalog = self.get_catalog(check_files=False)
+        for filepath in catalog.readable()[:1]:
+            bunch_length = catalog[filepath].shots
+            if data is not None:
+                data_length = data.shape[0]
+            else:
+                data_length = catalog[filepath].dataset(check_name).shape[0]
             if bunch_length != data_length:
                 warnings.warn('dataset cannot be split into measurement and background, setting back_sep=False')
                 return False
@@ -202,23 +359,10 @@ class Run:
 
         '''
 
-        valid_paths = []
-        invalid_paths = []
-        for path in self.filepaths:
-            if not os.path.exists(path):  # check file location
-                invalid_paths.append(path)
-            else:
-                valid_paths.append(path)
-
-        valid_h5files = []
-        invalid_h5files = []
-        for path in valid_paths:
-            try: # try loading the file into an h5py.File object
-                with h5py.File(path) as file:
-                    _ = file.keys()
-                valid_h5files.append(path)
-            except (FileNotFoundError, OSError):
-                invalid_h5files.append(path)
+        catalog = self.get_catalog()
+        invalid_paths = [path for path in self.filepaths if catalog[path].identity is None]
+        invalid_h5files = [path for path in self.filepaths
+                           if catalog[path].identity is not None and not catalog[path].readable]
 
         return invalid_paths, invalid_h5files
 
@@ -244,6 +388,10 @@ class Run:
         a default value
         """
         if self.background_periods is None or len(self.background_periods)==0:
+            periods = self.get_catalog().background_periods(filepaths)
+            if periods and all(period is not None for period in periods):
+                self.background_periods = np.array(periods, dtype=float)
+                return self.background_periods
             try:
                 self.background_periods = np.array(self.simple_load_data(
                     'Background_Period',filepaths=filepaths),dtype=float)
@@ -370,20 +518,37 @@ class Run:
         error_in_all_files_flag = True  # if there is a problem loading a single file out of many, we will skip it
         if filepaths is None:
             filepaths = self.filepaths
+
+        def skip_file(filepath, e):
+            logging.warning(f'Error getting data with keyword ({name})) in file ({filepath}), skipping. Error message: {e}')
+            if filepath == self.filepaths[-1] and error_in_all_files_flag:
+                filepaths_string = '    ''\n    '.join(self.filepaths)
+                raise Exception(f"No data found with keyword ({name}).\nFiles checked:\
+\n    {filepaths_string}.\nError message: {e}")
+
+        # unreadable files, and files without the dataset, are skipped without opening them;
+        # only the file about to be opened is checked for changes
+        catalog = self.get_catalog(check_files=False)
+        check_datasets = self.keyword_functions is default_keyword_functions
         for filepath in filepaths:
             fore_out = []
             back_out = []
             fore_no_slu_out = []
             back_no_slu_out = []
-            with h5py.File(filepath,'r') as file:
+            entry = catalog.current(filepath)
+            if not entry.readable:
+                skip_file(filepath, entry.error)
+                continue
+            if check_datasets and not entry.has(name):
+                skip_file(filepath, KeyError(f'dataset ({name}) not in file'))
+                continue
+            with profiling.stage('open', filepath):
+                file = h5py.File(filepath,'r')
+            with file:
                 try:
                     h5_data = self.keyword_functions(name, lambda x:x, file)
                 except KeyError as e:
-                    logging.warning(f'Error getting data with keyword ({name})) in file ({filepath}), skipping. Error message: {e}')
-                    if filepath == self.filepaths[-1] and error_in_all_files_flag:
-                        filepaths_string = '    ''\n    '.join(self.filepaths)
-                        raise Exception(f"No data found with keyword ({name}).\nFiles checked:\
-\n    {filepaths_string}.\nError message: {e}")
+                    skip_file(filepath, e)
                     continue
                 
                 error_in_all_files_flag = False
@@ -401,7 +566,12 @@ class Run:
 
                 # we must load the while data; the chunks from FERMI data are too large, and
                 # slicing from the hdf5 data is actually much slower because of this!
-                h5_data = self.keyword_functions(name, lambda x:x, file)[()]
+                with profiling.stage('read', filepath) as record:
+                    h5_dataset = self.keyword_functions(name, lambda x:x, file)
+                    h5_data = h5_dataset[()]
+                    decompressed_bytes = np.asarray(h5_data).nbytes
+                    record.add_bytes(h5_dataset.id.get_storage_size() if isinstance(h5_dataset, h5py.Dataset)
+                                     else decompressed_bytes, decompressed_bytes)
                 h5_data = h5_data[slice_after_bunches]
 
                 # we will process all data as if everything were organized into shots.
@@ -442,10 +612,19 @@ class Run:
                 else:
                     reshape_data = lambda data: data
 
-                bunches = np.array(file['bunches'][()])
+                with profiling.stage('mask', filepath):
+                    bunches = np.array(file['bunches'][()])
 
-                is_background=self.background_from_bunches(bunches, filepaths=[filepath,])[0]
-                is_slu_off=self.slu_from_bunches(bunches, filepaths=[filepath,])[0]
+                    is_background=self.background_from_bunches(bunches, filepaths=[filepath,])[0]
+                    is_slu_off=self.slu_from_bunches(bunches, filepaths=[filepath,])[0]
+
+                    # the robust rule contexts (e.g. '(i0m@5)', see dictionary_search) take their
+                    # statistics separately for the shots of every condition
+                    shot_groups = np.zeros(len(bunches), dtype=int)
+                    if back_sep:
+                        shot_groups += np.asarray(is_background, dtype=int)
+                    if slu_sep:
+                        shot_groups += 2*np.asarray(is_slu_off, dtype=int)
 
                 def warnings_for_empty_sets(input_tuple, rule, background_period,
                                             back_sep=None,slu_sep=None, supress_warnings=True):
@@ -485,72 +664,79 @@ class Run:
                         back_no_slu = empty_array
                     return fore, back, fore_no_slu, back_no_slu
 
-                for rule in rules:
-
-                    filter_search = SearchClass(
-                            rule,
-                            operator_dict=search_symbols['operator_dict'],
-                            function_dict=search_symbols['function_dict'],
-                            context_dict=search_symbols['context_dict'],
-                            )
-
-                    alias_func = lambda keyword: self.keyword_alias(keyword)
-                    input_function = lambda keyword: self.keyword_functions(keyword, alias_func, file)
-                    rule_crit = filter_search.evaluate(input_function) + bunches!=bunches  # gets a bool array, with the shape of the bunches in the first dim
-
-                    if back_sep and slu_sep and self._check_background_split(name, data=h5_data):
-                        fore_slice = tuple([~is_background * ~is_slu_off * rule_crit,])
-                        back_slice = tuple([is_background * ~is_slu_off * rule_crit,])
-                        fore_no_slu_slice = tuple([~is_background * is_slu_off * rule_crit,])
-                        back_no_slu_slice = tuple([is_background * is_slu_off * rule_crit,])
-
-                        reshaped_data = reshape_data(h5_data)
-                        fore = reshaped_data[fore_slice]
-                        back = reshaped_data[back_slice]
-                        fore_no_slu= reshaped_data[fore_no_slu_slice]
-                        back_no_slu = reshaped_data[back_no_slu_slice]
-
-                        fore, back, fore_no_slu, back_no_slu = warnings_for_empty_sets(
-                                (fore, back, fore_no_slu, back_no_slu), rule,
-                                self.get_background_period(filepaths), back_sep=back_sep,slu_sep=slu_sep)
-
-                    elif back_sep and not slu_sep and self._check_background_split(name, data=h5_data):
-
-                        fore_slice = tuple([~is_background  * rule_crit,])
-                        back_slice = tuple([is_background  * rule_crit,])
-
-                        reshaped_data = reshape_data(h5_data)
-                        fore = reshaped_data[fore_slice]
-                        back = reshaped_data[back_slice]
-
-                        fore, back, fore_no_slu, back_no_slu = warnings_for_empty_sets(
-                                (fore, back, [], []), rule,
-                                self.get_background_period(filepaths), back_sep=back_sep,slu_sep=slu_sep)
-
-                    elif not back_sep and slu_sep and self._check_background_split(name, data=h5_data):
-                        fore_slice = tuple([ ~is_slu_off * rule_crit,])
-                        fore_no_slu_slice = tuple([ is_slu_off * rule_crit,])
+                # the same for every rule
+                can_split = (back_sep or slu_sep) and self._check_background_split(name, data=h5_data)
+                background_period = self.get_background_period(filepaths)
 
-                        reshaped_data = reshape_data(h5_data)
-
-                        fore = reshaped_data[fore_slice]
-                        fore_no_slu = reshaped_data[fore_no_slu_slice]
-
-                        fore, back, fore_no_slu, back_no_slu = warnings_for_empty_sets(
-                                (fore, [], fore_no_slu, []), rule,
-                                self.get_background_period(filepaths), back_sep=back_sep,slu_sep=slu_sep)
-
-                    else:
-                        if back_sep:
-                            warnings.warn(f'back_sep keyword not valid for this dataframe ({name})')
-                        if slu_sep:
-                            warnings.warn(f'slu_sep keyword not valid for this dataframe ({name})')
-                        all_slice = tuple([(is_background+~is_background)*rule_crit,])
-                        fore = reshape_data(h5_data[all_slice])
+                for rule in rules:
 
-                        fore, back, fore_no_slu, back_no_slu = warnings_for_empty_sets(
-                                (fore, [], [], []), rule,
-                                self.get_background_period(filepaths), back_sep=back_sep,slu_sep=slu_sep)
+                    with profiling.stage('rules', filepath):
+                        filter_search = SearchClass(
+                                rule,
+                                operator_dict=search_symbols['operator_dict'],
+                                function_dict=search_symbols['function_dict'],
+                                context_dict=search_symbols['context_dict'],
+                                )
+
+                        alias_func = lambda keyword: self.keyword_alias(keyword)
+                        input_function = lambda keyword: self.keyword_functions(keyword, alias_func, file)
+                        input_function.shot_groups = shot_groups
+                        rule_crit = filter_search.evaluate(input_function) + bunches!=bunches  # gets a bool array, with the shape of the bunches in the first dim
+
+                    with profiling.stage('select', filepath):
+                        if back_sep and slu_sep and can_split:
+                            fore_slice = tuple([~is_background * ~is_slu_off * rule_crit,])
+                            back_slice = tuple([is_background * ~is_slu_off * rule_crit,])
+                            fore_no_slu_slice = tuple([~is_background * is_slu_off * rule_crit,])
+                            back_no_slu_slice = tuple([is_background * is_slu_off * rule_crit,])
+
+                            reshaped_data = reshape_data(h5_data)
+                            fore = reshaped_data[fore_slice]
+                            back = reshaped_data[back_slice]
+                            fore_no_slu= reshaped_data[fore_no_slu_slice]
+                            back_no_slu = reshaped_data[back_no_slu_slice]
+
+                            fore, back, fore_no_slu, back_no_slu = warnings_for_empty_sets(
+                                    (fore, back, fore_no_slu, back_no_slu), rule,
+                                    background_period, back_sep=back_sep,slu_sep=slu_sep)
+
+                        elif back_sep and not slu_sep and can_split:
+
+                            fore_slice = tuple([~is_background  * rule_crit,])
+                            back_slice = tuple([is_background  * rule_crit,])
+
+                            reshaped_data = reshape_data(h5_data)
+                            fore = reshaped_data[fore_slice]
+                            back = reshaped_data[back_slice]
+
+                            fore, back, fore_no_slu, back_no_slu = warnings_for_empty_sets(
+                                    (fore, back, [], []), rule,
+                                    background_period, back_sep=back_sep,slu_sep=slu_sep)
+
+                        elif not back_sep and slu_sep and can_split:
+                            fore_slice = tuple([ ~is_slu_off * rule_crit,])
+                            fore_no_slu_slice = tuple([ is_slu_off * rule_crit,])
+
+                            reshaped_data = reshape_data(h5_data)
+
+                            fore = reshaped_data[fore_slice]
+                            fore_no_slu = reshaped_data[fore_no_slu_slice]
+
+                            fore, back, fore_no_slu, back_no_slu = warnings_for_empty_sets(
+                                    (fore, [], fore_no_slu, []), rule,
+                                    background_period, back_sep=back_sep,slu_sep=slu_sep)
+
+                        else:
+                            if back_sep:
+                                warnings.warn(f'back_sep keyword not valid for this dataframe ({name})')
+                            if slu_sep:
+                                warnings.warn(f'slu_sep keyword not valid for this dataframe ({name})')
+                            all_slice = tuple([(is_background+~is_background)*rule_crit,])
+                            fore = reshape_data(h5_data[all_slice])
+
+                            fore, back, fore_no_slu, back_no_slu = warnings_for_empty_sets(
+                                    (fore, [], [], []), rule,
+                                    background_period, back_sep=back_sep,slu_sep=slu_sep)
 
                     fore_out.append(fore)
                     back_out.append(back)
@@ -577,7 +763,8 @@ class Run:
         return compiled_data
 
     @_alias
-    def yield_sums_counts_filedata(self, dataname, back_sep=False, slu_sep=False, slice_range=None, rules=[None,], filepaths=None):
+    def yield_sums_counts_filedata(self, dataname, back_sep=False, slu_sep=False, slice_range=None, rules=[None,], filepaths=None,
+                                   reducer=None):
         '''
         Helps with computing the file-by-file or entire run average of the
         datasets.
@@ -594,6 +781,9 @@ class Run:
             DESCRIPTION. The default is None.
         rule : TYPE, optional
             DESCRIPTION. The default is None.
+        reducer : callable, optional
+            Applied to the shots of every file and rule before they are summed,
+            see the reducers module. The default is None.
 
         Returns
         -------
@@ -604,26 +794,51 @@ class Run:
 
         '''
 
-        for _, file_level_data in enumerate(self.yield_file_data(
+        for accumulator in self.yield_accumulators_filedata(
             dataname, back_sep=back_sep, slu_sep=slu_sep,
-            slice_range=slice_range, rules=rules, filepaths=filepaths)):
+            slice_range=slice_range, rules=rules, filepaths=filepaths, reducer=reducer):
 
-            file_data_sums = []
-            file_data_counts = []
-            for split_data in file_level_data:
-                split_data_sums = []
-                split_data_counts = []
-                for rule_data in split_data:
-                    rule_data_sum = np.sum(rule_data,axis=0)
-                    rule_data_count = len(rule_data)
+            yield accumulator.sum, accumulator.count
+
+    @_alias
+    def yield_accumulators_filedata(self, dataname, back_sep=False, slu_sep=False, slice_range=None, rules=[None,],
+                                    filepaths=None, reducer=None, m2=False):
+        '''
+        Same as Run.yield_sums_counts_filedata(), but yields the sums of every file as an
+        Accumulator (see the accumulators module), with M2 if m2.
+        '''
+
+        for file_level_data in self.yield_file_data(
+            dataname, back_sep=back_sep, slu_sep=slu_sep,
+            slice_range=slice_range, rules=rules, filepaths=filepaths):
+
+            with profiling.stage('reduce', profiling.current_file()):
+                reduced = [[apply_reducer(reducer, rule_data) for rule_data in split_data]
+                           for split_data in file_level_data]
+                accumulator = Accumulator.from_shots(reduced, m2=m2)
+
+            yield accumulator
+
+    @_alias
+    def yield_sketches_filedata(self, dataname, back_sep=False, slu_sep=False, slice_range=None, rules=[None,],
+                                filepaths=None, reducer=None, edges=None, size=sketches.DEFAULT_SIZE):
+        '''
+        Yields the Histogram (with edges; None without) and the QuantileSketch (with size
+        centroids; None if size is None) of the values of dataname of every file, see the
+        sketches module. The shots are not kept.
+        '''
 
-                    split_data_sums.append(rule_data_sum)
-                    split_data_counts.append(rule_data_count)
+        for file_level_data in self.yield_file_data(
+            dataname, back_sep=back_sep, slu_sep=slu_sep,
+            slice_range=slice_range, rules=rules, filepaths=filepaths):
 
-                file_data_sums.append(split_data_sums)
-                file_data_counts.append(split_data_counts)
+            with profiling.stage('reduce', profiling.current_file()):
+                reduced = [[apply_reducer(reducer, rule_data) for rule_data in split_data]
+                           for split_data in file_level_data]
+                histogram = None if edges is None else sketches.Histogram.from_values(edges, reduced)
+                quantile_sketch = None if size is None else sketches.QuantileSketch.from_values(reduced, size)
 
-            yield file_data_sums, file_data_counts
+            yield histogram, quantile_sketch
 
     @_alias
     def yield_moment_sums_filedata(self, dataname, back_sep=False, slu_sep=False, slice_range=None, rules=[None,], filepaths=None,
@@ -632,6 +847,11 @@ class Run:
         Helps with computing the file-by-file statistics of the
         datasets.
 
+        If filter1 or filter2 is a batch filter (or None, see reducers.is_batch()),
+        each filter is applied once per file and rule (see reducers.apply_reducer(),
+        a per-shot filter shot by shot) and the moment sums are taken of all shots at
+        once; if neither is, the shots are passed one by one through both filters.
+
         Output axes = (files, covar/sum/counts, conditions,  rules)
 
         Parameters
@@ -653,51 +873,56 @@ class Run:
             DESCRIPTION.
 
         '''
-        if filter1 is None:
-            filter1 = lambda x: x
-        if filter2 is None:
-            filter2 = lambda x: x
+        batch_filters = is_batch(filter1) or is_batch(filter2)
+        shot_filter1 = (lambda x: x) if filter1 is None else filter1
+        shot_filter2 = (lambda x: x) if filter2 is None else filter2
 
         for _, file_level_data in enumerate(self.yield_file_data(
             dataname, back_sep=back_sep, slu_sep=slu_sep,
             slice_range=slice_range, rules=rules, filepaths=filepaths)):
 
             file_data_covar, file_data_sum1, file_data_sum2, file_data_counts = [], [], [], []
-            for split_data in file_level_data:
-                split_data_covar, split_data_sum1, split_data_sum2, split_data_counts = [], [], [], []
-                for rule_data in split_data:
-                    if len(rule_data)>0:
-                        data_generator = (line for line in rule_data)
-                        weight = 1
-                    else:
-                        temp_data_shape = list(np.shape(rule_data))
-                        temp_data_shape[0]=1
-                        temp_data = np.zeros(shape=temp_data_shape)
-                        data_generator = (line for line in temp_data)
-                        weight = 0
-                    AnalysisDict = single_pass_moment_sums(
-                        data_generator,
-                        filter1=filter1, filter2=filter2,
-                        _weight=weight)
-                    rule_data_covar = AnalysisDict['covar_sum']
-                    rule_data_sum1 = AnalysisDict['x_sum']
-                    rule_data_sum2 = AnalysisDict['y_sum']
-                    rule_data_count = AnalysisDict['count']
-
-                    split_data_covar.append(rule_data_covar)
-                    split_data_sum1.append(rule_data_sum1)
-                    split_data_sum2.append(rule_data_sum2)
-                    split_data_counts.append(rule_data_count)
-
-                file_data_covar.append(split_data_covar)
-                file_data_sum1.append(split_data_sum1)
-                file_data_sum2.append(split_data_sum2)
-                file_data_counts.append(split_data_counts)
+            with profiling.stage('reduce', profiling.current_file()):
+                for split_data in file_level_data:
+                    split_data_covar, split_data_sum1, split_data_sum2, split_data_counts = [], [], [], []
+                    for rule_data in split_data:
+                        if batch_filters:
+                            AnalysisDict = batch_moment_sums(
+                                apply_reducer(filter1, rule_data), apply_reducer(filter2, rule_data))
+                        else:
+                            if len(rule_data)>0:
+                                data_generator = (line for line in rule_data)
+                                weight = 1
+                            else:
+                                temp_data_shape = list(np.shape(rule_data))
+                                temp_data_shape[0]=1
+                                temp_data = np.zeros(shape=temp_data_shape)
+                                data_generator = (line for line in temp_data)
+                                weight = 0
+                            AnalysisDict = single_pass_moment_sums(
+                                data_generator,
+                                filter1=shot_filter1, filter2=shot_filter2,
+                                _weight=weight)
+                        rule_data_covar = AnalysisDict['covar_sum']
+                        rule_data_sum1 = AnalysisDict['x_sum']
+                        rule_data_sum2 = AnalysisDict['y_sum']
+                        rule_data_count = AnalysisDict['count']
+
+                        split_data_covar.append(rule_data_covar)
+                        split_data_sum1.append(rule_data_sum1)
+                        split_data_sum2.append(rule_data_sum2)
+                        split_data_counts.append(rule_data_count)
+
+                    file_data_covar.append(split_data_covar)
+                    file_data_sum1.append(split_data_sum1)
+                    file_data_sum2.append(split_data_sum2)
+                    file_data_counts.append(split_data_counts)
 
             yield file_data_covar, file_data_sum1, file_data_sum2, file_data_counts
 
     @_alias
-    def give_sums_counts_filedata(self, dataname, back_sep=False, slu_sep=False, slice_range=None, rules=[None,], filepaths=None):
+    def give_sums_counts_filedata(self, dataname, back_sep=False, slu_sep=False, slice_range=None, rules=[None,], filepaths=None,
+                                  reducer=None):
         '''
         Similar to Run.yield_sums_counts_filedata(), but this method is a function and not a
         generator. Output axes are adapted accordingly.
@@ -709,7 +934,7 @@ class Run:
         output_counts = []
         for data_sums, data_counts in self.yield_sums_counts_filedata(
             dataname, back_sep=back_sep, slu_sep=slu_sep,
-            slice_range=slice_range, rules=rules, filepaths=filepaths):
+            slice_range=slice_range, rules=rules, filepaths=filepaths, reducer=reducer):
 
             output_sums.append(data_sums)
             output_counts.append(data_counts)
@@ -749,12 +974,12 @@ class Run:
 
         IMPORTANT: don't use this for Runs with many files; this function loads everything into memory!!!
 
+        filter1 is applied shot by shot, or once per file and rule to all shots if it is a
+        batch filter (see reducers.batch_filter()).
+
         Output axes: (conditions, rules)
         '''
 
-        if filter1 is None:
-            filter1 = lambda x: x
-
         if self.filepaths:
             outdir = self.filepaths[0].split('/rawdata/')[0] + '/work/get_rundata_cache'
             args = (filepaths, dataname, back_sep, slu_sep, slice_range, rules, filter1)
@@ -776,24 +1001,15 @@ class Run:
                     if len(rundata_collect[i])<=j:
                         rundata_collect[i].append([])
 
-                    def _get_data_from_filter(data, data_filter):
-                        ''' This allows filtering of non-zero AND zero-size arrays. '''
-
-                        filtered_data = [filter1(line) for line in data]
-
-
-                        if len(data)==0:
-                            filtered_data = _make_zero_shape(np.array([filter1(_make_zero_inner(data)),]))
-
-                        return filtered_data
-
-                    rundata_collect[i][j].append(_get_data_from_filter(rule_data, filter1))
+                    # filters both non-zero AND zero-size arrays, all shots at once for batch filters
+                    with profiling.stage('reduce', profiling.current_file()):
+                        rundata_collect[i][j].append(apply_reducer(filter1, rule_data))
         for i, _ in enumerate(rundata_collect):
             for j, _ in enumerate(rundata_collect[0]):
                 rundata_collect[i][j] = np.concatenate(rundata_collect[i][j],axis=0)
 
         if make_cache and self.filepaths:
-            np.savez_compressed(cache_return,
+            save_cache(cache_return,
                      rundata=np.array(rundata_collect, dtype=object),
                      )
 
@@ -802,11 +1018,17 @@ class Run:
     @_alias
     def average_run_data_weights(self, dataname, back_sep=False, slu_sep=False, slice_range=None,
                                  rules=[None,], use_cache=True, make_cache=True, _filepaths=None,
-                                 num_files_per_cache=None, 
+                                 num_files_per_cache=None, reducer=None,
                                  _save_incomplete_cache=False, _save_total_cache=True):
         '''
         Output axes: (sum/counts, conditions, rules, data)
+
+        With a reducer (see the reducers module), the shots are reduced file by file
+        before they are summed, and "data" has the reduced shape. Reducers without a
+        cache key (see cacheable()) are not cached.
         '''
+        if not cacheable(reducer):
+            use_cache = make_cache = False
         if _filepaths is None:
             filepaths = self.filepaths
         else:
@@ -816,7 +1038,7 @@ class Run:
         _files_per_cache = len(filepaths)
         look_for_filepaths = filepaths[:num_files_per_cache]
         outdir = filepaths[0].split('/rawdata/')[0] + '/work/average_run_data_weights_cache'
-        args = (filepaths, dataname, back_sep, slu_sep, slice_range, rules)
+        args = cache_args(filepaths, dataname, back_sep, slu_sep, slice_range, rules, reducer)
         cache_filepath = get_cache_filepath(
                         outdir, look_for_filepaths, args, ['rundata','runweights'], use_cache=use_cache)
         cache_found = os.path.exists(cache_filepath)
@@ -827,8 +1049,7 @@ class Run:
             num_files = len(filepaths)
             num_blocks = int(np.ceil(num_files / _files_per_cache))
             subsets_of_filepaths = [filepaths[i*_files_per_cache:(i+1)*_files_per_cache] for i in range(num_blocks)]
-            partial_run_avg = []
-            partial_run_weights = []
+            block_accumulators = []
             for subset in subsets_of_filepaths:
                 cache_is_incomplete = (len(subset)!=_files_per_cache)
                 save_if_incomplete = _save_incomplete_cache and cache_is_incomplete
@@ -837,64 +1058,41 @@ class Run:
                 block_avg, block_weights = self.average_run_data_weights(
                     dataname, back_sep=back_sep, slu_sep=slu_sep, slice_range=slice_range,
                     rules=rules, use_cache=use_cache, make_cache=save_part_cache, _filepaths=subset,
-                    num_files_per_cache=None,
+                    num_files_per_cache=None, reducer=reducer,
                     _save_incomplete_cache=True
                 )
-                partial_run_avg.append(block_avg)
-                partial_run_weights.append(block_weights)
-
-            run_file_weights = np.array(partial_run_weights) 
-            run_file_avg = np.array(partial_run_avg)
-
-            data_dim = np.ndim(run_file_avg)
-            weights_dim = np.ndim(run_file_weights)
-            match_dim_weights = np.expand_dims(run_file_weights, axis=[-(i+1) for i in range(data_dim-weights_dim)])
+                block_accumulators.append(Accumulator.from_average(block_avg, block_weights))
+            run_accumulator = merge_all(block_accumulators, copy=False)
 
-            run_file_sum = run_file_avg * match_dim_weights
-            run_file_data = run_file_sum
-            
             cache_return = cache_function(outdir, self.filepaths, args, ['rundata','runweights'], use_cache=False)
 
         # this is the original path without recursion
         else:
             if filepaths:
                 outdir = filepaths[0].split('/rawdata/')[0] + '/work/average_run_data_weights_cache'
-                args = (filepaths, dataname, back_sep, slu_sep, slice_range, rules)
+                args = cache_args(filepaths, dataname, back_sep, slu_sep, slice_range, rules, reducer)
                 cache_return = cache_function(outdir, filepaths, args, ['rundata','runweights'], use_cache=use_cache)
                 if not isinstance(cache_return, str):
                     # print(f'found a cache with {len(filepaths)} files')
                     return cache_return
 
-        compiled_data = []
-        compiled_count = []
-        run_average = []
-        run_weight = []
         if num_files_per_cache is None:
-            run_file_data, run_file_weights = self.give_sums_counts_filedata(
+            run_accumulator = merge_all(self.yield_accumulators_filedata(
                                     dataname, back_sep=back_sep, slu_sep=slu_sep,
-                                    slice_range=slice_range, rules=rules)
+                                    slice_range=slice_range, rules=rules, reducer=reducer,
+                                    filepaths=_filepaths), copy=False)
+
+        if run_accumulator is None:
+            run_average, run_weight = [], []
+        else:
+            run_average, run_weight = list(run_accumulator.mean()), list(run_accumulator.count)
 
-        for filedata_sum, filedata_count in zip(run_file_data, run_file_weights):
-            for i, (split_sum, split_count) in enumerate(zip(filedata_sum, filedata_count)):
-                if len(compiled_data)<=i:
-                    compiled_data.append([])
-                    compiled_count.append([])
-                compiled_data[i].append(split_sum)
-                compiled_count[i].append(split_count)
-        for split_data, split_count in zip(compiled_data, compiled_count):
-            data_dim = np.ndim(split_data)
-            match_dim_split_count = np.expand_dims(split_count, axis=[-(i+1) for i in range(data_dim-2)])
-            divisor = np.sum(match_dim_split_count, axis=0)
-            divisor[divisor==0]=1
-            run_average.append(np.sum(split_data, axis=0)/divisor)
-            run_weight.append(np.sum(split_count, axis=0))
-        
         if make_cache and (_filepaths is not None) and filepaths:
             rundata = np.array(run_average, dtype=float)
             runweights = np.array(run_weight, dtype=int)
             print(f'_filepath is list: saving cache with {len(filepaths)} files')
 
-            np.savez_compressed(cache_return,
+            save_cache(cache_return,
                      rundata=rundata,
                      runweights=runweights,
                      )
@@ -904,7 +1102,7 @@ class Run:
             runweights = np.array(run_weight, dtype=int)
             print(f'_filepath is None: saving cache with {len(filepaths)} files')
 
-            np.savez_compressed(cache_return,
+            save_cache(cache_return,
                      rundata=rundata,
                      runweights=runweights,
                      )
@@ -938,66 +1136,20 @@ class Run:
                 warnings.warn("Cache used! If this should not be the case, set the 'use_cache' keyword argument to False!")
                 return cache_return
 
-        run_file_covar, run_file_sum1, run_file_sum2, run_file_weights = self.give_moment_sums_filedata(
-                                dataname, back_sep=back_sep, slu_sep=slu_sep,
-                                slice_range=slice_range, rules=rules,
-                                filter1=filter1, filter2=filter2)
-
-        compiled_covar, compiled_sum1, compiled_sum2, compiled_count = [], [], [], []
-        run_covar, run_sum1, run_sum2, run_weight = [], [], [], []
-        for filedata_covar, filedata_sum1, filedata_sum2, filedata_count in zip(run_file_covar, run_file_sum1, run_file_sum2, run_file_weights):
-            for i, (split_covar, split_sum1, split_sum2, split_count) in enumerate(zip(filedata_covar, filedata_sum1, filedata_sum2, filedata_count)):
-                if len(compiled_sum1)<=i:
-                    compiled_covar.append([])
-                    compiled_sum1.append([])
-                    compiled_sum2.append([])
-                    compiled_count.append([])
-                compiled_covar[i].append(split_covar)
-                compiled_sum1[i].append(split_sum1)
-                compiled_sum2[i].append(split_sum2)
-                compiled_count[i].append(split_count)
-        for split_covar, split_sum1, split_sum2, split_count in zip(compiled_covar, compiled_sum1, compiled_sum2, compiled_count):
-            for i, (part_comoment_list, part_sum1_list, part_sum2_list, part_count_list) in enumerate(zip(split_covar, split_sum1, split_sum2, split_count)):
-                if i==0:
-                    temp_comoment = np.array(part_comoment_list[:])
-                    temp_sum1 = np.array(part_sum1_list)
-                    temp_sum2 = np.array(part_sum2_list)
-                    temp_count = np.array(part_count_list)
-                    continue
-
-                part_comoment = np.array(part_comoment_list)
-                part_sum1 = np.array(part_sum1_list)
-                part_sum2 = np.array(part_sum2_list)
-                part_count = np.array(part_count_list)
-
-                temp_zero_part_nonzero = (temp_count==0)*(part_count!=0)
-                temp_nonzero_part_nonzero = (temp_count!=0)*(part_count!=0)
-                update_comoment = np.zeros(shape=np.shape(temp_comoment))
-                update_comoment[temp_zero_part_nonzero] = part_comoment[temp_zero_part_nonzero]
-                update_comoment[temp_nonzero_part_nonzero] = (
-                    ((temp_count*part_count)/(temp_count+part_count))[:,np.newaxis,np.newaxis]
-                    * (temp_sum1/temp_count[:,np.newaxis]-part_sum1/part_count[:,np.newaxis])[:,np.newaxis,:]
-                    * (temp_sum2/temp_count[:,np.newaxis]-part_sum2/part_count[:,np.newaxis])[:,:,np.newaxis]
-                )[temp_nonzero_part_nonzero]
-
-                temp_comoment += update_comoment
-                temp_sum1 += part_sum1
-                temp_sum2 += part_sum2
-                temp_count += part_count
-
-            # run_covar.append(np.sum(split_covar, axis=0))
-            # run_sum1.append(np.sum(split_sum1, axis=0))
-            # run_sum2.append(np.sum(split_sum2, axis=0))
-            # run_weight.append(np.sum(split_count, axis=0))
-
-            run_covar.append(temp_comoment)
-            run_sum1.append(temp_sum1)
-            run_sum2.append(temp_sum2)
-            run_weight.append(temp_count)
+        run_accumulator = merge_all((
+            Accumulator(file_sum1, file_counts, sum2=file_sum2, comoment=file_covar)
+            for file_covar, file_sum1, file_sum2, file_counts in self.yield_moment_sums_filedata(
+                dataname, back_sep=back_sep, slu_sep=slu_sep,
+                slice_range=slice_range, rules=rules, filepaths=_filepaths,
+                filter1=filter1, filter2=filter2)), copy=False)
+        if run_accumulator is None:
+            return [], [], [], []
+        run_covar, run_sum1, run_sum2, run_weight = (list(run_accumulator.comoment), list(run_accumulator.sum),
+                                                     list(run_accumulator.sum2), list(run_accumulator.count))
 
         if make_cache and self.filepaths:
 
-            np.savez_compressed(cache_return, 
+            save_cache(cache_return, 
                      runcovar=np.array(run_covar, dtype=float), 
                      runsum1=np.array(run_sum1, dtype=float), 
                      runsum2=np.array(run_sum2, dtype=float), 
@@ -1009,7 +1161,7 @@ class Run:
     @_alias
     def average_run_data(self, dataname, back_sep=False, slu_sep=False, slice_range=None,
                          rules=[None,], use_cache=True, make_cache=True, num_files_per_cache=None,
-                         _save_total_cache=True):
+                         reducer=None, _save_total_cache=True):
         '''
         Same as Run.saverage_run_data_weights(), but just returning the "data" part of the tuple)
 
@@ -1020,18 +1172,212 @@ class Run:
                 dataname, back_sep=back_sep, slu_sep=slu_sep,
                 slice_range=slice_range, rules=rules,
                 use_cache=use_cache, make_cache=make_cache,
-                num_files_per_cache=num_files_per_cache, _save_total_cache=_save_total_cache)[0]
+                num_files_per_cache=num_files_per_cache, reducer=reducer,
+                _save_total_cache=_save_total_cache)[0]
+
+    def _file_accumulators(self, dataname, filepaths, back_sep=False, slu_sep=False, slice_range=None,
+                           rules=[None,], reducer=None, m2=False, backend=None):
+        '''
+        The Accumulators of filepaths (in order, one per file: None for a skipped file),
+        on backend if given.
+        '''
+        if backend is None:
+            return [next(self.yield_accumulators_filedata(
+                dataname, back_sep=back_sep, slu_sep=slu_sep, slice_range=slice_range, rules=rules,
+                filepaths=[filepath], reducer=reducer, m2=m2), None) for filepath in filepaths]
+        args_iter = zip(filepaths, repeat(self.object_attributes()), repeat(dataname))
+        kwargs = dict(back_sep=back_sep, slu_sep=slu_sep, slice_range=slice_range, rules=rules, reducer=reducer,
+                      m2=m2)
+        return starmap_profiled(backend, function_for_imap, args_iter, kwargs, backend.num_workers)
+
+    @_alias
+    def run_accumulator(self, dataname, back_sep=False, slu_sep=False, slice_range=None, rules=[None,],
+                        use_cache=True, make_cache=True, num_files_per_cache=None, reducer=None, m2=False,
+                        backend=None):
+        '''
+        The Accumulator (see the accumulators module) of all files of the Run, with M2 if
+        m2. The files are summed in cache blocks of num_files_per_cache files (default:
+        all files); every complete block is cached (average, weights and M2) in
+        work/average_run_data_weights_cache, so without m2 the caches are shared with
+        Run.average_run_data_weights(). With a backend (see the backends module), the
+        uncached files are processed on its workers.
+        '''
+        if not self.filepaths:
+            return None
+        if not cacheable(reducer):
+            use_cache = make_cache = False
+        block_accumulators, uncached_blocks = self._cached_blocks(
+            dataname, back_sep=back_sep, slu_sep=slu_sep, slice_range=slice_range, rules=rules,
+            use_cache=use_cache, num_files_per_cache=num_files_per_cache, reducer=reducer, m2=m2)
+        uncached_filepaths = [filepath for block, _ in uncached_blocks for filepath in block]
+        file_accumulators = self._file_accumulators(
+            dataname, uncached_filepaths, back_sep=back_sep, slu_sep=slu_sep, slice_range=slice_range,
+            rules=rules, reducer=reducer, m2=m2, backend=backend)
+        return self._merge_blocks(block_accumulators, uncached_blocks, file_accumulators,
+                                  make_cache=make_cache, num_files_per_cache=num_files_per_cache, m2=m2)
+
+    def _cached_blocks(self, dataname, back_sep=False, slu_sep=False, slice_range=None, rules=[None,],
+                       use_cache=True, num_files_per_cache=None, reducer=None, m2=False):
+        '''
+        The Accumulators of the cached blocks of Run.run_accumulator(), and the
+        (files, cache file) of the uncached ones.
+        '''
+        filepaths = self.filepaths
+        outdir = filepaths[0].split('/rawdata/')[0] + '/work/average_run_data_weights_cache'
+        datanames = ['rundata', 'runweights'] + (['runm2'] if m2 else [])
+        files_per_block = len(filepaths) if num_files_per_cache is None else num_files_per_cache
+
+        block_accumulators = []
+        uncached_blocks = []
+        for i in range(0, len(filepaths), files_per_block):
+            block = filepaths[i:i+files_per_block]
+            args = cache_args(block, dataname, back_sep, slu_sep, slice_range, rules, reducer) + (('m2',) if m2 else ())
+            cache_return = cache_function(outdir, block, args, datanames, use_cache=use_cache)
+            if isinstance(cache_return, str):
+                uncached_blocks.append((block, cache_return))
+            else:
+                block_accumulators.append(Accumulator.from_average(*cache_return))
+        return block_accumulators, uncached_blocks
+
+    def _merge_blocks(self, block_accumulators, uncached_blocks, file_accumulators, make_cache=True,
+                      num_files_per_cache=None, m2=False):
+        '''
+        Merges the file Accumulators (one per file, None for skipped files) of the
+        uncached blocks into the Accumulator of Run.run_accumulator(), and caches the
+        complete blocks without skipped files.
+        '''
+        files_per_block = len(self.filepaths) if num_files_per_cache is None else num_files_per_cache
+        _count = 0
+        for block, cache_return in uncached_blocks:
+            block_files = file_accumulators[_count:_count+len(block)]
+            _count += len(block)
+            block_accumulator = merge_all(block_files, copy=False)
+            if block_accumulator is None:
+                continue
+            block_accumulators.append(block_accumulator)
+            if make_cache and len(block) == files_per_block and None not in block_files:
+                save_cache(cache_return, rundata=block_accumulator.mean(), runweights=block_accumulator.count,
+                           **({'runm2': block_accumulator.m2} if m2 else {}))
+
+        return merge_all(block_accumulators, copy=False)
+
+    async def _file_accumulators_async(self, dataname, filepaths, back_sep=False, slu_sep=False,
+                                       slice_range=None, rules=[None,], reducer=None, m2=False, backend=None):
+        '''
+        The Accumulators of filepaths (in order, None for skipped files), with every file
+        submitted to backend (see the asynchronous module).
+        '''
+        args_iter = zip(filepaths, repeat(self.object_attributes()), repeat(dataname))
+        kwargs = dict(back_sep=back_sep, slu_sep=slu_sep, slice_range=slice_range, rules=rules, reducer=reducer,
+                      m2=m2)
+        async with asynchronous.backend_scope(backend) as task_backend:
+            return await asynchronous.starmap(task_backend, function_for_imap, args_iter, kwargs)
+
+    @_alias
+    async def run_accumulator_async(self, dataname, back_sep=False, slu_sep=False, slice_range=None,
+                                    rules=[None,], use_cache=True, make_cache=True, num_files_per_cache=None,
+                                    reducer=None, m2=False, backend=None):
+        '''
+        Awaitable Run.run_accumulator(), with the same caches. The uncached files are
+        submitted one by one to backend, and cancelling the call drops the files which have
+        not started (see the asynchronous module).
+        '''
+        if not self.filepaths:
+            return None
+        if not cacheable(reducer):
+            use_cache = make_cache = False
+        block_accumulators, uncached_blocks = await asyncio.to_thread(
+            self._cached_blocks, dataname, back_sep=back_sep, slu_sep=slu_sep, slice_range=slice_range,
+            rules=rules, use_cache=use_cache, num_files_per_cache=num_files_per_cache, reducer=reducer, m2=m2)
+        uncached_filepaths = [filepath for block, _ in uncached_blocks for filepath in block]
+        file_accumulators = await self._file_accumulators_async(
+            dataname, uncached_filepaths, back_sep=back_sep, slu_sep=slu_sep, slice_range=slice_range,
+            rules=rules, reducer=reducer, m2=m2, backend=backend)
+        return await asyncio.to_thread(
+            self._merge_blocks, block_accumulators, uncached_blocks, file_accumulators, make_cache=make_cache,
+            num_files_per_cache=num_files_per_cache, m2=m2)
+
+    @_alias
+    async def average_run_data_weights_async(self, dataname, back_sep=False, slu_sep=False, slice_range=None,
+                                             rules=[None,], use_cache=True, make_cache=True,
+                                             num_files_per_cache=None, reducer=None, backend=None):
+        '''
+        Awaitable Run.average_run_data_weights(), see Run.run_accumulator_async().
+
+        Output axes: (average/weights, conditions, rules, data)
+        '''
+        accumulator = await self.run_accumulator_async(
+            dataname, back_sep=back_sep, slu_sep=slu_sep, slice_range=slice_range, rules=rules,
+            use_cache=use_cache, make_cache=make_cache, num_files_per_cache=num_files_per_cache,
+            reducer=reducer, backend=backend)
+        if accumulator is None:
+            return [], []
+        return list(accumulator.mean()), list(accumulator.count)
+
+    @_alias
+    async def average_run_data_async(self, dataname, back_sep=False, slu_sep=False, slice_range=None,
+                                     rules=[None,], use_cache=True, make_cache=True, num_files_per_cache=None,
+                                     reducer=None, backend=None):
+        '''
+        Awaitable Run.average_run_data(), see Run.run_accumulator_async().
+
+        Output axes: (conditions, rules, data)
+        '''
+        return (await self.average_run_data_weights_async(
+            dataname, back_sep=back_sep, slu_sep=slu_sep, slice_range=slice_range, rules=rules,
+            use_cache=use_cache, make_cache=make_cache, num_files_per_cache=num_files_per_cache,
+            reducer=reducer, backend=backend))[0]
+
+    @_alias
+    async def average_run_data_errors_async(self, dataname, back_sep=False, slu_sep=False, slice_range=None,
+                                            rules=[None,], use_cache=True, make_cache=True,
+                                            num_files_per_cache=None, reducer=None, ddof=1, backend=None):
+        '''
+        Awaitable Run.average_run_data_errors(), see Run.run_accumulator_async().
+
+        Output axes: (average/std/standard error/weights, conditions, rules, data)
+        '''
+        accumulator = await self.run_accumulator_async(
+            dataname, back_sep=back_sep, slu_sep=slu_sep, slice_range=slice_range, rules=rules,
+            use_cache=use_cache, make_cache=make_cache, num_files_per_cache=num_files_per_cache,
+            reducer=reducer, m2=True, backend=backend)
+        if accumulator is None:
+            return [], [], [], []
+        return (list(accumulator.mean()), list(accumulator.std(ddof)), list(accumulator.standard_error(ddof)),
+                list(accumulator.count))
 
+    @_alias
+    def average_run_data_errors(self, dataname, back_sep=False, slu_sep=False, slice_range=None,
+                                rules=[None,], use_cache=True, make_cache=True, num_files_per_cache=None,
+                                reducer=None, ddof=1, backend=None):
+        '''
+        Same as Run.average_run_data_weights(), but with the standard deviation of the
+        shots and the standard error of the average, from the same pass over the files
+        (see Run.run_accumulator(), also for backend). Both are NaN where there are not
+        more than ddof shots.
+
+        Output axes: (average/std/standard error/weights, conditions, rules, data)
+        '''
+        accumulator = self.run_accumulator(
+            dataname, back_sep=back_sep, slu_sep=slu_sep, slice_range=slice_range, rules=rules,
+            use_cache=use_cache, make_cache=make_cache, num_files_per_cache=num_files_per_cache,
+            reducer=reducer, m2=True, backend=backend)
+        if accumulator is None:
+            return [], [], [], []
+        return (list(accumulator.mean()), list(accumulator.std(ddof)), list(accumulator.standard_error(ddof)),
+                list(accumulator.count))
 
     @_alias
-    def average_file_data(self, dataname, back_sep=False, slu_sep=False, slice_range=None, rules=[None,]):
+    def average_file_data(self, dataname, back_sep=False, slu_sep=False, slice_range=None, rules=[None,],
+                          reducer=None):
         '''
         Output axes: (file, condition, rules, data)
         '''
 
         file_average = []
         run_sums, run_counters = self.give_sums_counts_filedata(
-                dataname, back_sep=back_sep, slu_sep=slu_sep, slice_range=slice_range, rules=rules)
+                dataname, back_sep=back_sep, slu_sep=slu_sep, slice_range=slice_range, rules=rules,
+                reducer=reducer)
         for file_sums, file_counters in zip(run_sums, run_counters):
             for i, (split_sum, split_counter) in enumerate(zip(file_sums, file_counters)):
                 if len(file_average)<=i:
@@ -1041,6 +1387,189 @@ class Run:
 
         return file_average
 
+    @_alias
+    def give_events(self, dataname, threshold=0, back_sep=False, slu_sep=False, slice_range=None,
+                    rules=[None,], use_cache=True, make_cache=True):
+        '''
+        Event-mode version of give_rundata() for low-count camera frames (e.g. 'vmi'): every
+        frame is thresholded, and only its hits are kept (see events.EventStore). Events are
+        cached per file, so re-filtering, recentring and re-binning never read the raw
+        frames again.
+
+        Note: because of the keyword aliasing, threshold etc. must be given as keywords.
+
+        Output axes: (conditions, rules), with one EventStore (of all files) each
+        '''
+
+        output = None
+        for filepath in self.filepaths:
+            outdir = filepath.split('/rawdata/')[0] + '/work/give_events_cache'
+            args = cache_args([filepath,], dataname, back_sep, slu_sep, slice_range, rules) + (threshold,)
+            fields = ['shape', 'indptr', 'y', 'x', 'amplitude']
+            names = [f'{field}_{i}_{j}' for i in range(4) for j in range(len(rules)) for field in fields]
+            cache_return = cache_function(outdir, [filepath,], args, names, use_cache=use_cache)
+
+            if not isinstance(cache_return, str):
+                loaded = iter(cache_return)
+                file_events = [[EventStore(*[next(loaded) for _ in fields]) for _ in rules] for _ in range(4)]
+            else:
+                file_data = list(self.yield_file_data(
+                    dataname, back_sep=back_sep, slu_sep=slu_sep,
+                    slice_range=slice_range, rules=rules, filepaths=[filepath,]))
+                if not file_data:
+                    continue
+                with profiling.stage('reduce', filepath):
+                    file_events = [[EventStore.from_frames(rule_data, threshold) for rule_data in split_data]
+                                   for split_data in file_data[0]]
+                if make_cache:
+                    save_cache(cache_return, **{
+                        f'{field}_{i}_{j}': getattr(events, field) if field!='shape' else np.array(events.shape)
+                        for i, split_events in enumerate(file_events)
+                        for j, events in enumerate(split_events)
+                        for field in fields})
+
+            if output is None:
+                output = [[[events] for events in split_events] for split_events in file_events]
+            else:
+                for i, split_events in enumerate(file_events):
+                    for j, events in enumerate(split_events):
+                        output[i][j].append(events)
+
+        if output is None:
+            raise Exception(f'No data found with keyword ({dataname}).')
+        return [[EventStore.concatenate(events) for events in split_events] for split_events in output]
+
+    def object_attributes(self):
+        '''
+        The (name, value) pairs of the attributes of this object, which are used to
+        rebuild it in worker processes (see function_for_imap()).
+        '''
+        import inspect
+        attributes = inspect.getmembers(self, lambda a:not(inspect.isroutine(a)))
+        return [a for a in attributes if not(a[0].startswith('__') and a[0].endswith('__'))]
+
+    def scan_sums_counts_filedata(self, dataname, scan_name, scan_edges, back_sep=False, slu_sep=False,
+                                  slice_range=None, rules=[None,], filepaths=None, reducer=None):
+        '''
+        Sums the shots of dataname into the bins (scan_edges) of the per-shot value of
+        scan_name (e.g. 'delay'), over all files in filepaths. If scan_name only has one
+        value per file, all shots of the file go into its bin.
+
+        Output axes: (sums/counts, conditions, rules, scan bins, data)
+        '''
+        if filepaths is None:
+            filepaths = self.filepaths
+        run_sums, run_counts = self._scan_sums_counts(
+            dataname, scan_name, scan_edges, back_sep=back_sep, slu_sep=slu_sep, slice_range=slice_range,
+            rules=rules, filepaths=filepaths, reducer=reducer)
+        if run_sums is None:
+            raise Exception(f'No data found with keywords ({dataname}, {scan_name}) in ({filepaths}).')
+        return run_sums, run_counts
+
+    def _scan_sums_counts(self, dataname, scan_name, scan_edges, back_sep=False, slu_sep=False,
+                          slice_range=None, rules=[None,], filepaths=None, reducer=None):
+        '''
+        Run.scan_sums_counts_filedata(), but (None, None) if no file has the data, e.g.
+        for a single skipped file (see function_for_scan()).
+        '''
+        dataname = self.keyword_alias(dataname)
+        scan_name = self.keyword_alias(scan_name)
+        if filepaths is None:
+            filepaths = self.filepaths
+
+        run_sums, run_counts = None, None
+        for filepath in filepaths:
+            file_data = list(self.yield_file_data(
+                dataname, back_sep=back_sep, slu_sep=slu_sep,
+                slice_range=slice_range, rules=rules, filepaths=[filepath,]))
+            file_scan = list(self.yield_file_data(
+                scan_name, back_sep=back_sep, slu_sep=slu_sep,
+                rules=rules, filepaths=[filepath,]))
+            if not file_data or not file_scan:
+                continue
+            file_data, file_scan = file_data[0], file_scan[0]
+
+            per_shot = all(len(rule_scan)==len(rule_data)
+                           for split_data, split_scan in zip(file_data, file_scan)
+                           for rule_data, rule_scan in zip(split_data, split_scan))
+            # one value for the whole file, from any condition and rule which has it
+            file_value = next((np.ravel(rule_scan)[0] for split_scan in file_scan for rule_scan in split_scan
+                               if np.size(rule_scan)), np.nan)
+
+            with profiling.stage('reduce', filepath):
+                file_sums, file_counts = [], []
+                for split_data, split_scan in zip(file_data, file_scan):
+                    split_sums, split_counts = [], []
+                    for j, (rule_data, rule_scan) in enumerate(zip(split_data, split_scan)):
+                        rule_data = apply_reducer(reducer, rule_data)
+                        if per_shot:
+                            scan_values = np.asarray(rule_scan, dtype=float)
+                            scan_values = scan_values.reshape(len(scan_values), int(np.prod(scan_values.shape[1:])))[:,0]
+                        else:
+                            scan_values = np.full(len(rule_data), file_value, dtype=float)
+                        rule_sums, rule_counts = binned_sums(scan_values, scan_edges, rule_data)
+                        split_sums.append(rule_sums)
+                        split_counts.append(rule_counts)
+                    file_sums.append(split_sums)
+                    file_counts.append(split_counts)
+
+                file_sums, file_counts = np.array(file_sums, dtype=float), np.array(file_counts, dtype=int)
+            if run_sums is None:
+                run_sums, run_counts = file_sums, file_counts
+            else:
+                run_sums, run_counts = run_sums + file_sums, run_counts + file_counts
+        return run_sums, run_counts
+
+    def average_scan_data_weights(self, dataname, scan_name, scan_edges, back_sep=False, slu_sep=False,
+                                  slice_range=None, rules=[None,], use_cache=True, make_cache=True,
+                                  reducer=None, num_cores=1):
+        '''
+        Averages the shots of dataname in the bins (scan_edges) of the per-shot value of
+        scan_name, e.g. a delay scan, see RunSets.average_scan_data_weights().
+
+        Output axes: (average/weights, conditions, rules, scan bins, data)
+        '''
+        return RunSets([self]).average_scan_data_weights(
+                dataname, scan_name, scan_edges, back_sep=back_sep, slu_sep=slu_sep,
+                slice_range=slice_range, rules=rules, use_cache=use_cache, make_cache=make_cache,
+                reducer=reducer, num_cores=num_cores)
+
+    def run_sketches(self, dataname, back_sep=False, slu_sep=False, slice_range=None, rules=[None,],
+                     reducer=None, edges=None, size=sketches.DEFAULT_SIZE, num_cores=1, backend=None):
+        '''
+        Histogram (with edges; None without) and QuantileSketch (with size centroids; None
+        if size is None) of the values of dataname over all files, e.g. to look at the
+        distribution of 'i0m' without loading the shots, see RunSets.run_sketches().
+
+        Output: (Histogram, QuantileSketch), with the axes (conditions, rules)
+        '''
+        return RunSets([self]).run_sketches(
+                dataname, back_sep=back_sep, slu_sep=slu_sep, slice_range=slice_range, rules=rules,
+                reducer=reducer, edges=edges, size=size, num_cores=num_cores, backend=backend)[0]
+
+    def histogram_run_data(self, dataname, edges, back_sep=False, slu_sep=False, slice_range=None,
+                           rules=[None,], reducer=None, num_cores=1, backend=None):
+        '''
+        Histogram of the values of dataname over all files, see Run.run_sketches().
+
+        Output axes: (conditions, rules, bins) of Histogram.counts
+        '''
+        return self.run_sketches(
+                dataname, back_sep=back_sep, slu_sep=slu_sep, slice_range=slice_range, rules=rules,
+                reducer=reducer, edges=edges, size=None, num_cores=num_cores, backend=backend)[0]
+
+    def quantile_edges(self, dataname, num_bins, back_sep=False, slu_sep=False, slice_range=None,
+                       rules=[None,], reducer=None, size=sketches.DEFAULT_SIZE, num_cores=1, backend=None):
+        '''
+        Edges of num_bins bins with about equal numbers of shots, e.g. for rules of 'i0m',
+        from a QuantileSketch (see Run.run_sketches()).
+
+        Output axes: (conditions, rules, edges)
+        '''
+        return self.run_sketches(
+                dataname, back_sep=back_sep, slu_sep=slu_sep, slice_range=slice_range, rules=rules,
+                reducer=reducer, size=size, num_cores=num_cores, backend=backend)[1].edges(num_bins)
+
 
 class RunSets:
     '''
@@ -1080,6 +1609,12 @@ class RunSets:
     def alias(self, name):
         return name
 
+    def profile(self, memory=False, log=False):
+        '''
+        Context which profiles the calls within it, see Run.profile().
+        '''
+        return profiling.profile(memory=memory, log=log)
+
     def add(self, list_of_new_instances):
         '''
         Add more Run() instances. If an instance is already within the collection, it is ignored.
@@ -1099,19 +1634,30 @@ class RunSets:
 
     @_alias
     def average_run_data_weights(self, dataname, back_sep=False, slu_sep=False, slice_range=None,
-                                 rules=[None,], use_cache=True, make_cache=True):
+                                 rules=[None,], use_cache=True, make_cache=True, reducer=None,
+                                 backend=None):
         '''
         Output has axes: (average/weights, condition, run, average)
+
+        With a backend (see the backends module), the uncached files of all Runs are
+        processed in one pass on its workers, and the caches are made per Run.
         '''
 
+        if backend is None:
+            run_results = [run_instance.average_run_data_weights(
+                                dataname, back_sep=back_sep, slu_sep=slu_sep,
+                                slice_range=slice_range, rules=rules,
+                                use_cache=use_cache, make_cache=make_cache, reducer=reducer)
+                           for run_instance in self.run_instances]
+        else:
+            run_results = self._run_data_weights_on_backend(
+                dataname, back_sep=back_sep, slu_sep=slu_sep, slice_range=slice_range, rules=rules,
+                use_cache=use_cache, make_cache=make_cache, reducer=reducer, backend=backend)
+
         compiled_averages = []
         compiled_weights = []
-        for i, run_instance in enumerate(self.run_instances):
-            for j, (split_data, split_weights) in enumerate(
-                    zip(*run_instance.average_run_data_weights(
-                        dataname, back_sep=back_sep, slu_sep=slu_sep,
-                        slice_range=slice_range, rules=rules,
-                        use_cache=use_cache, make_cache=make_cache))):
+        for i, run_result in enumerate(run_results):
+            for j, (split_data, split_weights) in enumerate(zip(*run_result)):
 
                 if len(compiled_averages)<=j:
                     compiled_averages.append([])
@@ -1121,21 +1667,111 @@ class RunSets:
 
         return compiled_averages, compiled_weights
 
+    @_alias
+    def average_run_data_errors(self, dataname, back_sep=False, slu_sep=False, slice_range=None,
+                                rules=[None,], use_cache=True, make_cache=True, reducer=None, ddof=1,
+                                backend=None):
+        '''
+        Run.average_run_data_errors() of every Run.
+
+        Output has axes: (average/std/standard error/weights, condition, run, average)
+        '''
+        compiled = [[], [], [], []]
+        for run_instance in self.run_instances:
+            run_output = run_instance.average_run_data_errors(
+                dataname, back_sep=back_sep, slu_sep=slu_sep, slice_range=slice_range, rules=rules,
+                use_cache=use_cache, make_cache=make_cache, reducer=reducer, ddof=ddof, backend=backend)
+            for output, run_values in zip(compiled, run_output):
+                for j, split_values in enumerate(run_values):
+                    if len(output)<=j:
+                        output.append([])
+                    output[j].append(split_values)
+        return tuple(compiled)
+
+    @_alias
+    def average_set_data_errors(self, dataname, back_sep=False, slu_sep=False, slice_range=None,
+                                rules=[None,], use_cache=True, make_cache=True, reducer=None, ddof=1,
+                                backend=None):
+        '''
+        Average, standard deviation, standard error and weights of the shots of all Runs
+        together (the Run Accumulators are merged, see Run.run_accumulator()).
+
+        Output has axes: (average/std/standard error/weights, condition, rules, data)
+        '''
+        accumulator = merge_all((run_instance.run_accumulator(
+            dataname, back_sep=back_sep, slu_sep=slu_sep, slice_range=slice_range, rules=rules,
+            use_cache=use_cache, make_cache=make_cache, reducer=reducer, m2=True, backend=backend)
+            for run_instance in self.run_instances), copy=False)
+        if accumulator is None:
+            return [], [], [], []
+        return (list(accumulator.mean()), list(accumulator.std(ddof)), list(accumulator.standard_error(ddof)),
+                list(accumulator.count))
+
+    def _run_data_weights_on_backend(self, dataname, back_sep=False, slu_sep=False, slice_range=None,
+                                     rules=[None,], use_cache=True, make_cache=True, reducer=None,
+                                     backend=None):
+        '''
+        Run.average_run_data_weights() of every Run, with the uncached files of all Runs
+        sent to backend as one list of tasks (function_for_imap()).
+        '''
+        if not cacheable(reducer):
+            use_cache = make_cache = False
+        run_results = [None]*len(self.run_instances)
+        run_accumulators = [None]*len(self.run_instances)
+        run_cache_returns = [None]*len(self.run_instances)
+        tasks = []
+        for i, run_instance in enumerate(self.run_instances):
+            data_alias = run_instance.keyword_alias(dataname)
+            outdir = run_instance.filepaths[0].split('/rawdata/')[0] + '/work/average_run_data_weights_cache'
+            args = cache_args(run_instance.filepaths, data_alias, back_sep, slu_sep, slice_range, rules, reducer)
+            cache_return = cache_function(outdir, run_instance.filepaths, args, ['rundata','runweights'],
+                                          use_cache=use_cache)
+            if not isinstance(cache_return, str):
+                run_results[i] = cache_return
+                continue
+            run_cache_returns[i] = cache_return
+            attributes = run_instance.object_attributes()
+            for filepath in run_instance.filepaths:
+                tasks.append((i, filepath, attributes, data_alias))
+
+        kwargs = dict(back_sep=back_sep, slu_sep=slu_sep, slice_range=slice_range, rules=rules, reducer=reducer)
+        args_iter = [(filepath, attributes, data_alias) for _, filepath, attributes, data_alias in tasks]
+        results = starmap_profiled(backend, function_for_imap, args_iter, kwargs, backend.num_workers)
+
+        for (i, *_), file_accumulator in zip(tasks, results):
+            if file_accumulator is None:
+                continue
+            if run_accumulators[i] is None:
+                run_accumulators[i] = file_accumulator
+            else:
+                run_accumulators[i].merge(file_accumulator)
+
+        for i, cache_return in enumerate(run_cache_returns):
+            if cache_return is None or run_accumulators[i] is None:
+                continue
+            rundata, runweights = run_accumulators[i].mean(), run_accumulators[i].count
+            if make_cache:
+                save_cache(cache_return, rundata=rundata, runweights=runweights)
+            run_results[i] = (list(rundata), list(runweights))
+        return run_results
+
     @_alias
     def average_run_data(self, dataname, back_sep=False, slu_sep=False, slice_range=None,
-                         rules=[None,], use_cache=True, make_cache=True):
+                         rules=[None,], use_cache=True, make_cache=True, reducer=None, backend=None):
         return self.average_run_data_weights(dataname, back_sep=back_sep, slu_sep=slu_sep,
                                          slice_range=slice_range, rules=rules,
-                                         use_cache=use_cache, make_cache=make_cache)[0]
+                                         use_cache=use_cache, make_cache=make_cache,
+                                         reducer=reducer, backend=backend)[0]
 
     @_alias
     def average_set_data_weights(self, dataname, back_sep=False, slu_sep=False, slice_range=None,
-                                 rules=[None,], use_cache=True, make_cache=True):
+                                 rules=[None,], use_cache=True, make_cache=True, reducer=None,
+                                 backend=None):
 
         run_averages, run_weights = self.average_run_data_weights(
                 dataname, back_sep=back_sep, slu_sep=slu_sep,
                 slice_range=slice_range, rules=rules,
-                use_cache=use_cache, make_cache=make_cache)
+                use_cache=use_cache, make_cache=make_cache, reducer=reducer, backend=backend)
 
         set_averages = []
         set_weights = []
@@ -1153,10 +1789,238 @@ class RunSets:
 
     @_alias
     def average_set_data(self, dataname, back_sep=False, slu_sep=False, slice_range=None,
-                         rules=[None,], use_cache=True, make_cache=True):
+                         rules=[None,], use_cache=True, make_cache=True, reducer=None, backend=None):
         return self.average_set_data_weights(dataname=dataname, back_sep=back_sep, slu_sep=slu_sep,
                                              slice_range=slice_range, rules=rules,
-                                             use_cache=use_cache, make_cache=make_cache)[0]
+                                             use_cache=use_cache, make_cache=make_cache,
+                                             reducer=reducer, backend=backend)[0]
+
+    async def _run_accumulators_async(self, dataname, back_sep=False, slu_sep=False, slice_range=None,
+                                      rules=[None,], use_cache=True, make_cache=True, reducer=None, backend=None):
+        ''' Run.run_accumulator_async() of every Run, all at the same time. '''
+        return await asyncio.gather(*(run_instance.run_accumulator_async(
+            dataname, back_sep=back_sep, slu_sep=slu_sep, slice_range=slice_range, rules=rules,
+            use_cache=use_cache, make_cache=make_cache, reducer=reducer, backend=backend)
+            for run_instance in self.run_instances))
+
+    @_alias
+    async def average_run_data_weights_async(self, dataname, back_sep=False, slu_sep=False, slice_range=None,
+                                             rules=[None,], use_cache=True, make_cache=True, reducer=None,
+                                             backend=None):
+        '''
+        Awaitable RunSets.average_run_data_weights(): the Runs are processed at the same
+        time, with their files submitted to backend (see the asynchronous module).
+
+        Output has axes: (average/weights, condition, run, average)
+        '''
+        run_accumulators = await self._run_accumulators_async(
+            dataname, back_sep=back_sep, slu_sep=slu_sep, slice_range=slice_range, rules=rules,
+            use_cache=use_cache, make_cache=make_cache, reducer=reducer, backend=backend)
+        compiled_averages, compiled_weights = [], []
+        for run_accumulator in run_accumulators:
+            if run_accumulator is None:
+                continue
+            for j, (split_data, split_weights) in enumerate(zip(run_accumulator.mean(), run_accumulator.count)):
+                if len(compiled_averages)<=j:
+                    compiled_averages.append([])
+                    compiled_weights.append([])
+                compiled_averages[j].append(split_data)
+                compiled_weights[j].append(split_weights)
+        return compiled_averages, compiled_weights
+
+    @_alias
+    async def average_run_data_async(self, dataname, back_sep=False, slu_sep=False, slice_range=None,
+                                     rules=[None,], use_cache=True, make_cache=True, reducer=None, backend=None):
+        return (await self.average_run_data_weights_async(
+            dataname, back_sep=back_sep, slu_sep=slu_sep, slice_range=slice_range, rules=rules,
+            use_cache=use_cache, make_cache=make_cache, reducer=reducer, backend=backend))[0]
+
+    @_alias
+    async def average_set_data_weights_async(self, dataname, back_sep=False, slu_sep=False, slice_range=None,
+                                             rules=[None,], use_cache=True, make_cache=True, reducer=None,
+                                             backend=None):
+        '''
+        Awaitable RunSets.average_set_data_weights(), see
+        RunSets.average_run_data_weights_async().
+
+        Output has axes: (average/weights, condition, rules, data)
+        '''
+        accumulator = merge_all(await self._run_accumulators_async(
+            dataname, back_sep=back_sep, slu_sep=slu_sep, slice_range=slice_range, rules=rules,
+            use_cache=use_cache, make_cache=make_cache, reducer=reducer, backend=backend), copy=False)
+        if accumulator is None:
+            return [], []
+        average, count = accumulator.mean(), accumulator.count
+        # NaN without shots, as in RunSets.average_set_data_weights()
+        no_shots = np.reshape(count == 0, count.shape + (1,)*(np.ndim(average)-count.ndim))
+        return list(np.where(no_shots, np.nan, average)), list(count)
+
+    @_alias
+    async def average_set_data_async(self, dataname, back_sep=False, slu_sep=False, slice_range=None,
+                                     rules=[None,], use_cache=True, make_cache=True, reducer=None, backend=None):
+        return (await self.average_set_data_weights_async(
+            dataname, back_sep=back_sep, slu_sep=slu_sep, slice_range=slice_range, rules=rules,
+            use_cache=use_cache, make_cache=make_cache, reducer=reducer, backend=backend))[0]
+
+    def average_scan_data_weights(self, dataname, scan_name, scan_edges, back_sep=False, slu_sep=False,
+                                  slice_range=None, rules=[None,], use_cache=True, make_cache=True,
+                                  reducer=None, num_cores=1, backend=None):
+        '''
+        Shot-level scan reconstruction over all Runs: every shot of dataname is put into
+        the bin of its own value of scan_name (e.g. 'delay'), so drifting or mixed scan
+        positions within a Run are kept. All uncached files of all Runs are processed
+        in one pass, with num_cores processes or on backend (see the backends module).
+        Caches are made per Run.
+
+        The bin centers are (scan_edges[1:]+scan_edges[:-1])/2; empty bins have an
+        average of zero and a weight of zero.
+
+        Output axes: (average/weights, conditions, rules, scan bins, data)
+        '''
+
+        if not cacheable(reducer):
+            use_cache = make_cache = False
+        scan_edges = np.asarray(scan_edges, dtype=float)
+        run_sums = [None]*len(self.run_instances)
+        run_counts = [None]*len(self.run_instances)
+        run_cache_returns = [None]*len(self.run_instances)
+        tasks = []
+        for i, run_instance in enumerate(self.run_instances):
+            data_alias = run_instance.keyword_alias(dataname)
+            scan_alias = run_instance.keyword_alias(scan_name)
+            outdir = run_instance.filepaths[0].split('/rawdata/')[0] + '/work/average_scan_data_weights_cache'
+            args = cache_args(run_instance.filepaths, data_alias, back_sep, slu_sep, slice_range, rules,
+                              reducer) + (scan_alias, scan_edges.tolist())
+            cache_return = cache_function(outdir, run_instance.filepaths, args, ['rundata','runweights'],
+                                          use_cache=use_cache)
+            if not isinstance(cache_return, str):
+                rundata, runweights = cache_return
+                run_sums[i] = rundata * np.expand_dims(runweights, axis=tuple(range(3, np.ndim(rundata))))
+                run_counts[i] = runweights
+                continue
+            run_cache_returns[i] = cache_return
+            attributes = run_instance.object_attributes()
+            for filepath in run_instance.filepaths:
+                tasks.append((i, filepath, attributes, data_alias, scan_alias))
+
+        kwargs = dict(back_sep=back_sep, slu_sep=slu_sep, slice_range=slice_range, rules=rules, reducer=reducer)
+        args_iter = [(filepath, attributes, data_alias, scan_alias, scan_edges)
+                     for _, filepath, attributes, data_alias, scan_alias in tasks]
+        if backend is None and (num_cores <= 1 or len(tasks) <= 1):
+            results = [function_for_scan(*task_args, **kwargs) for task_args in args_iter]
+        else:
+            with backend_context(backend, num_cores) as task_backend:
+                results = starmap_profiled(task_backend, function_for_scan, args_iter, kwargs,
+                                           task_backend.num_workers)
+
+        for (i, *_), (file_sums, file_counts) in zip(tasks, results):
+            if file_sums is None:  # a skipped file
+                continue
+            if run_sums[i] is None:
+                run_sums[i], run_counts[i] = file_sums, file_counts
+            else:
+                run_sums[i], run_counts[i] = run_sums[i] + file_sums, run_counts[i] + file_counts
+
+        for i, cache_return in enumerate(run_cache_returns):
+            if make_cache and cache_return is not None and run_sums[i] is not None:
+                divisor = np.expand_dims(run_counts[i], axis=tuple(range(3, np.ndim(run_sums[i])))).copy()
+                divisor[divisor==0] = 1
+                save_cache(cache_return,
+                        rundata=np.array(run_sums[i]/divisor, dtype=float),
+                        runweights=np.array(run_counts[i], dtype=int),
+                        )
+
+        # runs without any data (all files skipped) are left out
+        run_sums = [sums for sums in run_sums if sums is not None]
+        run_counts = [counts for counts in run_counts if counts is not None]
+        if not run_sums:
+            raise Exception(f'No data found with keywords ({dataname}, {scan_name}).')
+        set_sums = np.sum(run_sums, axis=0)
+        set_counts = np.sum(run_counts, axis=0)
+        divisor = np.expand_dims(set_counts, axis=tuple(range(3, np.ndim(set_sums)))).copy()
+        divisor[divisor==0] = 1
+        return set_sums/divisor, set_counts
+
+    def average_scan_data(self, dataname, scan_name, scan_edges, back_sep=False, slu_sep=False,
+                          slice_range=None, rules=[None,], use_cache=True, make_cache=True,
+                          reducer=None, num_cores=1, backend=None):
+        return self.average_scan_data_weights(dataname, scan_name, scan_edges, back_sep=back_sep,
+                                              slu_sep=slu_sep, slice_range=slice_range, rules=rules,
+                                              use_cache=use_cache, make_cache=make_cache,
+                                              reducer=reducer, num_cores=num_cores, backend=backend)[0]
+
+    def run_sketches(self, dataname, back_sep=False, slu_sep=False, slice_range=None, rules=[None,],
+                     reducer=None, edges=None, size=sketches.DEFAULT_SIZE, num_cores=1, backend=None):
+        '''
+        Histogram (with edges; None without) and QuantileSketch (with size centroids; None
+        if size is None) of the values of dataname in every Run, see the sketches module.
+        All files of all Runs are processed in one pass, with num_cores processes or on
+        backend (see the backends module). Only the sketches of the files are kept, so
+        this is much lighter than give_rundata() for e.g. histograms of 'i0m'; they are not
+        cached.
+
+        Output: [(Histogram, QuantileSketch) of every Run], with the axes (conditions, rules)
+        '''
+
+        tasks = []
+        for i, run_instance in enumerate(self.run_instances):
+            attributes = run_instance.object_attributes()
+            data_alias = run_instance.keyword_alias(dataname)
+            for filepath in run_instance.filepaths:
+                tasks.append((i, filepath, attributes, data_alias))
+
+        kwargs = dict(back_sep=back_sep, slu_sep=slu_sep, slice_range=slice_range, rules=rules, reducer=reducer,
+                      edges=edges, size=size)
+        args_iter = [(filepath, attributes, data_alias) for _, filepath, attributes, data_alias in tasks]
+        if backend is None and (num_cores <= 1 or len(tasks) <= 1):
+            results = [function_for_sketch(*task_args, **kwargs) for task_args in args_iter]
+        else:
+            with backend_context(backend, num_cores) as task_backend:
+                results = starmap_profiled(task_backend, function_for_sketch, args_iter, kwargs,
+                                           task_backend.num_workers)
+
+        run_results = []
+        for i in range(len(self.run_instances)):
+            run_files = [result for (j, *_), result in zip(tasks, results) if j == i]
+            run_results.append(tuple(sketches.merge_all((file_sketches[k] for file_sketches in run_files), copy=False)
+                                     for k in range(2)))
+        return run_results
+
+    def set_sketches(self, dataname, back_sep=False, slu_sep=False, slice_range=None, rules=[None,],
+                     reducer=None, edges=None, size=sketches.DEFAULT_SIZE, num_cores=1, backend=None):
+        '''
+        RunSets.run_sketches() of all Runs together.
+
+        Output: (Histogram, QuantileSketch), with the axes (conditions, rules)
+        '''
+        run_results = self.run_sketches(
+                dataname, back_sep=back_sep, slu_sep=slu_sep, slice_range=slice_range, rules=rules,
+                reducer=reducer, edges=edges, size=size, num_cores=num_cores, backend=backend)
+        return tuple(sketches.merge_all((run_result[k] for run_result in run_results), copy=False)
+                     for k in range(2))
+
+    def histogram_set_data(self, dataname, edges, back_sep=False, slu_sep=False, slice_range=None,
+                           rules=[None,], reducer=None, num_cores=1, backend=None):
+        '''
+        Histogram of the values of dataname in all Runs, see RunSets.run_sketches().
+
+        Output axes: (conditions, rules, bins) of Histogram.counts
+        '''
+        return self.set_sketches(
+                dataname, back_sep=back_sep, slu_sep=slu_sep, slice_range=slice_range, rules=rules,
+                reducer=reducer, edges=edges, size=None, num_cores=num_cores, backend=backend)[0]
+
+    def quantile_edges(self, dataname, num_bins, back_sep=False, slu_sep=False, slice_range=None,
+                       rules=[None,], reducer=None, size=sketches.DEFAULT_SIZE, num_cores=1, backend=None):
+        '''
+        Edges of num_bins bins with about equal numbers of shots of all Runs, e.g. for
+        rules of 'i0m', see Run.quantile_edges().
+
+        Output axes: (conditions, rules, edges)
+        '''
+        return self.set_sketches(
+                dataname, back_sep=back_sep, slu_sep=slu_sep, slice_range=slice_range, rules=rules,
+                reducer=reducer, size=size, num_cores=num_cores, backend=backend)[1].edges(num_bins)
 
 
     @_alias
@@ -1257,6 +2121,31 @@ class MultithreadRun(Run):
                  keyword_functions=keyword_functions,
                  background_offset=background_offset)
         self.num_cores = 1
+        # with a backend (see the backends module), the files are processed on its
+        # workers instead of a pool of num_cores processes
+        self.backend = None
+
+    def object_attributes(self):
+        # the backend stays in this process
+        return [a for a in super().object_attributes() if a[0] != 'backend']
+
+    def _file_accumulators(self, dataname, filepaths, back_sep=False, slu_sep=False, slice_range=None,
+                           rules=[None,], reducer=None, m2=False, backend=None):
+        if backend is not None:
+            return super()._file_accumulators(dataname, filepaths, back_sep=back_sep, slu_sep=slu_sep,
+                                              slice_range=slice_range, rules=rules, reducer=reducer, m2=m2,
+                                              backend=backend)
+        with backend_context(self.backend, self.num_cores) as backend:
+            return super()._file_accumulators(dataname, filepaths, back_sep=back_sep, slu_sep=slu_sep,
+                                              slice_range=slice_range, rules=rules, reducer=reducer, m2=m2,
+                                              backend=backend)
+
+    async def _file_accumulators_async(self, dataname, filepaths, back_sep=False, slu_sep=False,
+                                       slice_range=None, rules=[None,], reducer=None, m2=False, backend=None):
+        async with asynchronous.backend_scope(backend or self.backend, self.num_cores) as backend:
+            return await super()._file_accumulators_async(
+                dataname, filepaths, back_sep=back_sep, slu_sep=slu_sep, slice_range=slice_range, rules=rules,
+                reducer=reducer, m2=m2, backend=backend)
 
     def _alias(func):
         @wraps(func)
@@ -1277,7 +2166,7 @@ class MultithreadRun(Run):
     @_alias
     def average_run_data_weights(self, dataname, back_sep=False, slu_sep=False, slice_range=None,
                                 rules=[None,], use_cache=True, make_cache=True, _filepaths=None,
-                                num_files_per_cache=None, 
+                                num_files_per_cache=None, reducer=None,
                                 _save_incomplete_cache=False, _save_total_cache=False):
         '''
         Output axes: (sum/counts, conditions, rules, data)
@@ -1286,7 +2175,8 @@ class MultithreadRun(Run):
         file regardless of num_files_per_cache, and only after they are returned, do we sort them back into
         blocks.
         '''
-
+        if not cacheable(reducer):
+            use_cache = make_cache = False
 
         if _filepaths is None:
             filepaths = self.filepaths
@@ -1303,7 +2193,7 @@ class MultithreadRun(Run):
         # checking possible caches
         for look_for_filepaths in subsets_of_filepaths:
             outdir = filepaths[0].split('/rawdata/')[0] + '/work/average_run_data_weights_cache'
-            args = (look_for_filepaths, dataname, back_sep, slu_sep, slice_range, rules)
+            args = cache_args(look_for_filepaths, dataname, back_sep, slu_sep, slice_range, rules, reducer)
             cache_filepath = get_cache_filepath(
                 outdir, look_for_filepaths, args, ['rundata','runweights'], use_cache=use_cache)
             cache_found = os.path.exists(cache_filepath)
@@ -1318,7 +2208,6 @@ class MultithreadRun(Run):
 
         from itertools import chain
         uncached_filepaths = list(chain.from_iterable(uncached_filepath_blocks))
-        time_start = time.time()
 
         N_max_processes = self.num_cores
 
@@ -1363,158 +2252,56 @@ class MultithreadRun(Run):
             pool.join()
 
         elif True:
-            from multiprocessing import cpu_count, pool, Pool
-            pool_results = []
-            pool = Pool(processes=N_max_processes)
-
-            import inspect
-            attributes = inspect.getmembers(self, lambda a:not(inspect.isroutine(a)))
-            object_attributes = [a for a in attributes if not(a[0].startswith('__') and a[0].endswith('__'))]
+            object_attributes = self.object_attributes()
 
             args_iter = zip(uncached_filepaths, repeat(object_attributes), repeat(dataname))
-            kwargs_iter = repeat(dict(back_sep=back_sep, slu_sep=slu_sep, slice_range=slice_range, rules=rules))
-            pool_results = starmap_with_kwargs(pool, function_for_imap, args_iter, kwargs_iter)
-
-            data_sums_counts = []
-            for ProcessedObject in pool_results:
-                data_sum, data_count = ProcessedObject
-                data_sums_counts.append((data_sum, data_count))
+            kwargs = dict(back_sep=back_sep, slu_sep=slu_sep, slice_range=slice_range, rules=rules, reducer=reducer)
+            with backend_context(self.backend, N_max_processes) as backend:
+                file_accumulators = starmap_profiled(backend, function_for_imap, args_iter, kwargs,
+                                                     backend.num_workers)
 
-        time_end = time.time()
-
-        time_start = time.time()
-        # function_for_process()
-        function_for_imap(filepaths[0], object_attributes, dataname)
-        time_end = time.time()
-
-        blocks_avg_counts = []
+        block_accumulators = []
         _count = 0
         for block_files in uncached_filepath_blocks:
             n_files = len(block_files)
             _incomplete = n_files != num_files_per_cache
-
-            separate_sums = np.array([item[0] for item in data_sums_counts[_count:_count+n_files]])
-            separate_counts = np.array([item[1] for item in data_sums_counts[_count:_count+n_files]])
-            block_sum = np.sum(separate_sums, axis=0)
-            block_counts = np.sum(separate_counts, axis=0) 
-
-            data_dim = np.ndim(block_sum)
-            weights_dim = np.ndim(block_counts)
-            match_dim_weights = np.expand_dims(block_counts, axis=[-(i+1) for i in range(data_dim-weights_dim)])
-            match_dim_weights[match_dim_weights==0] = 1
-
-            block_avg = block_sum / match_dim_weights
-            blocks_avg_counts.append([block_avg, block_counts])
-            rundata = block_avg
-            runweights = block_counts
-
-            filepaths = block_files
-            # outdir = filepaths[0].split('/rawdata/')[0] + '/work/average_run_data_weights_cache'
-            args = (filepaths, dataname, back_sep, slu_sep, slice_range, rules)
-            cache_return = cache_function(outdir, filepaths, args, ['rundata','runweights'], use_cache=use_cache)
-            if make_cache and (not _incomplete or _save_incomplete_cache):
-                print(f'saving cache with files {block_files}')
-                np.savez_compressed(cache_return,
-                        rundata=rundata,
-                        runweights=runweights,)
-
+            # one Accumulator per file, None for skipped files, which are not cached
+            block_file_accumulators = file_accumulators[_count:_count+n_files]
             _count += n_files
 
-        blocks_avg_counts.extend(blocks_data)
-        _temp = blocks_avg_counts[:]
+            block_accumulator = merge_all(block_file_accumulators, copy=False)
+            if block_accumulator is None:
+                continue
+            block_accumulators.append(block_accumulator)
 
-        partial_run_avg = [item[0] for item in blocks_avg_counts]
-        partial_run_weights = [item[1] for item in blocks_avg_counts]
-
-        try:
-            run_file_weights = np.array(partial_run_weights) 
-            run_file_avg = np.array(partial_run_avg)
-        except ValueError as e:
-            print('blocks_avg_counts: ')
-            partial_run_avg = [item[0] for item in _temp]
-            partial_run_weights = [item[1] for item in _temp]
-            for item in partial_run_avg:
-                print(f'    {np.shape(np.array(item))}')
-            print('blocks_weights_counts: ')
-            for item in partial_run_weights:
-                print(f'    {np.shape(np.array(item))}')
-            print('blocks_data: ')
-            for item in blocks_data:
-                print(f'    {np.shape(np.array(item))}')
-            
-            print()
-            print()
-            print()
-            print()
-            print(partial_run_weights)
-            print()
-            print()
-            print()
-            print(partial_run_avg)
-            print()
-            print()
-            print()
-            print()
-            raise e
-
-        data_dim = np.ndim(run_file_avg)
-        weights_dim = np.ndim(run_file_weights)
-        match_dim_weights = np.expand_dims(run_file_weights, axis=[-(i+1) for i in range(data_dim-weights_dim)])
-
-        try:
-            run_file_data = run_file_avg * match_dim_weights
-        except Exception as e:
-            print('exception at 1433')
-            print('run_file_avg: ', np.shape(run_file_avg))
-            print('match_dim_weights: ', np.shape(match_dim_weights))
-
-            print('blocks_avg_counts: ')
-            partial_run_avg = [item[0] for item in _temp]
-            partial_run_weights = [item[1] for item in _temp]
-            for item in partial_run_avg:
-                print(f'    {np.shape(np.array(item))}')
-            print('blocks_weights_counts: ')
-            for item in partial_run_weights:
-                print(f'    {np.shape(np.array(item))}')
-            print('blocks_data: ')
-            for item in blocks_data:
-                print(f'    {np.shape(np.array(item))}')
-            raise e
+            args = cache_args(block_files, dataname, back_sep, slu_sep, slice_range, rules, reducer)
+            cache_return = cache_function(outdir, block_files, args, ['rundata','runweights'], use_cache=use_cache)
+            if make_cache and (not _incomplete or _save_incomplete_cache) and None not in block_file_accumulators:
+                print(f'saving cache with files {block_files}')
+                save_cache(cache_return,
+                        rundata=block_accumulator.mean(),
+                        runweights=block_accumulator.count,)
 
-        compiled_data = []
-        compiled_count = []
-        run_average = []
-        run_weight = []
-        for filedata_sum, filedata_count in zip(run_file_data, run_file_weights):
-            for i, (split_sum, split_count) in enumerate(zip(filedata_sum, filedata_count)):
-                if len(compiled_data)<=i:
-                    compiled_data.append([])
-                    compiled_count.append([])
-                compiled_data[i].append(split_sum)
-                compiled_count[i].append(split_count)
-        for split_data, split_count in zip(compiled_data, compiled_count):
-            data_dim = np.ndim(split_data)
-            match_dim_split_count = np.expand_dims(split_count, axis=[-(i+1) for i in range(data_dim-2)])
-            divisor = np.sum(match_dim_split_count, axis=0)
-            divisor[divisor==0]=1
-            run_average.append(np.sum(split_data, axis=0)/divisor)
-            run_weight.append(np.sum(split_count, axis=0))
+        block_accumulators.extend(Accumulator.from_average(*block_data) for block_data in blocks_data)
+        run_accumulator = merge_all(block_accumulators, copy=False)
+        if run_accumulator is None:
+            return [], []
+        run_average, run_weight = list(run_accumulator.mean()), list(run_accumulator.count)
 
         if make_cache and filepaths and _save_total_cache:
-            rundata = np.array(run_average, dtype=float)
-            runweights = np.array(run_weight, dtype=int)
-
-            np.savez_compressed(cache_return,
-                    rundata=rundata,
-                    runweights=runweights,
+            args = cache_args(filepaths, dataname, back_sep, slu_sep, slice_range, rules, reducer)
+            cache_return = cache_function(outdir, filepaths, args, ['rundata','runweights'], use_cache=False)
+            save_cache(cache_return,
+                    rundata=np.array(run_average, dtype=float),
+                    runweights=np.array(run_weight, dtype=int),
                     )
-        
+
         return run_average, run_weight
 
     @_alias
     def average_run_data(self, dataname, back_sep=False, slu_sep=False, slice_range=None,
                          rules=[None,], use_cache=True, make_cache=True, num_files_per_cache=None,
-                         ):
+                         reducer=None):
         '''
         Same as Run.average_run_data_weights(), but just returning the "data" part of the tuple)
 
@@ -1525,4 +2312,4 @@ class MultithreadRun(Run):
                 dataname, back_sep=back_sep, slu_sep=slu_sep,
                 slice_range=slice_range, rules=rules,
                 use_cache=use_cache, make_cache=make_cache,
-                num_files_per_cache=num_files_per_cache)[0]
\ No newline at end of file
+                num_files_per_cache=num_files_per_cache, reducer=reducer)[0]
\ No newline at end of file
@@ -0,0 +1,276 @@
+'''
+Mergeable histograms and quantile sketches of per-shot values.
+
+Like the Accumulators (see the accumulators module), a Histogram or a QuantileSketch
+holds the values of one or more files with the fixed axes (conditions, rules) of
+Run.yield_file_data(), and the sketches of different files or Runs are combined with
+merge(). They are made from the values alone, so e.g. the distribution of 'i0m' or
+equal-population bin edges for rules are found without keeping the shots:
+
+    histogram, sketch = run.run_sketches('i0m', back_sep=True, edges=np.linspace(0, 80, 81))
+    edges = sketch.edges(4)[0][0]  # 4 bins with about equal numbers of foreground shots
+    rules = [f'(i0m>{lo} & i0m<{hi})' for lo, hi in zip(edges[:-1], edges[1:])]
+
+All values of a shot are used (e.g. every pixel of a frame), so data with more than one
+value per shot is usually reduced first (see the reducers module). Non-finite values are
+ignored.
+
+A QuantileSketch keeps at most size weighted centroids per (condition, rule): as long as
+there are not more values than that, the values themselves, and else centroids of about
+equal weight. The rank error of its quantiles is then about 1/size (plus a little per
+level of merging); minimum and maximum are exact.
+'''
+
+import numpy as np
+from .accumulators import merge_all
+
+DEFAULT_SIZE = 200
+
+
+def _finite_values(data):
+    values = np.asarray(data, dtype=float).ravel()
+    return values[np.isfinite(values)]
+
+
+def _compress(means, weights, size):
+    '''
+    At most size centroids (sorted, padded with zero weights to size) of the weighted
+    values means.
+    '''
+    used = weights > 0
+    means, weights = means[used], weights[used]
+    order = np.argsort(means, kind='stable')
+    means, weights = means[order], weights[order]
+    if len(means) > size:
+        ranks = np.cumsum(weights) - weights/2
+        buckets = np.minimum((ranks/weights.sum()*size).astype(int), size-1)
+        bucket_weights = np.bincount(buckets, weights, minlength=size)
+        bucket_sums = np.bincount(buckets, weights*means, minlength=size)
+        used = bucket_weights > 0
+        means, weights = bucket_sums[used]/bucket_weights[used], bucket_weights[used]
+    padding = size - len(means)
+    return np.pad(means, (0, padding)), np.pad(weights, (0, padding))
+
+
+class Histogram():
+    '''
+    Counts of the values in the bins of edges, with the axes (conditions, rules, bins).
+
+    Attributes
+    ----------
+    edges : np.ndarray
+        Bin edges, shape (bins+1,); as for np.histogram(), the last bin includes its
+        right edge.
+    counts : np.ndarray
+        int64 with shape (conditions, rules, bins).
+    underflow : np.ndarray
+        Number of values below edges[0], shape (conditions, rules).
+    overflow : np.ndarray
+        Number of values above edges[-1], shape (conditions, rules).
+    '''
+
+    __slots__ = ('edges', 'counts', 'underflow', 'overflow')
+
+    def __init__(self, edges, counts, underflow=None, overflow=None):
+        self.edges = np.array(edges, dtype=float)
+        self.counts = np.array(counts, dtype=np.int64)
+        self.underflow = np.zeros(self.counts.shape[:2], dtype=np.int64) if underflow is None else np.array(underflow, dtype=np.int64)
+        self.overflow = np.zeros(self.counts.shape[:2], dtype=np.int64) if overflow is None else np.array(overflow, dtype=np.int64)
+        if self.counts.ndim != 3 or self.counts.shape[2] != len(self.edges) - 1:
+            raise ValueError(f'counts {self.counts.shape} do not have the axes (conditions, rules, {len(self.edges)-1} bins)')
+
+    @classmethod
+    def from_values(cls, edges, file_level_data):
+        '''
+        Histogram of the values given as [conditions][rules] arrays, e.g. the output of
+        Run.yield_file_data().
+        '''
+        edges = np.asarray(edges, dtype=float)
+        counts, underflow, overflow = [], [], []
+        for split_data in file_level_data:
+            counts.append([])
+            underflow.append([])
+            overflow.append([])
+            for rule_data in split_data:
+                values = _finite_values(rule_data)
+                counts[-1].append(np.histogram(values, edges)[0])
+                underflow[-1].append(np.count_nonzero(values < edges[0]))
+                overflow[-1].append(np.count_nonzero(values > edges[-1]))
+        return cls(edges, counts, underflow, overflow)
+
+    @property
+    def shape(self):
+        ''' (conditions, rules, bins) '''
+        return self.counts.shape
+
+    @property
+    def centers(self):
+        return (self.edges[1:] + self.edges[:-1])/2
+
+    @property
+    def total(self):
+        ''' Number of (finite) values, shape (conditions, rules). '''
+        return self.counts.sum(axis=-1) + self.underflow + self.overflow
+
+    def density(self):
+        ''' counts/(total*bin width), zero without values. '''
+        total = self.total.astype(float)
+        total[total==0] = 1
+        return self.counts/total[..., None]/np.diff(self.edges)
+
+    def copy(self):
+        return Histogram(**self.as_arrays())
+
+    def merge(self, other):
+        '''
+        Adds the counts of other (with the same edges) to this Histogram (in place) and
+        returns it.
+        '''
+        if self.counts.shape != other.counts.shape or not np.array_equal(self.edges, other.edges):
+            raise ValueError('cannot merge Histograms with different edges or axes')
+        self.counts += other.counts
+        self.underflow += other.underflow
+        self.overflow += other.overflow
+        return self
+
+    def __iadd__(self, other):
+        return self.merge(other)
+
+    def __add__(self, other):
+        return self.copy().merge(other)
+
+    def as_arrays(self):
+        ''' {field: array}, e.g. for np.savez(). '''
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(**{name: arrays[name] for name in cls.__slots__})
+
+    def __repr__(self):
+        return f'Histogram(shape={self.shape}, range=({self.edges[0]:g}, {self.edges[-1]:g}), values={int(self.total.sum())})'
+
+
+class QuantileSketch():
+    '''
+    Approximate distribution of the values, with the axes (conditions, rules), see the
+    module docstring.
+
+    Attributes
+    ----------
+    means : np.ndarray
+        Centroids, sorted along the last axis, shape (conditions, rules, size).
+    weights : np.ndarray
+        Number of values of every centroid (zero for unused ones), shape of means.
+    minimum : np.ndarray
+        Smallest value, shape (conditions, rules); inf without values.
+    maximum : np.ndarray
+        Largest value; -inf without values.
+    '''
+
+    __slots__ = ('means', 'weights', 'minimum', 'maximum')
+
+    def __init__(self, means, weights, minimum, maximum):
+        self.means = np.array(means, dtype=float)
+        self.weights = np.array(weights, dtype=float)
+        self.minimum = np.array(minimum, dtype=float)
+        self.maximum = np.array(maximum, dtype=float)
+        if self.means.ndim != 3 or self.weights.shape != self.means.shape or self.minimum.shape != self.means.shape[:2]:
+            raise ValueError(f'means {self.means.shape} and weights {self.weights.shape} do not have the axes (conditions, rules, size)')
+
+    @classmethod
+    def from_values(cls, file_level_data, size=DEFAULT_SIZE):
+        '''
+        QuantileSketch of the values given as [conditions][rules] arrays, e.g. the output
+        of Run.yield_file_data().
+        '''
+        means, weights, minimum, maximum = [], [], [], []
+        for split_data in file_level_data:
+            for output in (means, weights, minimum, maximum):
+                output.append([])
+            for rule_data in split_data:
+                values = _finite_values(rule_data)
+                rule_means, rule_weights = _compress(values, np.ones(len(values)), size)
+                means[-1].append(rule_means)
+                weights[-1].append(rule_weights)
+                minimum[-1].append(values.min() if len(values) else np.inf)
+                maximum[-1].append(values.max() if len(values) else -np.inf)
+        return cls(means, weights, minimum, maximum)
+
+    @property
+    def size(self):
+        ''' Maximal number of centroids. '''
+        return self.means.shape[-1]
+
+    @property
+    def shape(self):
+        ''' (conditions, rules) '''
+        return self.minimum.shape
+
+    @property
+    def count(self):
+        ''' Number of values, shape (conditions, rules). '''
+        return self.weights.sum(axis=-1).round().astype(np.int64)
+
+    def copy(self):
+        return QuantileSketch(**self.as_arrays())
+
+    def merge(self, other):
+        '''
+        Adds the values of other (of the same size and axes) to this QuantileSketch (in
+        place) and returns it.
+        '''
+        if self.means.shape != other.means.shape:
+            raise ValueError(f'cannot merge a QuantileSketch of shape {other.means.shape} into {self.means.shape}')
+        for index in np.ndindex(self.shape):
+            self.means[index], self.weights[index] = _compress(
+                np.concatenate([self.means[index], other.means[index]]),
+                np.concatenate([self.weights[index], other.weights[index]]), self.size)
+        self.minimum = np.minimum(self.minimum, other.minimum)
+        self.maximum = np.maximum(self.maximum, other.maximum)
+        return self
+
+    def __iadd__(self, other):
+        return self.merge(other)
+
+    def __add__(self, other):
+        return self.copy().merge(other)
+
+    def quantile(self, q):
+        '''
+        Approximate quantiles q (between 0 and 1), shape (conditions, rules, *np.shape(q));
+        NaN without values.
+        '''
+        q = np.asarray(q, dtype=float)
+        output = np.full(self.shape + q.shape, np.nan)
+        for index in np.ndindex(self.shape):
+            used = self.weights[index] > 0
+            means, weights = self.means[index][used], self.weights[index][used]
+            if not len(means):
+                continue
+            total = weights.sum()
+            ranks = np.concatenate([[0], np.cumsum(weights) - weights/2, [total]])
+            values = np.concatenate([[self.minimum[index]], means, [self.maximum[index]]])
+            output[index] = np.interp(q*total, ranks, values)
+        return output
+
+    def median(self):
+        return self.quantile(0.5)
+
+    def edges(self, num_bins):
+        '''
+        Edges of num_bins bins with about equal numbers of values, from the minimum to the
+        maximum, shape (conditions, rules, num_bins+1).
+        '''
+        return self.quantile(np.linspace(0, 1, num_bins + 1))
+
+    def as_arrays(self):
+        ''' {field: array}, e.g. for np.savez(). '''
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(**{name: arrays[name] for name in cls.__slots__})
+
+    def __repr__(self):
+        return f'QuantileSketch(shape={self.shape}, size={self.size}, values={int(self.count.sum())})'
@@ -0,0 +1,178 @@
+'''
+Generator of synthetic FERMI-like HDF5 files, for tests and benchmarks of the
+reduction engine at realistic sizes.
+
+The files follow the layout of the beamtime data (see examples/TestBeamtime):
+
+    <beamtime_dir>/Run_XXX/rawdata/Run_XXX_<first bunch>.h5
+    <beamtime_dir>/Run_XXX/work/
+
+with the datasets 'bunches', 'Background_Period', 'slu', 'vmi/andor' (VMI frames),
+'digitizer/channel1' (ion TOF traces), the I0 monitor and the delay line position.
+'Background_Period'-th shots have no FEL (background), and every other shot has no
+SLU (pump laser), so back_sep/slu_sep and the filtering rules can be exercised.
+'''
+
+import os
+import numpy as np
+import h5py
+
+default_alias_dict = {
+    'i0m' : 'photon_diagnostics/FEL01/I0_monitor/iom_sh_a',
+    'vmi' : 'vmi/andor',
+    'ion_tof' : 'digitizer/channel1',
+    'delay' : 'user_laser/delay_line/position',
+    'slu' : 'user_laser/energy_meter/Energy2',
+    'bunch_number' : 'bunches',
+    }
+
+
+def vmi_frames(rng, intensities, frame_shape=(300, 300), radius=None, beta=1.0, hits_per_uJ=5.0,
+               amplitude=1000, noise=5.0):
+    '''
+    Low-count VMI frames: every hit is the projection of a velocity on a sphere of the
+    given radius, with the angular distribution 1 + beta*P2(cos(theta)) around the
+    vertical axis, plus Gaussian read-out noise.
+    '''
+    ny, nx = frame_shape
+    if radius is None:
+        radius = min(ny, nx)/4
+    frames = rng.normal(100, noise, size=(len(intensities), ny, nx)).astype(np.float32)
+    hits = rng.poisson(hits_per_uJ*np.clip(intensities, 0, None))
+    # rejection sampling of cos(theta) from 1 + beta*P2(cos(theta))
+    cos_theta = rng.uniform(-1, 1, size=4*hits.sum()+16)
+    weight = (1 + beta*(3*cos_theta**2-1)/2) / (1 + max(beta, -beta/2))
+    cos_theta = cos_theta[rng.uniform(size=len(cos_theta)) < weight][:hits.sum()]
+    cos_theta = np.resize(cos_theta, hits.sum())
+    phi = rng.uniform(0, 2*np.pi, size=hits.sum())
+    r = rng.normal(radius, 1.5, size=hits.sum())
+    y = np.clip(ny/2 + r*cos_theta, 0, ny-1).astype(int)
+    x = np.clip(nx/2 + r*np.sqrt(1-cos_theta**2)*np.cos(phi), 0, nx-1).astype(int)
+    shots = np.repeat(np.arange(len(intensities)), hits)
+    np.add.at(frames, (shots, y, x), rng.exponential(amplitude, size=hits.sum()))
+    return np.clip(frames, 0, 65535).astype(np.uint16)
+
+
+def tof_traces(rng, intensities, tof_bins=26000, mq=(1, 2, 16, 17, 18, 28), t0=6059.3, propconst=7.44e-07,
+               width=8, amplitude=400, noise=3.0):
+    '''
+    Ion TOF traces (negative peaks on a baseline, as from the digitizer) at the flight
+    times of the given m/q values, scaled with the pulse intensities.
+    '''
+    t = np.arange(tof_bins)
+    peaks = np.zeros(tof_bins)
+    for mqi in mq:
+        peaks += np.exp(-(t - (t0 + np.sqrt(mqi/propconst)))**2/(2*width**2))
+    traces = -amplitude*np.clip(intensities, 0, None)[:,None]*peaks[None,:]/np.max(intensities.clip(1e-9))
+    traces += rng.normal(0, noise, size=traces.shape)
+    return np.round(traces).astype(np.int16)
+
+
+def write_synthetic_file(filepath, first_bunch=0, shots=100, frame_shape=(300, 300), tof_bins=26000,
+                         background_period=3, slu_period=2, delay=0.0, delay_drift=0.0, i0m_mean=40.0,
+                         chunks='shot', compression='gzip', compression_opts=4, with_vmi=True,
+                         with_tof=True, seed=None):
+    '''
+    Writes one synthetic HDF5 file.
+
+    Parameters
+    ----------
+    filepath : str
+        Output file path.
+    first_bunch : int, optional
+        Bunch number of the first shot. The default is 0.
+    shots : int, optional
+        Number of shots. The default is 100.
+    frame_shape : tuple, optional
+        Shape of the VMI frames. The default is (300, 300).
+    tof_bins : int, optional
+        Length of the TOF traces. The default is 26000.
+    background_period : int, optional
+        Every background_period-th bunch has no FEL. The default is 3.
+    slu_period : int, optional
+        Every slu_period-th shot has no pump laser. The default is 2.
+    delay, delay_drift : float, optional
+        Delay line position of the first shot, and its linear drift over the file.
+        The default is 0.0 and 0.0.
+    i0m_mean : float, optional
+        Mean I0 monitor value (uJ) of the FEL shots. The default is 40.0.
+    chunks : str or tuple or None, optional
+        'shot' (one chunk per shot, as in FERMI data), 'file' (one chunk per dataset),
+        None (contiguous) or an explicit chunk shape for the per-shot datasets.
+        The default is 'shot'.
+    compression, compression_opts : optional
+        h5py compression of the per-shot datasets. The default is 'gzip', 4.
+    with_vmi, with_tof : bool, optional
+        Write the VMI frames / TOF traces. The default is True.
+    seed : int, optional
+        Random seed. The default is None.
+    '''
+    rng = np.random.default_rng(seed)
+    bunches = np.arange(first_bunch, first_bunch+shots, dtype=np.int32)
+    fel_on = bunches % background_period != 0
+    slu_on = np.arange(shots) % slu_period != 0
+    i0m = np.where(fel_on, rng.gamma(8, i0m_mean/8, size=shots), rng.normal(0, 0.05, size=shots))
+    delays = delay + delay_drift*np.arange(shots)/max(shots-1, 1) + rng.normal(0, 1e-5, size=shots)
+    slu = np.where(slu_on, rng.normal(1.0, 0.05, size=shots), rng.normal(0, 0.001, size=shots))
+
+    def create(file, name, data):
+        data = np.asarray(data)
+        if data.ndim == 0:
+            file.create_dataset(name, data=data)
+            return
+        if chunks == 'shot':
+            chunk_shape = (1,) + data.shape[1:]
+        elif chunks == 'file':
+            chunk_shape = data.shape
+        else:
+            chunk_shape = chunks
+        if chunk_shape is None and compression is None:
+            file.create_dataset(name, data=data)
+        else:
+            if chunk_shape is not None:
+                chunk_shape = tuple(min(c, n) for c, n in zip(chunk_shape, data.shape))
+            file.create_dataset(name, data=data, chunks=chunk_shape if chunk_shape is not None else True,
+                                compression=compression, compression_opts=compression_opts)
+
+    with h5py.File(filepath, 'w') as file:
+        create(file, 'bunches', bunches)
+        create(file, 'Background_Period', np.int64(background_period))
+        create(file, 'ShotsPerFile', np.int64(shots))
+        create(file, 'slu', slu)
+        create(file, default_alias_dict['slu'], slu)
+        create(file, default_alias_dict['i0m'], i0m)
+        create(file, default_alias_dict['delay'], delays)
+        if with_vmi:
+            create(file, default_alias_dict['vmi'], vmi_frames(rng, i0m*fel_on, frame_shape=frame_shape))
+        if with_tof:
+            create(file, default_alias_dict['ion_tof'], tof_traces(rng, i0m*fel_on, tof_bins=tof_bins))
+
+
+def write_synthetic_run(beamtime_dir, run_number, files=2, shots_per_file=100, delay=0.0, seed=None, **kwargs):
+    '''
+    Writes the files of one synthetic Run, see write_synthetic_file() for the keyword
+    arguments. Returns the file paths.
+    '''
+    rawdata_dir = os.path.join(beamtime_dir, f'Run_{run_number:03d}', 'rawdata')
+    os.makedirs(rawdata_dir, exist_ok=True)
+    os.makedirs(os.path.join(beamtime_dir, f'Run_{run_number:03d}', 'work'), exist_ok=True)
+    seeds = np.random.SeedSequence(seed).spawn(files)
+    filepaths = []
+    for i in range(files):
+        first_bunch = 1000*run_number*files + i*shots_per_file
+        filepath = os.path.join(rawdata_dir, f'Run_{run_number:03d}_{first_bunch}.h5')
+        write_synthetic_file(filepath, first_bunch=first_bunch, shots=shots_per_file, delay=delay,
+                             seed=seeds[i], **kwargs)
+        filepaths.append(filepath)
+    return filepaths
+
+
+def write_synthetic_beamtime(beamtime_dir, runs=3, delays=None, **kwargs):
+    '''
+    Writes a delay scan of synthetic Runs (Run_001, Run_002, ...), see
+    write_synthetic_run(). Returns a dictionary {run_number: filepaths}.
+    '''
+    if delays is None:
+        delays = np.linspace(-100, 100, runs)
+    return {run_number: write_synthetic_run(beamtime_dir, run_number, delay=delay, **kwargs)
+            for run_number, delay in zip(range(1, runs+1), delays)}
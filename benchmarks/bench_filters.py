@@ -0,0 +1,47 @@
+'''
+Compares the per-shot and the batch path of the filters (see
+fermi_libraries.reducers.batch_filter) for give_rundata-like filtering and for the
+moment sums, on synthetic TOF traces.
+
+Usage: python benchmarks/bench_filters.py [shots] [bins]
+'''
+
+import sys
+import timeit
+import numpy as np
+from fermi_libraries.common_functions import single_pass_moment_sums, batch_moment_sums
+from fermi_libraries.reducers import apply_reducer, batch_filter
+
+
+def roi_sums(trace):
+    return np.array([trace[:1000].sum(), trace[1000:2000].sum(), trace[2000:].sum()])
+
+@batch_filter
+def batch_roi_sums(shots):
+    return np.stack([shots[:, :1000].sum(axis=-1), shots[:, 1000:2000].sum(axis=-1),
+                     shots[:, 2000:].sum(axis=-1)], axis=-1)
+
+
+def best_of(function, repeat=5):
+    return min(timeit.repeat(function, number=1, repeat=repeat))
+
+
+def main(shots=2000, bins=26000):
+    traces = np.random.default_rng(0).normal(size=(shots, bins)).astype(np.float32)
+    results = {
+        'filter, per shot': best_of(lambda: apply_reducer(roi_sums, traces)),
+        'filter, batch': best_of(lambda: apply_reducer(batch_roi_sums, traces)),
+        'moment sums, per shot': best_of(lambda: single_pass_moment_sums(
+            (line for line in traces), filter1=roi_sums, filter2=roi_sums)),
+        'moment sums, batch': best_of(lambda: batch_moment_sums(
+            apply_reducer(batch_roi_sums, traces), apply_reducer(batch_roi_sums, traces))),
+    }
+
+    print(f'{shots} shots x {bins} bins')
+    for name, seconds in results.items():
+        print(f'    {name:<24s} {seconds*1e3:9.2f} ms')
+    return results
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,96 @@
+'''
+Import time of the fermi_libraries and cpbasex modules, each in a fresh interpreter.
+
+For every module, the wall time of the import and the heavy packages which the import
+loads (SciPy, matplotlib, lmfit) are reported. The modules in LIGHT_MODULES must not
+load the packages listed there; the script exits with 1 if one does, or if an import
+takes longer than --budget seconds:
+
+    python benchmarks/bench_import.py
+    python benchmarks/bench_import.py --budget 0.5 --importtime
+'''
+
+import sys
+import json
+import argparse
+import subprocess
+
+HEAVY_PACKAGES = ('scipy', 'matplotlib', 'lmfit')
+
+MODULES = ['fermi_libraries', 'fermi_libraries.run_module', 'fermi_libraries.dictionary_search',
+           'fermi_libraries.common_functions', 'fermi_libraries.calibration_tools', 'cpbasex.image_mod',
+           'cpbasex']
+
+# {module: packages its import must not load}; the cpbasex package itself needs SciPy
+LIGHT_MODULES = {module: HEAVY_PACKAGES for module in MODULES if module.startswith('fermi_libraries')}
+LIGHT_MODULES['cpbasex.image_mod'] = ('matplotlib',)
+
+_probe = '''
+import sys, time, json
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+heavy = sorted({{name.split('.')[0] for name in sys.modules}} & set({heavy!r}))
+print(json.dumps(dict(seconds=seconds, heavy=heavy)))
+'''
+
+
+def measure(module, repeat=3):
+    '''
+    Best import time of module (s) over repeat fresh interpreters, and the heavy packages
+    it loaded.
+    '''
+    times, heavy = [], []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', _probe.format(module=module, heavy=HEAVY_PACKAGES)],
+                                capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        times.append(result['seconds'])
+        heavy = result['heavy']
+    return min(times), heavy
+
+
+def importtime(module, top=15):
+    '''
+    The top slowest entries of python -X importtime for module (cumulative us, name).
+    '''
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            capture_output=True, text=True, check=True).stderr
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        entries.append((int(cumulative), name.strip()))
+    return sorted(entries, reverse=True)[:top]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modules', nargs='+', default=MODULES)
+    parser.add_argument('--budget', type=float, default=None, help='maximal import time (s) of every module')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--importtime', action='store_true', help='print the slowest imports of every module')
+    args = parser.parse_args(argv)
+
+    violations = []
+    for module in args.modules:
+        seconds, heavy = measure(module, args.repeat)
+        flags = []
+        forbidden = [name for name in heavy if name in LIGHT_MODULES.get(module, ())]
+        if forbidden:
+            flags.append('loads ' + ', '.join(forbidden))
+        if args.budget is not None and seconds > args.budget:
+            flags.append('over budget')
+        print(f"    {module:<40s} {seconds*1e3:8.1f} ms  {', '.join(heavy) or '-':<25s}"
+              + (f'  <-- {"; ".join(flags)}' if flags else ''))
+        if flags:
+            violations.append((module, flags))
+        if args.importtime:
+            for cumulative, name in importtime(module):
+                print(f'        {cumulative/1e3:8.1f} ms  {name}')
+    return violations
+
+
+if __name__ == '__main__':
+    sys.exit(1 if main() else 0)
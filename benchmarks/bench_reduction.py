@@ -0,0 +1,180 @@
+'''
+Benchmark suite of the reduction engine on synthetic FERMI-like data (see
+fermi_libraries.synthetic_data), against data size and number of cores.
+
+Timed: Run.yield_file_data, Run.average_run_data_weights (serial) and
+MultithreadRun.average_run_data_weights, Run.give_moment_sums_rundata, rebinning,
+cpbasex.gData.findG and cpbasex.cpbasex.cpbasex.
+
+The results are written as JSON (with the git commit and machine information), and
+can be compared with an earlier results file to find regressions:
+
+    python benchmarks/bench_reduction.py --shots 100 400 --cores 1 2 4
+    python benchmarks/bench_reduction.py --compare benchmarks/results/<earlier>.json
+'''
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+import tempfile
+import numpy as np
+from multiprocessing import cpu_count
+
+from fermi_libraries.run_module import Run, MultithreadRun
+from fermi_libraries.common_functions import rebinning
+from fermi_libraries.reducers import batch_filter
+from fermi_libraries.synthetic_data import write_synthetic_run, default_alias_dict
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+@batch_filter
+def tof_roi_sums(shots):
+    return np.stack([shots[:, 1000:1200].sum(axis=-1), shots[:, 5000:5200].sum(axis=-1)], axis=-1)
+
+
+def best_of(function, repeat=3):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter()-start)
+    return min(times)
+
+
+def make_run(tempdir, shots, files, frame_shape, tof_bins, run_class=Run):
+    filepaths = write_synthetic_run(tempdir, shots, files=files, shots_per_file=shots,
+                                    frame_shape=frame_shape, tof_bins=tof_bins, seed=shots)
+    run = run_class(filepaths, alias_dict=default_alias_dict)
+    return run
+
+
+def run_benchmarks(shots_list, cores_list, files=4, frame_shape=(300, 300), tof_bins=26000, repeat=3,
+                   gdata_sizes=(30, 60)):
+    results = []
+
+    def record(name, seconds, **parameters):
+        results.append(dict(name=name, seconds=seconds, **parameters))
+        details = ', '.join(f'{key}={value}' for key, value in parameters.items())
+        print(f'    {name:<40s} {details:<40s} {seconds*1e3:10.1f} ms')
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        for shots in shots_list:
+            run = make_run(tempdir, shots, files, frame_shape, tof_bins)
+            size = dict(shots=shots*files)
+            no_cache = dict(use_cache=False, make_cache=False)
+
+            for dataname in ['vmi', 'ion_tof']:
+                record(f'yield_file_data({dataname})', best_of(lambda: [
+                    _ for _ in run.yield_file_data(dataname, back_sep=True, slu_sep=True)], repeat), **size)
+                record(f'average_run_data_weights({dataname})', best_of(lambda: run.average_run_data_weights(
+                    dataname, back_sep=True, slu_sep=True, **no_cache), repeat), cores=1, **size)
+                multithread_run = MultithreadRun(run.filepaths, alias_dict=default_alias_dict)
+                for cores in cores_list:
+                    multithread_run.num_cores = cores
+                    record(f'MultithreadRun.average_run_data_weights({dataname})',
+                           best_of(lambda: multithread_run.average_run_data_weights(
+                               dataname, back_sep=True, slu_sep=True, **no_cache), repeat), cores=cores, **size)
+
+            record('give_moment_sums_rundata(ion_tof, batch filter)',
+                   best_of(lambda: run.give_moment_sums_rundata(
+                       'ion_tof', back_sep=True, filter1=tof_roi_sums, filter2=tof_roi_sums, **no_cache), repeat),
+                   **size)
+
+            traces = np.random.default_rng(0).normal(size=(shots*files, tof_bins))
+            record('rebinning(traces, 10x)', best_of(lambda: rebinning(
+                np.arange(0, tof_bins, 10)+4.5, np.arange(tof_bins), traces, axis=-1), repeat), **size)
+
+        from cpbasex.gData import get_gData, loadG, findG
+        from cpbasex.rBFs import rBFs
+        from cpbasex.cpbasex import cpbasex
+        np.seterr('ignore')
+        for nx in gdata_sizes:
+            x = np.arange(nx, dtype='double')+0.5
+            k = np.arange(0, nx, 4) + 1.5
+            params = 0.7*4
+            rBF, zIP = rBFs('gauss')
+            for cores in cores_list:
+                record('findG', best_of(lambda: findG(
+                    x, k, np.arange(0, 5, 2), lambda r, k: rBF(r, k, params), lambda r, k: zIP(r, k, params),
+                    0.05, nProc=cores), 1), nx=nx, cores=cores)
+
+            gdata = dict(rBF='gauss', x=x, k=k, params=params, l=np.arange(0, 5, 2))
+            save_path = os.path.join(tempdir, f'G_{nx}.h5')
+            get_gData(gdata, save_path=save_path, nProc=1, silent=1, shape='half')
+            gdata = loadG(save_path)
+            images = np.random.default_rng(0).random((nx, 2*nx, 50))
+            record('cpbasex(50 images)', best_of(lambda: cpbasex(images, gdata), repeat), nx=nx)
+
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ''
+
+
+def save_results(results, output=None):
+    meta = dict(time=time.strftime('%Y-%m-%d %H:%M:%S'), commit=git_commit(), python=platform.python_version(),
+                numpy=np.__version__, machine=platform.machine(), cpu_count=cpu_count())
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d_%H%M%S')}_{meta['commit']}.json")
+    with open(output, 'w') as f:
+        json.dump(dict(meta=meta, results=results), f, indent=1)
+    print(f'results saved in {output}')
+    return output
+
+
+def compare_results(results, reference_path, tolerance=1.2):
+    '''
+    Prints the ratio of the new to the reference timings; ratios above tolerance are
+    marked as regressions. Returns the list of regressions.
+    '''
+    with open(reference_path) as f:
+        reference = json.load(f)
+    key = lambda item: tuple(sorted((k, v) for k, v in item.items() if k != 'seconds'))
+    reference_times = {key(item): item['seconds'] for item in reference['results']}
+    print(f"compared with {reference_path} (commit {reference['meta'].get('commit', '?')})")
+    regressions = []
+    for item in results:
+        if key(item) not in reference_times:
+            continue
+        ratio = item['seconds']/reference_times[key(item)]
+        flag = '  <-- regression' if ratio > tolerance else ''
+        details = ', '.join(f'{k}={v}' for k, v in item.items() if k not in ('name', 'seconds'))
+        print(f"    {item['name']:<40s} {details:<40s} {ratio:6.2f}x{flag}")
+        if ratio > tolerance:
+            regressions.append((item, ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--shots', type=int, nargs='+', default=[50, 200], help='shots per file')
+    parser.add_argument('--files', type=int, default=4, help='files per run')
+    parser.add_argument('--cores', type=int, nargs='+', default=[1, 2], help='numbers of cores')
+    parser.add_argument('--frame', type=int, nargs=2, default=[300, 300], help='VMI frame shape')
+    parser.add_argument('--tof-bins', type=int, default=26000)
+    parser.add_argument('--gdata-sizes', type=int, nargs='*', default=[30, 60])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', default=None, help='results file (default: benchmarks/results/)')
+    parser.add_argument('--compare', default=None, help='earlier results file to compare with')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.shots, args.cores, files=args.files, frame_shape=tuple(args.frame),
+                             tof_bins=args.tof_bins, repeat=args.repeat, gdata_sizes=args.gdata_sizes)
+    save_results(results, args.output)
+    if args.compare:
+        return compare_results(results, args.compare)
+
+
+if __name__ == '__main__':
+    sys.exit(1 if main() else 0)
@@ -342,6 +342,20 @@ delays, *_ = simplify_data(delays, single_rule=True, single_run=False)
 delays = np.squeeze(delays)
 print(delays)
 
+# %%
+"""
+Alternatively, bin every shot by its own delay over all Runs (in one pass), instead of
+using the Run-averaged delays. This keeps shots with drifting delays within a Run.
+The output axes are (condition, rule, delay bin, data).
+"""
+
+# %%
+delay_edges = np.linspace(np.min(delays)-1, np.max(delays)+1, num=len(run_numbers)+1)
+scan_vmi, scan_weights = BasicRunSet.average_scan_data_weights('vmi', 'delay', delay_edges,
+                                    back_sep=BACKGROUND, make_cache=MAKE_CACHE, use_cache=LOAD_FROM_CACHE)
+delay_centers = (delay_edges[1:] + delay_edges[:-1])/2
+print(f'shots per delay bin: {scan_weights[0][0]}')
+
 # %%
 """
 Show VMI and resizing
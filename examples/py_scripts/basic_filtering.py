@@ -200,6 +200,17 @@ i0m_bins = i0m_edges[:-1]
 i0m_filter_rules = [f'(i0m>{lo} & i0m<{hi})' for lo, hi in zip(i0m_edges[:-1], i0m_edges[1:])]
 print(f'i0m filter rules: {i0m_filter_rules}')
 
+# %%
+"""
+Alternatively, choose edges with about equal numbers of foreground shots in every bin.
+These come from a quantile sketch of I0M, so the shots are not loaded (see
+RunSets.quantile_edges() and RunSets.histogram_set_data()).
+"""
+
+# %%
+i0m_quantile_edges = BasicRunSet.quantile_edges('i0m', 3)[0][0]
+print(f'equal-population i0m edges: {i0m_quantile_edges}')
+
 # %%
 """
 Get ion TOF spectra, binned by each of the filtering rules.
@@ -0,0 +1,164 @@
+# %%
+"""
+## Import statements
+"""
+
+# %%
+# uncomment the following line when you want to interact with the matplotlib plots
+#%matplotlib widget
+
+import os
+import time
+
+import numpy as np
+import matplotlib.pyplot as plt
+from fermi_libraries.run_module import Run, RunSets
+from fermi_libraries.common_functions import (
+    simplify_data, name_from_runs, set_recursion_limit, resolve_path, find_subdir
+    )
+from fermi_libraries.dictionary_search import search_symbols
+import pathlib
+
+# %%
+try:
+    CURRENT_SCRIPT_DIR = str(pathlib.Path(__file__).parent.resolve())+'/'
+except NameError:  # this will happen in .ipynb files
+    CURRENT_SCRIPT_DIR = os.path.abspath('')
+
+# %%
+"""
+### Function and alias definitions
+"""
+
+# %%
+
+@set_recursion_limit(1)
+def keyword_functions(keyword, aliasFunc, DictionaryObject):
+    return DictionaryObject[aliasFunc(keyword)]
+
+alias_dict = {
+    'vmi' : 'vmi/andor',
+    'ion_tof' : 'digitizer/channel1',
+    'delay' : 'user_laser/delay_line/position',
+    'slu' : 'user_laser/energy_meter/Energy2',
+    }
+
+# %%
+"""
+
+---
+
+# ! Data selection !
+
+Compares the full cpbasex inversion with the fast rbasex inversion (used for
+live previews) on the same VMI images.
+"""
+
+# %%
+BEAMTIME_DIR = find_subdir('TestBeamtime', resolve_path(CURRENT_SCRIPT_DIR, '..'))
+DATA_DIR = f'{BEAMTIME_DIR}/Beamtime'
+SAVE_DIR = f'{BEAMTIME_DIR}/results/evaluation'
+
+SAVE_FILES = True
+BACKGROUND = True
+NAMEADD = 'compare_inversions_XX' # your name here
+run_numbers = np.arange(1,3)
+
+MAKE_CACHE = True
+LOAD_FROM_CACHE = True
+
+# %%
+RunCollection = {}
+for run_id in run_numbers:
+    folderpath = os.path.join(DATA_DIR, f'Run_{run_id:03d}/rawdata')
+    filepaths = [folderpath+'/'+filename for filename in os.listdir(folderpath)[::]]
+    RunCollection[run_id] = Run(filepaths,
+                                alias_dict=alias_dict, search_symbols=search_symbols,
+                                keyword_functions=keyword_functions,
+                                )
+
+BasicRunSet = RunSets([])
+for run in run_numbers:
+    BasicRunSet.add([RunCollection[run]])
+
+run_string = name_from_runs(run_numbers)
+prefix = os.path.join(SAVE_DIR, run_string)
+outdir = (prefix + '_' + NAMEADD).rstrip('_')
+if SAVE_FILES:
+    if not os.path.exists(outdir):
+        os.mkdir(outdir)
+
+# %%
+"""
+Load and fold the VMI images, as in basic_abel_inversion
+"""
+
+# %%
+
+from cpbasex.cpbasex import cpbasex_energy as cpbasex_energy_inversion
+from cpbasex.rbasex import rbasex_energy as rbasex_energy_inversion
+from cpbasex.gData import loadG
+from cpbasex.image_mod import resize, resizeFoldedHalf, foldHalf
+
+runset_vmi = BasicRunSet.average_run_data('vmi',back_sep=BACKGROUND,
+                                    make_cache=MAKE_CACHE, use_cache=LOAD_FROM_CACHE)
+fore_vmi, back_vmi, *_ = simplify_data(runset_vmi, single_rule=True, single_run=False)
+sub_vmi = (fore_vmi - back_vmi).transpose(1,2,0)
+
+vmi = resize(sub_vmi, (450, 450), axis=(0,1))
+folded = foldHalf(vmi, x0=264, y0=260, half_filter=[True, True])
+resized = resizeFoldedHalf(folded, 225)
+
+# %%
+"""
+Invert with both methods. The rbasex lookup tables are made on the first call
+for a given image size, so it is timed twice.
+"""
+
+# %%
+PROJECT_DIRECTORY = resolve_path(CURRENT_SCRIPT_DIR, '../..')
+gData = loadG(f'{PROJECT_DIRECTORY}/G_r225_k57_l4_half.h5')
+
+time_start = time.time()
+out_cpbasex = cpbasex_energy_inversion(resized, gData, shape='half')
+time_cpbasex = time.time() - time_start
+
+time_start = time.time()
+out_rbasex = rbasex_energy_inversion(resized, l=gData['l'], shape='half')
+time_rbasex_tables = time.time() - time_start
+time_start = time.time()
+out_rbasex = rbasex_energy_inversion(resized, l=gData['l'], shape='half')
+time_rbasex = time.time() - time_start
+
+print(f'cpbasex: {time_cpbasex:.3f} s, rbasex: {time_rbasex:.3f} s ({time_rbasex_tables:.3f} s incl. lookup tables)')
+
+# %%
+"""
+Accuracy of rbasex, relative to cpbasex
+"""
+
+# %%
+E = out_cpbasex['E']
+IE_cpbasex, IE_rbasex = out_cpbasex['IE'], out_rbasex['IE']
+betas_cpbasex, betas_rbasex = out_cpbasex['betas'], out_rbasex['betas']
+
+difference = np.max(np.abs(IE_rbasex-IE_cpbasex), axis=0) / np.max(np.abs(IE_cpbasex), axis=0)
+print(f'maximum difference of IE, relative to the peak: {np.atleast_1d(difference)}')
+
+fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(9,4))
+ax1.plot(E, IE_cpbasex[:,0], label='cpbasex')
+ax1.plot(E, IE_rbasex[:,0], label='rbasex', linestyle='--')
+ax1.set_xlabel(r'r$^{2}$')
+ax1.set_ylabel('radial-squared density (arb.u.)')
+ax1.legend()
+ax1.grid()
+for i, l in enumerate(gData['l'][1:]):
+    ax2.plot(E, betas_cpbasex[:,i,0], label=fr'$\beta_{l}$ cpbasex')
+    ax2.plot(E, betas_rbasex[:,i,0], label=fr'$\beta_{l}$ rbasex', linestyle='--')
+ax2.set_xlabel(r'r$^{2}$')
+ax2.set_ylim(-1, 2)
+ax2.legend()
+ax2.grid()
+plt.tight_layout()
+if SAVE_FILES: fig.savefig(f'{outdir}/compare_inversions.png')
+plt.show()
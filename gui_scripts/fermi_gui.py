@@ -2080,11 +2080,12 @@ class Ui_MainWindow(object):
         
         vmi_rotation = self.image_correction_data['rotate']
 
-        corrected = stretch(rotate(center_image(vmi_subt, vmi_center), vmi_rotation), vmi_zoom)
-        vmi = resize(corrected, (reduce_image_size, reduce_image_size), axis=(0,1))
-        folded = foldHalf(vmi, half_filter=half_filter)
-        # resized = resizeFoldedHalf(folded, 225)
-        resized = folded
+        # one cached resampling per geometry, instead of center_image -> rotate -> stretch -> resize -> foldHalf
+        geometry = dict(center=vmi_center, rotation=vmi_rotation, stretch=vmi_zoom,
+                        r_max=raw_image_size/2, half_filter=half_filter)
+        corrected = correct_images(vmi_subt, raw_image_size//2, fold=False, **geometry)
+        vmi = correct_images(vmi_subt, reduce_image_size//2, fold=False, **geometry)
+        resized = correct_images(vmi_subt, reduce_image_size//2, **geometry)
 
 
         self.graph_data['vmi_raw'] = vmi_subt
@@ -2097,37 +2098,39 @@ class Ui_MainWindow(object):
             self.betas = gData['l']
 
         if self.valid_inversion_condition():
-
-
             out = cpbasex_energy_inversion(resized, self.gdata, make_images=True, shape='half')
-            try:
-                inv = out['inv'][:,:]/2
-            except KeyError:
-                inv = vmi * np.nan
-            try:
-                fit = out['fit'][:,:]/2
-            except KeyError:
-                fit = vmi * np.nan
-
-            rsquare = out['E']
-            rsquare_spectrum = out['IE']
-            betas = out['betas']
-
-            slope = self.pes_calibration_constant
-            rsquare_to_energy = lambda x: slope * x
-            energies = rsquare_to_energy(rsquare)
-            pes = rsquare_spectrum / slope # jacobian correction
             radial = self.gdata['x']
-            rdf = pes * 2/radial  # radial distirubtion function w/ jacobian correction
-
-            self.graph_data['radial'] = radial
-            self.graph_data['subt_rdf'] = radial, rdf
-            self.graph_data['subt_rsdf'] = rsquare, pes
-            # self.graph_data['pes_subt'] = energies, pes
-            self.graph_data['betas'] = rsquare, betas
-            self.graph_data['vmi_inverse'] = inv
-            self.graph_data['vmi_fit'] = fit
-            
+        else:  # no inversion data for this image size, use the fast preview instead
+            l_values = self.betas if len(self.betas) else (0, 2, 4)
+            out = rbasex_energy_inversion(resized, l=l_values, make_images=True, shape='half')
+            radial = np.sqrt(out['E'])
+        try:
+            inv = out['inv'][:,:]/2
+        except KeyError:
+            inv = vmi * np.nan
+        try:
+            fit = out['fit'][:,:]/2
+        except KeyError:
+            fit = vmi * np.nan
+
+        rsquare = out['E']
+        rsquare_spectrum = out['IE']
+        betas = out['betas']
+
+        slope = self.pes_calibration_constant
+        rsquare_to_energy = lambda x: slope * x
+        energies = rsquare_to_energy(rsquare)
+        pes = rsquare_spectrum / slope # jacobian correction
+        rdf = pes * 2/radial  # radial distirubtion function w/ jacobian correction
+
+        self.graph_data['radial'] = radial
+        self.graph_data['subt_rdf'] = radial, rdf
+        self.graph_data['subt_rsdf'] = rsquare, pes
+        # self.graph_data['pes_subt'] = energies, pes
+        self.graph_data['betas'] = rsquare, betas
+        self.graph_data['vmi_inverse'] = inv
+        self.graph_data['vmi_fit'] = fit
+        
         xcenter, ycenter = self.image_correction_data['center']
         if xcenter is None: xcenter = np.shape(self.graph_data['vmi_raw'])[0]/2
         if ycenter is None: ycenter = np.shape(self.graph_data['vmi_raw'])[1]/2
@@ -2272,7 +2275,6 @@ class Ui_MainWindow(object):
         (_, _, _, _, ion_constants_dict) = list(ion_calibration_dict.values())
         ion_constants = ion_constants_dict['timezero'], ion_constants_dict['C']
         tof_mq_coor_func = lambda tof: tof_mq_coordinate_func(tof, *ion_constants)
-        tof_to_mq = lambda tof, spec, axis=None: tof_to_mq_conversion(tof, spec, *ion_constants, axis=axis)
         
         self.ion_tof_calibration_constants = ion_constants
 
@@ -2286,44 +2288,16 @@ class Ui_MainWindow(object):
         self.calibration_data['tof_mq_points'] = tof_points, mq_points
         self.calibration_data['tof_mq_model'] = tof_model, mq_model
 
-        mq_raw_coor, mq_raw_subt = tof_to_mq(tof_coor, tof_subt)
-        mq_start, mq_end, mq_bins = self.get_mq_lim_data(tof_mq_coor_func(tof_coor))
-
-        mq_coor = np.linspace(mq_start, mq_end, num=mq_bins)
-        if len(mq_raw_coor) < 2:
-            mq_coor = np.array([])
-            mq_subt = np.array([])
-        else:
-            mq_subt = rebinning(mq_coor, mq_raw_coor, mq_raw_subt)
-
-        self.graph_data['mq_subt'] = mq_coor, mq_subt
-
-        mq_raw_coor, mq_raw_fore = tof_to_mq(*self.graph_data['tof_fore'])
-        mq_start, mq_end, mq_bins = self.get_mq_lim_data(tof_mq_coor_func(tof_coor))
-        mq_coor = np.linspace(mq_start, mq_end, num=mq_bins)
-        if len(mq_raw_coor) < 2:
-            mq_coor = np.array([])
-            mq_fore = np.array([])
-        else:
-            mq_fore = rebinning(mq_coor, mq_raw_coor, mq_raw_fore)
-            
-        mq_raw_coor, mq_raw_back = tof_to_mq(*self.graph_data['tof_back'])
-        mq_start, mq_end, mq_bins = self.get_mq_lim_data(tof_mq_coor_func(tof_coor))
-        mq_coor = np.linspace(mq_start, mq_end, num=mq_bins)
-        if len(mq_raw_coor) < 2:
-            mq_coor = np.array([])
-            mq_back = np.array([])
-        else:
-            mq_back = rebinning(mq_coor, mq_raw_coor, mq_raw_back)
-
-        mq_raw_coor, mq_raw_subt = tof_to_mq(*self.graph_data['tof_subt'])
         mq_start, mq_end, mq_bins = self.get_mq_lim_data(tof_mq_coor_func(tof_coor))
         mq_coor = np.linspace(mq_start, mq_end, num=mq_bins)
-        if len(mq_raw_coor) < 2:
+        if np.sum(tof_coor > ion_constants[0]) < 2:
             mq_coor = np.array([])
-            mq_subt = np.array([])
+            mq_fore, mq_back, mq_subt = np.array([]), np.array([]), np.array([])
         else:
-            mq_subt = rebinning(mq_coor, mq_raw_coor, mq_raw_subt)
+            # TOF -> m/q with the Jacobian, as one (cached) sparse product per spectrum
+            mq_fore, mq_back, mq_subt = (
+                tof_to_mq_operator(tof, mq_coor, *ion_constants).apply(spectrum)
+                for tof, spectrum in (self.graph_data['tof_fore'], self.graph_data['tof_back'], self.graph_data['tof_subt']))
 
         self.graph_data['mq_fore'] = mq_coor, mq_fore
         self.graph_data['mq_back'] = mq_coor, mq_back
@@ -2367,9 +2341,9 @@ class Ui_MainWindow(object):
         new_mq_coor, new_mq_back = self.graph_data['new_mq_back']
         new_mq_coor, new_mq_subt = self.graph_data['new_mq_subt']
 
-        self._line_fore_tof.set_data(new_tof_coor, new_tof_fore)
-        self._line_back_tof.set_data(new_tof_coor, new_tof_back)
-        self._line_subt_tof.set_data(new_tof_coor, new_tof_subt)
+        self._live_lines['fore_tof'].set_data(new_tof_coor, new_tof_fore)
+        self._live_lines['back_tof'].set_data(new_tof_coor, new_tof_back)
+        self._live_lines['subt_tof'].set_data(new_tof_coor, new_tof_subt)
         yscale = self.combobox_tof_yscale.currentText().lower()
         self._fore_tof_ax.set_yscale(yscale)
         self._back_tof_ax.set_yscale(yscale)
@@ -2382,14 +2356,14 @@ class Ui_MainWindow(object):
         self.set_new_xlim_ylim(*self.graph_data['tof_subt'], self._subt_tof_ax, 
             self.graph_data['tof_start'], self.graph_data['tof_end'], kind=yscale)
 
-        self._line_fore_tof.figure.canvas.draw()
-        self._line_back_tof.figure.canvas.draw()
-        self._line_subt_tof.figure.canvas.draw()
+        self._blit_managers['fore_tof'].update()
+        self._blit_managers['back_tof'].update()
+        self._blit_managers['subt_tof'].update()
         
         tof_coor, raw_tof = self.graph_data['tof_subt']
         with IgnoreWarnings("length one"):
             new_raw_tof = rebinning(new_tof_coor, tof_coor, raw_tof)
-        self._line_raw_tof.set_data(new_tof_coor, new_raw_tof)
+        self._live_lines['raw_tof'].set_data(new_tof_coor, new_raw_tof)
 
         tof_points, mq_points = self.calibration_data['tof_mq_points']
         tof_model, mq_model = self.calibration_data['tof_mq_model']
@@ -2402,7 +2376,7 @@ class Ui_MainWindow(object):
         self.set_new_xlim_ylim(tof_points, mq_points, self._cal_tof_ax, None, None)
 
 
-        self._line_mq_tof.set_data(self.graph_data['mq_subt'])
+        self._live_lines['mq_tof'].set_data(*self.graph_data['mq_subt'])
 
         
         self.set_new_xlim_ylim(*self.graph_data['tof_subt'], self._raw_tof_ax, 
@@ -2411,16 +2385,14 @@ class Ui_MainWindow(object):
             *self.get_mq_lim_data(self.graph_data['mq_subt'][0])[:2])
         # self._mq_tof_ax.ticklabel_format(axis='y', useOffset=False)  # setting the ylim resets the format! This is a quick fix
         
-        self._line_raw_tof.figure.canvas.draw()
-        self._line_raw_tof_points.figure.canvas.draw()
-        self._line_cal_tof.figure.canvas.draw()
-        self._line_cal_tof_points.figure.canvas.draw()
-        self._line_mq_tof.figure.canvas.draw()
+        self._blit_managers['raw_tof'].update()
+        self._blit_managers['cal_tof'].update()
+        self._blit_managers['mq_tof'].update()
 
 
-        self._line_fore_mq.set_data(new_mq_coor, new_mq_fore)
-        self._line_back_mq.set_data(new_mq_coor, new_mq_back)
-        self._line_subt_mq.set_data(new_mq_coor, new_mq_subt)
+        self._live_lines['fore_mq'].set_data(new_mq_coor, new_mq_fore)
+        self._live_lines['back_mq'].set_data(new_mq_coor, new_mq_back)
+        self._live_lines['subt_mq'].set_data(new_mq_coor, new_mq_subt)
         yscale = self.combobox_tof_yscale.currentText().lower()
         self._fore_mq_ax.set_yscale(yscale)
         self._back_mq_ax.set_yscale(yscale)
@@ -2433,9 +2405,9 @@ class Ui_MainWindow(object):
         self.set_new_xlim_ylim(*self.graph_data['mq_subt'], self._subt_mq_ax, 
             self.graph_data['mq_start'], self.graph_data['mq_end'], kind=yscale)
 
-        self._line_fore_mq.figure.canvas.draw()
-        self._line_back_mq.figure.canvas.draw()
-        self._line_subt_mq.figure.canvas.draw()
+        self._blit_managers['fore_mq'].update()
+        self._blit_managers['back_mq'].update()
+        self._blit_managers['subt_mq'].update()
 
         time_end = time.time()
         print('time elapsed (redraw_tof_data): ', time_end-time_start)
@@ -2464,9 +2436,9 @@ class Ui_MainWindow(object):
             4 : self.box_beta4,
         }
         if self.box_pes.isChecked():
-            self._line_pes.set_data(energies, pes)
+            self._live_lines['pes'].set_data(energies, pes)
         else:
-            self._line_pes.set_data(energies, np.zeros(np.shape(pes))*np.nan)
+            self._live_lines['pes'].set_data(energies, np.zeros(np.shape(pes))*np.nan)
         possible_l_values = [l_value for l_value in l_values if l_value in [1,2,3,4]]        
         for index, l_value in enumerate(possible_l_values):
             if betas_to_boxes[l_value].isChecked():
@@ -2478,144 +2450,58 @@ class Ui_MainWindow(object):
         self.set_new_xlim_ylim(energies, pes, self._pes_ax, 
             *self.get_ke_lim_data(ke)[:2])
 
-        self._pes_ax.figure.canvas.draw()
-        self._betas_ax.figure.canvas.draw()
+        self._blit_managers['pes'].update()
 
     def update_main_vmi_window(self):
         """
         Update the VMI window in the Main VMI tab.
         """
 
-        if do_blitting := self.graph_data['vmi_fore'].shape == self._vmi_shape:
-            fore_background = self.fore_fig.canvas.copy_from_bbox(self._fore_ax.bbox)
-            self.fore_fig.canvas.restore_region(fore_background)
-            self._fore_ax_data.set_data(self.graph_data['vmi_fore'])
-            self._fore_ax.draw_artist(self._fore_ax_data)
-            # self._fore_ax_data.autoscale()
-            self.fore_fig.canvas.blit(self._fore_ax.bbox)
-
-            back_background = self.back_fig.canvas.copy_from_bbox(self._back_ax.bbox)
-            self.back_fig.canvas.restore_region(back_background)
-            self._back_ax_data.set_data(self.graph_data['vmi_back'])
-            self._back_ax.draw_artist(self._back_ax_data)
-            # self._back_ax_data.autoscale()
-            self.back_fig.canvas.blit(self._back_ax.bbox)
-
-            subt_background = self.subt_fig.canvas.copy_from_bbox(self._subt_ax.bbox)
-            self.subt_fig.canvas.restore_region(subt_background)
-            self._subt_ax_data.set_data(self.graph_data['vmi_subt'])
-            self._subt_ax.draw_artist(self._subt_ax_data)
-            # self._subt_ax_data.autoscale()
-            self.subt_fig.canvas.blit(self._subt_ax.bbox)
-            
-        else:
-            # extent = (0, data_shape[0], 0, data_shape[1])
-            data_shape = self.graph_data['vmi_fore'].shape
+        data_shape = self.graph_data['vmi_fore'].shape
+        if new_shape := data_shape != self._vmi_shape:
             extent = (0, data_shape[0], data_shape[1], 0)
-            self._fore_ax_data.set_data(self.graph_data['vmi_fore'])
-            self._fore_ax_data.autoscale()
-            self._back_ax_data.set_data(self.graph_data['vmi_back'])
-            self._back_ax_data.autoscale()
-            self._subt_ax_data.set_data(self.graph_data['vmi_subt'])
             with IgnoreWarnings("makes transformation singular"):
                 self._fore_ax_data.set_extent(extent)
                 self._back_ax_data.set_extent(extent)
                 self._subt_ax_data.set_extent(extent)
-            self._subt_ax_data.autoscale()
-            self._fore_ax_data.figure.canvas.draw()
-            self._back_ax_data.figure.canvas.draw()
-            self._subt_ax_data.figure.canvas.draw()
 
-        self._vmi_shape = self.graph_data['vmi_fore'].shape
+        for name in ['vmi_fore', 'vmi_back', 'vmi_subt']:
+            self._live_images[name].set_data(self.graph_data[name], autoscale=new_shape)
+            self._blit_managers[name].update()
+
+        self._vmi_shape = data_shape
 
     def update_image_window(self):
-        if do_blitting := ((self.graph_data['vmi_raw'].shape == self._image_vmi_shape)
-                           and (self.graph_data['vmi_reduced'].shape==self._image_small_vmi_shape)
-        ):
-            vmi_raw_background = self.vmi_raw_fig.canvas.copy_from_bbox(self._vmi_raw_ax.bbox)
-            self.vmi_raw_fig.canvas.restore_region(vmi_raw_background)
-            self._vmi_raw_ax_data.set_data(self.graph_data['vmi_raw'])
-            self._vmi_raw_guide_ax_data.set_data(self.graph_data['ring_guide'])
-            self._vmi_raw_ax.draw_artist(self._vmi_raw_ax_data)
-            self._vmi_raw_ax.draw_artist(self._vmi_raw_guide_ax_data)
-            # self._vmi_raw_ax_data.autoscale()
-            self.vmi_raw_fig.canvas.blit(self._vmi_raw_ax.bbox)
-            
-            vmi_corr_background = self.vmi_corr_fig.canvas.copy_from_bbox(self._vmi_corr_ax.bbox)
-            self.vmi_corr_fig.canvas.restore_region(vmi_corr_background)
-            self._vmi_corr_ax_data.set_data(self.graph_data['vmi_corr'])
-            self._vmi_corr_ax.draw_artist(self._vmi_corr_ax_data)
-            # self._vmi_corr_ax_data.autoscale()
-            self.vmi_corr_fig.canvas.blit(self._vmi_corr_ax.bbox)
-            
-            vmi_reduced_background = self.vmi_reduced_fig.canvas.copy_from_bbox(self._vmi_reduced_ax.bbox)
-            self.vmi_reduced_fig.canvas.restore_region(vmi_reduced_background)
-            self._vmi_reduced_ax_data.set_data(self.graph_data['vmi_reduced'])
-            self._vmi_reduced_ax.draw_artist(self._vmi_reduced_ax_data)
-            # self._vmi_reduced_ax_data.autoscale()
-            self.vmi_reduced_fig.canvas.blit(self._vmi_reduced_ax.bbox)
-            
-            vmi_fit_background = self.vmi_fit_fig.canvas.copy_from_bbox(self._vmi_fit_ax.bbox)
-            self.vmi_fit_fig.canvas.restore_region(vmi_fit_background)
-            self._vmi_fit_ax_data.set_data(self.graph_data['vmi_fit'])
-            self._vmi_fit_ax.draw_artist(self._vmi_fit_ax_data)
-            # self._vmi_fit_ax_data.autoscale()
-            self.vmi_fit_fig.canvas.blit(self._vmi_fit_ax.bbox)
-            
-            vmi_inverse_background = self.vmi_inverse_fig.canvas.copy_from_bbox(self._vmi_inverse_ax.bbox)
-            self.vmi_inverse_fig.canvas.restore_region(vmi_inverse_background)
-            self._vmi_inverse_ax_data.set_data(self.graph_data['vmi_inverse'])
-            self._vmi_inverse_ax.draw_artist(self._vmi_inverse_ax_data)
-            # self._vmi_inverse_ax_data.autoscale()
-            self.vmi_inverse_fig.canvas.blit(self._vmi_inverse_ax.bbox)
-            
-        else:
-            data_shape = self.graph_data['vmi_raw'].shape
-            extent = (0, data_shape[0], data_shape[1], 0)
-            
-            small_data_shape = self.graph_data['vmi_reduced'].shape
-            small_extent = (0, small_data_shape[0], small_data_shape[1], 0)
-            
-            self._vmi_raw_ax_data.set_data(self.graph_data['vmi_raw'])
-            self._vmi_raw_guide_ax_data.set_data(self.graph_data['ring_guide'])
-            with IgnoreWarnings("makes transformation singular"):
+        data_shape = self.graph_data['vmi_raw'].shape
+        small_data_shape = self.graph_data['vmi_reduced'].shape
+        new_shape = data_shape != self._image_vmi_shape
+        new_small_shape = small_data_shape != self._image_small_vmi_shape
+        with IgnoreWarnings("makes transformation singular"):
+            if new_shape:
+                extent = (0, data_shape[0], data_shape[1], 0)
                 self._vmi_raw_ax_data.set_extent(extent)
-            self._vmi_raw_ax_data.autoscale()
-            self._vmi_raw_ax.figure.canvas.draw()
-            
-            self._vmi_corr_ax_data.set_data(self.graph_data['vmi_corr'])
-            with IgnoreWarnings("makes transformation singular"):
                 self._vmi_corr_ax_data.set_extent(extent)
-            self._vmi_corr_ax_data.autoscale()
-            self._vmi_corr_ax.figure.canvas.draw()
-            
-            self._vmi_reduced_ax_data.set_data(self.graph_data['vmi_reduced'])
-            with IgnoreWarnings("makes transformation singular"):
+            if new_small_shape:
+                small_extent = (0, small_data_shape[0], small_data_shape[1], 0)
                 self._vmi_reduced_ax_data.set_extent(small_extent)
-            self._vmi_reduced_ax_data.autoscale()
-            self._vmi_reduced_ax.figure.canvas.draw()
-
-            self._vmi_fit_ax_data.set_data(self.graph_data['vmi_fit'])
-            with IgnoreWarnings("makes transformation singular"):
                 self._vmi_fit_ax_data.set_extent(small_extent)
-            self._vmi_fit_ax_data.autoscale()
-            self._vmi_fit_ax.figure.canvas.draw()
-
-            self._vmi_inverse_ax_data.set_data(self.graph_data['vmi_inverse'])
-            with IgnoreWarnings("makes transformation singular"):
                 self._vmi_inverse_ax_data.set_extent(small_extent)
-            self._vmi_inverse_ax_data.autoscale()
-            self._vmi_inverse_ax.figure.canvas.draw()
 
-        self._image_vmi_shape = self.graph_data['vmi_raw'].shape
-        self._image_small_vmi_shape = self.graph_data['vmi_reduced'].shape
+        self._vmi_raw_guide_ax_data.set_data(self.graph_data['ring_guide'])
+        for name, autoscale in [('vmi_raw', new_shape), ('vmi_corr', new_shape), ('vmi_reduced', new_small_shape),
+                                ('vmi_fit', new_small_shape), ('vmi_inverse', new_small_shape)]:
+            self._live_images[name].set_data(self.graph_data[name], autoscale=autoscale)
+            self._blit_managers[name].update()
+
+        self._image_vmi_shape = data_shape
+        self._image_small_vmi_shape = small_data_shape
 
         # PES in the image correction tab
         radial, rdf = self.graph_data['subt_rdf']
         self._vmi_rdf_ax_data.set_data(radial, rdf)
         self.set_new_xlim_ylim(radial, rdf, self._vmi_rdf_ax, 
             None, None)
-        self._vmi_rdf_ax.figure.canvas.draw()
+        self._blit_managers['vmi_rdf'].update()
     
     def get_mq_lim_data(self, mq_coor):
         mq_start_string = self.text_edit_mq_start.toPlainText()
@@ -2760,7 +2646,7 @@ class Ui_MainWindow(object):
         ke_coor, raw_pes = ke, pes
         with IgnoreWarnings("length one"):
             new_raw_pes = rebinning(new_ke_coor, ke_coor, raw_pes)
-        self._line_ke_rsquare.set_data(new_ke_coor, new_raw_pes)
+        self._live_lines['ke_rsquare'].set_data(new_ke_coor, new_raw_pes)
 
 
         model_rsquare = np.linspace(np.min(rsquare_points), np.max(rsquare_points), num=1000)
@@ -2773,7 +2659,7 @@ class Ui_MainWindow(object):
 
         self.graph_data['ke_subt'] = ke, pes
 
-        self._line_raw_rsquare.set_data(*self.graph_data['subt_rsdf'])
+        self._live_lines['raw_rsquare'].set_data(*self.graph_data['subt_rsdf'])
         self._line_raw_rsquare_points.set_data(rsquare_points, subt_rsdf[closest(rsquare_points, rsquare)])
         
         self.set_new_xlim_ylim(*self.graph_data['subt_rsdf'], self._raw_rsquare_ax, 
@@ -2783,10 +2669,9 @@ class Ui_MainWindow(object):
             *self.get_ke_lim_data(ke)[:2])
         # self._mq_tof_ax.ticklabel_format(axis='y', useOffset=False)  # setting the ylim resets the format! This is a quick fix
 
-        self._line_cal_rsquare_points.figure.canvas.draw()
-        self._line_raw_rsquare.figure.canvas.draw()
-        # self._line_subt_ke.figure.canvas.draw()
-        self._line_ke_rsquare.figure.canvas.draw()
+        self._blit_managers['cal_rsquare'].update()
+        self._blit_managers['raw_rsquare'].update()
+        self._blit_managers['ke_rsquare'].update()
 
 
     def change_pes_calibration_constants(self):
@@ -2837,15 +2722,17 @@ from fermi_libraries.run_module import Run
 from fermi_libraries.common_functions import (
     set_recursion_limit, resolve_path, closest, set_default_labels, rebinning)
 from fermi_libraries.dictionary_search import search_symbols
+from fermi_libraries.live_plotting import BlitManager, LiveImage, LiveLine
 from fermi_libraries.calibration_tools import (
     tof_mq_calibration, tof_mq_coordinate_func, mq_tof_coordinate_func, 
-    tof_to_mq_conversion, mq_to_tof_conversion)
+    tof_to_mq_conversion, mq_to_tof_conversion, tof_to_mq_operator)
 
 from cpbasex.cpbasex import cpbasex_energy as cpbasex_energy_inversion
+from cpbasex.rbasex import rbasex_energy as rbasex_energy_inversion
 from cpbasex.gData import loadG
 from cpbasex.image_mod import resize, resizeFoldedHalf, foldHalf
 from cpbasex.image_mod import find_center, find_rotation, find_ellipticity
-from cpbasex.image_mod import center_image, rotate, stretch
+from cpbasex.image_mod import center_image, rotate, stretch, correct_images
 
 class MplCanvas(FigureCanvasQTAgg):
     def __init__(self, parent=None, width=5, height=4, dpi=100):
@@ -3264,6 +3151,46 @@ class MainWindow(QMainWindow):
         plt.tight_layout()
         cal_rsquare_fig.subplots_adjust(bottom=0.26, left=0.15, right=0.95, top=0.95)
 
+        # the artists are updated in place and redrawn on a saved background of their canvas,
+        # the images and traces at the resolution of their axes on screen
+        app._live_lines = {name: LiveLine(line) for name, line in [
+            ('pes', app._line_pes),
+            ('fore_tof', app._line_fore_tof), ('back_tof', app._line_back_tof), ('subt_tof', app._line_subt_tof),
+            ('raw_tof', app._line_raw_tof), ('mq_tof', app._line_mq_tof),
+            ('fore_mq', app._line_fore_mq), ('back_mq', app._line_back_mq), ('subt_mq', app._line_subt_mq),
+            ('raw_rsquare', app._line_raw_rsquare), ('ke_rsquare', app._line_ke_rsquare),
+        ]}
+        app._live_images = {name: LiveImage(artist) for name, artist in [
+            ('vmi_fore', app._fore_ax_data), ('vmi_back', app._back_ax_data), ('vmi_subt', app._subt_ax_data),
+            ('vmi_raw', app._vmi_raw_ax_data), ('vmi_corr', app._vmi_corr_ax_data),
+            ('vmi_reduced', app._vmi_reduced_ax_data), ('vmi_fit', app._vmi_fit_ax_data),
+            ('vmi_inverse', app._vmi_inverse_ax_data),
+        ]}
+        app._blit_managers = {name: BlitManager(artists[0].figure.canvas, artists) for name, artists in [
+            ('pes', [app._line_pes, app._line_beta1, app._line_beta2, app._line_beta3, app._line_beta4]),
+            ('vmi_fore', [app._fore_ax_data]),
+            ('vmi_back', [app._back_ax_data]),
+            ('vmi_subt', [app._subt_ax_data]),
+            ('vmi_raw', [app._vmi_raw_ax_data, app._vmi_raw_guide_ax_data]),
+            ('vmi_corr', [app._vmi_corr_ax_data]),
+            ('vmi_reduced', [app._vmi_reduced_ax_data]),
+            ('vmi_fit', [app._vmi_fit_ax_data]),
+            ('vmi_inverse', [app._vmi_inverse_ax_data]),
+            ('vmi_rdf', [app._vmi_rdf_ax_data]),
+            ('fore_tof', [app._line_fore_tof]),
+            ('back_tof', [app._line_back_tof]),
+            ('subt_tof', [app._line_subt_tof]),
+            ('raw_tof', [app._line_raw_tof, app._line_raw_tof_points]),
+            ('mq_tof', [app._line_mq_tof]),
+            ('cal_tof', [app._line_cal_tof, app._line_cal_tof_points]),
+            ('fore_mq', [app._line_fore_mq]),
+            ('back_mq', [app._line_back_mq]),
+            ('subt_mq', [app._line_subt_mq]),
+            ('raw_rsquare', [app._line_raw_rsquare, app._line_raw_rsquare_points]),
+            ('ke_rsquare', [app._line_ke_rsquare]),
+            ('cal_rsquare', [app._line_cal_rsquare, app._line_cal_rsquare_points]),
+        ]}
+
         self.show()
 
 def close_app_threadpool(w, app, tabwidget):
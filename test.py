@@ -58,6 +58,104 @@ class TestMultithreadTemplates():
         from tests.run_test_multithread_run import test_multithread_run
         assert test_multithread_run() is None
 
+class TestLibraries():
+
+    def test_cpbasex_images(self):
+        from tests.run_cpbasex_images import test_cpbasex_images
+        assert test_cpbasex_images() is None
+
+    def test_rbasex(self):
+        from tests.run_rbasex import test_rbasex
+        assert test_rbasex() is None
+
+    def test_find_centers(self):
+        from tests.run_find_centers import test_find_centers
+        assert test_find_centers() is None
+
+    def test_polar_corrections(self):
+        from tests.run_polar_corrections import test_polar_corrections
+        assert test_polar_corrections() is None
+
+    def test_correct_images(self):
+        from tests.run_correct_images import test_correct_images
+        assert test_correct_images() is None
+
+    def test_rebinner(self):
+        from tests.run_rebinner import test_rebinner
+        assert test_rebinner() is None
+
+    def test_calibration_operators(self):
+        from tests.run_calibration_operators import test_calibration_operators
+        assert test_calibration_operators() is None
+
+    def test_reducers(self):
+        from tests.run_reducers import test_reducers
+        assert test_reducers() is None
+
+    def test_batch_filters(self):
+        from tests.run_batch_filters import test_batch_filters
+        assert test_batch_filters() is None
+
+    def test_scan_binning(self):
+        from tests.run_scan_binning import test_scan_binning
+        assert test_scan_binning() is None
+
+    def test_events(self):
+        from tests.run_events import test_events
+        assert test_events() is None
+
+    def test_synthetic_data(self):
+        from tests.run_synthetic_data import test_synthetic_data
+        assert test_synthetic_data() is None
+
+    def test_profiling(self):
+        from tests.run_profiling import test_profiling
+        assert test_profiling() is None
+
+    def test_planner(self):
+        from tests.run_planner import test_planner
+        assert test_planner() is None
+
+    def test_catalog(self):
+        from tests.run_catalog import test_catalog
+        assert test_catalog() is None
+
+    def test_lazy_imports(self):
+        from tests.run_lazy_imports import test_lazy_imports
+        assert test_lazy_imports() is None
+
+    def test_backends(self):
+        from tests.run_backends import test_backends
+        assert test_backends() is None
+
+    def test_accumulators(self):
+        from tests.run_accumulators import test_accumulators
+        assert test_accumulators() is None
+
+    def test_average_errors(self):
+        from tests.run_average_errors import test_average_errors
+        assert test_average_errors() is None
+
+    def test_shot_filters(self):
+        from tests.run_shot_filters import test_shot_filters
+        assert test_shot_filters() is None
+
+    def test_sketches(self):
+        from tests.run_sketches import test_sketches
+        assert test_sketches() is None
+
+    def test_async(self):
+        from tests.run_async import test_async
+        assert test_async() is None
+
+    def test_live_plotting(self):
+        from tests.run_live_plotting import test_live_plotting
+        assert test_live_plotting() is None
+
+    def test_peak_fitting(self):
+        from tests.run_peak_fitting import test_peak_fitting
+        assert test_peak_fitting() is None
+
 class TestNotebooks():
     
     def test_notebook_processing_preprocess_html(self):
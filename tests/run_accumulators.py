@@ -0,0 +1,98 @@
+import pickle
+import asyncio
+import tempfile
+import numpy as np
+import pytest
+from fermi_libraries.run_module import Run, MultithreadRun
+from fermi_libraries.backends import ProcessPoolBackend
+from fermi_libraries.accumulators import Accumulator, merge_all
+from fermi_libraries.synthetic_data import write_synthetic_run, default_alias_dict
+
+def test_accumulators():
+    rng = np.random.default_rng(0)
+    # [conditions][rules] shots of three "files", with different means and an empty rule
+    files = [[[rng.normal(loc, 1+loc, size=(n, 3)) for n in (n_shots, 0)] for loc in (0, 5)]
+             for n_shots in (4, 7, 10)]
+    accumulators = [Accumulator.from_shots(shots, m2=True) for shots in files]
+    merged = merge_all(accumulators)
+    assert merged is not accumulators[0] and accumulators[0].count[0, 0] == 4
+    for condition in range(2):
+        shots = np.concatenate([shots[condition][0] for shots in files])
+        assert merged.count[condition, 0] == 21 and merged.count[condition, 1] == 0
+        assert np.allclose(merged.mean()[condition, 0], shots.mean(axis=0))
+        assert np.allclose(merged.m2[condition, 0], shots.var(axis=0)*len(shots))
+        assert np.all(merged.mean()[condition, 1] == 0) and np.all(merged.m2[condition, 1] == 0)
+    left = (accumulators[0] + accumulators[1]) + accumulators[2]
+    right = accumulators[0] + (accumulators[1] + accumulators[2])
+    for name in ['sum', 'count', 'm2']:
+        assert np.allclose(getattr(left, name), getattr(right, name))
+
+    # serialization
+    for copy in [Accumulator.from_bytes(merged.to_bytes()), pickle.loads(pickle.dumps(merged)),
+                 Accumulator.from_arrays(merged.as_arrays())]:
+        for name in ['sum', 'count', 'm2']:
+            assert np.array_equal(getattr(copy, name), getattr(merged, name))
+        assert copy.sum2 is None
+    with pytest.raises(ValueError):
+        merged.merge(Accumulator.from_shots(files[0]))  # without m2
+    with pytest.raises(ValueError):
+        merged.merge(Accumulator.zeros(2, 2, (4,), m2=True))
+
+    # co-moments of two different variables merge like one pass over all shots
+    x, y = rng.normal(size=(30, 3)), rng.normal(size=(30, 2))
+    y[:, 0] += x[:, 1]
+    parts = []
+    for part in np.split(np.arange(30), [5, 18]):
+        xi, yi = x[part], y[part]
+        comoment = (xi - xi.mean(axis=0)).T @ (yi - yi.mean(axis=0))
+        parts.append(Accumulator([[xi.sum(axis=0)]], [[len(part)]], sum2=[[yi.sum(axis=0)]],
+                                 comoment=[[comoment]]))
+    total = merge_all(parts)
+    assert np.allclose(total.covariance()[0, 0], np.cov(x.T, y.T)[:3, 3:])
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        filepaths = write_synthetic_run(tempdir, 1, files=5, shots_per_file=20, frame_shape=(12, 12),
+                                        tof_bins=8000, seed=0)
+        run = Run(filepaths, alias_dict=default_alias_dict)
+        no_cache = dict(use_cache=False, make_cache=False)
+        averages, weights = run.average_run_data_weights('vmi', back_sep=True, **no_cache)
+        # cache blocks contain only their own files
+        block_averages, block_weights = run.average_run_data_weights('vmi', back_sep=True, num_files_per_cache=2,
+                                                                     use_cache=False, make_cache=True)
+        assert np.array_equal(block_weights, weights) and np.allclose(block_averages, averages)
+        assert np.sum(weights) == 100
+
+        # give_moment_sums_rundata with different filters
+        roi1 = lambda trace: np.array([trace[7000:7400].sum(), trace[:100].sum()], dtype=float)
+        roi2 = lambda trace: np.array([trace[7000:7400].sum(), trace[100:200].sum(), trace[200:300].sum()],
+                                      dtype=float)
+        covar, sum1, sum2, counts = run.give_moment_sums_rundata('ion_tof', filter1=roi1, filter2=roi2, **no_cache)
+        traces = run.give_rundata('ion_tof', **no_cache)[0][0]
+        x, y = np.array([roi1(t) for t in traces]), np.array([roi2(t) for t in traces])
+        assert counts[0][0] == len(traces) == 100
+        assert np.allclose(covar[0][0], np.cov(x.T, y.T, bias=True)[:2, 2:]*len(traces))
+        assert np.allclose(sum1[0][0], x.sum(axis=0)) and np.allclose(sum2[0][0], y.sum(axis=0))
+
+    # a corrupt file is skipped, and the blocks (and their caches) keep their own files
+    with tempfile.TemporaryDirectory() as tempdir:
+        filepaths = write_synthetic_run(tempdir, 1, files=5, shots_per_file=20, frame_shape=(12, 12),
+                                        with_tof=False, seed=1)
+        with open(filepaths[1], 'wb') as file:
+            file.write(b'not an hdf5 file')
+        expected = Run(filepaths[:1] + filepaths[2:], alias_dict=default_alias_dict).average_run_data_errors(
+            'vmi', back_sep=True, use_cache=False, make_cache=False)
+        assert np.sum(expected[3]) == 80
+        run = Run(filepaths, alias_dict=default_alias_dict)
+        multithread_run = MultithreadRun(filepaths, alias_dict=default_alias_dict)
+        multithread_run.num_cores = 2
+        with ProcessPoolBackend(2) as backend:
+            for use_cache in [False, True]:  # the second pass reads the caches of the complete blocks
+                kwargs = dict(back_sep=True, num_files_per_cache=2, use_cache=use_cache, make_cache=True)
+                for errors in [run.average_run_data_errors('vmi', **kwargs),
+                               run.average_run_data_errors('vmi', backend=backend, **kwargs),
+                               asyncio.run(run.average_run_data_errors_async('vmi', **kwargs))]:
+                    for output, expected_output in zip(errors, expected):
+                        assert np.allclose(output, expected_output, equal_nan=True)
+                for averages, weights in [run.average_run_data_weights('vmi', **kwargs),
+                                          multithread_run.average_run_data_weights('vmi', **kwargs)]:
+                    assert np.array_equal(weights, expected[3]) and np.allclose(averages, expected[0])
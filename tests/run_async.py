@@ -0,0 +1,74 @@
+import time
+import asyncio
+import tempfile
+import concurrent.futures
+import numpy as np
+from fermi_libraries.run_module import Run, RunSets, MultithreadRun
+from fermi_libraries.backends import SerialBackend, ProcessPoolBackend
+from fermi_libraries.asynchronous import Latest, BackgroundLoop, starmap
+from fermi_libraries.synthetic_data import write_synthetic_beamtime, default_alias_dict
+
+def test_async():
+    with tempfile.TemporaryDirectory() as tempdir:
+        runs = write_synthetic_beamtime(tempdir, runs=2, delays=[-50, 50], files=3, shots_per_file=20,
+                                        frame_shape=(12, 12), with_tof=False, seed=3)
+        run = Run(runs[1], alias_dict=default_alias_dict)
+        run_sets = RunSets([run, Run(runs[2], alias_dict=default_alias_dict)])
+        no_cache = dict(use_cache=False, make_cache=False)
+        kwargs = dict(back_sep=True, rules=[None, '(i0m>30)'])
+        vmi = run.average_run_data('vmi', **kwargs, **no_cache)
+        i0m = run.average_run_data('i0m', **kwargs, **no_cache)
+
+        async def main():
+            # VMI and i0m at the same time, also on worker processes
+            with ProcessPoolBackend(2) as backend:
+                for task_backend in [None, backend]:
+                    outputs = await asyncio.gather(
+                        run.average_run_data_async('vmi', **kwargs, backend=task_backend, **no_cache),
+                        run.average_run_data_async('i0m', **kwargs, backend=task_backend, **no_cache))
+                    assert np.allclose(outputs[0], vmi) and np.allclose(outputs[1], i0m)
+            errors = await run.average_run_data_errors_async('vmi', **kwargs, **no_cache)
+            for expected, output in zip(run.average_run_data_errors('vmi', **kwargs, **no_cache), errors):
+                assert np.allclose(expected, output, equal_nan=True)
+
+            # cached blocks are shared with the synchronous methods
+            blocked = await run.average_run_data_weights_async('vmi', num_files_per_cache=2, **kwargs)
+            assert np.allclose(blocked[0], vmi)
+            assert np.allclose(run.run_accumulator('vmi', num_files_per_cache=2, make_cache=False, **kwargs).mean(), vmi)
+
+            multithread_run = MultithreadRun(runs[1], alias_dict=default_alias_dict)
+            multithread_run.num_cores = 2
+            assert np.allclose(await multithread_run.average_run_data_async('vmi', **kwargs, **no_cache), vmi)
+
+            set_average, set_weights = await run_sets.average_set_data_weights_async('vmi', back_sep=True, **no_cache)
+            expected = run_sets.average_set_data_weights('vmi', back_sep=True, **no_cache)  # NaN without shots
+            assert np.isnan(expected[0][2]).all()
+            assert np.allclose(set_average, expected[0], equal_nan=True) and np.array_equal(set_weights, expected[1])
+            run_averages = await run_sets.average_run_data_async('vmi', back_sep=True, **no_cache)
+            assert np.allclose(run_averages, run_sets.average_run_data('vmi', back_sep=True, **no_cache))
+
+            # a newer request supersedes the stale one
+            latest = Latest()
+            stale = latest.submit('vmi', run.average_run_data_async('vmi', **kwargs, **no_cache))
+            newest = latest.submit('vmi', run.average_run_data_async('vmi', **kwargs, **no_cache))
+            assert np.allclose(await newest, vmi)
+            assert stale.cancelled() and not latest.running('vmi')
+
+            # cancelling drops the tasks which have not started
+            with SerialBackend() as backend:
+                task = asyncio.ensure_future(starmap(backend, time.sleep, [(0.2,)]*10))
+                await asyncio.sleep(0.05)
+                task.cancel()
+                start = time.perf_counter()
+                await asyncio.to_thread(backend.close)
+                assert task.cancelled() and time.perf_counter() - start < 1
+
+        asyncio.run(main())
+
+        # futures for code without an event loop
+        with BackgroundLoop() as background:
+            stale = background.submit(run.average_run_data_async('vmi', **kwargs, **no_cache), key='vmi')
+            newest = background.submit(run.average_run_data_async('vmi', **kwargs, **no_cache), key='vmi')
+            assert np.allclose(newest.result(timeout=60), vmi)
+            concurrent.futures.wait([stale], timeout=60)
+            assert stale.cancelled()
@@ -0,0 +1,48 @@
+import tempfile
+import numpy as np
+from fermi_libraries.run_module import Run, RunSets, MultithreadRun
+from fermi_libraries.synthetic_data import write_synthetic_beamtime, default_alias_dict
+
+def test_average_errors():
+    with tempfile.TemporaryDirectory() as tempdir:
+        runs = write_synthetic_beamtime(tempdir, runs=2, delays=[-50, 50], files=5, shots_per_file=20,
+                                        frame_shape=(12, 12), with_tof=False, seed=0)
+        run = Run(runs[1], alias_dict=default_alias_dict)
+        no_cache = dict(use_cache=False, make_cache=False)
+        kwargs = dict(back_sep=True, rules=[None, '(i0m>0.5)'])
+
+        shots = run.give_rundata('vmi', **kwargs, **no_cache)
+        average, std, error, weights = run.average_run_data_errors('vmi', **kwargs, **no_cache)
+        for condition in range(2):
+            for rule in range(2):
+                data = np.asarray(shots[condition][rule], dtype=float)
+                assert weights[condition][rule] == len(data)
+                if len(data) < 2:
+                    assert np.all(np.isnan(std[condition][rule]))
+                    continue
+                assert np.allclose(average[condition][rule], data.mean(axis=0))
+                assert np.allclose(std[condition][rule], data.std(axis=0, ddof=1))
+                assert np.allclose(error[condition][rule], data.std(axis=0, ddof=1)/np.sqrt(len(data)))
+        assert np.allclose(average, run.average_run_data('vmi', **kwargs, **no_cache))
+
+        # cached blocks (also an incomplete one) and multiple processes give the same result
+        for _ in range(2):
+            blocked = run.average_run_data_errors('vmi', num_files_per_cache=2, **kwargs)
+            for expected, output in zip([average, std, error, weights], blocked):
+                assert np.allclose(expected, output, equal_nan=True)
+        multithread_run = MultithreadRun(runs[1], alias_dict=default_alias_dict)
+        multithread_run.num_cores = 2
+        for expected, output in zip([average, std, error, weights],
+                                    multithread_run.average_run_data_errors('vmi', **kwargs, **no_cache)):
+            assert np.allclose(expected, output, equal_nan=True)
+
+        # merged over Runs
+        run_sets = RunSets([run, Run(runs[2], alias_dict=default_alias_dict)])
+        set_average, set_std, set_error, set_weights = run_sets.average_set_data_errors('vmi', back_sep=True, **no_cache)
+        run_errors = run_sets.average_run_data_errors('vmi', back_sep=True, **no_cache)
+        assert np.allclose(run_errors[0][0][0], run.average_run_data('vmi', back_sep=True, **no_cache)[0])
+        data = np.concatenate([np.asarray(run_instance.give_rundata('vmi', back_sep=True, **no_cache)[0][0], dtype=float)
+                               for run_instance in run_sets.run_instances])
+        assert set_weights[0][0] == len(data)
+        assert np.allclose(set_std[0][0], data.std(axis=0, ddof=1))
+        assert np.allclose(set_error[0][0], data.std(axis=0, ddof=1)/np.sqrt(len(data)))
@@ -0,0 +1,50 @@
+import os
+import glob
+import tempfile
+import numpy as np
+import pytest
+from fermi_libraries.run_module import Run, RunSets, MultithreadRun
+from fermi_libraries.backends import SerialBackend, ProcessPoolBackend, SocketBackend
+from fermi_libraries.synthetic_data import write_synthetic_beamtime, default_alias_dict
+
+def _fail(x):
+    raise ValueError(f'bad task {x}')
+
+def test_backends():
+    with tempfile.TemporaryDirectory() as tempdir:
+        runs = write_synthetic_beamtime(tempdir, runs=2, delays=[-50, 50], files=3, shots_per_file=20,
+                                        frame_shape=(16, 16), with_tof=False, seed=0)
+        run_sets = RunSets([Run(filepaths, alias_dict=default_alias_dict) for filepaths in runs.values()])
+        no_cache = dict(use_cache=False, make_cache=False)
+        reference = run_sets.average_run_data_weights('vmi', back_sep=True, rules=[None, '(i0m>0.5)'], **no_cache)
+
+        with SocketBackend(local_workers=2, timeout=60) as backend:
+            assert backend.address[0] == '127.0.0.1'  # not reachable from other machines by default
+            assert backend.starmap(pow, [(2, 3), (3, 2)]) == [8, 9]
+            with pytest.raises(RuntimeError, match='bad task 1'):
+                backend.starmap(_fail, [(1,)])
+            with ProcessPoolBackend(2) as pool_backend:
+                for task_backend in [SerialBackend(), pool_backend, backend]:
+                    averages, weights = run_sets.average_run_data_weights(
+                        'vmi', back_sep=True, rules=[None, '(i0m>0.5)'], backend=task_backend, **no_cache)
+                    for i in range(2):
+                        assert np.allclose(averages[i], reference[0][i]) and np.array_equal(weights[i], reference[1][i])
+
+            # the per-run caches are the same as those of Run.average_run_data_weights()
+            run_sets.average_run_data_weights('vmi', back_sep=True, backend=backend)
+            assert len(glob.glob(os.path.join(tempdir, 'Run_*', 'work', 'average_run_data_weights_cache', '*'))) == 2
+            cached = run_sets.average_run_data_weights('vmi', back_sep=True, make_cache=False)
+            averages, weights = run_sets.average_run_data_weights('vmi', back_sep=True, **no_cache)
+            assert np.allclose(cached[0], averages) and np.array_equal(cached[1], weights)
+
+            multithread_run = MultithreadRun(runs[1], alias_dict=default_alias_dict)
+            multithread_run.backend = backend
+            assert all(name != 'backend' for name, _ in multithread_run.object_attributes())
+            vmi = multithread_run.average_run_data('vmi', back_sep=True, **no_cache)
+            assert np.allclose(vmi, Run(runs[1], alias_dict=default_alias_dict).average_run_data(
+                'vmi', back_sep=True, **no_cache))
+
+            scan_edges = [-100, 0, 100]
+            scan = run_sets.average_scan_data('vmi', 'delay', scan_edges, backend=backend, **no_cache)
+            assert np.allclose(scan, run_sets.average_scan_data('vmi', 'delay', scan_edges, **no_cache))
+        assert backend.workers == []
@@ -0,0 +1,52 @@
+import glob
+import numpy as np
+from fermi_libraries.run_module import Run
+from fermi_libraries.common_functions import single_pass_moment_sums, batch_moment_sums
+from fermi_libraries.reducers import batch_filter, ROIIntegral
+
+def roi_sums(trace):
+    return np.array([trace[:1000].sum(), trace[1000:].sum()], dtype=float)
+
+@batch_filter
+def batch_roi_sums(shots):
+    return np.stack([shots[:, :1000].sum(axis=-1), shots[:, 1000:].sum(axis=-1)], axis=-1).astype(float)
+
+def test_batch_filters():
+    # same moment sums from a batch as from the per-sample generator
+    data = np.random.default_rng(1).normal(size=(50, 4))
+    single = single_pass_moment_sums((line for line in data), filter1=lambda x: x[:3], filter2=lambda x: x[1:])
+    batch = batch_moment_sums(data[:, :3], data[:, 1:])
+    for key in ['covar_sum', 'x_sum', 'y_sum', 'count']:
+        assert np.allclose(single[key], batch[key])
+    empty = batch_moment_sums(np.zeros((0, 3)))
+    assert empty['count'] == 0 and np.shape(empty['covar_sum']) == (3, 3) and np.all(empty['covar_sum'] == 0)
+
+    filepaths = sorted(glob.glob('examples/TestBeamtime/Beamtime/Run_005/rawdata/*.h5'))
+    dataname = 'digitizer/channel1'
+    run = Run(filepaths)
+    run.slu_offset = 0  # these files have no SLU dataset
+
+    # give_rundata: per-shot and batch filters agree, also for empty conditions
+    kwargs = dict(back_sep=True, use_cache=False, make_cache=False)
+    per_shot = run.give_rundata(dataname, filter1=roi_sums, **kwargs)
+    batch = run.give_rundata(dataname, filter1=batch_roi_sums, **kwargs)
+    for per_shot_split, batch_split in zip(per_shot, batch):
+        for per_shot_rule, batch_rule in zip(per_shot_split, batch_split):
+            assert np.shape(per_shot_rule) == np.shape(batch_rule)
+            assert np.allclose(per_shot_rule, batch_rule)
+    assert np.shape(batch[0][0]) == (27, 2) and np.shape(batch[2][0]) == (0, 2)
+
+    # moment sums: the batch path (also for reducers) gives the per-shot result
+    roi = ROIIntegral.from_ranges(np.arange(60000), [(0, 1000), (1000, 60000)])
+    kwargs = dict(back_sep=True, use_cache=False, make_cache=False)
+    per_shot = run.give_moment_sums_rundata(dataname, filter1=roi_sums, filter2=roi_sums, **kwargs)
+    for batch_filter1 in [batch_roi_sums, roi]:
+        batch = run.give_moment_sums_rundata(dataname, filter1=batch_filter1, filter2=batch_filter1, **kwargs)
+        for per_shot_output, batch_output in zip(per_shot, batch):
+            assert np.allclose(np.array(per_shot_output, dtype=float), np.array(batch_output, dtype=float))
+
+    # a batch filter with a per-shot filter: each is applied on its own
+    for filters in [dict(filter1=batch_roi_sums, filter2=roi_sums), dict(filter1=roi_sums, filter2=roi)]:
+        mixed = run.give_moment_sums_rundata(dataname, **filters, **kwargs)
+        for per_shot_output, mixed_output in zip(per_shot, mixed):
+            assert np.allclose(np.array(per_shot_output, dtype=float), np.array(mixed_output, dtype=float))
@@ -0,0 +1,31 @@
+import numpy as np
+from fermi_libraries.common_functions import rebinning
+from fermi_libraries.calibration_tools import (
+    tof_to_mq_operator, tof_to_ke_operator, tof_to_mq_conversion, tof_to_ke_conversion)
+
+def test_calibration_operators():
+    tof = np.arange(0, 20000, 1.0) + 0.5
+    spectrum = np.exp(-(tof-8000)**2/(2*30**2)) + 0.5*np.exp(-(tof-12000)**2/(2*40**2))
+    spectra = np.stack([spectrum, 2*spectrum, 3*spectrum])[:,None,:] * np.ones((1, 2, 1))
+
+    # TOF -> m/q: the same as the conversion followed by rebinning, and conserving counts
+    t0, propconst = 500., 1e-5
+    mq = np.linspace(1, 1600, 3000)
+    operator = tof_to_mq_operator(tof, mq, t0, propconst)
+    mq_spectra = operator.apply(spectra, axis=-1)
+    assert mq_spectra.shape == (3, 2, len(mq))
+    reference = rebinning(mq, *tof_to_mq_conversion(tof, spectrum, t0, propconst))
+    assert np.allclose(mq_spectra[0,0], reference, atol=1e-5*np.max(reference))
+    assert np.isclose(np.sum(mq_spectra[2,1])*(mq[1]-mq[0]), 3*np.sum(spectrum))
+    assert tof_to_mq_operator(tof, mq, t0, propconst) is operator
+    assert tof_to_mq_operator(tof, mq, t0+1, propconst) is not operator
+
+    # TOF -> KE, with the absolute Jacobian
+    t0, propconst, ke0 = 100., 1.6e-9, 0.2
+    ke = np.linspace(0.5, 30, 2000)
+    ke_spectra = tof_to_ke_operator(tof, ke, t0, propconst, ke0).apply(spectra.transpose(2,0,1), axis=0)
+    ke_coor, ke_spectrum = tof_to_ke_conversion(tof, spectrum, t0, propconst, ke0)
+    order = np.argsort(ke_coor)
+    reference = rebinning(ke, ke_coor[order], -ke_spectrum[order])
+    assert np.allclose(ke_spectra[:,0,0], reference, atol=1e-5*np.max(reference))
+    assert np.isclose(np.sum(ke_spectra[:,1,0])*(ke[1]-ke[0]), 2*np.sum(spectrum))
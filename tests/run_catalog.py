@@ -0,0 +1,57 @@
+import os
+import glob
+import tempfile
+import numpy as np
+from fermi_libraries.run_module import Run
+from fermi_libraries import catalog
+from fermi_libraries.synthetic_data import write_synthetic_run, write_synthetic_file, default_alias_dict
+
+def test_catalog():
+    with tempfile.TemporaryDirectory() as tempdir:
+        filepaths = write_synthetic_run(tempdir, 1, files=2, shots_per_file=30, frame_shape=(20, 20),
+                                        with_tof=False, chunks='shot', seed=0)
+        rawdata = os.path.dirname(filepaths[0])
+        no_vmi = os.path.join(rawdata, 'Run_001_9000.h5')
+        write_synthetic_file(no_vmi, first_bunch=9000, shots=30, with_vmi=False, with_tof=False, seed=1)
+        broken = os.path.join(rawdata, 'Run_001_9030.h5')
+        with open(broken, 'wb') as f:
+            f.write(b'not an hdf5 file')
+        missing = os.path.join(rawdata, 'Run_001_9060.h5')
+
+        run = Run(filepaths + [no_vmi, broken, missing], alias_dict=default_alias_dict)
+        run_catalog = run.get_catalog()
+        assert run.get_catalog() is run_catalog
+        assert run_catalog.unreadable() == [broken, missing]
+        assert run.check_file_path() == ([missing], [broken])
+        assert run_catalog.with_dataset('vmi/andor') == filepaths
+        entry = run_catalog[filepaths[0]]
+        assert entry.shots == 30 and entry.background_period == 3
+        vmi = entry.dataset('/vmi/andor')
+        assert vmi.shape == (30, 20, 20) and vmi.dtype == 'uint16'
+        assert vmi.chunks == (1, 20, 20) and vmi.compression == 'gzip'
+        assert len(glob.glob(os.path.join(tempdir, 'Run_001', 'work', 'catalog_cache', '*.json'))) == 4  # all existing files
+
+        # only the files with the dataset are opened
+        with run.profile() as profile:
+            averages, weights = run.average_run_data_weights('vmi', back_sep=True, use_cache=False, make_cache=False)
+        assert profile.aggregate()['open'].count == 2
+        assert np.sum(weights) == 60
+        assert np.allclose(run.get_background_period(), [3, 3, 3])
+
+        # a call stats every file about once, not once per file and rule
+        file_identity, calls = catalog.file_identity, []
+        catalog.file_identity = lambda filepath: calls.append(filepath) or file_identity(filepath)
+        try:
+            run.average_run_data_weights('vmi', back_sep=True, rules=[None, '(i0m>0.5)', '(i0m>1)'],
+                                         use_cache=False, make_cache=False)
+        finally:
+            catalog.file_identity = file_identity
+        assert len(calls) <= 2*len(run.filepaths)
+
+        # from the cache file (same identity), and remade for a changed file
+        catalog._entries.clear()
+        assert catalog.get_entry(filepaths[0]).as_dict() == entry.as_dict()
+        write_synthetic_file(filepaths[1], first_bunch=5000, shots=12, frame_shape=(20, 20), with_tof=False, seed=2)
+        os.utime(filepaths[1], ns=(0, 10**18))
+        assert run.get_catalog() is not run_catalog
+        assert run.get_catalog()[filepaths[1]].shots == 12
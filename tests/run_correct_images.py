@@ -0,0 +1,44 @@
+import numpy as np
+from scipy.ndimage import rotate as scipy_rot
+from cpbasex.image_mod import correct_images, correction_operator, resize
+
+def ring_image(coordinates_raw, coordinates_col, radii=(30, 60), width=4, beta=1.5):
+    R = np.sqrt(coordinates_raw**2 + coordinates_col**2)
+    cos_theta = np.nan_to_num(coordinates_col/R)
+    return sum(np.exp(-(R-r0)**2/(2*width**2)) * (1 + beta*(1.5*cos_theta**2 - 0.5)) for r0 in radii)
+
+def test_correct_images():
+    N, nx, center = 200, 50, (104, 97)
+    raw = np.arange(N)[:,None] + 0.5 - center[0]
+    col = np.arange(N)[None,:] + 0.5 - center[1]
+    image = ring_image(raw/1.1, col)
+
+    # expected: circular rings, folded onto the cpbasex grid (both halves summed)
+    x = (np.arange(nx)[:,None] + 0.5) * 2
+    y = (np.arange(2*nx)[None,:] - nx + 0.5) * 2
+    expected = 2*ring_image(x, y)
+
+    folded = correct_images(image, nx, center=center, stretch=(1/1.1, 1), r_max=100)
+    assert folded.shape == (nx, 2*nx)
+    assert np.max(np.abs(folded - expected)) < 2e-2*np.max(expected)
+
+    # rotation, and a stack of images in one product
+    rotated = scipy_rot(ring_image(np.arange(N)[:,None]+0.5-100, np.arange(N)[None,:]+0.5-100), -15, reshape=False)
+    stack = np.stack((rotated, 2*rotated), axis=-1)
+    folded = correct_images(stack, nx, center=(100, 100), rotation=15, r_max=100)
+    assert folded.shape == (nx, 2*nx, 2)
+    assert np.max(np.abs(folded[...,0] - expected)) < 2e-2*np.max(expected)
+    assert np.allclose(folded[...,1], 2*folded[...,0])
+
+    # without folding, it matches resize() of the centered image
+    centered = ring_image(np.arange(N)[:,None]+0.5-100, np.arange(N)[None,:]+0.5-100)
+    full = correct_images(centered, nx, r_max=100, fold=False)
+    assert full.shape == (2*nx, 2*nx)
+    assert np.max(np.abs(full - resize(centered, (2*nx, 2*nx)))) < 0.1*np.max(centered)
+
+    # one half only, and the operator is cached per geometry
+    half = correct_images(centered, nx, r_max=100, half_filter=(0, 1))
+    assert np.allclose(2*half, correct_images(centered, nx, r_max=100), rtol=0.05, atol=1e-2)
+    n_cached = correction_operator.cache_info().currsize
+    correct_images(centered, nx, r_max=100, half_filter=(0, 1))
+    assert correction_operator.cache_info().currsize == n_cached
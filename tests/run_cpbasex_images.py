@@ -0,0 +1,53 @@
+import os
+import tempfile
+import numpy as np
+import h5py
+from quadrant import unfoldQuadrant
+from cpbasex.gData import get_gData, loadG
+from cpbasex.cpbasex import cpbasex_energy, reconstruct_images
+from cpbasex.image_mod import unfoldHalf
+
+def make_small_gdata(save_dir, shape='half', nx=30, xkratio=3):
+    gData = {}
+    gData['rBF'] = 'gauss'
+    gData['x'] = np.arange(nx, dtype='double')+0.5
+    gData['k'] = np.arange(0, nx, xkratio) + 0.5 * (xkratio - 1)
+    gData['params'] = 0.7 * xkratio
+    gData['l'] = np.arange(0, 5, 2)
+    save_path = os.path.join(save_dir, f'_temp_G_{shape}.h5')
+    np.seterr("ignore")
+    get_gData(gData, save_path=save_path, nProc=1, silent=1, shape=shape)
+    return save_path
+
+def test_cpbasex_images():
+    rng = np.random.default_rng(0)
+    regularization = 0.1
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for shape, unfold in [('half', unfoldHalf), ('quadrant', unfoldQuadrant)]:
+            save_path = make_small_gdata(tmpdir, shape=shape)
+            gData = loadG(save_path, make_images=True)
+            with h5py.File(save_path, 'r') as f:
+                Ginv = f['Ginv'][()]
+            assert 'Ginv' not in gData
+
+            nx, ny = len(gData['x']), len(gData['y'])
+            c = rng.normal(size=(gData['nk']*gData['nl'], 3))
+            fit, inv = reconstruct_images(c, gData, regularization=regularization, shape=shape)
+
+            # reference: dense diagonal scaling and dense Ginv
+            fit_shape = (nx, ny) if shape=='half' else (ny, nx)
+            dense_fit = gData['Up'].T.dot(np.diag((gData['S']**2+regularization)/gData['S']).dot(gData['V'].T.dot(c)))
+            dense_fit = unfold(dense_fit.reshape(fit_shape+(3,)))
+            dense_inv = unfold(Ginv.dot(c).reshape(nx, ny, 3))
+            assert np.allclose(fit, dense_fit)
+            assert np.max(np.abs(inv-dense_inv)) < 1e-2*np.max(np.abs(dense_inv))
+
+            # selected images, and a downsampled preview
+            fit_1, inv_1 = reconstruct_images(c, gData, regularization=regularization, shape=shape, image_indices=[1])
+            assert np.allclose(fit_1[...,0], fit[...,1]) and np.allclose(inv_1[...,0], inv[...,1])
+            _, inv_preview = reconstruct_images(c, gData, shape=shape, image_step=2)
+            assert inv_preview.shape[:2] == unfold(np.zeros((nx, ny))[::2, ::2]).shape
+
+            images = rng.random(size=fit_shape+(2,))
+            out = cpbasex_energy(images, gData, make_images=True, shape=shape, image_indices=0)
+            assert out['fit'].shape == out['inv'].shape == unfold(images[...,:1]).shape[:2]
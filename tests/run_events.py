@@ -0,0 +1,62 @@
+import os
+import tempfile
+import numpy as np
+import h5py
+from fermi_libraries.run_module import Run
+from fermi_libraries.events import EventStore
+
+def sparse_frames(rng, shots, shape=(40, 60), hits=5):
+    frames = rng.normal(0, 0.1, size=(shots,) + shape)
+    for frame in frames:
+        frame[rng.integers(0, shape[0], hits), rng.integers(0, shape[1], hits)] += rng.uniform(1, 3, hits)
+    return frames
+
+def test_events():
+    rng = np.random.default_rng(2)
+    frames = sparse_frames(rng, 30)
+    thresholded = np.where(frames > 0.5, frames, 0)
+    events = EventStore.from_frames(frames, 0.5)
+    assert len(events) == 30 and events.num_events == np.count_nonzero(thresholded)
+
+    # sums, histograms at another resolution, recentring, counting
+    assert np.allclose(events.sum_image(), thresholded.sum(axis=0), atol=1e-5)
+    binned = events.histogram(np.arange(0, 41, 2), np.arange(0, 61, 2))
+    assert np.allclose(binned, thresholded.sum(axis=0).reshape(20, 2, 30, 2).sum(axis=(1, 3)), atol=1e-4)
+    shifted = events.histogram(np.arange(-10, 31), np.arange(-20, 41), center=(10, 20))
+    assert np.allclose(shifted, events.sum_image(), atol=1e-4)
+    assert np.isclose(events.sum_image(counting=True).sum(), events.num_events)
+
+    # selecting shots, re-thresholding and joining stores without the frames
+    assert np.allclose(events.select([3, 1]).frames(), thresholded[[3, 1]], atol=1e-5)
+    assert np.allclose(events.select(np.arange(30) % 2 == 0).sum_image(), thresholded[::2].sum(axis=0), atol=1e-5)
+    assert np.allclose(events.threshold(2).frames(), np.where(frames > 2, frames, 0), atol=1e-5)
+    joined = EventStore.concatenate([events.select(slice(0, 10)), events.select(slice(10, 30))])
+    assert np.array_equal(joined.indptr, events.indptr) and np.array_equal(joined.x, events.x)
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        events.save(f'{tempdir}/events.npz')
+        loaded = EventStore.load(f'{tempdir}/events.npz')
+        assert np.array_equal(loaded.frames(), events.frames())
+
+        # events of a Run, cached per file
+        os.makedirs(f'{tempdir}/Run_001/rawdata')
+        os.makedirs(f'{tempdir}/Run_001/work')
+        filepaths = []
+        for i in range(2):
+            filepath = f'{tempdir}/Run_001/rawdata/Run_001_{i}.h5'
+            with h5py.File(filepath, 'w') as f:
+                f['bunches'] = np.arange(i*30, (i+1)*30)
+                f['Background_Period'] = 3
+                f['vmi/andor'] = sparse_frames(rng, 30)
+            filepaths.append(filepath)
+        run = Run(filepaths)
+        run.slu_offset = 0
+        run_events = run.give_events('vmi/andor', threshold=0.5, back_sep=True, use_cache=False, make_cache=True)
+        frames = run.give_rundata('vmi/andor', back_sep=True)
+        for split_events, split_frames in zip(run_events, frames):
+            assert len(split_events[0]) == len(split_frames[0])
+            assert np.allclose(split_events[0].sum_image(),
+                               np.where(split_frames[0] > 0.5, split_frames[0], 0).sum(axis=0), atol=1e-4)
+        cached = run.give_events('vmi/andor', threshold=0.5, back_sep=True, use_cache=True, make_cache=False)
+        assert len(os.listdir(f'{tempdir}/Run_001/work/give_events_cache')) == 2
+        assert np.array_equal(cached[1][0].frames(), run_events[1][0].frames())
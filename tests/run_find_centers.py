@@ -0,0 +1,28 @@
+import numpy as np
+from cpbasex.image_mod import find_center, find_centers
+
+def ring_image(shape, center, r0=20, width=3, beta=1.0):
+    raw = np.arange(shape[0])[:,None] + 0.5 - center[0]
+    col = np.arange(shape[1])[None,:] + 0.5 - center[1]
+    R = np.sqrt(raw**2 + col**2)
+    cos_theta = np.nan_to_num(raw/R)
+    return np.exp(-(R-r0)**2/(2*width**2)) * (1 + beta*(1.5*cos_theta**2 - 0.5))
+
+def test_find_centers():
+    rng = np.random.default_rng(0)
+    centers = np.array([(50.3, 48.8), (47.0, 52.5), (51.75, 49.2)]).T
+    stack = np.stack([ring_image((100, 100), c) for c in centers.T], axis=-1)
+    stack += 0.02*rng.random(stack.shape)
+
+    found = find_centers(stack)
+    assert found.shape == (2, 3)
+    assert np.max(np.abs(found - centers)) < 0.05
+    found = find_centers(stack, center_guess=(50, 50), r_max=40)
+    assert np.max(np.abs(found - centers)) < 0.05
+
+    # single, non-square image
+    assert np.allclose(find_centers(ring_image((80, 120), (40.3, 61.2))), (40.3, 61.2), atol=0.05)
+
+    # integer convention of find_center: image[:center] is the upper half
+    assert find_center(stack[...,0], (50, 50), 40) == [51, 50]
+    assert find_center(stack[...,1], (50, 50), 40) == [48, 53]
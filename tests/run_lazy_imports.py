@@ -0,0 +1,29 @@
+import sys
+import subprocess
+
+_probe = '''
+import sys
+import {modules}
+print(' '.join(sorted({{name.split('.')[0] for name in sys.modules}} & {{'scipy', 'matplotlib', 'lmfit'}})))
+'''
+
+def loaded_heavy_packages(*modules):
+    output = subprocess.run([sys.executable, '-c', _probe.format(modules=', '.join(modules))],
+                            capture_output=True, text=True, check=True).stdout
+    return output.split()
+
+def test_lazy_imports():
+    assert loaded_heavy_packages('fermi_libraries', 'fermi_libraries.run_module',
+                                 'fermi_libraries.dictionary_search', 'fermi_libraries.common_functions',
+                                 'fermi_libraries.calibration_tools') == []
+    assert 'matplotlib' not in loaded_heavy_packages('cpbasex.image_mod')
+
+    # the deferred imports still work
+    import numpy as np
+    from fermi_libraries.common_functions import nm_to_ev, ev_to_nm, Rebinner
+    assert np.isclose(ev_to_nm(nm_to_ev(20.)), 20.)
+    rebinner = Rebinner(np.linspace(0, 10, 101), np.linspace(0, 10, 6))
+    assert rebinner.apply(np.ones((2, 101)), axis=-1).shape == (2, 6)
+    from cpbasex.image_mod import hot_cmap
+    import cpbasex
+    assert cpbasex.hot_cmap is hot_cmap
@@ -0,0 +1,67 @@
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from fermi_libraries.live_plotting import (
+    BlitManager, ImagePyramid, LiveImage, LiveLine, TracePyramid, axes_pixel_shape, downsample)
+
+def test_live_plotting():
+    image = np.arange(7*9, dtype=float).reshape(7, 9)
+    assert np.array_equal(downsample(image), image[:6, :8].reshape(3, 2, 4, 2).mean(axis=(1, 3)))
+    pyramid = ImagePyramid(np.ones((1000, 1000)))
+    assert pyramid.level((300, 200)).shape == (500, 500)
+    assert pyramid.level((100, 100)).shape == (125, 125)
+    assert pyramid.level((2000, 2000)).shape == (1000, 1000)
+
+    figure = Figure(figsize=(3, 3), dpi=100)
+    canvas = FigureCanvasAgg(figure)
+    ax = figure.subplots()
+    rng = np.random.default_rng(0)
+    live_image = LiveImage(ax.imshow(np.zeros((1, 1))))
+    frame = rng.random((1000, 1000))
+    live_image.artist.set_extent((0, 1000, 1000, 0))
+    live_image.set_data(frame, autoscale=True)
+    rows, columns = axes_pixel_shape(ax)
+    shown = live_image.artist.get_array()
+    assert rows <= shown.shape[0] < 2*rows and columns <= shown.shape[1] < 2*columns
+
+    line, = ax.plot([0, 1000], [0, 1000], color='red')
+    blit_manager = BlitManager(canvas, [live_image.artist, line])
+    assert blit_manager.update()  # the first update draws the figure
+    live_image.set_data(rng.random((1000, 1000)))
+    line.set_ydata([1000, 0])
+    assert not blit_manager.update()
+    blitted = np.array(canvas.buffer_rgba())
+    canvas.draw()
+    assert np.array_equal(blitted, np.asarray(canvas.buffer_rgba()))  # the same as a full redraw
+
+    # draws from elsewhere, new limits and colour limits need a full redraw
+    assert blit_manager.update() and not blit_manager.update()
+    ax.set_xlim(0, 500)
+    assert blit_manager.update()
+    live_image.set_data(2*frame, autoscale=True)
+    assert blit_manager.update() and not blit_manager.update()
+    line.set_visible(False)
+    assert not blit_manager.update() and not line.get_visible()
+
+    # traces: about two points per pixel of the visible range, peaks are kept
+    x = np.linspace(0, 1e4, 100001)
+    y = rng.normal(size=len(x))
+    y[54321], y[7] = 100, -100
+    trace = TracePyramid(x, y)
+    view_x, view_y = trace.view(None, 500)
+    assert 1000 <= len(view_x) <= 2000 and view_y.max() == 100 and view_y.min() == -100
+    assert np.all(np.diff(view_x) >= 0)
+    view_x, view_y = trace.view((5000, 6000), 500)
+    assert 1000 <= len(view_x) <= 2100 and view_y.max() == 100 and view_x[0] <= 5000 and view_x[-1] >= 6000
+    assert np.array_equal(trace.view((5000, 5010), 500)[1], y[49999:50102])  # few samples are shown as they are
+    assert np.nanmax(TracePyramid(x[::-1], y).view((0, 10), 100)[1]) == 100  # unsorted x: the whole trace
+
+    live_line = LiveLine(ax.plot([], [])[0])
+    live_line.set_data(x, y)
+    assert len(live_line.line.get_xdata()) <= 4*axes_pixel_shape(ax)[1]
+    assert np.array_equal(live_line.get_data()[1], y)
+    ax.set_xlim(5000, 5010)
+    assert np.array_equal(live_line.line.get_ydata(), y[49999:50102])
+    ax.set_xlim(0, 1)
+    live_line.set_data(x[:10], y[:10])
+    assert np.array_equal(live_line.line.get_ydata(), y[:10])
@@ -0,0 +1,43 @@
+import numpy as np
+import lmfit
+from fermi_libraries.common_functions import gaussians, non_normalized_gaussians, residuals
+from fermi_libraries.peak_fitting import MODELS, fit_spectra, guess_gaussian
+
+def test_peak_fitting():
+    x = np.linspace(0, 100, 300)
+    params = np.array([[50., 40, 5, 20, 60, 3]])
+    dict_params = dict(zip(['amp0', 'center0', 'width0', 'amp1', 'center1', 'width1'], params[0]))
+    # the models are those of common_functions, with their analytic jacobians
+    for model, reference in [(MODELS['gaussians'], gaussians), (MODELS['non_normalized_gaussians'], non_normalized_gaussians)]:
+        values, jacobian = model(x, params)
+        assert np.allclose(values[0], reference(dict_params, x))
+        numerical = np.stack([(model(x, params + 1e-6*step)[0] - values)/1e-6 for step in np.eye(6)], axis=-1)
+        assert np.allclose(jacobian, numerical, atol=1e-5*np.abs(jacobian).max())
+
+    # a delay scan (delays, rules) with a moving peak
+    rng = np.random.default_rng(0)
+    centers = 40 + np.linspace(0, 10, 20)[:, None] + np.zeros(3)
+    true = np.stack([100 + 0*centers, centers, 4 + 0*centers], axis=-1)
+    spectra = MODELS['gaussians'](x, true.reshape(-1, 3))[0].reshape(20, 3, -1) + rng.normal(0, 0.2, (20, 3, len(x)))
+    fits = fit_spectra(x, spectra, [80, 38, 6], scan_axis=0)
+    assert fits.shape == (20, 3) and fits.params.shape == (20, 3, 3) and fits.success.all()
+    assert np.all(np.abs(fits['center0'] - centers) < 5*fits.error('center0'))
+    cold = fit_spectra(x, spectra, [80, 38, 6], scan_axis=0, warm_start=False)
+    assert np.allclose(cold.params, fits.params) and fits.iterations.sum() < cold.iterations.sum()
+
+    # the same values and errors as lmfit
+    initial = lmfit.Parameters()
+    initial.add_many(('amp0', 80), ('center0', 38), ('width0', 6))
+    result = lmfit.minimize(residuals, initial, args=(gaussians, x, spectra[7, 1]))
+    for name in ['amp0', 'center0', 'width0']:
+        assert np.isclose(fits[name][7, 1], result.params[name].value, rtol=1e-6)
+        assert np.isclose(fits.error(name)[7, 1], result.params[name].stderr, rtol=1e-3)
+
+    # other axes on worker processes, fixed parameters, errors, gaps, guesses
+    assert np.allclose(fit_spectra(x, spectra, [80, 38, 6], scan_axis=0, num_processes=2).params, fits.params)
+    fixed = fit_spectra(x, spectra[0], [80, 38, 4.5], vary=[True, True, False], yerr=0.2, scale_covar=False)
+    assert np.all(fixed['width0'] == 4.5) and np.all(fixed.error('width0') == 0)
+    assert np.all(fixed.error('center0') > 0)
+    gaps = spectra[0].copy()
+    gaps[:, 100:120] = np.nan
+    assert fit_spectra(x, gaps, guess_gaussian(x, gaps)).success.all()
@@ -0,0 +1,49 @@
+import tempfile
+import warnings
+import numpy as np
+from fermi_libraries.run_module import Run
+from fermi_libraries import planner
+from fermi_libraries.synthetic_data import write_synthetic_run, default_alias_dict
+
+def test_planner():
+    with tempfile.TemporaryDirectory() as tempdir:
+        filepaths = write_synthetic_run(tempdir, 1, files=4, shots_per_file=20, frame_shape=(40, 50),
+                                        with_tof=False, seed=0)
+        run = Run(filepaths, alias_dict=default_alias_dict)
+
+        info = planner.DatasetInfo.from_run(run, 'vmi')
+        assert info.shapes == [(20, 40, 50)]*4 and info.dtype == np.uint16 and info.shots == [20]*4
+        assert info.shot_size(0, slice_range=[(0, 20, 1), (None, None, 2)]) == 20*25
+
+        frame_bytes = 20*40*50*2
+        estimate = run.estimate_memory('vmi', rules=[None, '(i0m>30)'])
+        sums_bytes = 4*2*8*40*50
+        assert estimate.per_file >= frame_bytes*3 + sums_bytes
+        assert estimate.parent == 2*sums_bytes
+        # the files are merged as they are read: more files, or cache blocks, add no file sums
+        many_files = planner.DatasetInfo(info.filepaths*10, info.shapes*10, info.dtype, info.shots*10)
+        assert planner.estimate_memory(many_files, rules=[None, '(i0m>30)']).total == estimate.total
+        blocked = run.estimate_memory('vmi', rules=[None, '(i0m>30)'], num_files_per_cache=1)
+        assert blocked.parent == estimate.parent + 4*sums_bytes
+        assert run.estimate_memory('vmi', num_cores=2).workers >= 2*planner.worker_overhead
+        assert run.estimate_memory('vmi', call='give_rundata').total > 2*4*frame_bytes
+
+        # a budget with room for all files, but not for worker processes
+        plan = run.plan('vmi', memory_budget=estimate.total, max_cores=4, back_sep=True,
+                        rules=[None, '(i0m>30)'], use_cache=False, make_cache=False)
+        assert plan.fits and plan.num_cores == 1 and plan.num_files_per_cache is None
+        averages = plan()
+        direct = run.average_run_data('vmi', back_sep=True, rules=[None, '(i0m>30)'],
+                                      use_cache=False, make_cache=False)
+        assert np.allclose(averages, direct)
+
+        # cache blocks do not help with a smaller budget
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            plan = run.plan('vmi', memory_budget=estimate.total-1, max_cores=1, rules=[None, '(i0m>30)'])
+        assert not plan.fits and plan.num_files_per_cache is None and len(caught) == 1
+
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            plan = run.plan('vmi', call='give_rundata', memory_budget=1000)
+        assert not plan.fits and len(caught) == 1
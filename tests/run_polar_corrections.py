@@ -0,0 +1,35 @@
+import numpy as np
+from scipy.ndimage import rotate as scipy_rot
+from cpbasex.image_mod import polar_transform, find_rotation, find_ellipticity, rotate, stretch
+
+def ring_image(n, center, axes=(1, 1), radii=(20, 35), width=2.5, beta=1.5):
+    raw = (np.arange(n)[:,None] + 0.5 - center[0]) / axes[0]
+    col = (np.arange(n)[None,:] + 0.5 - center[1]) / axes[1]
+    R = np.sqrt(raw**2 + col**2)
+    cos_theta = np.nan_to_num(raw/R)
+    return sum(np.exp(-(R-r0)**2/(2*width**2)) * (1 + beta*(1.5*cos_theta**2 - 0.5)) for r0 in radii)
+
+def test_polar_corrections():
+    image = ring_image(100, (50, 50))
+
+    # polar transform of a stack, with per-image centers
+    stack = np.stack((image, ring_image(100, (48, 53))), axis=-1)
+    r, theta, polar = polar_transform(stack, center=[(50, 48), (50, 53)], r_max=40)
+    assert polar.shape == (40, 360, 2)
+    assert np.allclose(polar[...,0], polar[...,1], atol=1e-2)
+    assert abs(r[np.argmax(np.mean(polar[...,0], axis=1))] - 20) <= 1
+
+    # rotation, corrected by rotate()
+    angles = np.array([10, -20, 40])
+    rotated = np.stack([scipy_rot(image, angle, reshape=False) for angle in angles], axis=-1)
+    found = find_rotation(rotated, center=(50, 50))
+    assert np.allclose(found, -angles, atol=0.1)
+    assert np.allclose(find_rotation(rotated[...,0], guess=90, center=(50, 50)), 80, atol=0.1)
+    assert np.max(np.abs(rotate(rotated[...,0], found[0]) - image)) < 0.1*np.max(image)
+
+    # ellipticity, corrected by stretch()
+    elliptic = ring_image(100, (50, 50), axes=(1.1, 1))
+    factors = find_ellipticity(elliptic, center=(50, 50))
+    assert np.allclose(factors, (1.1**-0.5, 1.1**0.5), atol=5e-3)
+    assert np.allclose(find_ellipticity(stretch(elliptic, factors), center=(50, 50)), 1, atol=5e-3)
+    assert find_ellipticity(np.stack((image, elliptic), axis=-1)).shape == (2, 2)
@@ -0,0 +1,40 @@
+import tempfile
+import numpy as np
+from fermi_libraries.run_module import Run, MultithreadRun, RunSets
+from fermi_libraries import profiling
+from fermi_libraries.synthetic_data import write_synthetic_run, default_alias_dict
+
+def test_profiling():
+    with tempfile.TemporaryDirectory() as tempdir:
+        filepaths = write_synthetic_run(tempdir, 1, files=2, shots_per_file=20, frame_shape=(32, 32),
+                                        with_tof=False, seed=0)
+        run = Run(filepaths, alias_dict=default_alias_dict)
+
+        with run.profile(memory=True) as profile:
+            averages = run.average_run_data('vmi', back_sep=True, slu_sep=True, rules=['(i0m>30)'])
+            cached = run.average_run_data('vmi', back_sep=True, slu_sep=True, rules=['(i0m>30)'])
+        assert profiling.active() is None
+        assert np.allclose(averages, cached)
+
+        aggregate = profile.aggregate()
+        for stage in ['open', 'read', 'mask', 'rules', 'select', 'reduce', 'cache_lookup', 'cache_write']:
+            assert stage in aggregate, stage
+        assert aggregate['read'].decompressed_bytes == 2*20*32*32*2  # uint16 frames
+        assert aggregate['read'].count == 2 and aggregate['cache_lookup'].nbytes > 0
+        assert aggregate['select'].peak_memory > 0
+        per_file = profile.per_file()
+        assert set(per_file) == set(filepaths) | {None}
+        assert per_file[filepaths[0]]['reduce'].count == 1
+        assert profile.bound() in ('io', 'decompression', 'python', 'cache')
+        assert profile.log_line().startswith(f'{profile.seconds:.2f} s')
+        assert profile.as_dict()['aggregate']['read']['nbytes'] == aggregate['read'].nbytes
+
+        multithread_run = MultithreadRun(filepaths, alias_dict=default_alias_dict)
+        multithread_run.num_cores = 2
+        with RunSets([multithread_run]).profile() as profile:
+            multithread_averages = multithread_run.average_run_data(
+                'vmi', back_sep=True, slu_sep=True, rules=['(i0m>30)'], use_cache=False, make_cache=False)
+        assert np.allclose(multithread_averages, averages)
+        per_file = profile.per_file()
+        assert all('read' in per_file[filepath] for filepath in filepaths)  # from the worker processes
+        assert profile.aggregate()['ipc'].nbytes > 0
@@ -0,0 +1,38 @@
+import tempfile
+import numpy as np
+from cpbasex.gData import loadG
+from cpbasex.cpbasex import cpbasex, cpbasex_energy
+from cpbasex.rbasex import rbasex, rbasex_energy, _rbasex_tables
+from tests.run_cpbasex_images import make_small_gdata
+
+def test_rbasex():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        gData = loadG(make_small_gdata(tmpdir, shape='half', nx=30, xkratio=2))
+
+    # forward projection of two rings with beta2=1, beta4=-0.3
+    nx, nk = len(gData['x']), gData['nk']
+    k = np.arange(nk)
+    profile = np.exp(-(k-0.6*nk)**2/4) + 0.5*np.exp(-(k-0.3*nk)**2/2)
+    c = np.concatenate((profile, profile, -0.3*profile))[:,None]
+    images = gData['Up'].T.dot(gData['S'][:,None]*gData['V'].T.dot(c)).reshape(nx, 2*nx, 1)
+    images = np.concatenate((images, 2*images), axis=2)
+
+    ref = cpbasex(images, gData)
+    out = rbasex(images, make_images=True)
+    assert np.allclose(out['r'], ref['r'])
+    assert np.max(np.abs(out['IR']-ref['IR'])) < 5e-2*np.max(ref['IR'])
+    ring = ref['IR'][:,0] > 0.2*np.max(ref['IR'][:,0])
+    assert np.max(np.abs(out['betas'][ring]-ref['betas'][ring])) < 5e-2
+    assert out['fit'].shape == out['inv'].shape == (2*nx, 2*nx, 2)
+    assert np.max(np.abs(out['fit']-np.vstack((images[::-1], images)))) < 5e-2*np.max(images)
+
+    # the tables of a few settings are kept, e.g. for a regularization slider
+    for regularization in np.linspace(0, 1, 10):
+        rbasex(images, regularization=regularization)
+    assert _rbasex_tables.cache_info().currsize == _rbasex_tables.cache_info().maxsize
+
+    ref = cpbasex_energy(images[...,0], gData, alpha=2.0)
+    out = rbasex_energy(images[...,0], alpha=2.0)
+    assert set(out) == set(ref) - {'c'}  # no coefficients of the gData basis functions
+    assert np.allclose(out['E'], ref['E'])
+    assert np.max(np.abs(out['IE']-ref['IE'])) < 5e-2*np.max(ref['IE'])
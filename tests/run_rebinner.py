@@ -0,0 +1,35 @@
+import numpy as np
+from fermi_libraries.common_functions import Rebinner, get_rebinner, rebinning
+
+def test_rebinner():
+    x = np.linspace(0, 10, 1001)
+    xnew = np.linspace(0, 10, 51)
+    y = np.exp(-(x-5)**2)
+
+    # conservative: the integral is unchanged, and a new bin is the average of the old ones
+    rebinner = Rebinner(x, xnew)
+    ynew = rebinner.apply(y)
+    assert np.isclose(np.sum(ynew)*(xnew[1]-xnew[0]), np.sum(y)*(x[1]-x[0]), rtol=1e-6)
+    assert np.isclose(ynew[25], np.mean(y[(x > 4.9) & (x < 5.1)]), rtol=1e-3)
+    assert np.allclose(Rebinner(x, x).apply(y), y)
+
+    # batched along any axis, and unsorted grids
+    batch = np.stack([y, 2*y, 3*y])[:,None,:] * np.ones((1, 4, 1))
+    assert np.allclose(rebinner.apply(batch, axis=-1)[2,3], 3*ynew)
+    assert np.allclose(rebinner.apply(batch.transpose(2,0,1), axis=0)[:,1,0], 2*ynew)
+    assert np.allclose(Rebinner(x[::-1], xnew).apply(y[::-1]), ynew)
+    assert np.allclose(Rebinner(x, xnew[::-1]).apply(y), ynew[::-1])
+
+    # NaNs only spoil the new bins they fall into
+    y_nan = y.copy()
+    y_nan[500] = np.nan
+    ynew_nan = rebinner.apply(y_nan)
+    assert np.flatnonzero(np.isnan(ynew_nan)).tolist() == [25]
+    assert np.allclose(np.delete(ynew_nan, 25), np.delete(ynew, 25))
+
+    # outside of x the result is zero
+    assert np.all(Rebinner(x, np.linspace(11, 12, 5)).apply(y) == 0)
+
+    # cached per pair of grids, and used by rebinning()
+    assert get_rebinner(x, xnew) is get_rebinner(x.copy(), xnew.copy())
+    assert np.allclose(rebinning(xnew, x, batch, axis=-1), rebinner.apply(batch))
@@ -0,0 +1,66 @@
+import os
+import glob
+import pickle
+import numpy as np
+from fermi_libraries.run_module import Run, MultithreadRun, cache_args, cacheable
+from fermi_libraries.reducers import (
+    apply_reducer, Rebin, ROIIntegral, PixelBinning, Projection, Chain)
+
+def head(trace):
+    return trace[:1000]
+
+def test_reducers():
+    # batch reducers on (shots, ...) arrays, including files without shots
+    images = np.random.default_rng(0).random((5, 6, 8))
+    binned = PixelBinning((2, 2))(images)
+    assert binned.shape == (5, 3, 4)
+    assert np.isclose(binned[1, 2, 3], images[1, 4:6, 6:8].sum())
+    assert np.allclose(Projection(0)(images), images.sum(axis=1))
+    assert np.allclose(Chain(PixelBinning((2, 2)), Projection(-1))(images), binned.sum(axis=-1))
+    masks = np.zeros((2, 6, 8), dtype=bool)
+    masks[0, :3], masks[1, 3:] = True, True
+    assert np.allclose(ROIIntegral(masks)(images), np.stack([images[:, :3].sum(axis=(1, 2)),
+                                                              images[:, 3:].sum(axis=(1, 2))], axis=-1))
+    assert apply_reducer(PixelBinning((2, 2)), np.zeros((0, 6, 8))).shape == (0, 3, 4)
+    assert apply_reducer(np.sum, np.zeros((0, 6, 8))).shape == (0,)
+    assert np.allclose(apply_reducer(np.sum, images), images.sum(axis=(1, 2)))
+
+    # picklable, and the repr (part of the cache key) depends on the parameters
+    x = np.arange(60000, dtype=float)
+    rebin = Rebin(x, x[::100]+49.5)
+    assert repr(pickle.loads(pickle.dumps(rebin))) == repr(rebin)
+    assert repr(Rebin(x, x[::50])) != repr(rebin)
+    args = (['file'], 'data', True, False, None, [None])
+    assert cache_args(*args) == args
+    assert cache_args(*args, rebin)[-1] == repr(rebin) == rebin.cache_key
+    # other callables have no deterministic key, and are not cached
+    assert not cacheable(head) and not cacheable(lambda trace: trace[:10]) and not cacheable(Chain(rebin, head))
+    assert cacheable(None) and cacheable(Chain(rebin, Projection(-1)))
+
+    # reduced accumulation equals the reduction of the accumulated raw traces
+    filepaths = sorted(glob.glob('examples/TestBeamtime/Beamtime/Run_005/rawdata/*.h5'))
+    dataname = 'digitizer/channel1'
+    run = Run(filepaths)
+    run.slu_offset = 0  # these files have no SLU dataset
+    raw, raw_weights = run.average_run_data_weights(dataname, back_sep=True, use_cache=False, make_cache=False)
+    reduced, weights = run.average_run_data_weights(dataname, back_sep=True, use_cache=False, make_cache=False,
+                                                    reducer=rebin)
+    assert np.shape(reduced) == (4, 1, 600)
+    assert np.array_equal(weights, raw_weights)
+    assert np.allclose(reduced, rebin.operator().apply(np.array(raw, dtype=float), axis=-1))
+
+    roi = ROIIntegral.from_ranges(x, [(0, 1000), (1000, 60000)])
+    multithread_run = MultithreadRun(filepaths)
+    multithread_run.num_cores = 2
+    multithread_run.slu_offset = 0
+    reduced = multithread_run.average_run_data(dataname, back_sep=True, use_cache=False, make_cache=False,
+                                               reducer=roi)
+    assert np.allclose(reduced, roi(np.array(raw, dtype=float)[:, 0])[:, None])
+
+    cache_dir = 'examples/TestBeamtime/Beamtime/work/average_run_data_weights_cache'
+    caches = set(os.listdir(cache_dir)) if os.path.isdir(cache_dir) else set()
+    for reduced in [run.average_run_data(dataname, back_sep=True, reducer=head),
+                    run.average_run_data_errors(dataname, back_sep=True, reducer=head)[0],
+                    multithread_run.average_run_data(dataname, back_sep=True, reducer=head)]:
+        assert np.allclose(reduced, np.array(raw, dtype=float)[..., :1000])
+    assert (set(os.listdir(cache_dir)) if os.path.isdir(cache_dir) else set()) == caches
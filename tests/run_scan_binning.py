@@ -0,0 +1,72 @@
+import os
+import glob
+import shutil
+import tempfile
+import numpy as np
+from fermi_libraries.run_module import Run, RunSets
+from fermi_libraries.common_functions import binned_sums
+
+def test_scan_binning():
+    values = np.array([0.5, 1.5, 1.5, 2.0, np.nan, -1])
+    sums, counts = binned_sums(values, np.array([0., 1., 2.]), np.arange(12).reshape(6, 2))
+    assert counts.tolist() == [1, 3]
+    assert np.allclose(sums, [[0, 1], [2+4+6, 3+5+7]])
+
+    source_filepaths = sorted(glob.glob('examples/TestBeamtime/Beamtime/Run_005/rawdata/*.h5'))
+    dataname, scan_name = 'digitizer/channel1', 'delay'
+    alias_dict = {'delay': 'user_laser/delay_line/position', 'i0m': 'photon_diagnostics/FEL01/I0_monitor/iom_sh_a'}
+    scan_edges = np.array([15.9997, 16.0000, 16.00015, 16.0004])
+    rules = [None, '(i0m<-4.5)']
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        runs = []
+        for i, source_filepath in enumerate(source_filepaths):  # one file per run
+            rawdata_dir = f'{tempdir}/Run_{i:03d}/rawdata'
+            os.makedirs(rawdata_dir)
+            os.makedirs(f'{tempdir}/Run_{i:03d}/work')
+            shutil.copy(source_filepath, rawdata_dir)
+            run = Run(glob.glob(f'{rawdata_dir}/*.h5'), alias_dict=alias_dict)
+            run.slu_offset = 0  # these files have no SLU dataset
+            runs.append(run)
+        run_set = RunSets(runs)
+
+        kwargs = dict(back_sep=True, rules=rules, slice_range=[(0, 1000, 1)])
+        average, weights = run_set.average_scan_data_weights(
+            dataname, scan_name, scan_edges, use_cache=False, make_cache=True, num_cores=2, **kwargs)
+        assert np.shape(average) == (4, 2, 3, 1000) and np.shape(weights) == (4, 2, 3)
+
+        # reference: bin the shots of give_rundata by hand
+        traces = [run.give_rundata(dataname, **kwargs) for run in runs]
+        delays = [run.give_rundata(scan_name, back_sep=True, rules=rules) for run in runs]
+        for i in range(2):
+            for j in range(2):
+                trace = np.concatenate([run_traces[i][j] for run_traces in traces]).astype(float)
+                delay = np.concatenate([run_delays[i][j] for run_delays in delays])[:, 0]
+                index = np.digitize(delay, scan_edges)-1
+                assert weights[i][j].tolist() == [np.sum(index==k) for k in range(3)]
+                for k in range(3):
+                    if np.any(index==k):
+                        assert np.allclose(average[i][j][k], trace[index==k].mean(axis=0))
+                    else:
+                        assert np.all(average[i][j][k] == 0)
+        assert np.sum(weights[0][0]) + np.sum(weights[1][0]) == 40
+
+        # the per-run caches give the same result, and a single Run bins the same way
+        cached_average, cached_weights = run_set.average_scan_data_weights(
+            dataname, scan_name, scan_edges, use_cache=True, make_cache=False, **kwargs)
+        assert np.allclose(cached_average, average) and np.array_equal(cached_weights, weights)
+        run_average, run_weights = runs[0].average_scan_data_weights(
+            dataname, scan_name, scan_edges, use_cache=False, make_cache=False, **kwargs)
+        assert np.all(run_weights <= weights)
+        assert np.sum(run_weights[:2, 0]) == 20
+
+        # an unreadable file is skipped
+        corrupt_filepath = f'{tempdir}/Run_000/rawdata/0_corrupt.h5'
+        with open(corrupt_filepath, 'wb') as file:
+            file.write(b'not an hdf5 file')
+        corrupt_run = Run([corrupt_filepath] + runs[0].filepaths, alias_dict=alias_dict)
+        corrupt_run.slu_offset = 0
+        for num_cores in [1, 2]:
+            skipped_average, skipped_weights = RunSets([corrupt_run] + runs[1:]).average_scan_data_weights(
+                dataname, scan_name, scan_edges, use_cache=False, make_cache=False, num_cores=num_cores, **kwargs)
+            assert np.allclose(skipped_average, average) and np.array_equal(skipped_weights, weights)
@@ -0,0 +1,53 @@
+import tempfile
+import h5py
+import numpy as np
+from fermi_libraries.run_module import Run, MultithreadRun
+from fermi_libraries.common_functions import robust_inliers
+from fermi_libraries.synthetic_data import write_synthetic_beamtime, default_alias_dict
+
+def test_shot_filters():
+    values = np.concatenate([np.random.default_rng(0).normal(10, 1, 200), [50, -40, np.nan]])
+    for method in ['mad', 'clip']:
+        inliers = robust_inliers(values, nsigma=5, method=method)
+        assert not inliers[-3:].any() and inliers[:-3].mean() > 0.99
+    # the statistics are taken per group: the second group is not an outlier of the first
+    groups = np.repeat([0, 1], [100, 103])
+    shifted = np.where(groups == 1, values + 1000, values)
+    assert np.array_equal(robust_inliers(shifted, groups=groups), robust_inliers(values, groups=groups))
+    # a median absolute deviation of zero (most shots without counts) keeps the small counts
+    counts = np.concatenate([np.zeros(60), np.random.default_rng(1).integers(1, 4, 40), [1000]])
+    assert np.array_equal(robust_inliers(counts), np.arange(101) < 100)
+    assert robust_inliers(np.zeros(10)).all()
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        runs = write_synthetic_beamtime(tempdir, runs=1, delays=[0], files=4, shots_per_file=30,
+                                        frame_shape=(8, 8), with_tof=False, seed=1)
+        filepaths = runs[1]
+        spikes = [4, 10]  # one foreground shot (background period 3) in each of two files
+        for filepath, spike in zip(filepaths, spikes):
+            with h5py.File(filepath, 'r+') as file:
+                file[default_alias_dict['i0m']][spike] = 1e4
+
+        run = Run(filepaths, alias_dict=default_alias_dict)
+        no_cache = dict(use_cache=False, make_cache=False)
+        i0m = run.give_rundata('i0m', back_sep=True, rules=[None, '(i0m@5)', '(i0m#3)'], **no_cache)
+        for method in [1, 2]:
+            assert np.max(i0m[0][method]) < 1e3  # the spikes are rejected
+            assert len(i0m[1][method]) == len(i0m[1][0])  # no background shot is
+        assert len(i0m[0][0]) - len(i0m[0][1]) >= len(spikes)
+
+        # frames are compared by a reduction per shot, here their maximum
+        vmi = run.give_rundata('vmi', back_sep=True, rules=['(vmi@5,max)&(i0m@5)'], **no_cache)
+        assert len(vmi[0][0]) <= len(i0m[0][1])
+
+        # the same shots with cached blocks and on worker processes
+        kwargs = dict(back_sep=True, rules=[None, '(i0m@5)'])
+        average, weights = run.average_run_data_weights('vmi', **kwargs, **no_cache)
+        assert np.array_equal(weights[0], [len(i0m[0][0]), len(i0m[0][1])])
+        for _ in range(2):
+            blocked = run.average_run_data_weights('vmi', num_files_per_cache=3, **kwargs)
+            assert np.allclose(average, blocked[0]) and np.array_equal(weights, blocked[1])
+        multithread_run = MultithreadRun(filepaths, alias_dict=default_alias_dict)
+        multithread_run.num_cores = 2
+        output = multithread_run.average_run_data_weights('vmi', **kwargs, **no_cache)
+        assert np.allclose(average, output[0]) and np.array_equal(weights, output[1])
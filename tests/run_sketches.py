@@ -0,0 +1,53 @@
+import tempfile
+import numpy as np
+from fermi_libraries.run_module import Run, RunSets
+from fermi_libraries.sketches import Histogram, QuantileSketch, merge_all
+from fermi_libraries.synthetic_data import write_synthetic_beamtime, default_alias_dict
+
+def test_sketches():
+    rng = np.random.default_rng(0)
+    parts = [rng.gamma(8, 5, size=n) for n in [40, 3000, 700, 5000]]
+    values = np.sort(np.concatenate(parts))
+    sketch = merge_all(QuantileSketch.from_values([[part]], size=100) for part in parts)
+    q = np.linspace(0, 1, 11)
+    ranks = np.searchsorted(values, sketch.quantile(q)[0, 0])/len(values)
+    assert np.abs(ranks - q).max() < 0.02
+    assert sketch.count[0, 0] == len(values) and sketch.quantile(1)[0, 0] == values[-1]
+    # exact below size values, NaN without values
+    assert np.allclose(QuantileSketch.from_values([[np.arange(11.)]]).edges(2), [0, 5, 10])
+    assert np.all(np.isnan(QuantileSketch.from_values([[[]]]).median()))
+    edges = np.linspace(0, 60, 13)
+    histogram = merge_all(Histogram.from_values(edges, [[part]]) for part in parts)
+    assert np.array_equal(histogram.counts[0, 0], np.histogram(values, edges)[0])
+    assert histogram.total[0, 0] == len(values) and histogram.overflow[0, 0] == np.sum(values > 60)
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        runs = write_synthetic_beamtime(tempdir, runs=2, delays=[-50, 50], files=3, shots_per_file=40,
+                                        with_vmi=False, with_tof=False, seed=2)
+        run_sets = RunSets([Run(filepaths, alias_dict=default_alias_dict) for filepaths in runs.values()])
+        no_cache = dict(use_cache=False, make_cache=False)
+        kwargs = dict(back_sep=True, rules=[None, '(i0m>40)'])
+
+        rundata = run_sets.give_rundata('i0m', **kwargs, **no_cache)  # (conditions, runs, rules)
+        shots = [[np.concatenate([np.ravel(run_data[rule]) for run_data in split_data]) for rule in range(2)]
+                 for split_data in rundata]
+        edges = np.linspace(-10, 100, 23)
+        histogram, sketch = run_sets.set_sketches('i0m', edges=edges, size=50, **kwargs)
+        for condition in range(2):
+            for rule in range(2):
+                rule_shots = shots[condition][rule]
+                assert np.array_equal(histogram.counts[condition, rule], np.histogram(rule_shots, edges)[0])
+                assert sketch.count[condition, rule] == len(rule_shots)
+                if len(rule_shots):
+                    assert sketch.minimum[condition, rule] == rule_shots.min()
+
+        # equal-population edges; the same on worker processes
+        i0m_edges = run_sets.quantile_edges('i0m', 4, **kwargs)
+        assert i0m_edges.shape == (4, 2, 5)  # (conditions, rules, edges)
+        fore = np.sort(shots[0][0])
+        populations = np.diff(np.searchsorted(fore, i0m_edges[0, 0], side='right'))
+        assert populations.min() >= len(fore)/4 - 3
+        assert np.allclose(i0m_edges, run_sets.quantile_edges('i0m', 4, num_cores=2, **kwargs), equal_nan=True)
+
+        run_histogram = run_sets.run_instances[0].histogram_run_data('i0m', edges, back_sep=True)
+        assert np.array_equal(run_histogram.counts, run_sets.run_sketches('i0m', edges=edges, back_sep=True)[0][0].counts)
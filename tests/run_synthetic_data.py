@@ -0,0 +1,26 @@
+import tempfile
+import numpy as np
+import h5py
+from fermi_libraries.run_module import Run
+from fermi_libraries.synthetic_data import write_synthetic_beamtime, default_alias_dict
+
+def test_synthetic_data():
+    with tempfile.TemporaryDirectory() as tempdir:
+        runs = write_synthetic_beamtime(tempdir, runs=2, delays=[-50, 50], files=2, shots_per_file=30,
+                                        frame_shape=(64, 64), tof_bins=8000, chunks='shot', seed=0)
+        assert sorted(runs) == [1, 2] and all(len(filepaths) == 2 for filepaths in runs.values())
+        with h5py.File(runs[1][0], 'r') as f:
+            assert f['vmi/andor'].shape == (30, 64, 64) and f['vmi/andor'].chunks == (1, 64, 64)
+            assert f['digitizer/channel1'].shape == (30, 8000) and f['digitizer/channel1'].dtype == np.int16
+            assert f['Background_Period'][()] == 3
+
+        run = Run(runs[2], alias_dict=default_alias_dict)
+        vmi, weights = run.average_run_data_weights('vmi', back_sep=True, slu_sep=True,
+                                                    use_cache=False, make_cache=False)
+        assert np.sum(weights) == 60 and np.all(np.array(weights) > 0)
+        fore, back = np.array(vmi[0][0], dtype=float), np.array(vmi[1][0], dtype=float)
+        assert fore.sum() > back.sum()  # FEL-on shots have hits, background shots only noise
+        delays = run.average_run_data('delay', use_cache=False, make_cache=False)
+        assert np.isclose(np.squeeze(delays[0]), 50, atol=1e-3)
+        ion_tof = run.average_run_data('ion_tof', back_sep=True, use_cache=False, make_cache=False)
+        assert np.min(ion_tof[0][0]) < np.min(ion_tof[1][0])  # negative ion peaks (H+ at ~7200)